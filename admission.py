@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+准入控制（过载保护）
+每个路由（或共用的默认通道）限制同时处理的请求数，超出的请求在有界队列中按到达顺序等待：
+
+- 队列已满，或按最近的处理耗时估算等待时间会超过 max_wait：立即拒绝
+- 在队列中等待超过 max_wait 仍未轮到：放弃等待并拒绝（不再处理已经等太久的请求）
+
+被拒绝的请求返回 503 和 Retry-After，不占用工作线程、数据库连接，也不会在后面堆积成超时。
+
+同步请求（Flask 工作线程）和协程（ASGI 模式）使用同一套通道，名额在两者之间按到达顺序交接。
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+
+# 处理耗时的指数滑动平均系数
+SERVICE_TIME_ALPHA = 0.2
+
+# 拒绝原因
+QUEUE_FULL = 'queue_full'
+DEADLINE = 'deadline'
+TIMEOUT = 'timeout'
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入"""
+
+    def __init__(self, route, reason, retry_after):
+        super().__init__(f"服务器繁忙，请稍后重试（{route}: {reason}）")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Ticket:
+    """排队中的一个请求；名额交接给它时 granted 置为真"""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.event = None if loop else threading.Event()
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+class AdmissionLane:
+    """一个准入通道：并发上限 + 有界等待队列"""
+
+    def __init__(self, name, max_concurrent=64, max_queue=128, max_wait=2.0, retry_after=1):
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = float(max_wait)
+        self.retry_after = float(retry_after)
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = deque()
+        self._service_time = 0.0
+
+        # 统计计数器
+        self._admitted = 0
+        self._queued = 0
+        self._rejected = {QUEUE_FULL: 0, DEADLINE: 0, TIMEOUT: 0}
+        self._max_depth = 0
+
+    def _try_enter(self, loop=None):
+        """调用者持有锁：有空闲名额返回 None，需要排队返回排队凭据，不能排队时抛出 AdmissionRejected"""
+        if self._active < self.max_concurrent and not self._queue:
+            self._active += 1
+            self._admitted += 1
+            return None
+        if len(self._queue) >= self.max_queue:
+            raise self._reject(QUEUE_FULL)
+        # 按排在前面的请求数和平均处理耗时估算等待时间，肯定等不到的请求不进入队列
+        if self._expected_wait(len(self._queue) + 1) > self.max_wait:
+            raise self._reject(DEADLINE)
+        ticket = _Ticket(loop)
+        self._queue.append(ticket)
+        self._queued += 1
+        self._max_depth = max(self._max_depth, len(self._queue))
+        return ticket
+
+    def _expected_wait(self, position):
+        return position / self.max_concurrent * self._service_time
+
+    def _reject(self, reason):
+        # 调用者持有锁
+        self._rejected[reason] += 1
+        retry_after = max(self.retry_after, self._expected_wait(len(self._queue) + 1))
+        return AdmissionRejected(self.name, reason, math.ceil(retry_after))
+
+    def _give_up(self, ticket):
+        """等待时被取消：已交接名额则转交下一个，否则离开队列"""
+        with self._lock:
+            if ticket.granted:
+                self._hand_over()
+            else:
+                self._queue.remove(ticket)
+
+    def acquire(self):
+        """取得名额（工作线程中调用），最多排队 max_wait 秒"""
+        with self._lock:
+            ticket = self._try_enter()
+        if ticket is None:
+            return time.monotonic()
+        ticket.event.wait(self.max_wait)
+        with self._lock:
+            if ticket.granted:
+                self._admitted += 1
+                return time.monotonic()
+            self._queue.remove(ticket)
+            raise self._reject(TIMEOUT)
+
+    async def acquire_async(self):
+        """acquire() 的协程版本（事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            ticket = self._try_enter(loop)
+        if ticket is None:
+            return time.monotonic()
+        # 不使用 asyncio.wait_for：它可能在名额到达的同时吞掉取消
+        handle = loop.call_later(self.max_wait, _resolve, ticket.future)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            self._give_up(ticket)
+            raise
+        finally:
+            handle.cancel()
+        with self._lock:
+            if ticket.granted:
+                self._admitted += 1
+                return time.monotonic()
+            self._queue.remove(ticket)
+            raise self._reject(TIMEOUT)
+
+    def release(self, started_at):
+        """处理结束，started_at 为 acquire() 的返回值；名额直接交给队首的请求"""
+        elapsed = time.monotonic() - started_at
+        with self._lock:
+            if self._service_time:
+                self._service_time += SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+            else:
+                self._service_time = elapsed
+            self._hand_over()
+
+    def _hand_over(self):
+        # 调用者持有锁
+        if self._queue:
+            ticket = self._queue.popleft()
+            ticket.granted = True
+            ticket.wake()
+        else:
+            self._active -= 1
+
+    def reset(self):
+        """fork之后在子进程中调用：重建锁，丢弃父进程中的计数和排队请求"""
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = deque()
+
+    def stats(self):
+        """通道统计信息"""
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'max_wait': self.max_wait,
+                'active': self._active,
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self._max_depth,
+                'admitted': self._admitted,
+                'queued': self._queued,
+                'rejected': dict(self._rejected),
+                'avg_service_ms': round(self._service_time * 1000, 3)
+            }
+
+
+class AdmissionControl:
+    """按路由分配准入通道"""
+
+    def __init__(self, routes=None, default=None, exempt=(), retry_after=1, enabled=True):
+        self.enabled = bool(enabled)
+        # 路由规则（如 /api/rate-plugin）-> 通道；未单独配置的路由共用默认通道
+        self.lanes = {
+            route: AdmissionLane(route, retry_after=retry_after, **limits)
+            for route, limits in (routes or {}).items()
+        }
+        self.default = AdmissionLane('default', retry_after=retry_after, **default) if default else None
+        self.exempt = frozenset(exempt)
+
+    @classmethod
+    def from_config(cls, admission_config=None):
+        """根据 config.json 的 admission 配置创建"""
+        admission_config = admission_config or {}
+        return cls(
+            routes=admission_config.get('routes'),
+            default=admission_config.get('default'),
+            exempt=admission_config.get('exempt', ['/metrics', '/api/status', '/api/live']),
+            retry_after=admission_config.get('retry_after', 1),
+            enabled=admission_config.get('enabled', True)
+        )
+
+    def lane(self, route):
+        """路由对应的通道，不受限制时返回 None"""
+        if not self.enabled or route in self.exempt:
+            return None
+        return self.lanes.get(route, self.default)
+
+    def after_fork(self):
+        """fork之后在子进程中调用"""
+        for lane in self._all_lanes():
+            lane.reset()
+
+    def _all_lanes(self):
+        lanes = list(self.lanes.values())
+        if self.default:
+            lanes.append(self.default)
+        return lanes
+
+    def stats(self):
+        """各通道的统计信息"""
+        return {
+            'enabled': self.enabled,
+            'lanes': {lane.name: lane.stats() for lane in self._all_lanes()}
+        }
@@ -5,26 +5,125 @@
 简单的静态文件服务器，用于托管游戏网站
 """
 
-from flask import Flask, send_from_directory, send_file, jsonify, request
+from flask import Flask, jsonify, request, g
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.wsgi import wrap_file
 import os
 import mimetypes
 import json
+import hashlib
+import time
+from urllib.parse import urlencode
 import pymysql
 from datetime import datetime
+from decimal import Decimal
 
-# 创建Flask应用
+from config_manager import read_config
+from db_pool import ConnectionPool, PoolTimeoutError
+from admission import AdmissionControl, AdmissionRejected
+from rate_limiter import RateLimiter
+from circuit_breaker import CircuitBreaker, CircuitOpenError, is_connection_error, STATE_VALUES
+import storage
+from response_cache import ResponseCache
+from asset_pipeline import AssetPipeline
+from static_index import StaticIndex
+from hot_file_cache import HotFileCache
+from rating_queue import RatingQueue
+from plugin_stats import (fetch_existing_ratings, fetch_existing_votes, apply_rating_changes,
+                          fetch_ranking_scores, fetch_statistics, fetch_recent_ratings)
+from plugin_catalog import PluginCatalog
+from plugin_ranking import PluginRanking
+from metrics import ServerMetrics
+from live_hub import LiveHub
+from game_saves import SaveStore, SaveError, SAVE_ID_PATTERN, decode_body, decompress, load_json
+from leaderboard import Leaderboards, MAX_NAME_LENGTH, public_player_id
+from plugin_listing import (ListingError, parse_listing_args, decode_cursor, encode_cursor,
+                            build_listing_query, ENSURE_STATISTICS_ROWS_SQL)
+
+# 创建Flask应用（路由在本模块中注册，运行时状态由 create_app() 初始化）
 app = Flask(__name__)
 
 # 配置静态文件目录
 STATIC_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# 设置MIME类型
+mimetypes.add_type('application/javascript', '.js')
+mimetypes.add_type('text/css', '.css')
+mimetypes.add_type('text/html', '.html')
+
+# 带哈希文件名的资源内容不会变化，可以长期缓存
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# 未带哈希的脚本、样式和图片缓存1小时
+STATIC_CACHE_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.gif')
+STATIC_CACHE_CONTROL = 'public, max-age=3600'
+
+# 每个响应都带的跨域响应头
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', 'Content-Type,Content-Encoding,Authorization,If-None-Match,If-Match'),
+    ('Access-Control-Expose-Headers', 'ETag,X-Save-Version'),
+    ('Access-Control-Allow-Methods', 'GET,PUT,PATCH,POST,DELETE,OPTIONS')
+]
+
+PLUGINS_CACHE_KEY = 'plugins'
+PLUGIN_MANIFEST_CACHE_PREFIX = 'plugin-manifest:'
+PLUGIN_STATS_CACHE_PREFIX = 'plugin-stats:'
+PLUGIN_STATS_BATCH_CACHE_PREFIX = 'plugin-stats-batch:'
+
+# 批量统计接口：每个插件默认附带的最近评分条数及上限，单次请求的插件数上限
+RECENT_RATINGS_LIMIT = 10
+MAX_RECENT_RATINGS = 50
+MAX_BATCH_PLUGIN_IDS = 500
+
+# 插件列表中每个插件附带的统计字段，没有统计行时使用默认值
+PLUGIN_STATS_FIELDS = [
+    'total_ratings', 'average_rating', 'ranking_score',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count'
+]
+PLUGIN_LISTING_PARAMS = ('sort', 'limit', 'cursor', 'category', 'complaint')
+EMPTY_PLUGIN_STATS = dict(
+    {field: 0 for field in PLUGIN_STATS_FIELDS},
+    average_rating=Decimal('0.00'),
+    ranking_score=Decimal('3.0000'),
+    last_rating_at=None
+)
+
+# 运行时状态，导入模块时不做任何IO，由 create_app() 填充
+CONFIG = None
+# 运行时数据目录（SQLite数据库、评分队列、指标快照），在网站根目录之外
+DATA_DIR = None
+DB_CONFIG = None
+DB_POOL = None
+DB_BREAKER = None
+RESPONSE_CACHE = None
+ASSET_PIPELINE = None
+STATIC_INDEX = None
+HOT_FILE_CACHE = None
+RATING_QUEUE = None
+# 数据库不可用时暂存评分的本地队列（启用评分队列时就是 RATING_QUEUE）
+RATING_SPOOL = None
+PLUGIN_CATALOG = None
+PLUGIN_RANKING = None
+METRICS = None
+LIVE_HUB = None
+SAVE_STORE = None
+LEADERBOARDS = None
+ADMISSION = None
+RATE_LIMITER = None
+# 服务器前面可信的反向代理层数（server.proxy_count），0 表示不信任 X-Forwarded-For
+PROXY_COUNT = 0
+# ASGI模式下由 asgi_app.create_asgi_app() 设置
+ASGI_APP = None
+
 # 加载配置文件
-def load_config():
+def load_config(config_path=None):
     """加载配置文件"""
-    config_path = os.path.join(STATIC_DIR, 'config.json')
+    config_path = config_path or os.path.join(STATIC_DIR, 'config.json')
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        # 未写出的配置项使用 config.example.json 中的默认值
+        config = read_config(config_path)
         print(f"✅ 配置文件加载成功: {config_path}")
         return config
     except FileNotFoundError:
@@ -38,33 +137,273 @@ def load_config():
         print(f"❌ 加载配置文件失败: {e}")
         return None
 
-# 全局配置
-CONFIG = load_config()
-if not CONFIG:
-    print("❌ 无法加载配置，程序退出")
-    exit(1)
-
-# 数据库配置
-DB_CONFIG = {
-    'host': CONFIG['database']['host'],
-    'port': CONFIG['database']['port'],
-    'user': CONFIG['database']['username'],
-    'password': CONFIG['database']['password'],
-    'database': CONFIG['database']['database'],
-    'charset': CONFIG['database']['charset'],
-    'autocommit': CONFIG['database']['autocommit']
-}
+def build_assets():
+    """构建压缩、带哈希、预压缩的静态资源，失败时退回直接提供源文件"""
+    assets_config = CONFIG.get('assets', {})
+    if not assets_config.get('enabled', True):
+        return None
+    try:
+        pipeline = AssetPipeline.from_config(STATIC_DIR, assets_config).build()
+        print(f"✅ 静态资源构建完成: {len(pipeline.assets)} 个资源")
+        return pipeline
+    except Exception as e:
+        print(f"⚠️  静态资源构建失败，使用源文件: {e}")
+        return None
 
-# 设置MIME类型
-mimetypes.add_type('application/javascript', '.js')
-mimetypes.add_type('text/css', '.css')
-mimetypes.add_type('text/html', '.html')
+def reload_static_files():
+    """重新扫描静态文件并重新构建资源"""
+    global ASSET_PIPELINE
+    count = STATIC_INDEX.refresh()
+    HOT_FILE_CACHE.clear()
+    ASSET_PIPELINE = build_assets()
+    RESPONSE_CACHE.invalidate_prefix(PLUGIN_MANIFEST_CACHE_PREFIX)
+    print(f"🔄 静态文件索引已刷新: {count} 个文件")
+    return count
+
+def start_background_tasks():
+    """启动后台线程（fork出的工作进程需要重新启动）"""
+    METRICS.start()
+    LIVE_HUB.start()
+    SAVE_STORE.start()
+    LEADERBOARDS.start()
+    if RATING_SPOOL:
+        RATING_SPOOL.start()
+    STATIC_INDEX.start_watcher(
+        CONFIG.get('static', {}).get('watch_interval', 0),
+        on_change=reload_static_files
+    )
+
+def create_app(config_path=None, start_background=True):
+    """应用工厂：加载配置并初始化连接池、缓存和静态资源
+
+    多次调用只初始化一次。配置无法加载时抛出 RuntimeError。
+    预fork的服务器传入 start_background=False，由工作进程在fork后启动后台线程。
+    """
+    global CONFIG, DATA_DIR, DB_CONFIG, DB_POOL, DB_BREAKER, RESPONSE_CACHE, ASSET_PIPELINE, STATIC_INDEX, HOT_FILE_CACHE
+    global RATING_QUEUE, RATING_SPOOL, PLUGIN_CATALOG, PLUGIN_RANKING, METRICS, LIVE_HUB, SAVE_STORE
+    global LEADERBOARDS, ADMISSION, RATE_LIMITER, PROXY_COUNT
+    
+    if CONFIG is not None:
+        return app
+    
+    config = load_config(config_path)
+    if not config:
+        raise RuntimeError("无法加载配置")
+    
+    data_dir = storage.data_dir(STATIC_DIR, config)
+    if storage.inside(data_dir, STATIC_DIR):
+        print(f"⚠️  数据目录 {data_dir} 位于网站根目录内，请改到项目目录之外（data_dir 配置）")
+    
+    # 数据库配置（database.backend 选择 MySQL 或本地 SQLite，见 storage.py）
+    connect, db_config = storage.connection_settings(data_dir, config['database'])
+    storage.prepare(data_dir, config['database'])
+    
+    CONFIG = config
+    DATA_DIR = data_dir
+    DB_CONFIG = db_config
+    
+    # 运行指标（请求耗时、数据库语句耗时等），在 /metrics 以 Prometheus 格式导出
+    METRICS = ServerMetrics.from_config(DATA_DIR, CONFIG.get('metrics'))
+    
+    # 数据库连接池（按需建立连接，每个工作进程各自一个，池大小等参数来自 database.pool 配置）
+    DB_POOL = ConnectionPool.from_config(DB_CONFIG, CONFIG['database'].get('pool'), connect=connect)
+    DB_POOL.observer = METRICS
+    
+    # 数据库熔断器：连续连接失败后直接拒绝借出连接，不再每个请求都等待连接超时
+    DB_BREAKER = CircuitBreaker.from_config(CONFIG.get('circuit_breaker'))
+    DB_POOL.breaker = DB_BREAKER
+    
+    # API响应缓存（缓存序列化后的响应体，评分写入时失效）
+    RESPONSE_CACHE = ResponseCache.from_config(CONFIG.get('cache'))
+    
+    ASSET_PIPELINE = build_assets()
+    
+    # 静态文件白名单索引（构建输出目录由 ASSET_PIPELINE 负责，不重复索引）
+    STATIC_INDEX = StaticIndex.from_config(
+        STATIC_DIR, CONFIG.get('static'),
+        exclude_dirs=[CONFIG.get('assets', {}).get('build_dir', 'build')]
+    )
+    STATIC_INDEX.refresh()
+    
+    # 热点小文件常驻内存，大文件走 wsgi.file_wrapper（gunicorn等服务器会使用sendfile零拷贝发送）
+    HOT_FILE_CACHE = HotFileCache.from_config(CONFIG.get('static'))
+    
+    # 启用插件元数据常驻内存，按需检测变化后刷新
+    PLUGIN_CATALOG = PluginCatalog.from_config(
+        get_db_connection, CONFIG.get('catalog'),
+        on_reload=lambda cursor: cursor.execute(ENSURE_STATISTICS_ROWS_SQL)
+    )
+    
+    # 插件排名（按 ranking_score 有序的内存索引），评分写入后增量调整
+    PLUGIN_RANKING = PluginRanking.from_config(get_db_connection, CONFIG.get('ranking'))
+    
+    # 评分写入队列：评分先落盘到本地队列，由后台线程批量写入数据库
+    queue_config = CONFIG.get('rating_queue', {})
+    if queue_config.get('enabled', False):
+        RATING_QUEUE = RatingQueue.from_config(DATA_DIR, write_rating_batch, queue_config)
+    
+    # 未启用评分队列时，数据库不可用期间的评分暂存到同一个本地队列文件，恢复后由后台线程补写
+    RATING_SPOOL = RATING_QUEUE
+    if RATING_SPOOL is None and CONFIG.get('circuit_breaker', {}).get('spool_ratings', True):
+        RATING_SPOOL = RatingQueue.from_config(DATA_DIR, write_rating_batch, queue_config)
+    
+    # 评分统计增量的实时推送（SSE），由持有推送端口的进程广播给浏览器
+    LIVE_HUB = LiveHub.from_config(CONFIG.get('live'))
+    
+    # 游戏存档同步（快照 + 增量补丁，后台线程合并）
+    SAVE_STORE = SaveStore.from_config(get_db_connection, CONFIG.get('saves'))
+    
+    # 全局排行榜（内存有序索引，后台批量写入数据库）
+    LEADERBOARDS = Leaderboards.from_config(get_db_connection, CONFIG.get('leaderboard'))
+    
+    # 准入控制：按路由限制并发和排队，过载时直接返回503
+    ADMISSION = AdmissionControl.from_config(CONFIG.get('admission'))
+    
+    # 按客户端IP的令牌桶限流（共享内存，须在fork之前创建，所有工作进程共用）
+    RATE_LIMITER = RateLimiter.from_config(CONFIG.get('rate_limit'))
+    
+    # 只信任最后 proxy_count 个代理追加的 X-Forwarded-For，request.remote_addr 为真实客户端地址
+    PROXY_COUNT = max(0, int(CONFIG['server'].get('proxy_count', 0)))
+    if PROXY_COUNT:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+    
+    register_component_metrics()
+    
+    if start_background:
+        start_background_tasks()
+    return app
+
+def register_component_metrics():
+    """把连接池、缓存、评分队列已有的统计导出为指标（导出时读取）"""
+    registry = METRICS.registry
+    registry.gauge('db_pool_connections', '连接池中的连接数', ('state',), callback=lambda: {
+        (state,): DB_POOL.stats()[state] for state in ('idle', 'in_use', 'waiting')
+    })
+    registry.counter('db_pool_timeouts_total', '等待连接超时次数',
+                     callback=lambda: DB_POOL.stats()['timeouts'])
+    registry.counter('response_cache_requests_total', 'API响应缓存查找次数', ('result',), callback=lambda: {
+        ('hit',): RESPONSE_CACHE.stats()['hits'], ('miss',): RESPONSE_CACHE.stats()['misses'],
+        ('stale',): RESPONSE_CACHE.stats()['stale_hits']
+    })
+    registry.counter('response_cache_coalesced_total', '等待同一键进行中的加载、未单独查询数据库的请求数',
+                     callback=lambda: RESPONSE_CACHE.stats()['coalesced'])
+    registry.counter('hot_file_cache_requests_total', '热点文件缓存查找次数', ('result',), callback=lambda: {
+        ('hit',): HOT_FILE_CACHE.stats()['hits'], ('miss',): HOT_FILE_CACHE.stats()['misses']
+    })
+    registry.counter('plugin_catalog_reloads_total', '插件元数据快照重新加载次数',
+                     callback=lambda: PLUGIN_CATALOG.stats()['reloads'])
+    registry.counter('plugin_ranking_updates_total', '评分写入后插件排名的增量调整次数',
+                     callback=lambda: PLUGIN_RANKING.stats()['updates'])
+    registry.gauge('db_circuit_state', '数据库熔断器状态（0 关闭、1 半开、2 打开）',
+                   callback=lambda: STATE_VALUES[DB_BREAKER.stats()['state']])
+    registry.gauge('admission_active_requests', '准入通道中正在处理的请求数', ('lane',), callback=lambda: {
+        (name,): lane['active'] for name, lane in ADMISSION.stats()['lanes'].items()
+    })
+    registry.gauge('admission_queue_depth', '准入通道中排队等待的请求数', ('lane',), callback=lambda: {
+        (name,): lane['queue_depth'] for name, lane in ADMISSION.stats()['lanes'].items()
+    })
+    registry.counter('admission_rejected_total', '未被准入、返回503的请求数', ('lane', 'reason'), callback=lambda: {
+        (name, reason): count
+        for name, lane in ADMISSION.stats()['lanes'].items() for reason, count in lane['rejected'].items()
+    })
+    registry.counter('rate_limited_total', '按客户端IP限流、返回429的请求数', ('route',), callback=lambda: {
+        (route,): count for route, count in RATE_LIMITER.stats()['limited'].items()
+    })
+    registry.counter('db_circuit_rejected_total', '熔断期间未尝试连接、直接失败的数据库请求数',
+                     callback=lambda: DB_BREAKER.stats()['rejected'])
+    if RATING_SPOOL:
+        registry.gauge('rating_queue_pending', '评分队列中待写入的评分数',
+                       callback=lambda: RATING_SPOOL.pending())
+        registry.counter('rating_queue_written_total', '评分队列已写入数据库的评分数',
+                         callback=lambda: RATING_SPOOL.stats()['written'])
+    registry.counter('live_events_published_total', '发布到实时推送中心的统计事件数',
+                     callback=lambda: LIVE_HUB.stats()['published'])
+    registry.counter('leaderboard_submissions_total', '排行榜成绩提交次数',
+                     callback=lambda: LEADERBOARDS.stats()['submissions'])
+    registry.gauge('leaderboard_pending_writes', '排行榜尚未写入数据库的成绩数',
+                   callback=lambda: LEADERBOARDS.stats()['pending'])
+    registry.counter('game_save_writes_total', '游戏存档写入次数', ('kind',), callback=lambda: {
+        ('full',): SAVE_STORE.stats()['full_writes'], ('patch',): SAVE_STORE.stats()['patch_writes']
+    })
+    registry.counter('game_save_upload_bytes_total', '游戏存档写入的压缩字节数', ('kind',), callback=lambda: {
+        ('full',): SAVE_STORE.stats()['full_bytes'], ('patch',): SAVE_STORE.stats()['patch_bytes']
+    })
+
+def reinit_after_fork():
+    """在fork出的工作进程中调用：丢弃继承自父进程的连接，重启后台线程"""
+    if CONFIG is None:
+        return
+    DB_POOL.reset()
+    DB_BREAKER.after_fork()
+    ADMISSION.after_fork()
+    RATE_LIMITER.after_fork()
+    METRICS.after_fork()
+    PLUGIN_CATALOG.after_fork()
+    PLUGIN_RANKING.after_fork()
+    LIVE_HUB.after_fork()
+    SAVE_STORE.after_fork()
+    LEADERBOARDS.after_fork()
+    if RATING_SPOOL:
+        RATING_SPOOL.after_fork()
+    start_background_tasks()
+
+def send_static_entry(entry):
+    """按索引条目发送文件，使用预先记录的元数据，不再重复stat
+
+    小文件直接从内存缓存返回；大文件交给 wsgi.file_wrapper，
+    支持的服务器（如gunicorn）会用 os.sendfile 在内核中完成拷贝。
+    两种方式都支持 Range 请求。
+    """
+    try:
+        data = HOT_FILE_CACHE.get(entry)
+        if data is not None:
+            response = app.response_class(data, mimetype=entry.mimetype)
+        else:
+            response = app.response_class(
+                wrap_file(request.environ, open(entry.path, 'rb')),
+                mimetype=entry.mimetype,
+                direct_passthrough=True
+            )
+            response.content_length = entry.size
+    except FileNotFoundError:
+        return f"文件未找到: {entry.rel_path}", 404
+    
+    response.last_modified = entry.mtime
+    response.set_etag(entry.etag)
+    response.cache_control.no_cache = True
+    try:
+        return response.make_conditional(request, accept_ranges=True, complete_length=entry.size)
+    except RequestedRangeNotSatisfiable as e:
+        # 越界的 Range 返回 416（带 Content-Range: bytes */长度），不能被外层当作500
+        response.close()
+        return e.get_response()
+
+def send_built_asset(asset, immutable):
+    """按 Accept-Encoding 发送预压缩的构建产物"""
+    entry, encoding = asset.choose(request.accept_encodings)
+    response = send_static_entry(entry)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+def is_local_request():
+    """是否为本机直接发起的请求（管理接口使用）"""
+    return (request.remote_addr in ('127.0.0.1', '::1')
+            and not request.headers.get('X-Forwarded-For'))
 
 @app.route('/')
 def index():
     """主页路由 - 返回游戏主页面"""
     try:
-        return send_file(os.path.join(STATIC_DIR, 'index.html'))
+        if ASSET_PIPELINE:
+            return send_built_asset(ASSET_PIPELINE.index, immutable=False)
+        entry = STATIC_INDEX.get('index.html')
+        if not entry:
+            return "错误：无法加载游戏页面 - index.html 不存在", 500
+        return send_static_entry(entry)
     except Exception as e:
         return f"错误：无法加载游戏页面 - {str(e)}", 500
 
@@ -72,29 +411,54 @@ def index():
 def static_files(filename):
     """静态文件路由 - 处理所有静态资源"""
     try:
-        # 安全检查：防止目录遍历攻击
-        if '..' in filename or filename.startswith('/'):
-            return "访问被拒绝", 403
+        # 带哈希文件名的构建产物
+        if ASSET_PIPELINE:
+            asset = ASSET_PIPELINE.get(filename)
+            if asset:
+                return send_built_asset(asset, immutable=True)
         
-        file_path = os.path.join(STATIC_DIR, filename)
-        
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
+        # 只提供索引中的文件，目录遍历等路径不可能命中
+        entry = STATIC_INDEX.get(filename)
+        if not entry:
             return f"文件未找到: {filename}", 404
         
-        # 检查是否为文件（不是目录）
-        if not os.path.isfile(file_path):
-            return "无效的文件路径", 400
-        
-        # 获取文件目录和文件名
-        directory = os.path.dirname(file_path)
-        basename = os.path.basename(file_path)
-        
-        return send_from_directory(directory, basename)
+        return send_static_entry(entry)
     
     except Exception as e:
         return f"服务器错误: {str(e)}", 500
 
+@app.route('/api/static/reload', methods=['POST'])
+def api_static_reload():
+    """重新扫描静态文件（仅限本机调用）"""
+    if not is_local_request():
+        return jsonify({'success': False, 'message': '仅允许本机访问'}), 403
+    
+    count = reload_static_files()
+    return jsonify({
+        'success': True,
+        'files': count,
+        'assets': len(ASSET_PIPELINE.assets) if ASSET_PIPELINE else 0
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 格式的运行指标（默认仅限本机，metrics.public 为 true 时对外开放）"""
+    if not CONFIG.get('metrics', {}).get('public', False) and not is_local_request():
+        return jsonify({'success': False, 'message': '仅允许本机访问'}), 403
+    return app.response_class(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/live')
+def api_live():
+    """实时推送的连接地址（插件页面据此建立 EventSource 连接）"""
+    live_config = CONFIG.get('live', {})
+    if not LIVE_HUB.enabled:
+        return jsonify({'success': True, 'enabled': False, 'url': None})
+    # 未配置对外地址时，使用与页面相同的主机名和推送端口
+    host, _, port = request.host.rpartition(':')
+    hostname = host if host and port.isdigit() else request.host
+    url = live_config.get('public_url') or f"//{hostname}:{LIVE_HUB.port}/events"
+    return jsonify({'success': True, 'enabled': True, 'url': url})
+
 @app.route('/api/status')
 def api_status():
     """API状态检查"""
@@ -102,33 +466,132 @@ def api_status():
         'status': 'running',
         'message': '办公室生存游戏服务器运行正常',
         'timestamp': datetime.now().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'db_pool': DB_POOL.stats(),
+        'db_breaker': DB_BREAKER.stats(),
+        'admission': ADMISSION.stats(),
+        'rate_limit': RATE_LIMITER.stats(),
+        'cache': RESPONSE_CACHE.stats(),
+        'hot_files': HOT_FILE_CACHE.stats(),
+        'catalog': PLUGIN_CATALOG.stats(),
+        'ranking': PLUGIN_RANKING.stats(),
+        'rating_queue': RATING_SPOOL.stats() if RATING_SPOOL else None,
+        'live': LIVE_HUB.stats(),
+        'saves': SAVE_STORE.stats(),
+        'leaderboard': LEADERBOARDS.stats(),
+        'asgi': ASGI_APP.stats() if ASGI_APP else None
     })
 
 # 数据库连接函数
 def get_db_connection():
-    """获取数据库连接"""
+    """从连接池获取数据库连接，用完调用 close() 归还"""
     try:
-        connection = pymysql.connect(**DB_CONFIG)
-        return connection
+        return DB_POOL.get_connection()
+    except CircuitOpenError:
+        # 熔断中：立即返回，不逐个请求打印日志
+        return None
+    except PoolTimeoutError as e:
+        print(f"获取数据库连接超时: {e}")
+        return None
     except Exception as e:
         print(f"数据库连接失败: {e}")
         return None
 
-def get_client_ip():
-    """获取客户端IP地址"""
-    if request.headers.get('X-Forwarded-For'):
-        return request.headers.get('X-Forwarded-For').split(',')[0].strip()
-    elif request.headers.get('X-Real-IP'):
-        return request.headers.get('X-Real-IP')
+def make_etag(body):
+    """根据响应体内容计算版本标签，内容不变则标签不变（多进程间一致）"""
+    return hashlib.md5(body).hexdigest()
+
+def json_body_response(body, etag=None, status=200):
+    """用已序列化的JSON响应体构造响应，带ETag时支持 If-None-Match 条件请求"""
+    if etag is None:
+        return app.response_class(body, status=status, mimetype='application/json')
+    
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
     else:
-        return request.remote_addr
+        response = app.response_class(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    # 允许客户端缓存，但每次使用前必须携带ETag重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def cache_json_response(cache_key, response):
+    """缓存成功的JSON响应并返回带ETag的响应"""
+    body = response.get_data()
+    etag = make_etag(body)
+    RESPONSE_CACHE.set(cache_key, (body, etag))
+    return json_body_response(body, etag)
+
+class ApiError(Exception):
+    """加载响应内容失败：错误信息和状态码直接返回给客户端（合并加载时每个等待者都收到同一个错误）"""
+
+    def __init__(self, message, status=500, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def api_error_response(error):
+    response = jsonify({'success': False, 'message': str(error)})
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response, error.status
+
+def db_unavailable_error():
+    """取不到数据库连接时的错误：熔断中返回503和重试时间，否则500"""
+    if DB_BREAKER.is_open():
+        return ApiError('数据库暂时不可用，请稍后重试', status=503, retry_after=DB_BREAKER.retry_after())
+    return ApiError('数据库连接失败')
+
+def stale_plugin_listing(cache_key):
+    """数据库不可用时的插件列表：最后一次成功加载的内容，加上 stale 标记；没有时返回 None"""
+    last_good = RESPONSE_CACHE.last_good(cache_key)
+    if last_good is None:
+        return None
+    payload = json.loads(last_good[0])
+    payload['stale'] = True
+    return cache_entry(payload)
+
+def cache_entry(payload):
+    """序列化响应内容，返回缓存条目 (响应体, ETag)；不依赖请求上下文，可在后台刷新线程中调用"""
+    body = app.json.response(payload).get_data()
+    return body, make_etag(body)
+
+def invalidate_plugin_caches(plugin_id):
+    """评分写入后使插件列表（包括各分页）、该插件统计和批量统计的缓存失效"""
+    RESPONSE_CACHE.invalidate_prefix(PLUGINS_CACHE_KEY)
+    RESPONSE_CACHE.invalidate(f"{PLUGIN_STATS_CACHE_PREFIX}{plugin_id}")
+    RESPONSE_CACHE.invalidate_prefix(PLUGIN_STATS_BATCH_CACHE_PREFIX)
+
+def publish_stat_deltas(deltas):
+    """评分提交后把各插件的星级增量推送给打开插件页面的浏览器"""
+    if deltas:
+        LIVE_HUB.publish('stats', [
+            {'id': plugin_id, 'delta': counts} for plugin_id, counts in sorted(deltas.items())
+        ])
+
+def get_client_ip():
+    """获取客户端IP地址（经过可信代理时 ProxyFix 已把 remote_addr 换成代理转发的客户端地址）"""
+    return request.remote_addr
+
+def client_ip_from(headers, remote_addr):
+    """按连接地址和可信代理转发的 X-Forwarded-For 确定客户端IP（ASGI模式使用，规则与 ProxyFix 相同）
+
+    只取最后 PROXY_COUNT 个代理追加的地址，客户端自己伪造的 X-Forwarded-For 不会被采用
+    """
+    if PROXY_COUNT:
+        forwarded = [value.strip() for value in ','.join(headers.getlist('X-Forwarded-For')).split(',')]
+        if len(forwarded) >= PROXY_COUNT and forwarded[-PROXY_COUNT]:
+            return forwarded[-PROXY_COUNT]
+    return remote_addr
 
 @app.route('/kiro/workshop')
 def plugins_page():
     """插件评分页面"""
     try:
-        return send_file(os.path.join(STATIC_DIR, 'plugins.html'))
+        entry = STATIC_INDEX.get('plugins.html')
+        if not entry:
+            return "错误：无法加载插件页面 - plugins.html 不存在", 500
+        return send_static_entry(entry)
     except Exception as e:
         return f"错误：无法加载插件页面 - {str(e)}", 500
 
@@ -139,210 +602,744 @@ def plugins_page_redirect():
     from flask import redirect
     return redirect('/kiro/workshop', code=301)
 
+def merge_plugin_stats(meta, stats):
+    """把插件元数据（来自内存快照）和统计行合并为接口返回的插件信息"""
+    plugin = dict(meta)
+    if stats:
+        for field in PLUGIN_STATS_FIELDS:
+            plugin[field] = stats[field]
+        plugin['last_rating_at'] = (
+            stats['last_rating_at'].isoformat() if stats['last_rating_at'] else None
+        )
+    else:
+        plugin.update(EMPTY_PLUGIN_STATS)
+    return plugin
+
+# 插件元数据来自内存快照，只需查询统计数据；按排名索引顺序读取，不需要排序
+PLUGIN_LIST_STATS_SQL = """
+    SELECT plugin_id, total_ratings, average_rating, ranking_score,
+           rating_1_count, rating_2_count, rating_3_count,
+           rating_4_count, rating_5_count, last_rating_at
+    FROM plugin_statistics
+    ORDER BY ranking_score DESC, plugin_id ASC
+"""
+
 @app.route('/api/plugins')
 def api_plugins():
-    """获取所有插件信息和统计数据"""
+    """获取插件信息和统计数据
+
+    不带参数时返回全部启用插件；带 sort / limit / cursor / category / complaint 参数时分页返回
+    """
+    if any(name in request.args for name in PLUGIN_LISTING_PARAMS):
+        return api_plugins_page()
+    
+    # 命中缓存时直接返回（或回复304），无需访问数据库；未命中时并发请求共享同一次查询
+    return plugin_listing_response(PLUGINS_CACHE_KEY, load_plugin_list)
+
+def plugin_listing_response(cache_key, load):
+    """插件列表响应：加载失败（数据库不可用）时返回最后一次成功的内容并标记为 stale"""
+    try:
+        cached = RESPONSE_CACHE.fetch(cache_key, load)
+    except ApiError as e:
+        cached = stale_plugin_listing(cache_key) if e.status >= 500 else None
+        if cached is None:
+            return api_error_response(e)
+    return json_body_response(*cached)
+
+def load_plugin_list():
+    """查询全部启用插件的统计数据，返回缓存条目"""
+    catalog = PLUGIN_CATALOG.snapshot()
+    if catalog is None:
+        raise db_unavailable_error()
+    
     connection = get_db_connection()
     if not connection:
-        return jsonify({'success': False, 'message': '数据库连接失败'}), 500
+        raise db_unavailable_error()
     
+    # 在查询之前取得最新事件 id：不大于它的统计增量都已包含在查询结果中
+    last_event_id = LIVE_HUB.last_event_id()
     try:
         with connection.cursor(pymysql.cursors.DictCursor) as cursor:
-            # 查询插件详细信息（包含统计数据）
-            cursor.execute("""
-                SELECT 
-                    p.id, p.plugin_name, p.plugin_id, p.description, p.author, 
-                    p.version, p.icon, p.color, p.category, p.target_complaints,
-                    p.created_at, p.is_active,
-                    COALESCE(s.total_ratings, 0) as total_ratings,
-                    COALESCE(s.average_rating, 0.00) as average_rating,
-                    COALESCE(s.rating_1_count, 0) as rating_1_count,
-                    COALESCE(s.rating_2_count, 0) as rating_2_count,
-                    COALESCE(s.rating_3_count, 0) as rating_3_count,
-                    COALESCE(s.rating_4_count, 0) as rating_4_count,
-                    COALESCE(s.rating_5_count, 0) as rating_5_count,
-                    s.last_rating_at
-                FROM plugins p
-                LEFT JOIN plugin_statistics s ON p.id = s.plugin_id
-                WHERE p.is_active = TRUE
-                ORDER BY s.average_rating DESC, s.total_ratings DESC, p.created_at ASC
-            """)
-            
-            plugins = cursor.fetchall()
-            
-            # 处理JSON字段
-            for plugin in plugins:
-                if plugin['target_complaints']:
-                    try:
-                        plugin['target_complaints'] = json.loads(plugin['target_complaints'])
-                    except:
-                        plugin['target_complaints'] = []
-                else:
-                    plugin['target_complaints'] = []
-                
-                # 格式化时间
-                if plugin['created_at']:
-                    plugin['created_at'] = plugin['created_at'].isoformat()
-                if plugin['last_rating_at']:
-                    plugin['last_rating_at'] = plugin['last_rating_at'].isoformat()
-            
-            return jsonify({
-                'success': True,
-                'plugins': plugins,
-                'total': len(plugins)
-            })
-            
+            cursor.execute(PLUGIN_LIST_STATS_SQL)
+            stats_rows = cursor.fetchall()
     except Exception as e:
         print(f"查询插件失败: {e}")
-        return jsonify({'success': False, 'message': str(e)}), 500
+        raise ApiError(str(e))
+    finally:
+        connection.close()
+    
+    return cache_entry(plugin_list_payload(catalog, stats_rows, last_event_id))
+
+def plugin_list_payload(catalog, stats_rows, last_event_id=None):
+    """全部启用插件的响应内容：统计行已按排名排序，还没有统计行的插件排在最后
+
+    last_event_id 为实时推送的事件 id，页面从它开始订阅统计增量
+    """
+    plugins = [
+        merge_plugin_stats(catalog.by_id[row['plugin_id']], row)
+        for row in stats_rows if row['plugin_id'] in catalog.by_id
+    ]
+    # 还没有统计行的插件（刚添加，下次快照重新加载时补行）排在最后
+    ranked_ids = {row['plugin_id'] for row in stats_rows}
+    plugins.extend(
+        merge_plugin_stats(meta, None) for meta in catalog.plugins if meta['id'] not in ranked_ids
+    )
+    return {
+        'success': True,
+        'plugins': plugins,
+        'total': len(plugins),
+        'last_event_id': last_event_id
+    }
+
+def api_plugins_page():
+    """分页获取插件：按分类、目标抱怨类型筛选，按评分/人数/时间/名称排序，用游标翻页"""
+    try:
+        sort, limit, category, complaint, cursor_token = parse_listing_args(request.args)
+        cursor_values = decode_cursor(sort, cursor_token) if cursor_token else None
+    except ListingError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return plugin_listing_response(
+        plugin_page_cache_key(request.args),
+        lambda: load_plugin_page(sort, limit, category, complaint, cursor_values)
+    )
+
+def load_plugin_page(sort, limit, category, complaint, cursor_values):
+    """查询一页插件，返回缓存条目"""
+    catalog = PLUGIN_CATALOG.snapshot()
+    if catalog is None:
+        raise db_unavailable_error()
+    
+    rows = []
+    # 抱怨类型筛选使用快照中的倒排索引，得到候选插件ID后再按主键查询
+    plugin_ids = catalog.by_complaint.get(complaint, []) if complaint else None
+    if plugin_ids is None or plugin_ids:
+        connection = get_db_connection()
+        if not connection:
+            raise db_unavailable_error()
+        try:
+            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute(*build_listing_query(sort, limit, category, plugin_ids, cursor_values))
+                rows = cursor.fetchall()
+        except Exception as e:
+            print(f"查询插件失败: {e}")
+            raise ApiError(str(e))
+        finally:
+            connection.close()
+    
+    return cache_entry(plugin_page_payload(catalog, rows, sort, limit))
+
+def plugin_page_cache_key(args):
+    """分页插件列表的缓存键（只包含列表参数，参数顺序无关）"""
+    return f"{PLUGINS_CACHE_KEY}?" + urlencode(sorted(
+        (name, args[name]) for name in PLUGIN_LISTING_PARAMS if name in args
+    ))
+
+def plugin_page_payload(catalog, rows, sort, limit):
+    """一页插件的响应内容，rows 为多查询一行的结果（用于判断是否还有下一页）"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    plugins = [
+        merge_plugin_stats(catalog.by_id[row['plugin_id']], row)
+        for row in rows if row['plugin_id'] in catalog.by_id
+    ]
+    return {
+        'success': True,
+        'plugins': plugins,
+        'count': len(plugins),
+        'sort': sort,
+        'limit': limit,
+        'next_cursor': encode_cursor(sort, rows[-1]) if has_more else None
+    }
+
+def write_rating_batch(votes):
+    """批量写入评分（评分队列的写入函数）
+
+    先锁定本批已有的评分取得旧星级，多行upsert写入评分后按增量更新统计，整批在一个事务中完成。
+    多个进程的刷新线程、超时后重新认领的批次可能乱序提交，提交时间早于已写入评分的评分不再覆盖
+    """
+    # 同一用户对同一插件的多次评分只保留最后一次
+    latest = {}
+    for vote in votes:
+        latest[(vote['plugin_id'], vote['user_ip'])] = vote
+    
+    connection = get_db_connection()
+    if not connection:
+        # ConnectionError：评分队列视为数据库不可用，整批保留重试，不计入失败次数
+        raise ConnectionError('数据库连接失败')
+    try:
+        connection.begin()
+        with connection.cursor() as cursor:
+            existing = fetch_existing_votes(cursor, latest.keys())
+            latest = {
+                key: vote for key, vote in latest.items()
+                if key not in existing or vote['submitted_at'] > existing[key][1]
+            }
+            deltas, ranking_scores = {}, {}
+            if latest:
+                # PyMySQL 会把 executemany 的 INSERT ... VALUES 合并成一条多行语句
+                cursor.executemany("""
+                    INSERT INTO plugin_ratings (plugin_id, user_ip, user_agent, rating, comment, submitted_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        rating = VALUES(rating),
+                        comment = VALUES(comment),
+                        submitted_at = VALUES(submitted_at),
+                        updated_at = CURRENT_TIMESTAMP
+                """, [
+                    (vote['plugin_id'], vote['user_ip'], vote['user_agent'], vote['rating'], vote['comment'],
+                     vote['submitted_at'])
+                    for vote in latest.values()
+                ])
+                deltas = apply_rating_changes(cursor, [
+                    (key[0], existing[key][0] if key in existing else None, vote['rating'])
+                    for key, vote in latest.items()
+                ])
+                ranking_scores = fetch_ranking_scores(cursor, deltas)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
     finally:
         connection.close()
+    
+    if latest:
+        ratings_written(sorted({plugin_id for plugin_id, _ in latest}), deltas, ranking_scores)
+
+def ratings_written(plugin_ids, deltas, ranking_scores):
+    """评分写入提交后：调整排名、使相关缓存失效并推送统计增量"""
+    PLUGIN_RANKING.update(ranking_scores)
+    for plugin_id in plugin_ids:
+        invalidate_plugin_caches(plugin_id)
+    publish_stat_deltas(deltas)
+
+def make_vote(plugin_id, user_ip, user_agent, rating, comment):
+    """评分队列中的一条评分"""
+    return {
+        'plugin_id': plugin_id,
+        'user_ip': user_ip,
+        'user_agent': user_agent,
+        'rating': rating,
+        'comment': comment,
+        'submitted_at': time.time()
+    }
+
+def enqueue_rating(plugin_id, user_ip, user_agent, rating, comment):
+    """把评分写入本地队列并立即确认，由后台线程批量写入数据库（数据库不可用时在恢复后补写）"""
+    try:
+        RATING_SPOOL.enqueue(make_vote(plugin_id, user_ip, user_agent, rating, comment))
+    except Exception as e:
+        print(f"评分写入队列失败: {e}")
+        return jsonify({'success': False, 'message': '评分提交失败，请稍后重试'}), 500
+    
+    return jsonify({
+        'success': True,
+        'message': '评分已提交',
+        'rating': rating,
+        'queued': True
+    }), 202
+
+def parse_rating_request(data):
+    """校验评分请求体，返回 (plugin_id, rating, comment)；无效时抛出 ValueError，错误信息可直接返回给客户端"""
+    plugin_id = data.get('plugin_id')
+    rating = data.get('rating')
+    comment = (data.get('comment') or '').strip()
+    
+    if not plugin_id or not rating:
+        raise ValueError('缺少必要参数')
+    
+    if not isinstance(rating, int) or rating < 1 or rating > 5:
+        raise ValueError('评分必须是1-5之间的整数')
+    
+    try:
+        plugin_id = int(plugin_id)
+    except (TypeError, ValueError):
+        raise ValueError('插件ID无效')
+    return plugin_id, rating, comment
+
+UPDATE_RATING_SQL = """
+    UPDATE plugin_ratings 
+    SET rating = %s, comment = %s, submitted_at = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE plugin_id = %s AND user_ip = %s
+"""
+INSERT_RATING_SQL = """
+    INSERT INTO plugin_ratings (plugin_id, user_ip, user_agent, rating, comment, submitted_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
 
 @app.route('/api/rate-plugin', methods=['POST'])
 def api_rate_plugin():
     """提交插件评分"""
+    data = request.get_json(silent=True) or {}
+    
+    # 验证数据
+    try:
+        plugin_id, rating, comment = parse_rating_request(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # 获取用户信息
+    user_ip = get_client_ip()
+    user_agent = request.headers.get('User-Agent', '')
+    
+    # 用内存中的插件元数据校验，不访问数据库
+    catalog = PLUGIN_CATALOG.snapshot()
+    if catalog is None:
+        return jsonify({'success': False, 'message': '数据库连接失败'}), 500
+    if plugin_id not in catalog.by_id:
+        return jsonify({'success': False, 'message': '插件不存在'}), 404
+    
+    if RATING_QUEUE:
+        return enqueue_rating(plugin_id, user_ip, user_agent, rating, comment)
+    
     connection = get_db_connection()
     if not connection:
-        return jsonify({'success': False, 'message': '数据库连接失败'}), 500
+        # 数据库不可用：评分暂存到本地队列，恢复后补写
+        if RATING_SPOOL:
+            return enqueue_rating(plugin_id, user_ip, user_agent, rating, comment)
+        return api_error_response(db_unavailable_error())
     
     try:
-        data = request.get_json()
-        plugin_id = data.get('plugin_id')
-        rating = data.get('rating')
-        comment = data.get('comment', '').strip()
-        
-        # 验证数据
-        if not plugin_id or not rating:
-            return jsonify({'success': False, 'message': '缺少必要参数'}), 400
-        
-        if not isinstance(rating, int) or rating < 1 or rating > 5:
-            return jsonify({'success': False, 'message': '评分必须是1-5之间的整数'}), 400
-        
-        # 获取用户信息
-        user_ip = get_client_ip()
-        user_agent = request.headers.get('User-Agent', '')
-        
+        connection.begin()
         with connection.cursor() as cursor:
-            # 检查插件是否存在
-            cursor.execute("SELECT id FROM plugins WHERE id = %s AND is_active = TRUE", (plugin_id,))
-            if not cursor.fetchone():
-                return jsonify({'success': False, 'message': '插件不存在'}), 404
+            # 检查用户是否已经评分过（锁定该评分直到提交）
+            existing_rating = fetch_existing_ratings(cursor, [(plugin_id, user_ip)]).get((plugin_id, user_ip))
             
-            # 检查用户是否已经评分过
-            cursor.execute(
-                "SELECT id FROM plugin_ratings WHERE plugin_id = %s AND user_ip = %s", 
-                (plugin_id, user_ip)
-            )
-            existing_rating = cursor.fetchone()
-            
-            if existing_rating:
+            if existing_rating is not None:
                 # 更新现有评分
-                cursor.execute("""
-                    UPDATE plugin_ratings 
-                    SET rating = %s, comment = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE plugin_id = %s AND user_ip = %s
-                """, (rating, comment, plugin_id, user_ip))
+                cursor.execute(UPDATE_RATING_SQL, (rating, comment, time.time(), plugin_id, user_ip))
                 message = '评分已更新'
             else:
                 # 插入新评分
-                cursor.execute("""
-                    INSERT INTO plugin_ratings (plugin_id, user_ip, user_agent, rating, comment)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (plugin_id, user_ip, user_agent, rating, comment))
+                cursor.execute(INSERT_RATING_SQL, (plugin_id, user_ip, user_agent, rating, comment, time.time()))
                 message = '评分已提交'
             
-            # 手动更新统计数据（如果触发器不工作）
-            cursor.execute("""
-                INSERT INTO plugin_statistics (
-                    plugin_id, total_ratings, average_rating, 
-                    rating_1_count, rating_2_count, rating_3_count, 
-                    rating_4_count, rating_5_count, last_rating_at
-                )
-                SELECT 
-                    %s,
-                    COUNT(*) as total_ratings,
-                    AVG(rating) as average_rating,
-                    SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) as rating_1_count,
-                    SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END) as rating_2_count,
-                    SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END) as rating_3_count,
-                    SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END) as rating_4_count,
-                    SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END) as rating_5_count,
-                    MAX(created_at) as last_rating_at
-                FROM plugin_ratings 
-                WHERE plugin_id = %s
-                ON DUPLICATE KEY UPDATE
-                    total_ratings = VALUES(total_ratings),
-                    average_rating = VALUES(average_rating),
-                    rating_1_count = VALUES(rating_1_count),
-                    rating_2_count = VALUES(rating_2_count),
-                    rating_3_count = VALUES(rating_3_count),
-                    rating_4_count = VALUES(rating_4_count),
-                    rating_5_count = VALUES(rating_5_count),
-                    last_rating_at = VALUES(last_rating_at)
-            """, (plugin_id, plugin_id))
-            
-            return jsonify({
-                'success': True,
-                'message': message,
-                'rating': rating
-            })
+            # 按增量更新统计：旧星级减一、新星级加一
+            deltas = apply_rating_changes(cursor, [(plugin_id, existing_rating, rating)])
+            ranking_scores = fetch_ranking_scores(cursor, deltas)
+        connection.commit()
+        
+        # 统计已变化，调整排名、使相关缓存失效并推送增量
+        ratings_written([plugin_id], deltas, ranking_scores)
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'rating': rating
+        })
             
     except Exception as e:
+        try:
+            connection.rollback()
+        except Exception:
+            connection.discard()
         print(f"提交评分失败: {e}")
+        # 连接中断：评分暂存到本地队列（补写按用户和插件覆盖，即使本次事务已提交也不会重复计数）
+        if RATING_SPOOL and is_connection_error(e):
+            return enqueue_rating(plugin_id, user_ip, user_agent, rating, comment)
         return jsonify({'success': False, 'message': str(e)}), 500
     finally:
         connection.close()
 
+PLUGIN_STATS_SQL = """
+    SELECT * FROM plugin_statistics WHERE plugin_id = %s
+"""
+PLUGIN_RECENT_RATINGS_SQL = """
+    SELECT rating, comment, created_at 
+    FROM plugin_ratings 
+    WHERE plugin_id = %s 
+    ORDER BY created_at DESC 
+    LIMIT 10
+"""
+
+def plugin_stats_payload(stats, recent_ratings):
+    """单个插件统计的响应内容（格式化时间字段）"""
+    format_plugin_stats(stats)
+    for rating in recent_ratings:
+        if rating['created_at']:
+            rating['created_at'] = rating['created_at'].isoformat()
+    return {
+        'success': True,
+        'stats': stats,
+        'recent_ratings': recent_ratings
+    }
+
 @app.route('/api/plugin-stats/<int:plugin_id>')
 def api_plugin_stats(plugin_id):
     """获取特定插件的详细统计信息"""
+    try:
+        cached = RESPONSE_CACHE.fetch(f"{PLUGIN_STATS_CACHE_PREFIX}{plugin_id}",
+                                      lambda: load_plugin_stats(plugin_id))
+    except ApiError as e:
+        return api_error_response(e)
+    return json_body_response(*cached)
+
+def load_plugin_stats(plugin_id):
+    """查询插件统计和最近的评分，返回缓存条目"""
     connection = get_db_connection()
     if not connection:
-        return jsonify({'success': False, 'message': '数据库连接失败'}), 500
+        raise db_unavailable_error()
     
     try:
         with connection.cursor(pymysql.cursors.DictCursor) as cursor:
             # 获取插件统计信息
-            cursor.execute("""
-                SELECT * FROM plugin_statistics WHERE plugin_id = %s
-            """, (plugin_id,))
+            cursor.execute(PLUGIN_STATS_SQL, (plugin_id,))
             
             stats = cursor.fetchone()
             if not stats:
-                return jsonify({'success': False, 'message': '插件统计不存在'}), 404
+                raise ApiError('插件统计不存在', 404)
             
             # 获取最近的评分
-            cursor.execute("""
-                SELECT rating, comment, created_at 
-                FROM plugin_ratings 
-                WHERE plugin_id = %s 
-                ORDER BY created_at DESC 
-                LIMIT 10
-            """, (plugin_id,))
+            cursor.execute(PLUGIN_RECENT_RATINGS_SQL, (plugin_id,))
             
             recent_ratings = cursor.fetchall()
-            
-            # 格式化时间
-            if stats['last_rating_at']:
-                stats['last_rating_at'] = stats['last_rating_at'].isoformat()
-            if stats['updated_at']:
-                stats['updated_at'] = stats['updated_at'].isoformat()
-            
-            for rating in recent_ratings:
-                if rating['created_at']:
-                    rating['created_at'] = rating['created_at'].isoformat()
-            
-            return jsonify({
-                'success': True,
-                'stats': stats,
-                'recent_ratings': recent_ratings
-            })
-            
+    except ApiError:
+        raise
     except Exception as e:
         print(f"查询插件统计失败: {e}")
-        return jsonify({'success': False, 'message': str(e)}), 500
+        raise ApiError(str(e))
+    finally:
+        connection.close()
+    
+    return cache_entry(plugin_stats_payload(stats, recent_ratings))
+
+def format_plugin_stats(stats):
+    """格式化统计行中的时间字段"""
+    if stats['last_rating_at']:
+        stats['last_rating_at'] = stats['last_rating_at'].isoformat()
+    if stats['updated_at']:
+        stats['updated_at'] = stats['updated_at'].isoformat()
+    return stats
+
+def plugin_stats_batch_etag(plugin_ids, stats_rows, recent_rows):
+    """批量统计的ETag：响应体完全由查询结果决定，不必先序列化整个响应体就能得到版本标签"""
+    return make_etag(repr((plugin_ids, stats_rows, recent_rows)).encode('utf-8'))
+
+def stream_plugin_stats(cache_key, generation, etag, plugin_ids, stats_rows, recent_rows):
+    """逐个插件输出批量统计响应，完整输出后写入响应缓存
+
+    两个查询的结果都按 plugin_id 排序，按顺序归并即可把最近评分分配给各插件；
+    查询之后发生过缓存失效（有新评分写入）时不写入缓存，避免缓存失效前的数据
+    """
+    chunks = []
+    
+    def emit(chunk):
+        chunks.append(chunk)
+        return chunk
+    
+    recent_iter = iter(recent_rows)
+    pending = next(recent_iter, None)
+    yield emit('{"success":true,"plugins":[')
+    for index, stats in enumerate(stats_rows):
+        recent_ratings = []
+        while pending is not None and pending['plugin_id'] == stats['plugin_id']:
+            recent_ratings.append({
+                'rating': pending['rating'],
+                'comment': pending['comment'],
+                'created_at': pending['created_at'].isoformat() if pending['created_at'] else None
+            })
+            pending = next(recent_iter, None)
+        yield emit((',' if index else '') + app.json.dumps({
+            'plugin_id': stats['plugin_id'],
+            'stats': format_plugin_stats(stats),
+            'recent_ratings': recent_ratings
+        }))
+    
+    found = {stats['plugin_id'] for stats in stats_rows}
+    missing = [plugin_id for plugin_id in plugin_ids if plugin_id not in found]
+    yield emit(f'],"count":{len(stats_rows)},"missing":{app.json.dumps(missing)}}}')
+    
+    RESPONSE_CACHE.set(cache_key, (''.join(chunks).encode('utf-8'), etag), generation=generation)
+
+def stale_plugin_stats_batch(cache_key, error):
+    """批量统计查询失败：返回最后一次成功的内容并标记为 stale，没有时返回错误"""
+    cached = stale_plugin_listing(cache_key) if error.status >= 500 else None
+    if cached is None:
+        return api_error_response(error)
+    return json_body_response(*cached)
+
+@app.route('/api/plugin-stats')
+def api_plugin_stats_batch():
+    """批量获取插件的详细统计信息（替代逐个调用 /api/plugin-stats/<id>）
+
+    ids=1,2,3 或 ids=all（所有启用插件）；recent 为每个插件附带的最近评分条数，默认10。
+    无论多少插件都只执行两条查询：一条取统计，一条窗口查询取各插件最近评分
+    """
+    ids_arg = request.args.get('ids', '').strip()
+    try:
+        recent = int(request.args.get('recent', RECENT_RATINGS_LIMIT))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'recent 必须是整数'}), 400
+    if recent < 0 or recent > MAX_RECENT_RATINGS:
+        return jsonify({'success': False, 'message': f'recent 必须在 0-{MAX_RECENT_RATINGS} 之间'}), 400
+    
+    if ids_arg == 'all':
+        ids_key = 'all'
+        catalog = PLUGIN_CATALOG.snapshot()
+        plugin_ids = sorted(catalog.by_id) if catalog is not None else None
+    else:
+        try:
+            plugin_ids = sorted({int(value) for value in ids_arg.split(',') if value.strip()})
+        except ValueError:
+            plugin_ids = None
+        if not plugin_ids:
+            return jsonify({'success': False, 'message': 'ids 必须是逗号分隔的插件ID或 all'}), 400
+        if len(plugin_ids) > MAX_BATCH_PLUGIN_IDS:
+            return jsonify({'success': False, 'message': f'单次最多查询 {MAX_BATCH_PLUGIN_IDS} 个插件'}), 400
+        ids_key = ','.join(map(str, plugin_ids))
+    
+    cache_key = f"{PLUGIN_STATS_BATCH_CACHE_PREFIX}{ids_key}:{recent}"
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        return json_body_response(*cached)
+    
+    if plugin_ids is None:
+        return stale_plugin_stats_batch(cache_key, db_unavailable_error())
+    connection = get_db_connection()
+    if not connection:
+        return stale_plugin_stats_batch(cache_key, db_unavailable_error())
+    
+    # 查询之前取得失效代数：查询期间有评分写入时，响应照常返回但不写入缓存
+    generation = RESPONSE_CACHE.generation()
+    try:
+        with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+            stats_rows = fetch_statistics(cursor, plugin_ids)
+            recent_rows = fetch_recent_ratings(
+                cursor, [stats['plugin_id'] for stats in stats_rows], recent
+            )
+    except Exception as e:
+        print(f"批量查询插件统计失败: {e}")
+        return stale_plugin_stats_batch(cache_key, ApiError(str(e)))
     finally:
         connection.close()
+    
+    etag = plugin_stats_batch_etag(plugin_ids, stats_rows, recent_rows)
+    if request.if_none_match.contains_weak(etag):
+        return json_body_response(b'', etag)
+    
+    # 查询完成后即归还连接，响应体边序列化边发送
+    response = app.response_class(
+        stream_plugin_stats(cache_key, generation, etag, plugin_ids, stats_rows, recent_rows),
+        mimetype='application/json'
+    )
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/plugin-rank/<int:plugin_id>')
+def api_plugin_rank(plugin_id):
+    """获取插件在综合排名中的名次（内存排名索引二分查找，不访问数据库）"""
+    ranking = PLUGIN_RANKING.rank(plugin_id)
+    if ranking is None:
+        return jsonify({'success': False, 'message': '插件不存在'}), 404
+    
+    rank, total, ranking_score = ranking
+    return jsonify({
+        'success': True,
+        'plugin_id': plugin_id,
+        'rank': rank,
+        'total': total,
+        'ranking_score': ranking_score
+    })
+
+def plugin_script(plugin_id):
+    """返回插件脚本的 (URL, 完整性校验值)，没有对应脚本时返回 (None, None)
+
+    插件脚本约定为 <bundle_dir>/<plugin_id>-plugin.js；构建后使用带哈希的文件名（可长期缓存），
+    未启用构建时使用源文件路径
+    """
+    rel_path = f"{CONFIG.get('assets', {}).get('bundle_dir', 'plugins')}/{plugin_id}-plugin.js"
+    if ASSET_PIPELINE:
+        asset = ASSET_PIPELINE.bundle(rel_path)
+        return (asset.url_name, asset.integrity) if asset else (None, None)
+    return (rel_path, None) if STATIC_INDEX.get(rel_path) else (None, None)
+
+@app.route('/api/plugin-manifest')
+def api_plugin_manifest():
+    """插件脚本清单：启用插件到带哈希插件脚本的映射，游戏页面据此按需加载插件"""
+    catalog = PLUGIN_CATALOG.snapshot()
+    if catalog is None:
+        return jsonify({'success': False, 'message': '数据库连接失败'}), 500
+    
+    # 插件集合变化时快照版本随之变化，旧版本的缓存自然不再命中
+    cache_key = f"{PLUGIN_MANIFEST_CACHE_PREFIX}{catalog.version}"
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        return json_body_response(*cached)
+    
+    plugins = []
+    for meta in catalog.plugins:
+        script, integrity = plugin_script(meta['plugin_id'])
+        plugins.append({
+            'id': meta['id'],
+            'plugin_id': meta['plugin_id'],
+            'name': meta['plugin_name'],
+            'version': meta['version'],
+            'script': script,
+            'integrity': integrity
+        })
+    return cache_json_response(cache_key, jsonify({
+        'success': True,
+        'plugins': plugins,
+        'total': len(plugins)
+    }))
+
+def save_etag(version):
+    """存档版本对应的ETag"""
+    return f"v{version}"
+
+def read_save_body():
+    """读取存档请求体（支持 gzip 压缩）并解析JSON，超过大小上限时抛出 SaveError(413)"""
+    limit = SAVE_STORE.max_document_bytes
+    if request.content_length is not None and request.content_length > limit:
+        raise SaveError('存档过大', status=413)
+    data = decode_body(request.get_data(cache=False), request.headers.get('Content-Encoding'), limit)
+    return load_json(data)
+
+def save_written_response(version):
+    response = jsonify({'success': True, 'version': version})
+    response.set_etag(save_etag(version))
+    return response
+
+def if_match_version():
+    """If-Match 中的存档版本号（"vN"），没有或无效时返回 None"""
+    base_versions = [tag[1:] for tag in request.if_match.as_set() if tag[:1] == 'v']
+    if len(base_versions) != 1 or not base_versions[0].isdigit():
+        return None
+    return int(base_versions[0])
+
+@app.route('/api/saves/<save_id>', methods=['GET', 'PUT', 'PATCH'])
+def api_save(save_id):
+    """游戏存档同步
+
+    GET    读取最新版本（响应体即存档JSON，版本在 ETag 和 X-Save-Version 中，支持 If-None-Match）
+    PUT    上传完整存档，返回新版本号；带 If-Match 时只在存档仍是该版本时覆盖，
+           带 If-None-Match: * 时只在存档不存在时创建，条件不成立返回 412
+    PATCH  上传相对 If-Match 版本的 JSON Patch（application/json-patch+json），返回新版本号；
+           If-Match 不是最新版本时返回 412（客户端拉取最新版本后处理冲突），
+           补丁无法应用时返回 422（客户端改为以同一 If-Match 上传完整存档）
+    请求体可以用 Content-Encoding: gzip 压缩
+    """
+    if not SAVE_STORE.enabled:
+        return jsonify({'success': False, 'message': '存档同步未启用'}), 503
+    try:
+        SAVE_STORE.check_save_id(save_id)
+        if request.method == 'PUT':
+            base_version = if_match_version()
+            if request.if_match and base_version is None:
+                return jsonify({'success': False, 'message': 'If-Match 版本无效'}), 428
+            if base_version is None and request.if_none_match.star_tag:
+                base_version = 0
+            return save_written_response(SAVE_STORE.write_full(save_id, read_save_body(), base_version))
+        
+        if request.method == 'PATCH':
+            base_version = if_match_version()
+            if base_version is None:
+                return jsonify({'success': False, 'message': '缺少 If-Match 版本'}), 428
+            return save_written_response(SAVE_STORE.write_patch(save_id, base_version, read_save_body()))
+        
+        # 客户端已有最新版本时只查询版本号，不读取存档内容
+        version = SAVE_STORE.version(save_id)
+        if version is None:
+            return jsonify({'success': False, 'message': '存档不存在'}), 404
+        if request.if_none_match.contains(save_etag(version)):
+            response = app.response_class(status=304)
+        else:
+            saved = SAVE_STORE.read(save_id)
+            if saved is None:
+                return jsonify({'success': False, 'message': '存档不存在'}), 404
+            version, text, compressed = saved
+            response = app.response_class(mimetype='application/json')
+            if compressed is not None and request.accept_encodings['gzip']:
+                # 已合并的存档直接发送快照的压缩数据
+                response.set_data(compressed)
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response.set_data(text if text is not None else decompress(compressed))
+            response.vary.add('Accept-Encoding')
+        response.set_etag(save_etag(version))
+        response.headers['X-Save-Version'] = str(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except SaveError as e:
+        return jsonify({'success': False, 'message': str(e)}), e.status
+    except Exception as e:
+        print(f"存档同步失败: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def leaderboard_int_arg(name, default, maximum):
+    """解析排行榜查询的整数参数，超出范围时截断，无效时抛出 ValueError"""
+    return max(0, min(int(request.args.get(name, default)), maximum))
+
+@app.route('/api/leaderboards')
+def api_leaderboards():
+    """各排行榜的玩家数和第一名"""
+    if not LEADERBOARDS.enabled:
+        return jsonify({'success': False, 'message': '排行榜未启用'}), 503
+    try:
+        return jsonify({'success': True, 'leaderboards': LEADERBOARDS.summary()})
+    except Exception as e:
+        print(f"查询排行榜失败: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/leaderboards/<board>', methods=['GET', 'POST'])
+def api_leaderboard(board):
+    """查询前N名（limit、offset），或提交成绩（只保留每个玩家的最好成绩）
+
+    提交: {"save_id": 存档码, "name": 玩家名称, "score": 成绩}，排行榜中只显示由存档码派生的玩家标识
+    """
+    if not LEADERBOARDS.enabled:
+        return jsonify({'success': False, 'message': '排行榜未启用'}), 503
+    if board not in LEADERBOARDS.board_ids:
+        return jsonify({'success': False, 'message': '排行榜不存在'}), 404
+    
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            save_id = data.get('save_id')
+            score = data.get('score')
+            name = str(data.get('name') or '').strip()[:MAX_NAME_LENGTH] or '玩家'
+            if not isinstance(save_id, str) or not SAVE_ID_PATTERN.match(save_id):
+                return jsonify({'success': False, 'message': '存档码无效'}), 400
+            if not LEADERBOARDS.valid_score(score):
+                return jsonify({'success': False, 'message': '成绩无效'}), 400
+            
+            improved, entry = LEADERBOARDS.submit(board, public_player_id(save_id), name, score)
+            return jsonify({'success': True, 'board': board, 'improved': improved, 'entry': entry})
+        
+        try:
+            limit = leaderboard_int_arg('limit', 10, LEADERBOARDS.max_limit)
+            offset = leaderboard_int_arg('offset', 0, 10 ** 9)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'limit、offset 必须是整数'}), 400
+        entries, total = LEADERBOARDS.top(board, limit, offset)
+        return jsonify({'success': True, 'board': board, 'total': total, 'entries': entries})
+    except Exception as e:
+        print(f"排行榜请求失败: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/leaderboards/<board>/around/<player>')
+def api_leaderboard_around(board, player):
+    """玩家的名次及前后各 range 名（默认5）"""
+    if not LEADERBOARDS.enabled:
+        return jsonify({'success': False, 'message': '排行榜未启用'}), 503
+    if board not in LEADERBOARDS.board_ids:
+        return jsonify({'success': False, 'message': '排行榜不存在'}), 404
+    try:
+        distance = leaderboard_int_arg('range', 5, LEADERBOARDS.max_range)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'range 必须是整数'}), 400
+    
+    try:
+        result = LEADERBOARDS.around(board, player, distance)
+    except Exception as e:
+        print(f"排行榜请求失败: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    if result is None:
+        return jsonify({'success': False, 'message': '玩家没有成绩'}), 404
+    
+    entry, entries, total = result
+    return jsonify({'success': True, 'board': board, 'total': total, 'entry': entry, 'entries': entries})
 
 @app.route('/api/files')
 def api_files():
@@ -390,18 +1387,71 @@ def internal_error(error):
         'status': 500
     }), 500
 
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间和进行中的请求数（不统计指标接口本身）"""
+    if request.endpoint != 'prometheus_metrics':
+        METRICS.request_started()
+
+@app.before_request
+def limit_request():
+    """按客户端IP限流：令牌用完时直接返回429，不排队也不访问数据库"""
+    if not request.url_rule:
+        return None
+    retry_after = RATE_LIMITER.check(request.url_rule.rule, request.method, get_client_ip())
+    if retry_after is not None:
+        return rate_limited_response(retry_after)
+    return None
+
+def rate_limited_response(retry_after):
+    response = jsonify({'success': False, 'message': '请求过于频繁，请稍后再试'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+@app.before_request
+def admit_request():
+    """准入控制：路由的并发名额已满时排队，排不上或等待超时直接返回503"""
+    lane = ADMISSION.lane(request.url_rule.rule) if request.url_rule else None
+    if lane is None:
+        return None
+    try:
+        g.admission = (lane, lane.acquire())
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    return None
+
+@app.teardown_request
+def release_admission(error=None):
+    """归还准入名额"""
+    admission = g.pop('admission', None)
+    if admission:
+        lane, started_at = admission
+        lane.release(started_at)
+
+def admission_rejected_response(error):
+    response = jsonify({'success': False, 'message': '服务器繁忙，请稍后重试'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+@app.teardown_request
+def finish_request_timer(error=None):
+    """按路由记录请求耗时，超过阈值时写慢请求日志"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.get('response_status', 500)
+    METRICS.request_finished(route, request.method, status, request.path)
+
 # 添加CORS支持（如果需要跨域访问）
 @app.after_request
 def after_request(response):
     """添加响应头"""
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    g.response_status = response.status_code
+    for name, value in CORS_HEADERS:
+        response.headers.add(name, value)
     
-    # 为静态文件添加缓存控制
-    if request.endpoint == 'static_files':
-        if any(request.path.endswith(ext) for ext in ['.js', '.css', '.png', '.jpg', '.gif']):
-            response.headers['Cache-Control'] = 'public, max-age=3600'  # 1小时缓存
+    # 为静态文件添加缓存控制（带哈希的构建产物已设置长期缓存）
+    if request.endpoint == 'static_files' and 'immutable' not in response.headers.get('Cache-Control', ''):
+        if request.path.endswith(STATIC_CACHE_EXTENSIONS):
+            response.headers['Cache-Control'] = STATIC_CACHE_CONTROL
     
     return response
 
@@ -411,6 +1461,7 @@ def print_startup_info():
     print("🎮 办公室生存游戏服务器")
     print("=" * 60)
     print(f"📁 静态文件目录: {STATIC_DIR}")
+    print(f"🗄️  数据库: {storage.describe(DATA_DIR, CONFIG['database'])}")
     print(f"🌐 本地访问地址: http://localhost:{CONFIG['server']['port']}")
     print(f"🌐 局域网访问: http://0.0.0.0:{CONFIG['server']['port']}")
     print("📊 主要页面:")
@@ -419,7 +1470,15 @@ def print_startup_info():
     print("📊 API接口:")
     print("   - /api/status    - 服务器状态")
     print("   - /api/plugins   - 插件列表")
+    print("   - /api/plugin-stats?ids=all - 批量插件统计")
+    print("   - /api/plugin-rank/<id> - 插件排名")
+    print("   - /api/plugin-manifest - 插件脚本清单")
+    print("   - /api/live      - 实时推送地址(SSE)")
+    print("   - /api/saves/<存档码> - 游戏存档同步(GET/PUT/PATCH)")
+    print("   - /api/leaderboards - 全局排行榜")
     print("   - /api/files     - 文件列表")
+    print("   - /metrics       - Prometheus运行指标(默认仅本机)")
+    print("   - POST /api/static/reload - 重新扫描静态文件(仅本机)")
     print("=" * 60)
     print("💡 提示: 按 Ctrl+C 停止服务器")
     print("=" * 60)
@@ -438,26 +1497,6 @@ if __name__ == '__main__':
         print("请确保在游戏项目目录中运行此服务器")
         exit(1)
     
-    # 打印启动信息
-    print_startup_info()
-    
-    # 启动Flask开发服务器
-    try:
-        server_config = CONFIG['server']
-        print(f"🚀 启动服务器: {server_config['host']}:{server_config['port']}")
-        
-        # 设置环境变量确保Flask使用正确端口
-        import os
-        os.environ['FLASK_RUN_PORT'] = str(server_config['port'])
-        os.environ['FLASK_RUN_HOST'] = server_config['host']
-        
-        app.run(
-            host=server_config['host'],
-            port=server_config['port'],
-            debug=False,  # 关闭debug模式避免重启问题
-            threaded=True
-        )
-    except KeyboardInterrupt:
-        print("\n👋 服务器已停止")
-    except Exception as e:
-        print(f"❌ 服务器启动失败: {e}")
\ No newline at end of file
+    # 按 config.json 的 server.mode 启动开发或生产服务器
+    import serve
+    serve.main()
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASGI入口，供外部ASGI服务器直接加载:
+    uvicorn asgi:app --port 5218
+    gunicorn -w 4 -k uvicorn_worker.UvicornWorker asgi:app
+推荐使用 python3 serve.py --mode asgi，它会按 config.json 的 server 配置启动 gunicorn
+"""
+
+from asgi_app import create_asgi_app
+
+app = application = create_asgi_app()
@@ -0,0 +1,800 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASGI 服务（server.mode = asgi）
+在事件循环中以协程处理读多写少的热点接口，一个工作进程可以同时保持成千上万个慢速连接，
+不需要为每个连接占用一个线程:
+  - GET  /api/plugins（含分页参数）
+  - POST /api/rate-plugin
+  - GET  /api/plugin-stats/<id>
+  - GET  / 和静态文件（Range 请求除外）
+数据库访问使用异步连接池（MySQL 为 aiomysql，SQLite 后端在线程池中执行），
+响应内容、缓存键和响应缓存与 Flask 路由共用 app 模块中的函数，两种模式返回的内容一致。
+
+每个请求有处理时限（asgi.request_timeout），超时返回 504；客户端在处理完成前断开时取消处理协程，
+正在使用的数据库连接随之关闭，不会继续占用连接池。
+
+其他接口（存档、排行榜、管理接口等）交给 Flask 应用，在有界线程池中执行。
+"""
+
+import asyncio
+import io
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import http_date, is_resource_modified, parse_accept_header, quote_etag
+from werkzeug.utils import get_content_type
+
+import app as app_module
+import storage
+from admission import AdmissionRejected
+from async_db_pool import AsyncConnectionPool
+from circuit_breaker import CircuitOpenError, is_connection_error
+from plugin_listing import ListingError, parse_listing_args, decode_cursor, build_listing_query
+from plugin_stats import (PLUGIN_STATS_DELTA_SQL, existing_ratings_query, rating_change_rows,
+                          changed_plugins, statistics_ids_query, ranking_scores_query)
+
+# 客户端在响应前断开时记录的状态码（与 nginx 一致）
+CLIENT_CLOSED_STATUS = 499
+
+# 运行中的 ASGI 应用（create_asgi_app 创建）
+ASGI_APP = None
+
+
+class ClientDisconnected(Exception):
+    """读取请求体时客户端已断开"""
+
+
+class BodyTooLarge(Exception):
+    """请求体超过 asgi.max_body_bytes"""
+
+
+class AsgiRequest:
+    """一个HTTP请求（只包含本模块的路由用到的部分）"""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'').decode('latin-1')
+        self.headers = Headers([
+            (name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']
+        ])
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else None
+        self.body = body
+        self._args = None
+
+    @property
+    def args(self):
+        """查询参数（与 Flask 的 request.args 相同）"""
+        if self._args is None:
+            self._args = MultiDict(parse_qsl(self.query_string, keep_blank_values=True))
+        return self._args
+
+    def conditional_environ(self):
+        """条件请求判断所需的最小 WSGI environ"""
+        return {
+            'REQUEST_METHOD': self.method,
+            'HTTP_IF_NONE_MATCH': self.headers.get('If-None-Match', ''),
+            'HTTP_IF_MODIFIED_SINCE': self.headers.get('If-Modified-Since', '')
+        }
+
+    def json(self):
+        """与 request.get_json(silent=True) 相同：Content-Type 不是JSON或解析失败时返回 None"""
+        mimetype = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if mimetype != 'application/json' and not (mimetype.startswith('application/') and mimetype.endswith('+json')):
+            return None
+        try:
+            return app_module.app.json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class AsgiResponse:
+    """响应：body 为完整内容，或 stream 为逐块产生内容的异步迭代器"""
+
+    def __init__(self, status, headers=None, body=b'', stream=None):
+        self.status = status
+        self.headers = headers or []
+        self.body = body
+        self.stream = stream
+
+
+def json_response(payload, status=200):
+    """与 jsonify 相同的JSON响应"""
+    body = app_module.app.json.response(payload).get_data()
+    return AsgiResponse(status, [('Content-Type', 'application/json')], body)
+
+
+def json_body_response(request, body, etag=None, status=200):
+    """用已序列化的JSON响应体构造响应，带ETag时支持 If-None-Match 条件请求（与 app.json_body_response 一致）"""
+    if etag is None:
+        return AsgiResponse(status, [('Content-Type', 'application/json')], body)
+    headers = [('ETag', quote_etag(etag)), ('Cache-Control', 'no-cache')]
+    if not is_resource_modified(request.conditional_environ(), etag=etag):
+        return AsgiResponse(304, headers)
+    return AsgiResponse(status, [('Content-Type', 'application/json')] + headers, body)
+
+
+def api_error_response(error):
+    """与 app.api_error_response 相同：熔断时带 Retry-After"""
+    response = json_response({'success': False, 'message': str(error)}, error.status)
+    if error.retry_after is not None:
+        response.headers.append(('Retry-After', str(max(1, round(error.retry_after)))))
+    return response
+
+
+def db_unavailable():
+    return api_error_response(app_module.db_unavailable_error())
+
+
+def rows_as_dicts(cursor, rows):
+    """按游标的列名把元组行转换为字典（与 DictCursor 的结果相同）"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class AsgiApplication:
+    """ASGI 应用：热点接口以协程处理，其余请求转交 Flask"""
+
+    def __init__(self, flask_app, pool, request_timeout=10, wsgi_threads=8,
+                 max_body_bytes=2 * 1024 * 1024, static_chunk_size=64 * 1024):
+        self.flask_app = flask_app
+        self.pool = pool
+        self.request_timeout = float(request_timeout)
+        self.wsgi_threads = max(1, int(wsgi_threads))
+        self.max_body_bytes = int(max_body_bytes)
+        self.static_chunk_size = max(4096, int(static_chunk_size))
+        self._executor = ThreadPoolExecutor(self.wsgi_threads, thread_name_prefix='wsgi')
+
+        # 统计计数器
+        self._requests = 0
+        self._wsgi_requests = 0
+        self._timeouts = 0
+        self._disconnects = 0
+
+        # (方法, 路径正则, 处理协程, 指标中的路由名)；静态文件只处理索引中存在的路径
+        self.routes = [
+            (('GET', 'HEAD'), re.compile(r'/api/plugins'), self.plugins, '/api/plugins'),
+            (('POST',), re.compile(r'/api/rate-plugin'), self.rate_plugin, '/api/rate-plugin'),
+            (('GET', 'HEAD'), re.compile(r'/api/plugin-stats/(\d+)'), self.plugin_stats,
+             '/api/plugin-stats/<int:plugin_id>'),
+            (('GET', 'HEAD'), re.compile(r'/'), self.index, '/'),
+            (('GET', 'HEAD'), re.compile(r'/(.+)'), self.static_file, '/<path:filename>'),
+        ]
+
+    @classmethod
+    def from_config(cls, flask_app, config):
+        """根据 config.json 创建，异步连接池使用与同步连接池相同的 database.pool 配置"""
+        database_config = config['database']
+        connect, connect_kwargs = storage.async_connection_settings(app_module.DATA_DIR, database_config)
+        pool = AsyncConnectionPool.from_config(connect, connect_kwargs, database_config.get('pool'))
+        asgi_config = config.get('asgi', {})
+        return cls(
+            flask_app,
+            pool,
+            request_timeout=asgi_config.get('request_timeout', 10),
+            wsgi_threads=asgi_config.get('wsgi_threads', 8),
+            max_body_bytes=asgi_config.get('max_body_bytes', 2 * 1024 * 1024),
+            static_chunk_size=asgi_config.get('static_chunk_size', 64 * 1024)
+        )
+
+    # ------------------------------------------------------------ 协议
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        match = self._match(scope)
+        # Range 请求、OPTIONS 以及其他路由由 Flask 处理
+        if match is None or any(name.lower() == b'range' for name, _ in scope['headers']):
+            await self._call_wsgi(scope, receive, send)
+            return
+
+        handler, args, route = match
+        app_module.METRICS.request_started()
+        status = 500
+        try:
+            status = await self._dispatch(scope, receive, send, handler, args, route)
+        finally:
+            app_module.METRICS.request_finished(route, scope['method'], status, scope['path'])
+
+    def _match(self, scope):
+        for methods, pattern, handler, route in self.routes:
+            matched = pattern.fullmatch(scope['path'])
+            if not matched or scope['method'] not in methods:
+                continue
+            if handler == self.static_file:
+                # 不在索引中的路径可能是其他 Flask 路由（如 /api/status），也可能是404
+                target = self._static_target(matched.group(1))
+                if target is None:
+                    return None
+                return handler, (target,), route
+            return handler, matched.groups(), route
+        return None
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.pool.close_all()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise BodyTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _dispatch(self, scope, receive, send, handler, args, route):
+        """读取请求体，在时限内运行处理协程；客户端断开时取消处理。返回记录到指标的状态码"""
+        self._requests += 1
+        try:
+            body = await self._read_body(receive)
+        except ClientDisconnected:
+            self._disconnects += 1
+            return CLIENT_CLOSED_STATUS
+        except BodyTooLarge:
+            response = json_response({'success': False, 'message': '请求体过大'}, 413)
+            await self._send(send, scope, response)
+            return response.status
+
+        request = AsgiRequest(scope, body)
+        task = asyncio.ensure_future(self._admit(route, handler, request, args))
+        watcher = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            done, _ = await asyncio.wait(
+                {task, watcher}, timeout=self.request_timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            watcher.cancel()
+
+        if task not in done:
+            # 超时或客户端断开：取消处理协程，等待它释放数据库连接
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            if watcher in done:
+                self._disconnects += 1
+                return CLIENT_CLOSED_STATUS
+            self._timeouts += 1
+            print(f"⏱️  请求处理超时({self.request_timeout}s): {request.method} {request.path}")
+            response = json_response({'success': False, 'message': '请求处理超时，请稍后重试'}, 504)
+        else:
+            response = task.result()
+
+        await self._send(send, scope, response)
+        return response.status
+
+    async def _admit(self, route, handler, request, args):
+        """按客户端IP限流，再经准入控制（与 app.limit_request / app.admit_request 相同），排队时间计入 request_timeout"""
+        client_ip = app_module.client_ip_from(request.headers, request.remote_addr)
+        retry_after = app_module.RATE_LIMITER.check(route, request.method, client_ip)
+        if retry_after is not None:
+            response = json_response({'success': False, 'message': '请求过于频繁，请稍后再试'}, 429)
+            response.headers.append(('Retry-After', str(retry_after)))
+            return response
+
+        lane = app_module.ADMISSION.lane(route)
+        if lane is None:
+            return await self._handle(handler, request, args)
+        try:
+            started_at = await lane.acquire_async()
+        except AdmissionRejected as e:
+            response = json_response({'success': False, 'message': '服务器繁忙，请稍后重试'}, 503)
+            response.headers.append(('Retry-After', str(e.retry_after)))
+            return response
+        try:
+            return await self._handle(handler, request, args)
+        finally:
+            lane.release(started_at)
+
+    async def _handle(self, handler, request, args):
+        try:
+            return await handler(request, *args)
+        except Exception as e:
+            print(f"处理请求失败 {request.method} {request.path}: {e}")
+            return json_response({
+                'error': '服务器内部错误',
+                'message': '请稍后重试或联系管理员',
+                'status': 500
+            }, 500)
+
+    async def _send(self, send, scope, response):
+        headers = response.headers + app_module.CORS_HEADERS
+        if response.stream is None and response.status != 304:
+            headers.append(('Content-Length', str(len(response.body))))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status,
+                'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            })
+            if scope['method'] == 'HEAD':
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            if response.stream is not None:
+                async for chunk in response.stream:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            else:
+                await send({'type': 'http.response.body', 'body': response.body})
+        except OSError:
+            # 发送过程中客户端断开
+            self._disconnects += 1
+        finally:
+            if response.stream is not None:
+                await response.stream.aclose()
+
+    # ------------------------------------------------------------ 数据库
+
+    async def _acquire(self):
+        """借出异步连接，失败时返回 None（与 get_db_connection 一致）"""
+        try:
+            return await self.pool.acquire()
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            print(f"数据库连接失败: {e}")
+            return None
+
+    async def _catalog(self):
+        """插件元数据快照；需要重新加载时在线程中进行"""
+        catalog = app_module.PLUGIN_CATALOG.cached()
+        if catalog is None:
+            catalog = await asyncio.to_thread(app_module.PLUGIN_CATALOG.snapshot)
+        return catalog
+
+    # ------------------------------------------------------------ 插件接口
+
+    async def _cached(self, request, cache_key, load, stale_fallback=False):
+        """经响应缓存返回内容：并发的未命中请求共享同一次加载，加载时限为 request_timeout
+
+        stale_fallback 为真时（插件列表），加载失败返回最后一次成功的内容并标记为 stale
+        """
+        try:
+            cached = await app_module.RESPONSE_CACHE.fetch_async(
+                cache_key, lambda: asyncio.wait_for(load(), self.request_timeout)
+            )
+        except app_module.ApiError as e:
+            cached = app_module.stale_plugin_listing(cache_key) if stale_fallback and e.status >= 500 else None
+            if cached is None:
+                return api_error_response(e)
+        except asyncio.TimeoutError:
+            cached = app_module.stale_plugin_listing(cache_key) if stale_fallback else None
+            if cached is None:
+                return json_response({'success': False, 'message': '请求处理超时，请稍后重试'}, 504)
+        return json_body_response(request, *cached)
+
+    async def plugins(self, request):
+        """GET /api/plugins，与 app.api_plugins 相同"""
+        if any(name in request.args for name in app_module.PLUGIN_LISTING_PARAMS):
+            return await self.plugins_page(request)
+        return await self._cached(request, app_module.PLUGINS_CACHE_KEY, self._load_plugin_list,
+                                  stale_fallback=True)
+
+    async def _load_plugin_list(self):
+        catalog = await self._catalog()
+        if catalog is None:
+            raise app_module.db_unavailable_error()
+
+        connection = await self._acquire()
+        if connection is None:
+            raise app_module.db_unavailable_error()
+        async with connection:
+            last_event_id = app_module.LIVE_HUB.last_event_id()
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(app_module.PLUGIN_LIST_STATS_SQL)
+                    stats_rows = rows_as_dicts(cursor, cursor.fetchall())
+            except Exception as e:
+                print(f"查询插件失败: {e}")
+                raise app_module.ApiError(str(e))
+
+        return app_module.cache_entry(app_module.plugin_list_payload(catalog, stats_rows, last_event_id))
+
+    async def plugins_page(self, request):
+        """分页获取插件，与 app.api_plugins_page 相同"""
+        try:
+            sort, limit, category, complaint, cursor_token = parse_listing_args(request.args)
+            cursor_values = decode_cursor(sort, cursor_token) if cursor_token else None
+        except ListingError as e:
+            return json_response({'success': False, 'message': str(e)}, 400)
+
+        return await self._cached(
+            request, app_module.plugin_page_cache_key(request.args),
+            lambda: self._load_plugin_page(sort, limit, category, complaint, cursor_values),
+            stale_fallback=True
+        )
+
+    async def _load_plugin_page(self, sort, limit, category, complaint, cursor_values):
+        catalog = await self._catalog()
+        if catalog is None:
+            raise app_module.db_unavailable_error()
+
+        rows = []
+        plugin_ids = catalog.by_complaint.get(complaint, []) if complaint else None
+        if plugin_ids is None or plugin_ids:
+            connection = await self._acquire()
+            if connection is None:
+                raise app_module.db_unavailable_error()
+            async with connection:
+                try:
+                    async with connection.cursor() as cursor:
+                        await cursor.execute(*build_listing_query(sort, limit, category, plugin_ids, cursor_values))
+                        rows = rows_as_dicts(cursor, cursor.fetchall())
+                except Exception as e:
+                    print(f"查询插件失败: {e}")
+                    raise app_module.ApiError(str(e))
+
+        return app_module.cache_entry(app_module.plugin_page_payload(catalog, rows, sort, limit))
+
+    async def rate_plugin(self, request):
+        """POST /api/rate-plugin，与 app.api_rate_plugin 相同"""
+        try:
+            plugin_id, rating, comment = app_module.parse_rating_request(request.json() or {})
+        except ValueError as e:
+            return json_response({'success': False, 'message': str(e)}, 400)
+
+        user_ip = app_module.client_ip_from(request.headers, request.remote_addr)
+        user_agent = request.headers.get('User-Agent', '')
+
+        catalog = await self._catalog()
+        if catalog is None:
+            return db_unavailable()
+        if plugin_id not in catalog.by_id:
+            return json_response({'success': False, 'message': '插件不存在'}, 404)
+
+        vote = app_module.make_vote(plugin_id, user_ip, user_agent, rating, comment)
+        if app_module.RATING_QUEUE:
+            return await self._enqueue_rating(vote)
+
+        connection = await self._acquire()
+        if connection is None:
+            # 数据库不可用：评分暂存到本地队列，恢复后补写
+            if app_module.RATING_SPOOL:
+                return await self._enqueue_rating(vote)
+            return db_unavailable()
+        spool = False
+        async with connection:
+            try:
+                await connection.begin()
+                async with connection.cursor() as cursor:
+                    # 检查用户是否已经评分过（锁定该评分直到提交）
+                    await cursor.execute(*existing_ratings_query([(plugin_id, user_ip)]))
+                    existing_rating = next(
+                        (row[2] for row in cursor.fetchall() if (row[0], row[1]) == (plugin_id, user_ip)), None
+                    )
+
+                    if existing_rating is not None:
+                        await cursor.execute(app_module.UPDATE_RATING_SQL,
+                                             (rating, comment, vote['submitted_at'], plugin_id, user_ip))
+                        message = '评分已更新'
+                    else:
+                        await cursor.execute(app_module.INSERT_RATING_SQL,
+                                             (plugin_id, user_ip, user_agent, rating, comment,
+                                              vote['submitted_at']))
+                        message = '评分已提交'
+
+                    # 按增量更新统计：旧星级减一、新星级加一
+                    changes = [(plugin_id, existing_rating, rating)]
+                    changed = changed_plugins(changes)
+                    missing = set()
+                    if changed:
+                        await cursor.execute(*statistics_ids_query(changed))
+                        missing = changed - {row[0] for row in cursor.fetchall()}
+                    deltas, rows = rating_change_rows(changes, missing)
+                    if rows:
+                        await cursor.executemany(PLUGIN_STATS_DELTA_SQL, rows)
+                    ranking_scores = {}
+                    if deltas:
+                        await cursor.execute(*ranking_scores_query(list(deltas)))
+                        ranking_scores = {row[0]: row[1] for row in cursor.fetchall()}
+                await connection.commit()
+            except Exception as e:
+                try:
+                    await connection.rollback()
+                except Exception:
+                    connection.discard()
+                print(f"提交评分失败: {e}")
+                spool = app_module.RATING_SPOOL and is_connection_error(e)
+                if not spool:
+                    return json_response({'success': False, 'message': str(e)}, 500)
+        if spool:
+            # 连接中断：评分暂存到本地队列（补写按用户和插件覆盖，不会重复计数）
+            return await self._enqueue_rating(vote)
+
+        app_module.ratings_written([plugin_id], deltas, ranking_scores)
+        return json_response({
+            'success': True,
+            'message': message,
+            'rating': rating
+        })
+
+    async def _enqueue_rating(self, vote):
+        """把评分写入本地队列并立即确认（与 app.enqueue_rating 相同）"""
+        try:
+            # 队列写入本地文件，在线程中进行
+            await asyncio.to_thread(app_module.RATING_SPOOL.enqueue, vote)
+        except Exception as e:
+            print(f"评分写入队列失败: {e}")
+            return json_response({'success': False, 'message': '评分提交失败，请稍后重试'}, 500)
+        return json_response({
+            'success': True,
+            'message': '评分已提交',
+            'rating': vote['rating'],
+            'queued': True
+        }, 202)
+
+    async def plugin_stats(self, request, plugin_id):
+        """GET /api/plugin-stats/<id>，与 app.api_plugin_stats 相同"""
+        plugin_id = int(plugin_id)
+        return await self._cached(request, f"{app_module.PLUGIN_STATS_CACHE_PREFIX}{plugin_id}",
+                                  lambda: self._load_plugin_stats(plugin_id))
+
+    async def _load_plugin_stats(self, plugin_id):
+        connection = await self._acquire()
+        if connection is None:
+            raise app_module.db_unavailable_error()
+        async with connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(app_module.PLUGIN_STATS_SQL, (plugin_id,))
+                    stats = rows_as_dicts(cursor, cursor.fetchall()[:1])
+                    if not stats:
+                        raise app_module.ApiError('插件统计不存在', 404)
+
+                    await cursor.execute(app_module.PLUGIN_RECENT_RATINGS_SQL, (plugin_id,))
+                    recent_ratings = rows_as_dicts(cursor, cursor.fetchall())
+            except app_module.ApiError:
+                raise
+            except Exception as e:
+                print(f"查询插件统计失败: {e}")
+                raise app_module.ApiError(str(e))
+
+        return app_module.cache_entry(app_module.plugin_stats_payload(stats[0], recent_ratings))
+
+    # ------------------------------------------------------------ 静态文件
+
+    async def index(self, request):
+        """主页，与 app.index 相同"""
+        if app_module.ASSET_PIPELINE:
+            return await self._send_built_asset(request, app_module.ASSET_PIPELINE.index, immutable=False)
+        entry = app_module.STATIC_INDEX.get('index.html')
+        if not entry:
+            return AsgiResponse(500, [('Content-Type', 'text/html; charset=utf-8')],
+                                '错误：无法加载游戏页面 - index.html 不存在'.encode('utf-8'))
+        return await self._send_static_entry(request, entry)
+
+    def _static_target(self, filename):
+        """静态文件路径对应的 (构建产物, 索引条目)，都不存在时返回 None"""
+        asset = app_module.ASSET_PIPELINE.get(filename) if app_module.ASSET_PIPELINE else None
+        entry = None if asset else app_module.STATIC_INDEX.get(filename)
+        if asset is None and entry is None:
+            return None
+        return asset, entry
+
+    async def static_file(self, request, target):
+        """静态文件，与 app.static_files 相同（带哈希文件名的构建产物或索引中的文件）"""
+        asset, entry = target
+        if asset:
+            return await self._send_built_asset(request, asset, immutable=True)
+
+        response = await self._send_static_entry(request, entry)
+        if entry.rel_path.endswith(app_module.STATIC_CACHE_EXTENSIONS):
+            response.headers = [
+                (name, app_module.STATIC_CACHE_CONTROL if name == 'Cache-Control' else value)
+                for name, value in response.headers
+            ]
+        return response
+
+    async def _send_built_asset(self, request, asset, immutable):
+        accept_encodings = parse_accept_header(request.headers.get('Accept-Encoding'))
+        entry, encoding = asset.choose(accept_encodings)
+        response = await self._send_static_entry(request, entry)
+        headers = [('Vary', 'Accept-Encoding')]
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        if immutable:
+            response.headers = [(name, value) for name, value in response.headers if name != 'Cache-Control']
+            headers.append(('Cache-Control', f'public, max-age={app_module.IMMUTABLE_MAX_AGE}, immutable'))
+        response.headers += headers
+        return response
+
+    async def _send_static_entry(self, request, entry):
+        """按索引条目发送文件：小文件来自内存缓存，大文件分块读取，不阻塞事件循环"""
+        headers = [
+            ('ETag', quote_etag(entry.etag)),
+            ('Last-Modified', http_date(entry.mtime)),
+            ('Cache-Control', 'no-cache'),
+            ('Accept-Ranges', 'bytes')
+        ]
+        last_modified = datetime.fromtimestamp(entry.mtime, timezone.utc)
+        if not is_resource_modified(request.conditional_environ(), etag=entry.etag, last_modified=last_modified):
+            return AsgiResponse(304, headers)
+
+        headers.insert(0, ('Content-Type', get_content_type(entry.mimetype, 'utf-8')))
+        hot_files = app_module.HOT_FILE_CACHE
+        data = hot_files.cached(entry)
+        if data is None and hot_files.accepts(entry):
+            try:
+                data = await asyncio.to_thread(hot_files.get, entry)
+            except FileNotFoundError:
+                return AsgiResponse(404, [('Content-Type', 'text/html; charset=utf-8')],
+                                    f"文件未找到: {entry.rel_path}".encode('utf-8'))
+        if data is not None:
+            return AsgiResponse(200, headers, data)
+
+        try:
+            handle = await asyncio.to_thread(open, entry.path, 'rb')
+        except FileNotFoundError:
+            return AsgiResponse(404, [('Content-Type', 'text/html; charset=utf-8')],
+                                f"文件未找到: {entry.rel_path}".encode('utf-8'))
+        headers.append(('Content-Length', str(entry.size)))
+        return AsgiResponse(200, headers, stream=self._file_chunks(handle))
+
+    async def _file_chunks(self, handle):
+        try:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, self.static_chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            handle.close()
+
+    # ------------------------------------------------------------ Flask
+
+    def _environ(self, scope, body):
+        """由 ASGI scope 构造 WSGI environ"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+                environ[name] = value
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def _call_wsgi(self, scope, receive, send):
+        """其他路由交给 Flask 应用，在有界线程池中执行（请求指标由 Flask 记录）"""
+        try:
+            body = await self._read_body(receive)
+        except ClientDisconnected:
+            return
+        except BodyTooLarge:
+            await self._send(send, scope, json_response({'success': False, 'message': '请求体过大'}, 413))
+            return
+
+        self._wsgi_requests += 1
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        def call():
+            result = self.flask_app(self._environ(scope, body), start_response)
+            return result, iter(result)
+
+        result, chunks = await loop.run_in_executor(self._executor, call)
+        try:
+            # 第一块在线程中取出后才能确定状态和响应头（流式响应会在此时调用 start_response）
+            chunk = await loop.run_in_executor(self._executor, next, chunks, None)
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                            for name, value in started['headers']]
+            })
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self._executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            self._disconnects += 1
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self._executor, result.close)
+
+    # ------------------------------------------------------------ 运行
+
+    def after_fork(self):
+        """fork之后在子进程中调用：丢弃继承的异步连接池状态和线程池"""
+        self.pool.reset()
+        self._executor = ThreadPoolExecutor(self.wsgi_threads, thread_name_prefix='wsgi')
+
+    def stats(self):
+        """ASGI 服务统计信息"""
+        return {
+            'requests': self._requests,
+            'wsgi_requests': self._wsgi_requests,
+            'timeouts': self._timeouts,
+            'disconnects': self._disconnects,
+            'request_timeout': self.request_timeout,
+            'db_pool': self.pool.stats()
+        }
+
+
+def create_asgi_app(config_path=None, start_background=True):
+    """创建 Flask 应用的运行时状态，并在其上创建 ASGI 应用"""
+    return build_asgi_app(app_module.create_app(config_path, start_background))
+
+
+def build_asgi_app(flask_app):
+    """在已初始化的 Flask 应用上创建 ASGI 应用（create_app 之后调用）"""
+    global ASGI_APP
+    ASGI_APP = AsgiApplication.from_config(flask_app, app_module.CONFIG)
+    ASGI_APP.pool.observer = app_module.METRICS
+    ASGI_APP.pool.breaker = app_module.DB_BREAKER
+    app_module.ASGI_APP = ASGI_APP
+    register_metrics(ASGI_APP)
+    return ASGI_APP
+
+
+def register_metrics(asgi_app):
+    """导出异步连接池和请求处理的统计"""
+    registry = app_module.METRICS.registry
+    registry.gauge('db_async_pool_connections', '异步连接池中的连接数', ('state',), callback=lambda: {
+        (state,): asgi_app.pool.stats()[state] for state in ('idle', 'in_use', 'waiting')
+    })
+    registry.counter('db_async_pool_timeouts_total', '等待异步连接超时次数',
+                     callback=lambda: asgi_app.pool.stats()['timeouts'])
+    registry.counter('asgi_cancelled_requests_total', '超时或客户端断开而取消的请求数', ('reason',),
+                     callback=lambda: {
+                         ('timeout',): asgi_app.stats()['timeouts'],
+                         ('disconnect',): asgi_app.stats()['disconnects']
+                     })
+
+
+def reinit_after_fork():
+    """在fork出的工作进程中调用"""
+    app_module.reinit_after_fork()
+    if ASGI_APP is not None:
+        ASGI_APP.after_fork()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源构建流水线
+启动时对 index.html 引用的本地资源做压缩(去除多余空白)、按内容哈希重命名，
+并预先生成 gzip / brotli 压缩版本；index.html 改写为引用带哈希的文件名。
+插件脚本目录（plugins/）中的脚本同样构建为带哈希的文件，由游戏页面按插件清单按需加载。
+
+也可以单独运行，提前构建:
+    python3 asset_pipeline.py
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from config_manager import read_config
+from static_index import make_entry
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只生成 gzip 版本
+    brotli = None
+
+# 可以去除空白的文本资源类型
+MINIFY_EXTENSIONS = ('.js', '.css', '.html')
+
+# 值得预压缩的资源类型（图片等已压缩格式跳过）
+COMPRESS_EXTENSIONS = ('.js', '.css', '.html', '.json', '.svg', '.txt')
+
+# 小于该大小的文件不压缩，压缩收益抵不过Content-Encoding的开销
+MIN_COMPRESS_SIZE = 1024
+
+# index.html 中的本地资源引用: src="..." / href="..."
+ASSET_REF_PATTERN = re.compile(r'(\b(?:src|href)=")([^"]+)(")')
+
+
+class BuiltAsset:
+    """一个构建产物及其各编码版本"""
+
+    def __init__(self, url_name, source, mimetype, digest, integrity=None):
+        self.url_name = url_name
+        self.source = source
+        self.mimetype = mimetype
+        self.digest = digest
+        # 子资源完整性校验值（<script integrity>），对应未压缩版本的内容
+        self.integrity = integrity
+        # 编码 -> StaticEntry，'identity' 为未压缩版本
+        self.variants = {}
+
+    def choose(self, accept_encodings):
+        """根据 Accept-Encoding 选择最合适的版本，返回 (StaticEntry, 编码)"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding]:
+                return self.variants[encoding], encoding
+        return self.variants['identity'], 'identity'
+
+    def etag(self, encoding):
+        """不同编码版本使用不同的ETag"""
+        if encoding == 'identity':
+            return self.digest
+        return f"{self.digest}-{encoding}"
+
+
+def minify_text(text):
+    """保守的空白压缩：去掉行首缩进、行尾空白和空行，保留换行以免破坏JS自动分号插入"""
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def fingerprint_name(rel_path, digest):
+    """game.js -> game.<hash>.js"""
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def is_local_reference(ref):
+    """是否是可以构建的本地资源引用（排除外链、锚点、模板变量等）"""
+    if not ref or ref.startswith(('#', '/', 'data:', 'javascript:', 'mailto:')):
+        return False
+    if '://' in ref or '${' in ref or '?' in ref or '..' in ref:
+        return False
+    return True
+
+
+class AssetPipeline:
+    """构建并索引带哈希、预压缩的静态资源"""
+
+    def __init__(self, static_dir, build_dir='build', entry='index.html', bundle_dir='plugins',
+                 minify=True, use_brotli=True, gzip_level=9, brotli_quality=11):
+        self.static_dir = static_dir
+        self.build_dir = os.path.join(static_dir, build_dir)
+        self.entry = entry
+        self.bundle_dir = bundle_dir
+        self.minify = minify
+        self.use_brotli = use_brotli and brotli is not None
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # 带哈希的URL文件名 -> BuiltAsset
+        self.assets = {}
+        # 插件脚本源文件路径（如 plugins/air-conditioning-plugin.js） -> BuiltAsset
+        self.bundles = {}
+        self.index = None
+
+    @classmethod
+    def from_config(cls, static_dir, assets_config=None):
+        """根据 config.json 的 assets 配置创建流水线"""
+        assets_config = assets_config or {}
+        return cls(
+            static_dir,
+            build_dir=assets_config.get('build_dir', 'build'),
+            bundle_dir=assets_config.get('bundle_dir', 'plugins'),
+            minify=assets_config.get('minify', True),
+            use_brotli=assets_config.get('brotli', True),
+            gzip_level=assets_config.get('gzip_level', 9),
+            brotli_quality=assets_config.get('brotli_quality', 11)
+        )
+
+    def _read_source(self, rel_path):
+        path = os.path.join(self.static_dir, rel_path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if self.minify and rel_path.endswith(MINIFY_EXTENSIONS):
+            data = minify_text(data.decode('utf-8')).encode('utf-8')
+        return data
+
+    def _write(self, path, data):
+        """写入构建产物，内容已存在时跳过（文件名带哈希，同名即同内容）"""
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _emit(self, url_name, source, data, digest):
+        """写出资源的原始版本和各压缩版本"""
+        mimetype = mimetypes.guess_type(source)[0] or 'application/octet-stream'
+        integrity = 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode('ascii')
+        asset = BuiltAsset(url_name, source, mimetype, digest, integrity)
+
+        def add_variant(encoding, path):
+            asset.variants[encoding] = make_entry(
+                path, url_name, mimetype=mimetype, etag=asset.etag(encoding)
+            )
+
+        path = os.path.join(self.build_dir, url_name)
+        self._write(path, data)
+        add_variant('identity', path)
+
+        if url_name.endswith(COMPRESS_EXTENSIONS) and len(data) >= MIN_COMPRESS_SIZE:
+            gz_path = f"{path}.gz"
+            if not os.path.exists(gz_path):
+                self._write(gz_path, gzip.compress(data, compresslevel=self.gzip_level, mtime=0))
+            add_variant('gzip', gz_path)
+
+            if self.use_brotli:
+                br_path = f"{path}.br"
+                if not os.path.exists(br_path):
+                    self._write(br_path, brotli.compress(data, quality=self.brotli_quality))
+                add_variant('br', br_path)
+
+        return asset
+
+    def build(self):
+        """执行构建，返回 self"""
+        entry_path = os.path.join(self.static_dir, self.entry)
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            html = f.read()
+
+        assets = {}
+        renamed = {}
+        for match in ASSET_REF_PATTERN.finditer(html):
+            ref = match.group(2)
+            if ref in renamed or not is_local_reference(ref):
+                continue
+            if not os.path.isfile(os.path.join(self.static_dir, ref)):
+                continue
+
+            asset = self._build_source(ref)
+            assets[asset.url_name] = asset
+            renamed[ref] = asset.url_name
+
+        # 改写入口页面中的资源引用
+        html = ASSET_REF_PATTERN.sub(
+            lambda m: m.group(1) + renamed.get(m.group(2), m.group(2)) + m.group(3),
+            html
+        )
+        data = html.encode('utf-8')
+        if self.minify:
+            data = minify_text(html).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        self.index = self._emit(fingerprint_name(self.entry, digest), self.entry, data, digest)
+
+        # 插件脚本不在入口页面中引用，单独构建
+        bundles = {}
+        for ref in self._bundle_sources():
+            asset = assets.get(renamed.get(ref)) or self._build_source(ref)
+            assets[asset.url_name] = asset
+            bundles[ref] = asset
+        self.assets = assets
+        self.bundles = bundles
+
+        previous = self._read_manifest_files()
+        self._write_manifest(renamed)
+        self._prune(previous)
+        return self
+
+    def _build_source(self, rel_path):
+        """压缩并按内容哈希重命名一个源文件"""
+        data = self._read_source(rel_path)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        return self._emit(fingerprint_name(rel_path, digest), rel_path, data, digest)
+
+    def _bundle_sources(self):
+        """插件脚本目录下的 .js 文件（相对路径，按名称排序）"""
+        if not self.bundle_dir:
+            return []
+        directory = os.path.join(self.static_dir, self.bundle_dir)
+        if not os.path.isdir(directory):
+            return []
+        return [
+            f"{self.bundle_dir}/{name}" for name in sorted(os.listdir(directory))
+            if name.endswith('.js') and os.path.isfile(os.path.join(directory, name))
+        ]
+
+    def _current_files(self):
+        """本次构建的全部产物（带哈希的文件名）"""
+        return sorted(set(self.assets) | {self.index.url_name})
+
+    def _read_manifest_files(self):
+        """上一次构建的产物列表，没有 manifest.json 时返回空列表"""
+        path = os.path.join(self.build_dir, 'manifest.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if 'files' in manifest:
+            return manifest['files']
+        # 旧版本的 manifest.json 没有 files 字段
+        return [manifest.get('entry')] + list(manifest.get('assets', {}).values()) + \
+            list(manifest.get('bundles', {}).values())
+
+    def _write_manifest(self, renamed):
+        """写出 manifest.json 便于排查，files 记录本次构建的全部产物，用于清理旧产物"""
+        manifest = {
+            'entry': self.index.url_name,
+            'assets': renamed,
+            'bundles': {ref: asset.url_name for ref, asset in self.bundles.items()},
+            'files': self._current_files(),
+            'brotli': self.use_brotli
+        }
+        path = os.path.join(self.build_dir, 'manifest.json')
+        os.makedirs(self.build_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    def _prune(self, previous):
+        """删除本次和上一次构建都没有用到的产物，返回删除的文件数
+
+        保留上一代：刚重新部署时，已打开旧页面的客户端和尚未重启的进程仍会请求旧的哈希文件名
+        """
+        keep = {'manifest.json'}
+        for url_name in set(self._current_files()) | set(filter(None, previous)):
+            keep.update((url_name, f"{url_name}.gz", f"{url_name}.br"))
+
+        removed = 0
+        for directory, _, names in os.walk(self.build_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                rel_path = os.path.relpath(path, self.build_dir).replace(os.sep, '/')
+                # 其他进程正在写入的临时文件
+                if rel_path in keep or '.tmp' in name:
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def get(self, url_name):
+        """按带哈希的文件名查找构建产物"""
+        return self.assets.get(url_name)
+
+    def bundle(self, rel_path):
+        """按源文件路径查找插件脚本的构建产物"""
+        return self.bundles.get(rel_path)
+
+
+def main():
+    """命令行入口：构建静态资源"""
+    static_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(static_dir, 'config.json')
+    assets_config = {}
+    if os.path.exists(config_path):
+        assets_config = read_config(config_path).get('assets', {})
+
+    pipeline = AssetPipeline.from_config(static_dir, assets_config).build()
+    print(f"✅ 静态资源构建完成: {pipeline.build_dir}")
+    print(f"📄 入口页面: {pipeline.index.url_name} ({', '.join(sorted(pipeline.index.variants))})")
+    for url_name, asset in sorted(pipeline.assets.items()):
+        sizes = ', '.join(
+            f"{encoding}={entry.size}" for encoding, entry in sorted(asset.variants.items())
+        )
+        print(f"   - {asset.source} -> {url_name} ({sizes})")
+    if pipeline.bundles:
+        print(f"🧩 插件脚本: {len(pipeline.bundles)} 个")
+    if brotli is None:
+        print("💡 未安装brotli，仅生成gzip版本: pip install Brotli")
+
+
+if __name__ == '__main__':
+    main()
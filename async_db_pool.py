@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步数据库连接池（ASGI模式使用）
+与 db_pool.ConnectionPool 行为一致的 asyncio 版本：有界、借出时存活检查、限制连接寿命、等待超时，
+并统计池大小、等待时间和借出次数。等待数据库时只挂起协程，不占用线程。
+
+连接函数为协程函数（aiomysql.connect，或 SQLite 后端的 sqlite_compat.connect_async），
+连接和游标的接口与 aiomysql 一致。
+
+用法:
+    connection = await pool.acquire()
+    async with connection:                      # 结束时归还连接
+        async with connection.cursor() as cursor:
+            await cursor.execute(sql, args)
+            rows = cursor.fetchall()
+
+请求被取消（超时或客户端断开）时，正在使用的连接可能停在一条语句的中间，归还时直接关闭而不放回池中。
+连接池只在一个事件循环中使用，状态在两次 await 之间修改，不需要锁。
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from circuit_breaker import is_connection_error
+from db_pool import PoolTimeoutError
+
+
+class AsyncInstrumentedCursor:
+    """记录每条语句耗时和行数的异步游标包装器，连接中断类的错误和执行成功报告给熔断器"""
+
+    def __init__(self, cursor, observer, breaker=None):
+        self._cursor = cursor
+        self._observer = observer
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def _timed(self, method, sql, args):
+        start = time.perf_counter()
+        try:
+            result = await method(sql, args)
+        except Exception as e:
+            if self._observer:
+                self._observer.query(sql, time.perf_counter() - start, 0, error=True)
+            if self._breaker and is_connection_error(e):
+                self._breaker.record_failure(e)
+            raise
+        # 语句执行成功才说明数据库可用；借出连接成功（可能是未经检查的空闲连接）不算
+        if self._breaker:
+            self._breaker.record_success()
+        if self._observer:
+            self._observer.query(sql, time.perf_counter() - start, max(self._cursor.rowcount or 0, 0))
+        return result
+
+    async def execute(self, sql, args=None):
+        return await self._timed(self._cursor.execute, sql, args)
+
+    async def executemany(self, sql, args):
+        return await self._timed(self._cursor.executemany, sql, args)
+
+
+class _CursorContext:
+    """async with connection.cursor() as cursor：打开游标，结束时关闭"""
+
+    def __init__(self, connection, cursor_args):
+        self._connection = connection
+        self._cursor_args = cursor_args
+        self._cursor = None
+
+    async def __aenter__(self):
+        self._cursor = await self._connection._raw.cursor(*self._cursor_args)
+        pool = self._connection._pool
+        if pool.observer or pool.breaker:
+            return AsyncInstrumentedCursor(self._cursor, pool.observer, pool.breaker)
+        return self._cursor
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._cursor.close()
+
+
+class AsyncPooledConnection:
+    """池化的异步连接，接口与 aiomysql 连接一致"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._broken = False
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *cursor_args):
+        return _CursorContext(self, cursor_args)
+
+    def discard(self):
+        """标记连接已损坏，归还时关闭"""
+        self._broken = True
+
+    async def close(self):
+        """归还连接"""
+        if self._released:
+            return
+        self._released = True
+        await self._pool.release(self, broken=self._broken)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # 被取消（超时或客户端断开）时连接的协议状态未知，不能再给其他请求使用
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            self._broken = True
+        await self.close()
+
+
+def _wake(future):
+    """唤醒等待者（交接名额或等待超时），由它检查 granted"""
+    if not future.done():
+        future.set_result(None)
+
+
+class _Waiter:
+    """等待连接的一个请求；名额交接给它时 granted 置为真，connection 为交接的空闲连接
+    (raw, created_at)，为 None 时需要新建连接"""
+
+    def __init__(self, loop):
+        self.future = loop.create_future()
+        self.granted = False
+        self.connection = None
+
+
+class AsyncConnectionPool:
+    """有界异步数据库连接池（每个事件循环一个）"""
+
+    def __init__(self, connect, connect_kwargs, max_size=10, max_lifetime=1800,
+                 wait_timeout=5.0, ping_on_checkout=True):
+        # 建立连接的协程函数
+        self._connect = connect
+        self._connect_kwargs = dict(connect_kwargs)
+        # 可选的观察者，提供 connect(秒)、wait(秒)、query(sql, 秒, 行数, error=False) 方法
+        self.observer = None
+        # 可选的熔断器（与同步连接池共用）
+        self.breaker = None
+        self._autocommit = self._connect_kwargs.get('autocommit', False)
+        self.max_size = max(1, int(max_size))
+        self.max_lifetime = float(max_lifetime)
+        self.wait_timeout = float(wait_timeout)
+        self.ping_on_checkout = bool(ping_on_checkout)
+
+        self._idle = deque()
+        # 等待名额的请求（_Waiter），名额空出时直接交给队首
+        self._waiters = deque()
+        self._size = 0
+        self._in_use = 0
+
+        # 统计计数器
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._cancelled = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @classmethod
+    def from_config(cls, connect, connect_kwargs, pool_config=None):
+        """根据 config.json 的 database.pool 配置创建连接池（与同步连接池使用相同配置）"""
+        pool_config = pool_config or {}
+        return cls(
+            connect,
+            connect_kwargs,
+            max_size=pool_config.get('max_size', 10),
+            max_lifetime=pool_config.get('max_lifetime', 1800),
+            wait_timeout=pool_config.get('wait_timeout', 5),
+            ping_on_checkout=pool_config.get('ping_on_checkout', True)
+        )
+
+    async def _open(self):
+        start = time.monotonic()
+        try:
+            raw = await self._connect(**self._connect_kwargs)
+        except Exception as e:
+            if self.breaker:
+                self.breaker.record_failure(e)
+            raise
+        created_at = time.monotonic()
+        if self.observer:
+            self.observer.connect(created_at - start)
+        self._created += 1
+        return raw, created_at
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _available(self):
+        return bool(self._idle) or self._size < self.max_size
+
+    def _hand_over(self, connection):
+        """名额空出：直接交给最早的等待者，不经过空闲队列，之后到达的请求不能抢先；没有等待者时归还
+
+        connection 为可以复用的 (raw, created_at)，None 表示连接已关闭、只空出名额。调用前后借出数和
+        连接数不变，交接给等待者的名额沿用这两个计数
+        """
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            waiter.connection = connection
+            _wake(waiter.future)
+            return
+        self._in_use -= 1
+        if connection is not None:
+            self._idle.append(connection)
+        else:
+            self._size -= 1
+
+    async def _wait_for_slot(self, timeout):
+        """排队等待交接的名额，返回 (raw, created_at)；需要新建连接时为 (None, None)"""
+        # 不使用 asyncio.wait_for：它可能在名额到达的同时吞掉取消，使已断开的请求继续占用连接
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop)
+        self._waiters.append(waiter)
+        handle = loop.call_later(timeout, _wake, waiter.future)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # 已取得名额但随即被取消：名额转交下一个等待者，否则离开队列
+            if waiter.granted:
+                self._hand_over(waiter.connection)
+            else:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            handle.cancel()
+        if not waiter.granted:
+            self._waiters.remove(waiter)
+            self._timeouts += 1
+            raise PoolTimeoutError(f"等待数据库连接超时({timeout}s)，连接池已满: {self.max_size}")
+        return waiter.connection or (None, None)
+
+    async def acquire(self, timeout=None):
+        """借出一个连接，池满时最多等待 timeout 秒；用完后用 async with 或 close() 归还"""
+        timeout = self.wait_timeout if timeout is None else timeout
+        if self.breaker:
+            self.breaker.before_connect()
+        start = time.monotonic()
+        if self._waiters or not self._available():
+            # 名额由归还方直接交接，借出数和连接数已经计入
+            raw, created_at = await self._wait_for_slot(timeout)
+        else:
+            raw, created_at = self._idle.pop() if self._idle else (None, None)
+            if raw is None:
+                # 占用一个名额，再建立连接
+                self._size += 1
+            self._in_use += 1
+
+        try:
+            if raw is not None:
+                if time.monotonic() - created_at > self.max_lifetime:
+                    self._close_raw(raw)
+                    raw = None
+                    self._discarded += 1
+                elif self.ping_on_checkout:
+                    try:
+                        await raw.ping(reconnect=False)
+                    except Exception:
+                        self._close_raw(raw)
+                        raw = None
+                        self._discarded += 1
+            if raw is None:
+                raw, created_at = await self._open()
+        except BaseException:
+            # 包括建立连接时被取消：释放占用的名额
+            if raw is not None:
+                self._close_raw(raw)
+            self._hand_over(None)
+            raise
+
+        waited = time.monotonic() - start
+        if self.observer:
+            self.observer.wait(waited)
+        self._checkouts += 1
+        self._total_wait += waited
+        if waited > self._max_wait:
+            self._max_wait = waited
+
+        return AsyncPooledConnection(self, raw, created_at)
+
+    async def release(self, connection, broken=False):
+        """归还连接，过期、损坏或被取消的连接直接关闭"""
+        raw = connection._raw
+        if broken:
+            self._cancelled += 1
+        reusable = not broken and not raw.closed
+        if reusable and time.monotonic() - connection._created_at > self.max_lifetime:
+            reusable = False
+        if reusable and not self._autocommit:
+            # 清理未提交的事务，避免状态泄漏给下一个使用者
+            try:
+                await raw.rollback()
+            except BaseException as e:
+                reusable = False
+                if isinstance(e, asyncio.CancelledError):
+                    self._give_back(raw, connection._created_at, reusable)
+                    raise
+        self._give_back(raw, connection._created_at, reusable)
+
+    def _give_back(self, raw, created_at, reusable):
+        if not reusable:
+            self._close_raw(raw)
+            self._discarded += 1
+        self._hand_over((raw, created_at) if reusable else None)
+
+    async def close_all(self):
+        """关闭所有空闲连接（服务器退出时调用）"""
+        idle = list(self._idle)
+        self._idle.clear()
+        self._size -= len(idle)
+        for raw, _ in idle:
+            self._close_raw(raw)
+
+    def reset(self):
+        """fork之后在子进程中调用：丢弃从父进程继承的连接和等待者"""
+        self._idle = deque()
+        self._waiters = deque()
+        self._size = 0
+        self._in_use = 0
+
+    def stats(self):
+        """连接池统计信息"""
+        checkouts = self._checkouts
+        return {
+            'max_size': self.max_size,
+            'size': self._size,
+            'idle': len(self._idle),
+            'in_use': self._in_use,
+            'waiting': len(self._waiters),
+            'checkouts': checkouts,
+            'created': self._created,
+            'discarded': self._discarded,
+            'cancelled': self._cancelled,
+            'timeouts': self._timeouts,
+            'avg_wait_ms': round(self._total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+            'max_wait_ms': round(self._max_wait * 1000, 3)
+        }
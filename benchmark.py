@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务器基准测试
+按设定的并发压测主页、游戏脚本、/api/plugins、/api/plugin-stats/<id> 和 /api/rate-plugin，
+统计各接口的 p50/p95/p99 延迟、吞吐量和错误率，结果保存为JSON以便对比回归。
+
+用法:
+    # 使用嵌入式SQLite数据库替身（自动生成N个插件、M条评分并启动服务器）
+    python3 benchmark.py run --plugins 50 --ratings 20000 --concurrency 32 --duration 20
+
+    # 使用本机MySQL（config.json 指向的数据库，需先执行 database_schema.sql），--seed 生成测试数据
+    python3 benchmark.py run --db mysql --seed --plugins 50 --ratings 20000
+
+    # 压测已经运行的服务器
+    python3 benchmark.py run --url http://127.0.0.1:5218
+
+    # 对比两次结果，p99延迟或吞吐量变差超过阈值时退出码为1
+    python3 benchmark.py compare benchmark_results/old.json benchmark_results/new.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+from config_manager import read_config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(BASE_DIR, 'benchmark_results')
+
+# 各接口的默认请求比例
+DEFAULT_MIX = {
+    'index': 1,
+    'bundle': 1,
+    'plugins': 4,
+    'plugin_stats': 3,
+    'rate': 1
+}
+
+COMPLAINTS = ['空调问题', '异味问题', '打印机问题', '排队问题', '光线问题',
+              '健康问题', '清洁问题', '网络问题', '电脑问题', '噪音问题']
+CATEGORIES = ['facility', 'equipment', 'service', 'infrastructure', 'general']
+
+
+# ---------------------------------------------------------------- 测试数据
+
+def seed_database(connection, plugins, ratings, seed=1):
+    """写入 N 个测试插件和 M 条随机评分，然后从评分明细生成统计
+
+    只删除和重建以 bench- 开头的测试插件，不影响其他数据
+    """
+    from plugin_stats import reconcile
+
+    rng = random.Random(seed)
+    connection.begin()
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM plugins WHERE plugin_id LIKE %s", ('bench-%',))
+        cursor.executemany("""
+            INSERT INTO plugins (plugin_name, plugin_id, description, author, version,
+                                 icon, color, category, target_complaints)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [
+            (f'测试插件 {i}', f'bench-{i}', f'基准测试插件 {i}', '基准测试', '1.0.0',
+             'plugin', '#4CAF50', rng.choice(CATEGORIES),
+             json.dumps(rng.sample(COMPLAINTS, 2), ensure_ascii=False))
+            for i in range(1, plugins + 1)
+        ])
+        cursor.execute("SELECT id FROM plugins WHERE plugin_id LIKE %s", ('bench-%',))
+        plugin_ids = [row[0] for row in cursor.fetchall()]
+
+        # 热门插件评分更多（长尾分布），同一插件同一IP只评一次
+        weights = [1.0 / rank for rank in range(1, len(plugin_ids) + 1)]
+        seen = set()
+        rows = []
+        while len(rows) < ratings:
+            plugin_id = rng.choices(plugin_ids, weights)[0]
+            user_ip = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+            if (plugin_id, user_ip) in seen:
+                continue
+            seen.add((plugin_id, user_ip))
+            rows.append((plugin_id, user_ip, 'benchmark', rng.randint(1, 5), ''))
+
+        for start in range(0, len(rows), 1000):
+            cursor.executemany("""
+                INSERT INTO plugin_ratings (plugin_id, user_ip, user_agent, rating, comment)
+                VALUES (%s, %s, %s, %s, %s)
+            """, rows[start:start + 1000])
+    connection.commit()
+
+    reconcile(connection, fix=True)
+    return plugin_ids
+
+
+def mysql_connection(config):
+    import pymysql
+
+    db = config['database']
+    return pymysql.connect(
+        host=db['host'], port=db['port'], user=db['username'], password=db['password'],
+        database=db['database'], charset=db['charset'], autocommit=True
+    )
+
+
+def load_config(config_path=None):
+    return read_config(config_path or os.path.join(BASE_DIR, 'config.json'))
+
+
+# ---------------------------------------------------------------- 被测服务器
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_server_config(config, work_dir, mode, sqlite_path=None):
+    """生成被测服务器使用的配置：队列文件、指标快照放在临时目录，不写pid文件，不启用实时推送
+
+    指定 sqlite_path 时使用 SQLite 存储后端
+    """
+    config = json.loads(json.dumps(config))
+    if sqlite_path:
+        config['database']['backend'] = 'sqlite'
+        config['database']['path'] = sqlite_path
+    config['data_dir'] = work_dir
+    config['server']['mode'] = mode
+    config['server']['pidfile'] = None
+    config['server']['accesslog'] = None
+    # 压测请求用 X-Forwarded-For 模拟不同用户，按一层可信代理处理
+    config['server']['proxy_count'] = 1
+    config.setdefault('rating_queue', {})['spool_path'] = os.path.join(work_dir, 'rating_queue.db')
+    config.setdefault('static', {})['watch_interval'] = 0
+    config.setdefault('metrics', {})['shared_dir'] = os.path.join(work_dir, 'metrics')
+    # 被测服务器不占用实时推送端口，以免与正在运行的服务器冲突
+    config.setdefault('live', {})['enabled'] = False
+    path = os.path.join(work_dir, 'config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def start_server(config_path, port, mode):
+    """在子进程中启动服务器（避免与压测线程争用GIL），返回进程对象"""
+    command = [sys.executable, os.path.join(BASE_DIR, 'serve.py'),
+               '--config', config_path, '--host', '127.0.0.1',
+               '--port', str(port), '--mode', mode]
+    return subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url, process=None, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"服务器进程已退出，退出码 {process.returncode}")
+        try:
+            status, _, _ = Client(base_url).request('GET', '/api/status')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"等待服务器启动超时: {base_url}")
+
+
+# ---------------------------------------------------------------- 压测客户端
+
+class Client:
+    """每个压测线程一个 keep-alive 连接"""
+
+    def __init__(self, base_url, timeout=10):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            data = response.read()
+        except Exception:
+            self.conn.close()
+            self.conn = None
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            self.conn.close()
+            self.conn = None
+        return response.status, response.headers, data
+
+
+def discover_targets(base_url):
+    """获取游戏脚本路径（构建后带哈希文件名）和插件ID列表"""
+    client = Client(base_url)
+    _, _, html = client.request('GET', '/')
+    match = re.search(rb'src="/?([^"]*game[^"/]*\.js)"', html)
+    bundle = '/' + match.group(1).decode() if match else '/game.js'
+
+    status, _, body = client.request('GET', '/api/plugins')
+    plugin_ids = []
+    if status == 200:
+        plugin_ids = [plugin['id'] for plugin in json.loads(body).get('plugins', [])]
+    return bundle, plugin_ids
+
+
+def make_request(name, rng, bundle, plugin_ids, voters):
+    """生成一个请求：(方法, 路径, 请求体, 请求头)"""
+    if name == 'index':
+        return 'GET', '/', None, {}
+    if name == 'bundle':
+        return 'GET', bundle, None, {'Accept-Encoding': 'gzip, br'}
+    if name == 'plugins':
+        return 'GET', '/api/plugins', None, {}
+    if name == 'plugin_stats':
+        return 'GET', f"/api/plugin-stats/{rng.choice(plugin_ids)}", None, {}
+    if name == 'rate':
+        body = json.dumps({'plugin_id': rng.choice(plugin_ids), 'rating': rng.randint(1, 5)})
+        # 用不同的转发IP模拟不同用户，既有新评分也有修改评分
+        voter = rng.randrange(voters)
+        return 'POST', '/api/rate-plugin', body, {
+            'Content-Type': 'application/json',
+            'X-Forwarded-For': f"172.{16 + voter // 65536 % 16}.{voter // 256 % 256}.{voter % 256}"
+        }
+    raise ValueError(f"未知接口: {name}")
+
+
+def run_load(base_url, mix, concurrency, duration, requests_limit, bundle, plugin_ids,
+             voters=10000, seed=1):
+    """闭环压测：每个线程发完一个请求再发下一个，返回 {接口: [(延迟秒, 状态码或None)]}"""
+    names = [name for name, weight in mix.items() if weight > 0]
+    if not plugin_ids:
+        names = [name for name in names if name not in ('plugin_stats', 'rate')]
+    weights = [mix[name] for name in names]
+    results = {name: [] for name in names}
+    lock = threading.Lock()
+    remaining = [requests_limit]
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(base_url)
+        local = {name: [] for name in names}
+        while time.monotonic() < deadline:
+            if requests_limit:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            name = rng.choices(names, weights)[0]
+            method, path, body, headers = make_request(name, rng, bundle, plugin_ids, voters)
+            start = time.perf_counter()
+            try:
+                status, _, _ = client.request(method, path, body=body, headers=headers)
+            except Exception:
+                status = None
+            local[name].append((time.perf_counter() - start, status))
+        with lock:
+            for name, samples in local.items():
+                results[name].extend(samples)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.monotonic() - started
+
+
+# ---------------------------------------------------------------- 统计与报告
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 500)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0
+    }
+
+
+def build_report(results, elapsed, params):
+    endpoints = {name: summarize(samples, elapsed) for name, samples in results.items()}
+    endpoints['total'] = summarize([s for samples in results.values() for s in samples], elapsed)
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'elapsed_s': round(elapsed, 3),
+        'endpoints': endpoints
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def print_report(report):
+    print(f"\n📊 基准测试结果 ({report['elapsed_s']}s, 提交 {report['commit'] or '未知'})")
+    print(f"{'接口':<14}{'请求数':>9}{'错误率':>9}{'吞吐(rps)':>12}"
+          f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, stats in report['endpoints'].items():
+        print(f"{name:<14}{stats['requests']:>9}{stats['error_rate']:>9.2%}{stats['throughput_rps']:>12}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def save_report(report, output_dir, label=None):
+    os.makedirs(output_dir, exist_ok=True)
+    name = label or datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(output_dir, f"{name}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare_reports(old, new, threshold):
+    """对比两次结果，返回回归列表（p99延迟升高或吞吐量下降超过 threshold 百分比）"""
+    regressions = []
+    print(f"{'接口':<14}{'p99(ms)':>22}{'吞吐(rps)':>24}{'错误率':>20}")
+    for name, new_stats in new['endpoints'].items():
+        old_stats = old['endpoints'].get(name)
+        if not old_stats:
+            continue
+        p99_change = change_percent(old_stats['p99_ms'], new_stats['p99_ms'])
+        rps_change = change_percent(old_stats['throughput_rps'], new_stats['throughput_rps'])
+        print(f"{name:<14}"
+              f"{old_stats['p99_ms']:>9} -> {new_stats['p99_ms']:<9}"
+              f"{old_stats['throughput_rps']:>10} -> {new_stats['throughput_rps']:<10}"
+              f"{old_stats['error_rate']:>8.2%} -> {new_stats['error_rate']:<8.2%}")
+        if p99_change > threshold:
+            regressions.append(f"{name}: p99 延迟升高 {p99_change:.1f}%")
+        if -rps_change > threshold:
+            regressions.append(f"{name}: 吞吐量下降 {-rps_change:.1f}%")
+        if new_stats['error_rate'] > old_stats['error_rate']:
+            regressions.append(f"{name}: 错误率 {old_stats['error_rate']:.2%} -> {new_stats['error_rate']:.2%}")
+    return regressions
+
+
+def change_percent(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+# ---------------------------------------------------------------- 命令行
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for item in text.split(','):
+            name, _, weight = item.partition('=')
+            if name.strip() not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f"未知接口: {name}，可选: {', '.join(DEFAULT_MIX)}")
+            mix[name.strip()] = float(weight)
+    return mix
+
+
+def command_run(args):
+    config = load_config(args.config)
+    work_dir = None
+    process = None
+    base_url = args.url
+
+    try:
+        if not base_url:
+            work_dir = tempfile.mkdtemp(prefix='office-bench-')
+            sqlite_path = None
+            if args.db == 'standin':
+                import sqlite_compat
+
+                sqlite_path = os.path.join(work_dir, 'bench.db')
+                sqlite_compat.init_schema(sqlite_path)
+                connection = sqlite_compat.connect(sqlite_path)
+                try:
+                    print(f"🗄️  SQLite替身: 写入 {args.plugins} 个插件、{args.ratings} 条评分")
+                    seed_database(connection, args.plugins, args.ratings, seed=args.seed_value)
+                finally:
+                    connection.close()
+            elif args.seed:
+                connection = mysql_connection(config)
+                try:
+                    print(f"🗄️  MySQL: 写入 {args.plugins} 个插件、{args.ratings} 条评分")
+                    seed_database(connection, args.plugins, args.ratings, seed=args.seed_value)
+                finally:
+                    connection.close()
+
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            config_path = write_server_config(config, work_dir, args.mode, sqlite_path)
+            process = start_server(config_path, port, args.mode)
+            print(f"🚀 启动被测服务器: {base_url} ({args.mode}, {args.db})")
+        wait_until_ready(base_url, process)
+
+        bundle, plugin_ids = discover_targets(base_url)
+        mix = parse_mix(args.mix)
+
+        if args.warmup:
+            print(f"🔥 预热 {args.warmup}s")
+            run_load(base_url, mix, args.concurrency, args.warmup, 0, bundle, plugin_ids,
+                     voters=args.voters, seed=args.seed_value + 1)
+
+        print(f"⏱️  压测: 并发 {args.concurrency}，时长 {args.duration}s"
+              + (f"，最多 {args.requests} 个请求" if args.requests else ''))
+        results, elapsed = run_load(base_url, mix, args.concurrency, args.duration, args.requests,
+                                    bundle, plugin_ids, voters=args.voters, seed=args.seed_value)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = build_report(results, elapsed, {
+        'url': args.url,
+        'db': None if args.url else args.db,
+        'mode': None if args.url else args.mode,
+        'plugins': args.plugins,
+        'ratings': args.ratings,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'requests': args.requests,
+        'mix': mix
+    })
+    print_report(report)
+    path = save_report(report, args.output, args.label)
+    print(f"💾 结果已保存: {path}")
+
+
+def command_compare(args):
+    with open(args.old, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    regressions = compare_reports(old, new, args.threshold)
+    if regressions:
+        print(f"\n⚠️  发现 {len(regressions)} 项回归（阈值 {args.threshold}%）:")
+        for item in regressions:
+            print(f"   - {item}")
+        sys.exit(1)
+    print(f"\n✅ 未发现超过 {args.threshold}% 的回归")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='办公室生存游戏服务器基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='运行基准测试')
+    run.add_argument('--url', help='压测已运行的服务器，不自动启动')
+    run.add_argument('--db', choices=['standin', 'mysql'], default='standin',
+                     help='自动启动服务器时使用的数据库，默认SQLite替身')
+    run.add_argument('--seed', action='store_true', help='--db mysql 时先写入测试数据')
+    run.add_argument('--mode', choices=['development', 'production'], default='production',
+                     help='被测服务器运行模式')
+    run.add_argument('--config', help='配置文件路径，默认 config.json')
+    run.add_argument('--plugins', type=int, default=50, help='测试插件数 N')
+    run.add_argument('--ratings', type=int, default=10000, help='测试评分数 M')
+    run.add_argument('--concurrency', type=int, default=16, help='并发连接数')
+    run.add_argument('--duration', type=float, default=10, help='压测时长（秒）')
+    run.add_argument('--requests', type=int, default=0, help='最多请求数，0 表示不限')
+    run.add_argument('--warmup', type=float, default=2, help='预热时长（秒）')
+    run.add_argument('--mix', help='请求比例，如 plugins=4,plugin_stats=3,rate=1')
+    run.add_argument('--voters', type=int, default=10000, help='模拟的评分用户数')
+    run.add_argument('--seed-value', type=int, default=1, help='随机数种子')
+    run.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help='结果保存目录')
+    run.add_argument('--label', help='结果文件名，默认使用时间')
+
+    compare = subparsers.add_parser('compare', help='对比两次结果')
+    compare.add_argument('old', help='基准结果JSON')
+    compare.add_argument('new', help='新结果JSON')
+    compare.add_argument('--threshold', type=float, default=10, help='回归阈值（百分比）')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        command_run(args)
+    else:
+        command_compare(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库熔断器
+连续 failure_threshold 次连接失败（建立连接失败、连接中断、读写超时）后进入打开状态，
+此后 reset_timeout 秒内借出连接立即失败，不再等待连接超时；时间到后进入半开状态，
+只放行 half_open_probes 个探测请求，探测成功则恢复，失败则重新打开。
+
+同步连接池和异步连接池共用一个熔断器（每个进程一个）。
+"""
+
+import asyncio
+import math
+import threading
+import time
+
+import pymysql
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 导出为指标时的状态值
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，未尝试连接数据库"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"数据库暂时不可用（熔断中，{math.ceil(retry_after)}秒后重试）")
+        self.retry_after = retry_after
+
+
+def is_connection_error(error):
+    """是否为数据库不可用类的错误；SQL错误、锁等待和死锁不计入"""
+    if isinstance(error, (pymysql.err.InterfaceError, OSError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, pymysql.err.OperationalError):
+        # 2000 以上为客户端错误码：无法连接(2003)、连接已断开(2006)、查询中连接中断(2013) 等
+        code = error.args[0] if error.args else 0
+        return isinstance(code, int) and code >= 2000
+    return False
+
+
+class CircuitBreaker:
+    """三态熔断器，线程安全"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=10, half_open_probes=1, enabled=True):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.half_open_probes = max(1, int(half_open_probes))
+        self.enabled = bool(enabled)
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        # 统计计数器
+        self._opens = 0
+        self._rejected = 0
+        self._last_error = None
+
+    @classmethod
+    def from_config(cls, breaker_config=None):
+        """根据 config.json 的 circuit_breaker 配置创建"""
+        breaker_config = breaker_config or {}
+        return cls(
+            failure_threshold=breaker_config.get('failure_threshold', 5),
+            reset_timeout=breaker_config.get('reset_timeout', 10),
+            half_open_probes=breaker_config.get('half_open_probes', 1),
+            enabled=breaker_config.get('enabled', True)
+        )
+
+    def before_connect(self):
+        """借出连接前调用：熔断中抛出 CircuitOpenError"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            # 打开 reset_timeout 秒后进入半开；半开时探测请求没有结果（如被取消）超过 reset_timeout 秒则重新放行
+            if now - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._opened_at = now
+                self._probes = 0
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            self._rejected += 1
+            retry_after = max(0.0, self._opened_at + self.reset_timeout - now)
+        raise CircuitOpenError(retry_after or self.reset_timeout)
+
+    def record_success(self):
+        """数据库操作成功"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._state != CLOSED:
+                print("✅ 数据库已恢复，熔断器关闭")
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self, error=None):
+        """连接失败或连接中断"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) if error is not None else None
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                if self._state == CLOSED:
+                    print(f"⚠️  数据库连续失败 {self._failures} 次，熔断 {self.reset_timeout} 秒: {error}")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._opens += 1
+
+    def is_open(self):
+        """是否处于熔断状态（打开或半开）"""
+        return self._state != CLOSED
+
+    def retry_after(self):
+        """距离下次探测的秒数"""
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def after_fork(self):
+        """fork之后在子进程中调用：重建锁"""
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """熔断器统计信息"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'opens': self._opens,
+                'rejected': self._rejected,
+                'last_error': self._last_error
+            }
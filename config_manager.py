@@ -3,6 +3,9 @@
 """
 配置管理工具
 用于管理和验证应用配置
+
+所有配置项的默认值以 config.example.json 为准：读取 config.json 时按配置节递归合并到默认值之上，
+config.json 只需写与默认值不同的项（如数据库地址和账号）。新增配置项只需加到 config.example.json。
 """
 
 import json
@@ -10,6 +13,33 @@ import os
 import sys
 from datetime import datetime
 
+import storage
+
+# 默认配置（同时是带全部配置项的示例）
+EXAMPLE_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.example.json')
+
+
+def merge_config(defaults, overrides):
+    """overrides 中的值覆盖 defaults，两边都是字典的配置节递归合并，返回新的字典"""
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_config(config_path):
+    """读取配置文件并补全默认值；文件不存在或格式错误时抛出异常"""
+    return merge_config(read_json(EXAMPLE_CONFIG_PATH), read_json(config_path))
+
+
 class ConfigManager:
     def __init__(self, config_path='config.json'):
         self.config_path = config_path
@@ -22,8 +52,7 @@ class ConfigManager:
                 print(f"❌ 配置文件不存在: {self.config_path}")
                 return False
                 
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
+            self.config = read_config(self.config_path)
             
             print(f"✅ 配置文件加载成功: {self.config_path}")
             return True
@@ -45,6 +74,9 @@ class ConfigManager:
             'server': ['host', 'port', 'debug'],
             'app': ['name', 'version', 'description']
         }
+        # 本地SQLite后端不需要MySQL连接参数
+        if self.config.get('database', {}).get('backend') == 'sqlite':
+            required_keys['database'] = []
         
         missing_keys = []
         
@@ -82,6 +114,12 @@ class ConfigManager:
             'autocommit': db_config.get('autocommit', True)
         }
     
+    def get_pool_config(self):
+        """获取数据库连接池配置"""
+        if not self.config:
+            return None
+        return self.config['database'].get('pool', {})
+    
     def get_server_config(self):
         """获取服务器配置"""
         if not self.config:
@@ -95,26 +133,10 @@ class ConfigManager:
         return self.config['app']
     
     def create_default_config(self):
-        """创建默认配置文件"""
+        """创建默认配置文件：只写入与 config.example.json 不同的项（新安装使用本地SQLite，无需数据库服务器）"""
         default_config = {
             "database": {
-                "host": "tx-db.cbore8wpy3mc.us-east-2.rds.amazonaws.com",
-                "port": 3306,
-                "username": "demo",
-                "password": "Demo1234",
-                "database": "game",
-                "charset": "utf8mb4",
-                "autocommit": True
-            },
-            "server": {
-                "host": "0.0.0.0",
-                "port": 5218,
-                "debug": True
-            },
-            "app": {
-                "name": "办公室生存游戏",
-                "version": "1.0.0",
-                "description": "插件评分系统"
+                "backend": "sqlite"
             }
         }
         
@@ -140,8 +162,11 @@ class ConfigManager:
         self.config[section][key] = value
         
         try:
+            # 只改写 config.json 本身（不把默认值写进去）
+            overrides = read_json(self.config_path)
+            overrides.setdefault(section, {})[key] = value
             with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+                json.dump(overrides, f, indent=2, ensure_ascii=False)
             
             print(f"✅ 配置已更新: {section}.{key} = {value}")
             return True
@@ -180,8 +205,9 @@ def main():
             config_manager.show_config()
             
             # 显示数据库连接信息
-            db_config = config_manager.get_db_config()
-            print(f"\n🗄️  数据库: {db_config['database']}@{db_config['host']}:{db_config['port']}")
+            base_dir = os.path.dirname(os.path.abspath(config_manager.config_path))
+            data_dir = storage.data_dir(base_dir, config_manager.config)
+            print(f"\n🗄️  数据库: {storage.describe(data_dir, config_manager.config['database'])}")
             
             # 显示服务器信息
             server_config = config_manager.get_server_config()
@@ -30,6 +30,7 @@ CREATE TABLE IF NOT EXISTS plugin_ratings (
     user_agent TEXT COMMENT '用户浏览器信息',
     rating INT NOT NULL CHECK (rating >= 1 AND rating <= 5) COMMENT '评分(1-5星)',
     comment TEXT COMMENT '评价留言(可选)',
+    submitted_at DOUBLE NOT NULL DEFAULT 0 COMMENT '评分提交时间(Unix时间戳，评分队列补写时较早的评分不覆盖较新的)',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '评分时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     FOREIGN KEY (plugin_id) REFERENCES plugins(id) ON DELETE CASCADE,
@@ -44,6 +45,7 @@ CREATE TABLE IF NOT EXISTS plugin_statistics (
     plugin_id INT PRIMARY KEY COMMENT '插件ID(外键)',
     total_ratings INT DEFAULT 0 COMMENT '总评分数',
     average_rating DECIMAL(3,2) DEFAULT 0.00 COMMENT '平均评分',
+    ranking_score DECIMAL(6,4) NOT NULL DEFAULT 3.0000 COMMENT '排名分数(贝叶斯平均，见 plugin_stats.py)',
     rating_1_count INT DEFAULT 0 COMMENT '1星评分数',
     rating_2_count INT DEFAULT 0 COMMENT '2星评分数',
     rating_3_count INT DEFAULT 0 COMMENT '3星评分数',
@@ -56,73 +58,12 @@ CREATE TABLE IF NOT EXISTS plugin_statistics (
     INDEX idx_total_ratings (total_ratings)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='插件统计表';
 
--- 4. 创建触发器：自动更新统计数据
-DELIMITER //
-
--- 插入评分后更新统计
-CREATE TRIGGER update_plugin_stats_after_insert
-AFTER INSERT ON plugin_ratings
-FOR EACH ROW
-BEGIN
-    INSERT INTO plugin_statistics (plugin_id, total_ratings, average_rating, 
-                                   rating_1_count, rating_2_count, rating_3_count, 
-                                   rating_4_count, rating_5_count, last_rating_at)
-    VALUES (NEW.plugin_id, 1, NEW.rating,
-            CASE WHEN NEW.rating = 1 THEN 1 ELSE 0 END,
-            CASE WHEN NEW.rating = 2 THEN 1 ELSE 0 END,
-            CASE WHEN NEW.rating = 3 THEN 1 ELSE 0 END,
-            CASE WHEN NEW.rating = 4 THEN 1 ELSE 0 END,
-            CASE WHEN NEW.rating = 5 THEN 1 ELSE 0 END,
-            NEW.created_at)
-    ON DUPLICATE KEY UPDATE
-        total_ratings = total_ratings + 1,
-        average_rating = (average_rating * (total_ratings - 1) + NEW.rating) / total_ratings,
-        rating_1_count = rating_1_count + CASE WHEN NEW.rating = 1 THEN 1 ELSE 0 END,
-        rating_2_count = rating_2_count + CASE WHEN NEW.rating = 2 THEN 1 ELSE 0 END,
-        rating_3_count = rating_3_count + CASE WHEN NEW.rating = 3 THEN 1 ELSE 0 END,
-        rating_4_count = rating_4_count + CASE WHEN NEW.rating = 4 THEN 1 ELSE 0 END,
-        rating_5_count = rating_5_count + CASE WHEN NEW.rating = 5 THEN 1 ELSE 0 END,
-        last_rating_at = NEW.created_at;
-END//
-
--- 更新评分后重新计算统计
-CREATE TRIGGER update_plugin_stats_after_update
-AFTER UPDATE ON plugin_ratings
-FOR EACH ROW
-BEGIN
-    -- 重新计算统计数据
-    UPDATE plugin_statistics 
-    SET 
-        total_ratings = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id),
-        average_rating = (SELECT AVG(rating) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id),
-        rating_1_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id AND rating = 1),
-        rating_2_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id AND rating = 2),
-        rating_3_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id AND rating = 3),
-        rating_4_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id AND rating = 4),
-        rating_5_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = NEW.plugin_id AND rating = 5),
-        last_rating_at = NEW.updated_at
-    WHERE plugin_id = NEW.plugin_id;
-END//
-
--- 删除评分后更新统计
-CREATE TRIGGER update_plugin_stats_after_delete
-AFTER DELETE ON plugin_ratings
-FOR EACH ROW
-BEGIN
-    UPDATE plugin_statistics 
-    SET 
-        total_ratings = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id),
-        average_rating = COALESCE((SELECT AVG(rating) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id), 0),
-        rating_1_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id AND rating = 1),
-        rating_2_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id AND rating = 2),
-        rating_3_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id AND rating = 3),
-        rating_4_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id AND rating = 4),
-        rating_5_count = (SELECT COUNT(*) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id AND rating = 5),
-        last_rating_at = (SELECT MAX(created_at) FROM plugin_ratings WHERE plugin_id = OLD.plugin_id)
-    WHERE plugin_id = OLD.plugin_id;
-END//
-
-DELIMITER ;
+-- 4. 统计数据由应用按增量维护（见 plugin_stats.py），不使用触发器
+-- 触发器会与应用的增量更新重复计数；从旧版本升级时删除已有触发器
+-- 手工删除或修改评分后可执行 python3 plugin_stats.py --fix 从评分明细重新统计
+DROP TRIGGER IF EXISTS update_plugin_stats_after_insert;
+DROP TRIGGER IF EXISTS update_plugin_stats_after_update;
+DROP TRIGGER IF EXISTS update_plugin_stats_after_delete;
 
 -- 5. 插入初始插件数据
 INSERT INTO plugins (plugin_name, plugin_id, description, author, version, icon, color, category, target_complaints) VALUES
@@ -149,6 +90,7 @@ SELECT
     p.is_active,
     COALESCE(s.total_ratings, 0) as total_ratings,
     COALESCE(s.average_rating, 0.00) as average_rating,
+    COALESCE(s.ranking_score, 3.0000) as ranking_score,
     COALESCE(s.rating_1_count, 0) as rating_1_count,
     COALESCE(s.rating_2_count, 0) as rating_2_count,
     COALESCE(s.rating_3_count, 0) as rating_3_count,
@@ -158,13 +100,57 @@ SELECT
 FROM plugins p
 LEFT JOIN plugin_statistics s ON p.id = s.plugin_id
 WHERE p.is_active = TRUE
-ORDER BY s.average_rating DESC, s.total_ratings DESC, p.created_at ASC;
+ORDER BY s.ranking_score DESC, p.id ASC;
 
 -- 7. 创建索引优化查询性能
 CREATE INDEX idx_plugin_details_rating ON plugin_statistics(average_rating DESC, total_ratings DESC);
+CREATE INDEX idx_plugin_ranking ON plugin_statistics(ranking_score DESC, plugin_id);
 CREATE INDEX idx_plugin_ratings_time ON plugin_ratings(created_at DESC);
+CREATE INDEX idx_plugin_recent ON plugin_ratings(plugin_id, created_at);
+-- 插件列表分页排序（见 plugin_listing.py）
+CREATE INDEX idx_plugin_popular ON plugin_statistics(total_ratings DESC, average_rating DESC);
+CREATE INDEX idx_plugins_newest ON plugins(is_active, created_at, id);
+CREATE INDEX idx_plugins_category_newest ON plugins(category, is_active, created_at, id);
+CREATE INDEX idx_plugins_name ON plugins(is_active, plugin_name);
+CREATE INDEX idx_plugins_category_name ON plugins(category, is_active, plugin_name);
+
+-- 8. 游戏存档（跨设备同步，见 game_saves.py）：gzip 快照 + 之后的 JSON Patch，后台定期把补丁合并进快照
+CREATE TABLE IF NOT EXISTS game_saves (
+    save_id VARCHAR(64) PRIMARY KEY COMMENT '存档码(客户端生成的随机标识)',
+    version INT NOT NULL COMMENT '最新版本号',
+    snapshot_version INT NOT NULL COMMENT '快照对应的版本号',
+    snapshot MEDIUMBLOB NOT NULL COMMENT '快照(gzip压缩的JSON)',
+    pending_patches INT NOT NULL DEFAULT 0 COMMENT '尚未合并进快照的补丁数',
+    document_size INT NOT NULL DEFAULT 0 COMMENT '最新版本JSON字节数',
+    written_at INT NOT NULL COMMENT '最后写入时间(Unix秒)',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    INDEX idx_game_saves_compact (pending_patches, written_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='游戏存档表';
+
+CREATE TABLE IF NOT EXISTS game_save_patches (
+    save_id VARCHAR(64) NOT NULL COMMENT '存档码(外键)',
+    version INT NOT NULL COMMENT '应用补丁后的版本号',
+    patch BLOB NOT NULL COMMENT 'JSON Patch(gzip压缩)',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '写入时间',
+    PRIMARY KEY (save_id, version),
+    FOREIGN KEY (save_id) REFERENCES game_saves(save_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='游戏存档补丁表';
+
+-- 9. 全局排行榜（见 leaderboard.py）：每个玩家每个排行榜的最好成绩，服务启动时按排名索引顺序读入内存
+CREATE TABLE IF NOT EXISTS leaderboard_scores (
+    board VARCHAR(50) NOT NULL COMMENT '排行榜ID',
+    player_id CHAR(20) NOT NULL COMMENT '玩家标识(由存档码派生)',
+    player_name VARCHAR(32) NOT NULL COMMENT '玩家名称',
+    score DOUBLE NOT NULL COMMENT '最好成绩',
+    achieved_at DOUBLE NOT NULL COMMENT '达成时间(Unix秒)',
+    updated_at DOUBLE NOT NULL COMMENT '写入时间(Unix秒)，进程间同步使用',
+    PRIMARY KEY (board, player_id),
+    INDEX idx_leaderboard_rank (board, score DESC, achieved_at, player_id),
+    INDEX idx_leaderboard_updated (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='全局排行榜';
 
--- 8. 插入测试数据的存储过程
+-- 10. 插入测试数据的存储过程
 DELIMITER //
 CREATE PROCEDURE insert_test_ratings()
 BEGIN
@@ -196,5 +182,5 @@ DELIMITER ;
 
 -- 执行说明
 -- 1. 首先执行上述所有CREATE语句创建表结构
--- 2. 可选：执行 CALL insert_test_ratings(); 插入测试数据
+-- 2. 可选：执行 CALL insert_test_ratings(); 插入测试数据，然后执行 python3 plugin_stats.py --fix 生成统计
 -- 3. 查询示例：SELECT * FROM plugin_details; 查看所有插件及其评分统计
\ No newline at end of file
@@ -45,6 +45,7 @@ CREATE TABLE IF NOT EXISTS plugin_statistics (
     plugin_id INT PRIMARY KEY COMMENT '插件ID(外键)',
     total_ratings INT DEFAULT 0 COMMENT '总评分数',
     average_rating DECIMAL(3,2) DEFAULT 0.00 COMMENT '平均评分',
+    ranking_score DECIMAL(6,4) NOT NULL DEFAULT 3.0000 COMMENT '排名分数(贝叶斯平均，见 plugin_stats.py)',
     rating_1_count INT DEFAULT 0 COMMENT '1星评分数',
     rating_2_count INT DEFAULT 0 COMMENT '2星评分数',
     rating_3_count INT DEFAULT 0 COMMENT '3星评分数',
@@ -82,6 +83,7 @@ SELECT
     p.is_active,
     COALESCE(s.total_ratings, 0) as total_ratings,
     COALESCE(s.average_rating, 0.00) as average_rating,
+    COALESCE(s.ranking_score, 3.0000) as ranking_score,
     COALESCE(s.rating_1_count, 0) as rating_1_count,
     COALESCE(s.rating_2_count, 0) as rating_2_count,
     COALESCE(s.rating_3_count, 0) as rating_3_count,
@@ -91,11 +93,55 @@ SELECT
 FROM plugins p
 LEFT JOIN plugin_statistics s ON p.id = s.plugin_id
 WHERE p.is_active = TRUE
-ORDER BY s.average_rating DESC, s.total_ratings DESC, p.created_at ASC;
+ORDER BY s.ranking_score DESC, p.id ASC;
 
 -- 6. 创建索引优化查询性能
 CREATE INDEX idx_plugin_details_rating ON plugin_statistics(average_rating DESC, total_ratings DESC);
+CREATE INDEX idx_plugin_ranking ON plugin_statistics(ranking_score DESC, plugin_id);
 CREATE INDEX idx_plugin_ratings_time ON plugin_ratings(created_at DESC);
+CREATE INDEX idx_plugin_recent ON plugin_ratings(plugin_id, created_at);
+-- 插件列表分页排序（见 plugin_listing.py）
+CREATE INDEX idx_plugin_popular ON plugin_statistics(total_ratings DESC, average_rating DESC);
+CREATE INDEX idx_plugins_newest ON plugins(is_active, created_at, id);
+CREATE INDEX idx_plugins_category_newest ON plugins(category, is_active, created_at, id);
+CREATE INDEX idx_plugins_name ON plugins(is_active, plugin_name);
+CREATE INDEX idx_plugins_category_name ON plugins(category, is_active, plugin_name);
+
+-- 7. 游戏存档（跨设备同步，见 game_saves.py）：gzip 快照 + 之后的 JSON Patch，后台定期把补丁合并进快照
+CREATE TABLE IF NOT EXISTS game_saves (
+    save_id VARCHAR(64) PRIMARY KEY COMMENT '存档码(客户端生成的随机标识)',
+    version INT NOT NULL COMMENT '最新版本号',
+    snapshot_version INT NOT NULL COMMENT '快照对应的版本号',
+    snapshot MEDIUMBLOB NOT NULL COMMENT '快照(gzip压缩的JSON)',
+    pending_patches INT NOT NULL DEFAULT 0 COMMENT '尚未合并进快照的补丁数',
+    document_size INT NOT NULL DEFAULT 0 COMMENT '最新版本JSON字节数',
+    written_at INT NOT NULL COMMENT '最后写入时间(Unix秒)',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    INDEX idx_game_saves_compact (pending_patches, written_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='游戏存档表';
+
+CREATE TABLE IF NOT EXISTS game_save_patches (
+    save_id VARCHAR(64) NOT NULL COMMENT '存档码(外键)',
+    version INT NOT NULL COMMENT '应用补丁后的版本号',
+    patch BLOB NOT NULL COMMENT 'JSON Patch(gzip压缩)',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '写入时间',
+    PRIMARY KEY (save_id, version),
+    FOREIGN KEY (save_id) REFERENCES game_saves(save_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='游戏存档补丁表';
+
+-- 8. 全局排行榜（见 leaderboard.py）：每个玩家每个排行榜的最好成绩，服务启动时按排名索引顺序读入内存
+CREATE TABLE IF NOT EXISTS leaderboard_scores (
+    board VARCHAR(50) NOT NULL COMMENT '排行榜ID',
+    player_id CHAR(20) NOT NULL COMMENT '玩家标识(由存档码派生)',
+    player_name VARCHAR(32) NOT NULL COMMENT '玩家名称',
+    score DOUBLE NOT NULL COMMENT '最好成绩',
+    achieved_at DOUBLE NOT NULL COMMENT '达成时间(Unix秒)',
+    updated_at DOUBLE NOT NULL COMMENT '写入时间(Unix秒)，进程间同步使用',
+    PRIMARY KEY (board, player_id),
+    INDEX idx_leaderboard_rank (board, score DESC, achieved_at, player_id),
+    INDEX idx_leaderboard_updated (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='全局排行榜';
 
 -- 查询示例
 -- SELECT * FROM plugin_details; -- 查看所有插件及其评分统计
\ No newline at end of file
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库连接池
+有界、线程安全的PyMySQL连接池：借出时存活检查、限制连接寿命、等待超时，
+并统计池大小、等待时间和借出次数。设置熔断器后，数据库不可用期间借出连接立即失败
+"""
+
+import threading
+import time
+from collections import deque
+
+import pymysql
+
+from circuit_breaker import is_connection_error
+
+
+class PoolTimeoutError(Exception):
+    """等待可用连接超时"""
+
+
+class InstrumentedCursor:
+    """记录每条语句耗时和行数的游标包装器，连接中断类的错误和执行成功报告给熔断器"""
+
+    def __init__(self, cursor, observer, breaker=None):
+        self._cursor = cursor
+        self._observer = observer
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def _timed(self, method, sql, args):
+        start = time.perf_counter()
+        try:
+            result = method(sql, args)
+        except Exception as e:
+            if self._observer:
+                self._observer.query(sql, time.perf_counter() - start, 0, error=True)
+            if self._breaker and is_connection_error(e):
+                self._breaker.record_failure(e)
+            raise
+        # 语句执行成功才说明数据库可用；借出连接成功（可能是未经检查的空闲连接）不算
+        if self._breaker:
+            self._breaker.record_success()
+        if self._observer:
+            self._observer.query(sql, time.perf_counter() - start, max(self._cursor.rowcount or 0, 0))
+        return result
+
+    def execute(self, sql, args=None):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, args):
+        return self._timed(self._cursor.executemany, sql, args)
+
+
+class PooledConnection:
+    """池化连接包装器
+
+    用法与 pymysql 连接一致，close() 时把连接归还连接池而不是真正断开
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        observer = self._pool.observer
+        breaker = self._pool.breaker
+        return InstrumentedCursor(cursor, observer, breaker) if observer or breaker else cursor
+
+    def close(self):
+        """归还连接"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def discard(self):
+        """丢弃连接（连接已损坏时使用）"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at, broken=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """有界数据库连接池"""
+
+    def __init__(self, connect_kwargs, max_size=10, max_lifetime=1800,
+                 wait_timeout=5.0, ping_on_checkout=True, connect=None):
+        self._connect_kwargs = dict(connect_kwargs)
+        # 建立连接的函数，默认 pymysql.connect（基准测试可替换为 sqlite_compat.connect）
+        self._connect = connect or pymysql.connect
+        # 可选的观察者，提供 connect(秒)、wait(秒)、query(sql, 秒, 行数, error=False) 方法
+        self.observer = None
+        # 可选的熔断器（circuit_breaker.CircuitBreaker）
+        self.breaker = None
+        self._autocommit = self._connect_kwargs.get('autocommit', False)
+        self.max_size = max(1, int(max_size))
+        self.max_lifetime = float(max_lifetime)
+        self.wait_timeout = float(wait_timeout)
+        self.ping_on_checkout = bool(ping_on_checkout)
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        # 统计计数器
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @classmethod
+    def from_config(cls, db_config, pool_config=None, connect=None):
+        """根据 config.json 的 database / database.pool 配置创建连接池"""
+        pool_config = pool_config or {}
+        return cls(
+            db_config,
+            max_size=pool_config.get('max_size', 10),
+            max_lifetime=pool_config.get('max_lifetime', 1800),
+            wait_timeout=pool_config.get('wait_timeout', 5),
+            ping_on_checkout=pool_config.get('ping_on_checkout', True),
+            connect=connect
+        )
+
+    def _open(self):
+        start = time.monotonic()
+        try:
+            raw = self._connect(**self._connect_kwargs)
+        except Exception as e:
+            if self.breaker:
+                self.breaker.record_failure(e)
+            raise
+        created_at = time.monotonic()
+        if self.observer:
+            self.observer.connect(created_at - start)
+        with self._cond:
+            self._created += 1
+        return raw, created_at
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def get_connection(self, timeout=None):
+        """借出一个连接，池满时最多等待 timeout 秒"""
+        timeout = self.wait_timeout if timeout is None else timeout
+        if self.breaker:
+            self.breaker.before_connect()
+        start = time.monotonic()
+        deadline = start + timeout
+        raw = None
+        created_at = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # 占用一个名额，稍后在锁外建立连接
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"等待数据库连接超时({timeout}s)，连接池已满: {self.max_size}"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if raw is not None:
+                if time.monotonic() - created_at > self.max_lifetime:
+                    self._close_raw(raw)
+                    raw = None
+                    with self._cond:
+                        self._discarded += 1
+                elif self.ping_on_checkout:
+                    try:
+                        raw.ping(reconnect=False)
+                    except Exception:
+                        self._close_raw(raw)
+                        raw = None
+                        with self._cond:
+                            self._discarded += 1
+            if raw is None:
+                raw, created_at = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        if self.observer:
+            self.observer.wait(waited)
+        with self._cond:
+            self._checkouts += 1
+            self._total_wait += waited
+            if waited > self._max_wait:
+                self._max_wait = waited
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at, broken=False):
+        """归还连接，过期或损坏的连接直接关闭"""
+        reusable = not broken and raw.open
+        if reusable and time.monotonic() - created_at > self.max_lifetime:
+            reusable = False
+        if reusable and not self._autocommit:
+            # 清理未提交的事务，避免状态泄漏给下一个使用者
+            try:
+                raw.rollback()
+            except Exception:
+                reusable = False
+
+        if not reusable:
+            self._close_raw(raw)
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((raw, created_at))
+            else:
+                self._size -= 1
+                self._discarded += 1
+            self._cond.notify()
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_raw(raw)
+
+    def reset(self):
+        """fork之后在子进程中调用：丢弃从父进程继承的连接（不发送关闭报文，避免影响父进程）
+
+        父进程中其他线程可能在fork时持有锁，因此这里直接替换锁而不是获取它
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+    def stats(self):
+        """连接池统计信息"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3)
+            }
@@ -17,6 +17,18 @@ class GameManager {
         // 数据持久化
         this.saveKey = 'office-game-enhanced-data';
         this.autoSaveInterval = null;
+
+        // 服务器存档同步：保存时只上传相对上一个已确认版本的补丁（JSON Patch）
+        this.saveSync = {
+            idKey: 'office-game-save-id',        // 存档码，换设备时通过 ?save=存档码 继续游戏
+            stateKey: 'office-game-save-sync',   // 已确认的版本号和该版本的内容（计算补丁的基准）
+            endpoint: '/api/saves/',
+            saveId: null,
+            version: 0,
+            base: null,
+            inFlight: false,
+            disabled: false
+        };
     }
 
     // 初始化所有增强系统
@@ -44,6 +56,9 @@ class GameManager {
         // 加载保存的数据
         this.load();
 
+        // 与服务器存档同步（其他设备上有更新的进度时载入）
+        this.initializeSaveSync();
+
         // 设置自动保存
         this.setupAutoSave();
 
@@ -101,8 +116,8 @@ class GameManager {
         return this.leaderboardSystem;
     }
 
-    // 数据持久化 - 保存
-    save() {
+    // 数据持久化 - 保存（keepalive: 页面关闭时使用，请求在页面卸载后继续发送）
+    save(keepalive = false) {
         if (!this.initialized) return;
 
         const saveData = {
@@ -123,12 +138,18 @@ class GameManager {
             }
         };
 
+        let json;
         try {
-            localStorage.setItem(this.saveKey, JSON.stringify(saveData));
+            json = JSON.stringify(saveData);
+            localStorage.setItem(this.saveKey, json);
             console.log('💾 游戏数据已保存');
         } catch (error) {
             console.error('❌ 保存游戏数据失败:', error);
         }
+
+        if (json) {
+            this.pushSave(json, { keepalive: keepalive });
+        }
     }
 
     // 数据持久化 - 加载
@@ -142,42 +163,7 @@ class GameManager {
 
             const data = JSON.parse(savedData);
             console.log('📂 加载游戏数据...');
-
-            // 加载各系统数据
-            if (data.timeManager) {
-                this.timeManager.deserialize(data.timeManager);
-            }
-            if (data.resources) {
-                this.resourceSystem.deserialize(data.resources);
-            }
-            if (data.achievements) {
-                this.achievementSystem.deserialize(data.achievements);
-            }
-            if (data.events) {
-                this.eventSystem.deserialize(data.events);
-            }
-            if (data.progression) {
-                this.progressionSystem.deserialize(data.progression);
-            }
-            if (data.facilities) {
-                this.facilityManager.deserialize(data.facilities);
-            }
-            if (data.statistics) {
-                this.statisticsSystem.deserialize(data.statistics);
-            }
-            if (data.leaderboard) {
-                this.leaderboardSystem.deserialize(data.leaderboard);
-            }
-
-            // 恢复游戏统计
-            if (data.gameStats && data.gameStats.complaintStats) {
-                // 过滤掉无效的条目
-                const validEntries = data.gameStats.complaintStats.filter(
-                    entry => entry && entry[0] != null && entry[1] != null
-                );
-                this.game.complaintStats = new Map(validEntries);
-            }
-
+            this.applySaveData(data);
             console.log('✅ 游戏数据加载完成');
         } catch (error) {
             console.error('❌ 加载游戏数据失败:', error);
@@ -191,6 +177,44 @@ class GameManager {
         }
     }
 
+    // 把存档数据载入各系统
+    applySaveData(data) {
+        // 加载各系统数据
+        if (data.timeManager) {
+            this.timeManager.deserialize(data.timeManager);
+        }
+        if (data.resources) {
+            this.resourceSystem.deserialize(data.resources);
+        }
+        if (data.achievements) {
+            this.achievementSystem.deserialize(data.achievements);
+        }
+        if (data.events) {
+            this.eventSystem.deserialize(data.events);
+        }
+        if (data.progression) {
+            this.progressionSystem.deserialize(data.progression);
+        }
+        if (data.facilities) {
+            this.facilityManager.deserialize(data.facilities);
+        }
+        if (data.statistics) {
+            this.statisticsSystem.deserialize(data.statistics);
+        }
+        if (data.leaderboard) {
+            this.leaderboardSystem.deserialize(data.leaderboard);
+        }
+
+        // 恢复游戏统计
+        if (data.gameStats && data.gameStats.complaintStats) {
+            // 过滤掉无效的条目
+            const validEntries = data.gameStats.complaintStats.filter(
+                entry => entry && entry[0] != null && entry[1] != null
+            );
+            this.game.complaintStats = new Map(validEntries);
+        }
+    }
+
     // 设置自动保存
     setupAutoSave() {
         // 每30秒自动保存一次
@@ -200,8 +224,239 @@ class GameManager {
 
         // 页面关闭时保存
         window.addEventListener('beforeunload', () => {
-            this.save();
+            this.save(true);
+        });
+    }
+
+    // 服务器存档同步 - 确定存档码并拉取服务器上的进度
+    initializeSaveSync() {
+        const sync = this.saveSync;
+        try {
+            const requested = new URLSearchParams(window.location.search).get('save');
+            sync.saveId = requested || localStorage.getItem(sync.idKey);
+            if (!sync.saveId) {
+                const bytes = new Uint8Array(16);
+                crypto.getRandomValues(bytes);
+                sync.saveId = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+            }
+            localStorage.setItem(sync.idKey, sync.saveId);
+
+            const state = JSON.parse(localStorage.getItem(sync.stateKey) || 'null');
+            if (state && state.saveId === sync.saveId) {
+                sync.version = state.version;
+                sync.base = state.base;
+            }
+        } catch (error) {
+            console.warn('⚠️ 存档同步不可用:', error);
+            sync.disabled = true;
+            return;
+        }
+
+        console.log(`☁️ 存档码: ${sync.saveId}（在其他设备打开 ?save=${sync.saveId} 继续游戏）`);
+        this.pullSave();
+    }
+
+    // 获取存档码
+    getSaveId() {
+        return this.saveSync.saveId;
+    }
+
+    // 记录服务器已确认的版本，下次保存以它为基准计算补丁
+    acknowledgeSave(version, base) {
+        const sync = this.saveSync;
+        sync.version = version;
+        sync.base = base;
+        try {
+            localStorage.setItem(sync.stateKey, JSON.stringify({
+                saveId: sync.saveId, version: version, base: base
+            }));
+        } catch (error) {
+            console.warn('⚠️ 无法记录存档同步状态:', error);
+        }
+    }
+
+    // 拉取服务器存档：本地已是最新版本时服务器只回复304
+    async pullSave() {
+        const sync = this.saveSync;
+        const headers = {};
+        if (sync.version) {
+            headers['If-None-Match'] = `"v${sync.version}"`;
+        }
+        try {
+            const response = await fetch(sync.endpoint + encodeURIComponent(sync.saveId), { headers: headers });
+            if (response.status === 503) {
+                sync.disabled = true;
+                return;
+            }
+            if (response.status === 404 && sync.version) {
+                // 服务器上的存档已不存在，下次保存时重新创建
+                this.acknowledgeSave(0, null);
+                return;
+            }
+            if (!response.ok) {
+                return;
+            }
+            const version = parseInt(response.headers.get('X-Save-Version'), 10);
+            const data = await response.json();
+            if (version > sync.version) {
+                // 其他设备上有更新的进度；本设备也有未同步的进度时由玩家决定保留哪一份
+                const local = this.unsyncedSaveData();
+                if (local && window.confirm(
+                    `其他设备上有更新的存档（版本 ${version}），本设备也有尚未同步的进度。\n\n` +
+                    '确定：保留本设备的进度并覆盖服务器存档\n取消：载入服务器存档'
+                )) {
+                    // 以服务器版本为基准重新计算补丁，上传本设备的进度
+                    this.acknowledgeSave(version, data);
+                    this.pushSave(JSON.stringify(local));
+                    return;
+                }
+                this.applySaveData(data);
+                localStorage.setItem(this.saveKey, JSON.stringify(data));
+                this.acknowledgeSave(version, data);
+                console.log(`☁️ 已载入服务器存档（版本 ${version}）`);
+            }
+        } catch (error) {
+            console.warn('⚠️ 拉取服务器存档失败:', error);
+        }
+    }
+
+    // 本设备尚未同步到服务器的存档内容，没有时返回 null
+    unsyncedSaveData() {
+        try {
+            const json = localStorage.getItem(this.saveKey);
+            if (!json) {
+                return null;
+            }
+            const local = JSON.parse(json);
+            const base = this.saveSync.base;
+            if (base && this.diffSaveData(base, local).length === 0) {
+                return null;
+            }
+            return local;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // 上传存档：有已确认版本时只上传补丁，补丁无法应用时以同一版本为条件上传完整存档；
+    // 其他设备已更新存档（412）时拉取服务器存档处理冲突，不强制覆盖
+    async pushSave(json, options = {}) {
+        const sync = this.saveSync;
+        if (sync.disabled || !sync.saveId || sync.inFlight) {
+            return;
+        }
+        sync.inFlight = true;
+        let conflict = false;
+        try {
+            const current = JSON.parse(json);
+            let result = null;
+            if (sync.base && sync.version) {
+                const patch = this.diffSaveData(sync.base, current);
+                if (patch.length === 0) {
+                    return;
+                }
+                const patchJson = JSON.stringify(patch);
+                if (patchJson.length < json.length) {
+                    result = await this.sendSave('PATCH', patchJson, {
+                        'Content-Type': 'application/json-patch+json',
+                        'If-Match': `"v${sync.version}"`
+                    }, options.keepalive);
+                }
+            }
+            if (result === null || result.status === 422) {
+                // 没有已确认版本时只创建新存档，否则只覆盖已确认的版本
+                const headers = { 'Content-Type': 'application/json' };
+                if (sync.version) {
+                    headers['If-Match'] = `"v${sync.version}"`;
+                } else {
+                    headers['If-None-Match'] = '*';
+                }
+                result = await this.sendSave('PUT', json, headers, options.keepalive);
+            }
+            if (result.version !== null) {
+                this.acknowledgeSave(result.version, current);
+            }
+            conflict = result.status === 412;
+        } catch (error) {
+            console.warn('⚠️ 上传服务器存档失败:', error);
+        } finally {
+            sync.inFlight = false;
+        }
+        // 页面关闭时无法询问玩家，下次打开页面拉取存档时再处理冲突
+        if (conflict && !options.keepalive) {
+            console.warn('⚠️ 其他设备已更新服务器存档，拉取最新版本');
+            await this.pullSave();
+        }
+    }
+
+    // 发送存档请求，返回 { status, version }（被拒绝时 version 为 null）；浏览器支持时用 gzip 压缩请求体
+    async sendSave(method, body, headers, keepalive) {
+        let payload = body;
+        if (!keepalive && typeof CompressionStream !== 'undefined') {
+            const stream = new Blob([body]).stream().pipeThrough(new CompressionStream('gzip'));
+            payload = await new Response(stream).arrayBuffer();
+            headers['Content-Encoding'] = 'gzip';
+        }
+        const response = await fetch(this.saveSync.endpoint + encodeURIComponent(this.saveSync.saveId), {
+            method: method,
+            headers: headers,
+            body: payload,
+            keepalive: Boolean(keepalive)
+        });
+        if (response.status === 503) {
+            this.saveSync.disabled = true;
+        }
+        if (!response.ok) {
+            if (method === 'PUT' && response.status !== 412 && response.status !== 503) {
+                console.warn(`⚠️ 服务器拒绝存档: ${response.status}`);
+            }
+            return { status: response.status, version: null };
+        }
+        const result = await response.json();
+        return { status: response.status, version: result.version };
+    }
+
+    // 计算两个存档之间的 JSON Patch（RFC 6902）操作列表
+    diffSaveData(before, after, path = '', patch = []) {
+        if (before === after) {
+            return patch;
+        }
+        const isObject = value => value !== null && typeof value === 'object';
+        if (!isObject(before) || !isObject(after) || Array.isArray(before) !== Array.isArray(after)) {
+            patch.push({ op: 'replace', path: path, value: after });
+            return patch;
+        }
+
+        if (Array.isArray(after)) {
+            const common = Math.min(before.length, after.length);
+            for (let i = 0; i < common; i++) {
+                this.diffSaveData(before[i], after[i], `${path}/${i}`, patch);
+            }
+            for (let i = common; i < after.length; i++) {
+                patch.push({ op: 'add', path: `${path}/-`, value: after[i] });
+            }
+            // 从末尾开始删除，前面元素的下标不变
+            for (let i = before.length - 1; i >= common; i--) {
+                patch.push({ op: 'remove', path: `${path}/${i}` });
+            }
+            return patch;
+        }
+
+        const escape = key => key.replace(/~/g, '~0').replace(/\//g, '~1');
+        Object.keys(before).forEach(key => {
+            if (!(key in after)) {
+                patch.push({ op: 'remove', path: `${path}/${escape(key)}` });
+            }
+        });
+        Object.keys(after).forEach(key => {
+            const childPath = `${path}/${escape(key)}`;
+            if (key in before) {
+                this.diffSaveData(before[key], after[key], childPath, patch);
+            } else {
+                patch.push({ op: 'add', path: childPath, value: after[key] });
+            }
         });
+        return patch;
     }
 
     // 清理资源
@@ -4647,6 +4902,10 @@ class LeaderboardSystem {
         // 分享功能
         this.shareHistory = [];
         this.screenshots = [];
+
+        // 全局排行榜（服务器）
+        this.globalPlayerId = null;
+        this.globalDisabled = false;
         
         // 计时器
         this.updateTimer = 0;
@@ -4844,9 +5103,62 @@ class LeaderboardSystem {
         leaderboard.lastUpdated = Date.now();
 
         console.log(`🏆 成绩已记录到 ${leaderboard.name}: ${playerName} - ${score}`);
+
+        // 同时提交到全局排行榜（服务器只保留每个玩家的最好成绩）
+        this.submitGlobalScore(leaderboardId, playerName, score);
         return true;
     }
 
+    // 提交成绩到全局排行榜，返回玩家在全局排行榜中的条目
+    async submitGlobalScore(leaderboardId, playerName, score) {
+        const saveId = this.gameManager.getSaveId ? this.gameManager.getSaveId() : null;
+        if (!saveId || this.globalDisabled) {
+            return null;
+        }
+        try {
+            const response = await fetch(`/api/leaderboards/${encodeURIComponent(leaderboardId)}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ save_id: saveId, name: playerName, score: score })
+            });
+            if (response.status === 503) {
+                this.globalDisabled = true;
+                return null;
+            }
+            const data = await response.json();
+            if (!data.success) {
+                return null;
+            }
+            // 全局排行榜中只显示由存档码派生的玩家标识
+            this.globalPlayerId = data.entry.player;
+            return data.entry;
+        } catch (error) {
+            console.warn('⚠️ 提交全局排行榜失败:', error);
+            return null;
+        }
+    }
+
+    // 获取全局排行榜前N名
+    async getGlobalLeaderboard(leaderboardId, limit = 10, offset = 0) {
+        const response = await fetch(
+            `/api/leaderboards/${encodeURIComponent(leaderboardId)}?limit=${limit}&offset=${offset}`
+        );
+        const data = await response.json();
+        return data.success ? data : null;
+    }
+
+    // 获取自己在全局排行榜中的名次及前后各 range 名（提交过成绩后可用）
+    async getGlobalRankAround(leaderboardId, range = 5) {
+        if (!this.globalPlayerId) {
+            return null;
+        }
+        const response = await fetch(
+            `/api/leaderboards/${encodeURIComponent(leaderboardId)}/around/${this.globalPlayerId}?range=${range}`
+        );
+        const data = await response.json();
+        return data.success ? data : null;
+    }
+
     // 获取排行榜
     getLeaderboard(leaderboardId, limit = 10) {
         const leaderboard = this.leaderboards.get(leaderboardId);
@@ -677,6 +677,11 @@ class OfficeGame {
         this.pluginAPI = new PluginAPI(this);
         this.solutions = new Map(); // 存储已实施的解决方案
 
+        // 插件脚本按需加载（清单来自服务器，插件ID -> 加载中的Promise）
+        this.pluginManifest = null;
+        this.pluginScripts = new Map();
+        this.purchasedPluginsKey = 'office-game-purchased-plugins';
+
         // 员工抱怨内容库
         this.complaints = [
             '我想上厕所，但是不知道厕所有没有人，真的不想白跑一趟',
@@ -2326,7 +2331,11 @@ class OfficeGame {
             return false;
         }
 
-        return plugin.activate();
+        const activated = plugin.activate();
+        if (activated) {
+            this.recordPurchasedPlugin(pluginName);
+        }
+        return activated;
     }
 
     deactivatePlugin(pluginName) {
@@ -2343,6 +2352,84 @@ class OfficeGame {
         return Array.from(this.plugins.values()).map(plugin => plugin.getStatus());
     }
 
+    // 获取插件脚本清单（启用插件 -> 带哈希的插件脚本），失败后下次调用重新获取
+    loadPluginManifest() {
+        if (!this.pluginManifest) {
+            this.pluginManifest = fetch('/api/plugin-manifest')
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => data.plugins)
+                .catch(error => {
+                    this.pluginManifest = null;
+                    throw error;
+                });
+        }
+        return this.pluginManifest;
+    }
+
+    // 按插件ID或插件名称加载插件脚本，脚本执行时自行注册；同一插件只加载一次
+    loadPlugin(pluginKey) {
+        return this.loadPluginManifest().then(manifest => {
+            const entry = manifest.find(item => item.plugin_id === pluginKey || item.name === pluginKey);
+            if (!entry || !entry.script) {
+                throw new Error(`插件 "${pluginKey}" 没有可加载的脚本`);
+            }
+            if (this.plugins.has(entry.name)) {
+                return entry;
+            }
+            if (!this.pluginScripts.has(entry.plugin_id)) {
+                const loading = new Promise((resolve, reject) => {
+                    const script = document.createElement('script');
+                    script.src = entry.script;
+                    if (entry.integrity) {
+                        script.integrity = entry.integrity;
+                    }
+                    script.onload = () => resolve(entry);
+                    script.onerror = () => {
+                        script.remove();
+                        this.pluginScripts.delete(entry.plugin_id);
+                        reject(new Error(`插件脚本加载失败: ${entry.script}`));
+                    };
+                    document.head.appendChild(script);
+                });
+                this.pluginScripts.set(entry.plugin_id, loading);
+            }
+            return this.pluginScripts.get(entry.plugin_id);
+        });
+    }
+
+    // 并行加载多个插件，单个插件失败不影响其他插件
+    loadPlugins(pluginKeys) {
+        return Promise.all(pluginKeys.map(key => this.loadPlugin(key).catch(error => {
+            console.warn(`⚠️ 插件 "${key}" 加载失败:`, error);
+            return null;
+        })));
+    }
+
+    // 已购买（激活过）的插件名称，页面加载时预先加载这些插件
+    getPurchasedPlugins() {
+        try {
+            return JSON.parse(localStorage.getItem(this.purchasedPluginsKey)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    recordPurchasedPlugin(pluginName) {
+        const purchased = this.getPurchasedPlugins();
+        if (purchased.includes(pluginName)) return;
+        purchased.push(pluginName);
+        try {
+            localStorage.setItem(this.purchasedPluginsKey, JSON.stringify(purchased));
+        } catch (error) {
+            console.warn('⚠️ 无法记录已购买插件:', error);
+        }
+    }
+
     // 获取解决方案列表
     getSolutions() {
         return Array.from(this.solutions.values());
@@ -2356,6 +2443,12 @@ window.addEventListener('load', () => {
     game = new OfficeGame();
     window.game = game; // 暴露到全局作用域
 
+    // 只加载已购买的插件，其他插件在激活时按需加载
+    const purchasedPlugins = game.getPurchasedPlugins();
+    if (purchasedPlugins.length > 0) {
+        game.loadPlugins(purchasedPlugins);
+    }
+
     const canvas = document.getElementById('gameCanvas');
     canvas.addEventListener('click', (event) => {
         const rect = canvas.getBoundingClientRect();
@@ -2396,6 +2489,7 @@ function togglePause() {
 function resetGame() {
     if (confirm('确定要重置游戏吗？所有进度将丢失！')) {
         localStorage.removeItem('office-game-enhanced-data');
+        localStorage.removeItem('office-game-purchased-plugins');
         location.reload();
     }
 }
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游戏存档同步
+玩家用存档码（客户端生成的随机标识）在服务器保存游戏进度，换设备时用同一存档码继续游戏。
+
+每个存档保存一份 gzip 压缩的快照，之后的每次保存只上传相对上一个已确认版本的 JSON Patch（RFC 6902），
+服务器把补丁追加到补丁表，版本号加一。读取时在快照上依次应用补丁得到最新版本。
+后台线程定期把积累的补丁合并进快照（压缩），读取和写入时需要应用的补丁数保持在 compact_after 以内。
+"""
+
+import copy
+import gzip
+import json
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+SAVE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+class SaveError(ValueError):
+    """存档请求无效（status 为对应的 HTTP 状态码）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class PatchError(SaveError):
+    """补丁无法应用到当前版本"""
+
+    def __init__(self, message):
+        super().__init__(f"补丁无法应用: {message}", status=422)
+
+
+# ---- JSON Patch (RFC 6902) ----
+
+def _parse_pointer(pointer):
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise PatchError(f"路径无效 {pointer!r}")
+    if not pointer:
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _array_index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise PatchError(f"数组下标无效 {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"数组下标越界 {token}")
+    return index
+
+
+def _resolve(document, tokens):
+    """返回路径最后一级的父容器"""
+    target = document
+    for token in tokens[:-1]:
+        if isinstance(target, dict):
+            if token not in target:
+                raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_array_index(target, token)]
+        else:
+            raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+    return target
+
+
+def _get(document, tokens):
+    if not tokens:
+        return document
+    parent = _resolve(document, tokens)
+    token = tokens[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+        return parent[token]
+    if isinstance(parent, list):
+        return parent[_array_index(parent, token)]
+    raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+
+
+def _add(document, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens)
+    token = tokens[-1]
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, token, allow_end=True), value)
+    else:
+        raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+    return document
+
+
+def _remove(document, tokens):
+    if not tokens:
+        raise PatchError('不能删除整个文档')
+    parent = _resolve(document, tokens)
+    token = tokens[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+        return parent.pop(token)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, token))
+    raise PatchError(f"路径不存在 /{'/'.join(tokens)}")
+
+
+def apply_patch(document, patch):
+    """把 JSON Patch 操作列表应用到文档（会修改传入的文档），返回结果文档"""
+    if not isinstance(patch, list):
+        raise PatchError('补丁必须是操作列表')
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise PatchError('补丁操作必须是对象')
+        op = operation.get('op')
+        tokens = _parse_pointer(operation.get('path'))
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError(f"{op} 操作缺少 value")
+
+        if op == 'add':
+            document = _add(document, tokens, operation['value'])
+        elif op == 'remove':
+            _remove(document, tokens)
+        elif op == 'replace':
+            _get(document, tokens)
+            if tokens:
+                _remove(document, tokens)
+            document = _add(document, tokens, operation['value'])
+        elif op in ('move', 'copy'):
+            from_tokens = _parse_pointer(operation.get('from'))
+            if op == 'move':
+                if tokens[:len(from_tokens)] == from_tokens and tokens != from_tokens:
+                    raise PatchError('不能移动到自身的子路径')
+                value = _remove(document, from_tokens)
+            else:
+                value = copy.deepcopy(_get(document, from_tokens))
+            document = _add(document, tokens, value)
+        elif op == 'test':
+            if _get(document, tokens) != operation['value']:
+                raise PatchError(f"test 不成立 {operation.get('path')}")
+        else:
+            raise PatchError(f"不支持的操作 {op!r}")
+    return document
+
+
+# ---- 压缩 ----
+
+def compress(text):
+    """JSON 文本压缩为 gzip（快照可以直接作为 Content-Encoding: gzip 的响应体发送）"""
+    return gzip.compress(text.encode('utf-8'), compresslevel=6, mtime=0)
+
+
+def decompress(data):
+    return gzip.decompress(bytes(data)).decode('utf-8')
+
+
+def decode_body(data, content_encoding, max_bytes):
+    """解码请求体（支持 Content-Encoding: gzip），解压后超过 max_bytes 时抛出 SaveError(413)"""
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        if len(data) > max_bytes:
+            raise SaveError('存档过大', status=413)
+        return data
+    if encoding != 'gzip':
+        raise SaveError(f"不支持的 Content-Encoding: {content_encoding}", status=415)
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        result = decompressor.decompress(data, max_bytes + 1)
+    except zlib.error:
+        raise SaveError('请求体不是有效的 gzip 数据')
+    if len(result) > max_bytes or decompressor.unconsumed_tail:
+        raise SaveError('存档过大', status=413)
+    return result
+
+
+def load_json(data):
+    try:
+        return json.loads(data)
+    except (ValueError, UnicodeDecodeError):
+        raise SaveError('请求体不是有效的 JSON')
+
+
+def dump_json(document):
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+
+class SaveStore:
+    """游戏存档的版本化存储：快照 + 补丁，后台合并"""
+
+    def __init__(self, connect, compact_after=20, compact_idle=300, compact_interval=30,
+                 compact_batch=100, max_document_bytes=1048576, max_patch_ops=2000,
+                 cache_entries=1000, enabled=True):
+        self.connect = connect
+        # 补丁数达到 compact_after，或最后一次写入超过 compact_idle 秒时合并进快照
+        self.compact_after = max(1, int(compact_after))
+        self.compact_idle = float(compact_idle)
+        self.compact_interval = float(compact_interval)
+        self.compact_batch = max(1, int(compact_batch))
+        self.max_document_bytes = int(max_document_bytes)
+        self.max_patch_ops = int(max_patch_ops)
+        self.cache_entries = int(cache_entries)
+        self.enabled = bool(enabled)
+
+        # 最近写入的存档的最新版本 save_id -> (version, JSON文本)，连续保存时不必重建
+        self._heads = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # 统计计数器
+        self._full_writes = 0
+        self._patch_writes = 0
+        self._conflicts = 0
+        self._compactions = 0
+        self._compact_failures = 0
+        self._last_error = None
+        self._patch_bytes = 0
+        self._full_bytes = 0
+
+    @classmethod
+    def from_config(cls, connect, saves_config=None):
+        """根据 config.json 的 saves 配置创建"""
+        saves_config = saves_config or {}
+        return cls(
+            connect,
+            compact_after=saves_config.get('compact_after', 20),
+            compact_idle=saves_config.get('compact_idle', 300),
+            compact_interval=saves_config.get('compact_interval', 30),
+            compact_batch=saves_config.get('compact_batch', 100),
+            max_document_bytes=saves_config.get('max_document_bytes', 1048576),
+            max_patch_ops=saves_config.get('max_patch_ops', 2000),
+            cache_entries=saves_config.get('cache_entries', 1000),
+            enabled=saves_config.get('enabled', True)
+        )
+
+    @staticmethod
+    def check_save_id(save_id):
+        if not SAVE_ID_PATTERN.match(save_id or ''):
+            raise SaveError('存档码无效（16-64位字母、数字、- 或 _）')
+
+    def _connection(self):
+        connection = self.connect()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        return connection
+
+    # ---- 最新版本缓存 ----
+
+    def _cached_head(self, save_id, version):
+        with self._lock:
+            head = self._heads.get(save_id)
+            if head is not None and head[0] == version:
+                self._heads.move_to_end(save_id)
+                return head[1]
+        return None
+
+    def _remember_head(self, save_id, version, text):
+        if self.cache_entries <= 0:
+            return
+        with self._lock:
+            self._heads[save_id] = (version, text)
+            self._heads.move_to_end(save_id)
+            while len(self._heads) > self.cache_entries:
+                self._heads.popitem(last=False)
+
+    def _build_head(self, cursor, save_id, row):
+        """由快照和之后的补丁重建最新版本的 JSON 文本"""
+        version, snapshot_version, snapshot = row
+        text = self._cached_head(save_id, version)
+        if text is not None:
+            return text
+        text = decompress(snapshot)
+        if version > snapshot_version:
+            cursor.execute("""
+                SELECT patch FROM game_save_patches
+                WHERE save_id = %s AND version > %s AND version <= %s
+                ORDER BY version
+            """, (save_id, snapshot_version, version))
+            document = json.loads(text)
+            for (patch,) in cursor.fetchall():
+                document = apply_patch(document, json.loads(decompress(patch)))
+            text = dump_json(document)
+        self._remember_head(save_id, version, text)
+        return text
+
+    # ---- 读取 ----
+
+    def version(self, save_id):
+        """存档的最新版本号，不存在返回 None"""
+        connection = self._connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT version FROM game_saves WHERE save_id = %s", (save_id,))
+                row = cursor.fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def read(self, save_id):
+        """读取最新版本，返回 (版本号, JSON文本, gzip数据或None)；不存在返回 None
+
+        已合并（没有待应用补丁）的存档直接返回快照的压缩数据，不需要解压
+        """
+        connection = self._connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT version, snapshot_version, snapshot FROM game_saves WHERE save_id = %s
+                """, (save_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                if row[0] == row[1]:
+                    return row[0], None, bytes(row[2])
+                return row[0], self._build_head(cursor, save_id, row), None
+        finally:
+            connection.close()
+
+    # ---- 写入 ----
+
+    def write_full(self, save_id, document, base_version=None):
+        """上传完整存档（首次保存或补丁无法应用时），返回新版本号
+
+        base_version 为 None 时无条件覆盖；为 0 时只在存档不存在时创建；
+        否则只在最新版本等于 base_version 时覆盖，不一致时抛出 SaveError(412)
+        """
+        if not isinstance(document, dict):
+            raise SaveError('存档必须是 JSON 对象')
+        text = dump_json(document)
+        snapshot = compress(text)
+
+        connection = self._connection()
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT version FROM game_saves WHERE save_id = %s FOR UPDATE", (save_id,))
+                row = cursor.fetchone()
+                if base_version is not None and (row[0] if row else 0) != base_version:
+                    self._conflicts += 1
+                    if row is None:
+                        raise SaveError('存档不存在', status=412)
+                    raise SaveError(f"存档已更新到版本 {row[0]}", status=412)
+                version = row[0] + 1 if row else 1
+                cursor.execute("""
+                    INSERT INTO game_saves (save_id, version, snapshot_version, snapshot,
+                                            pending_patches, document_size, written_at)
+                    VALUES (%s, %s, %s, %s, 0, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        version = VALUES(version),
+                        snapshot_version = VALUES(snapshot_version),
+                        snapshot = VALUES(snapshot),
+                        pending_patches = 0,
+                        document_size = VALUES(document_size),
+                        written_at = VALUES(written_at),
+                        updated_at = CURRENT_TIMESTAMP
+                """, (save_id, version, version, snapshot, len(text), int(time.time())))
+                cursor.execute("DELETE FROM game_save_patches WHERE save_id = %s", (save_id,))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        self._remember_head(save_id, version, text)
+        self._full_writes += 1
+        self._full_bytes += len(snapshot)
+        return version
+
+    def write_patch(self, save_id, base_version, patch):
+        """在 base_version 上应用补丁，返回新版本号
+
+        存档不存在时抛出 SaveError(404)，base_version 不是最新版本时抛出 SaveError(412)，
+        补丁无法应用时抛出 PatchError(422)
+        """
+        if not isinstance(patch, list):
+            raise PatchError('补丁必须是操作列表')
+        if len(patch) > self.max_patch_ops:
+            raise SaveError(f"补丁操作数超过 {self.max_patch_ops}，请上传完整存档", status=413)
+        encoded_patch = compress(dump_json(patch))
+
+        connection = self._connection()
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                # 锁定存档行，同一存档的写入串行执行
+                cursor.execute("""
+                    SELECT version, snapshot_version, snapshot FROM game_saves
+                    WHERE save_id = %s FOR UPDATE
+                """, (save_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise SaveError('存档不存在', status=404)
+                if row[0] != base_version:
+                    self._conflicts += 1
+                    raise SaveError(f"存档已更新到版本 {row[0]}", status=412)
+
+                document = apply_patch(json.loads(self._build_head(cursor, save_id, row)), patch)
+                if not isinstance(document, dict):
+                    raise PatchError('存档必须是 JSON 对象')
+                text = dump_json(document)
+                if len(text.encode('utf-8')) > self.max_document_bytes:
+                    raise SaveError('存档过大', status=413)
+
+                version = base_version + 1
+                cursor.execute("""
+                    INSERT INTO game_save_patches (save_id, version, patch) VALUES (%s, %s, %s)
+                """, (save_id, version, encoded_patch))
+                cursor.execute("""
+                    UPDATE game_saves
+                    SET version = %s, pending_patches = pending_patches + 1,
+                        document_size = %s, written_at = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE save_id = %s
+                """, (version, len(text), int(time.time()), save_id))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        self._remember_head(save_id, version, text)
+        self._patch_writes += 1
+        self._patch_bytes += len(encoded_patch)
+        return version
+
+    # ---- 后台合并 ----
+
+    def compact(self, save_id):
+        """把存档的补丁合并进快照并删除已合并的补丁，返回是否合并"""
+        connection = self._connection()
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT version, snapshot_version, snapshot FROM game_saves
+                    WHERE save_id = %s FOR UPDATE
+                """, (save_id,))
+                row = cursor.fetchone()
+                if row is None or row[0] == row[1]:
+                    connection.rollback()
+                    return False
+                text = self._build_head(cursor, save_id, row)
+                cursor.execute("""
+                    UPDATE game_saves
+                    SET snapshot = %s, snapshot_version = version, pending_patches = 0
+                    WHERE save_id = %s
+                """, (compress(text), save_id))
+                cursor.execute("""
+                    DELETE FROM game_save_patches WHERE save_id = %s AND version <= %s
+                """, (save_id, row[0]))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        self._compactions += 1
+        return True
+
+    def compact_once(self):
+        """合并一批需要合并的存档，返回合并的存档数"""
+        idle_before = int(time.time() - self.compact_idle)
+        connection = self._connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT save_id FROM game_saves
+                    WHERE pending_patches >= %s OR (pending_patches > 0 AND written_at < %s)
+                    LIMIT %s
+                """, (self.compact_after, idle_before, self.compact_batch))
+                save_ids = [row[0] for row in cursor.fetchall()]
+        finally:
+            connection.close()
+        return sum(1 for save_id in save_ids if self.compact(save_id))
+
+    def _run(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                while self.compact_once() >= self.compact_batch:
+                    pass
+            except Exception as e:
+                self._compact_failures += 1
+                self._last_error = str(e)
+                print(f"⚠️  存档合并失败: {e}")
+
+    def start(self):
+        """启动后台合并线程（fork出的子进程需要重新启动）"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name='save-compactor', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """fork之后在子进程中调用：重建锁，父进程的线程不会被继承"""
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def stats(self):
+        """存档统计信息（本进程）"""
+        return {
+            'enabled': self.enabled,
+            'full_writes': self._full_writes,
+            'patch_writes': self._patch_writes,
+            'conflicts': self._conflicts,
+            'compactions': self._compactions,
+            'compact_failures': self._compact_failures,
+            'last_error': self._last_error,
+            'full_bytes': self._full_bytes,
+            'patch_bytes': self._patch_bytes,
+            'cached_heads': len(self._heads)
+        }
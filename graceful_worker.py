@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平滑退出的 gunicorn gthread 工作进程
+gunicorn 的 gthread 工作进程接受连接后先登记到 poller，等连接可读再交给线程池。收到 TERM 时
+（平滑重新加载、HUP、max_requests 回收）它直接关闭 poller：已接受但还没交给线程池的连接被丢弃，
+客户端看到连接被重置。DrainingThreadWorker 在关闭线程池之前把这些新连接交给线程池，
+与进行中的请求一起处理完（最多 graceful_timeout 秒）；空闲的 keep-alive 连接仍直接关闭，客户端会重新连接。
+
+serve.py 在 server.worker_class 为 gthread 时使用（依赖 gunicorn 21 的 gthread 内部结构）。
+"""
+
+from concurrent import futures
+from functools import partial
+
+from gunicorn.workers.gthread import ThreadWorker
+
+
+class _DrainingThreadPool(futures.ThreadPoolExecutor):
+    """关闭前先让工作进程提交已接受的连接"""
+
+    def __init__(self, worker, max_workers):
+        super().__init__(max_workers=max_workers)
+        self._worker = worker
+
+    def shutdown(self, wait=True, **kwargs):
+        self._worker.dispatch_accepted()
+        super().shutdown(wait, **kwargs)
+
+
+class DrainingThreadWorker(ThreadWorker):
+    """退出时处理完已接受连接的 gthread 工作进程"""
+
+    def get_thread_pool(self):
+        return _DrainingThreadPool(self, self.cfg.threads)
+
+    def dispatch_accepted(self):
+        """把已接受、尚未读取请求的新连接交给线程池（退出时调用），返回连接数"""
+        with self._lock:
+            accepted = [
+                key for key in self.poller.get_map().values()
+                if isinstance(key.data, partial) and key.data.func == self.on_client_socket_readable
+                and not key.data.args[0].initialized
+            ]
+        for key in accepted:
+            key.data(key.fileobj)
+        return len(accepted)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热点小文件内存缓存
+把频繁访问的小静态文件内容常驻内存，请求时不再 open/read；
+按总字节数预算做LRU淘汰，避免占用内存随文件数量增长
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class HotFileCache:
+    """按字节预算淘汰的文件内容缓存"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_file_size=1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.max_file_size = int(max_file_size)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._resident = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_config(cls, static_config=None):
+        """根据 config.json 的 static 配置创建缓存"""
+        static_config = static_config or {}
+        return cls(
+            max_bytes=static_config.get('hot_cache_bytes', 32 * 1024 * 1024),
+            max_file_size=static_config.get('hot_file_max_size', 1024 * 1024)
+        )
+
+    def accepts(self, entry):
+        """文件是否适合放入缓存（大文件交给 wsgi.file_wrapper/sendfile）"""
+        return 0 < self.max_file_size and entry.size <= min(self.max_file_size, self.max_bytes)
+
+    def get(self, entry):
+        """读取文件内容，不适合缓存的文件返回 None"""
+        if not self.accepts(entry):
+            return None
+
+        # 文件内容变化后索引会生成新的大小/修改时间，旧缓存自然失效
+        key = (entry.path, entry.size, entry.mtime)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return data
+            self._misses += 1
+
+        with open(entry.path, 'rb') as f:
+            data = f.read()
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self._resident += len(data)
+                while self._resident > self.max_bytes and self._entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._resident -= len(evicted)
+                    self._evictions += 1
+        return data
+
+    def cached(self, entry):
+        """只查缓存，不读取文件：已缓存时返回内容，否则返回 None（异步服务器据此决定是否需要在线程中读取）"""
+        key = (entry.path, entry.size, entry.mtime)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            return data
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._resident = 0
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'resident_bytes': self._resident,
+                'max_bytes': self.max_bytes,
+                'max_file_size': self.max_file_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions
+            }
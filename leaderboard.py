@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全局排行榜
+每个排行榜在内存中保存按 (分数降序, 达成时间, 玩家) 有序的分段列表，提交成绩、查询前N名和
+"我附近的名次"都不需要数据库排序：定位 O(log n)，取 k 条再加 O(k)。
+
+成绩先写入内存，后台线程每隔 flush_interval 秒把变化批量写入 leaderboard_scores 表（每个玩家每个
+排行榜只保留最好成绩），并读取其他进程写入的变化合并进本进程的索引。启动时按排名索引的顺序读入整张表
+重建内存索引（不需要排序）。
+"""
+
+import atexit
+import bisect
+import hashlib
+import math
+import threading
+import time
+from itertools import accumulate
+
+# 与 game-manager.js 中 LeaderboardSystem 的排行榜一致
+DEFAULT_BOARDS = (
+    'total_score', 'money_earned', 'employee_count',
+    'achievements_unlocked', 'satisfaction_rating', 'efficiency_score'
+)
+
+MAX_NAME_LENGTH = 32
+
+
+def public_player_id(save_id):
+    """由存档码派生公开的玩家标识（存档码可以读写存档，不能出现在排行榜中）"""
+    return hashlib.sha256(save_id.encode('utf-8')).hexdigest()[:20]
+
+
+class RankIndex:
+    """有序分段列表：每段最多 2*load 个键，段的最大键用于二分定位
+
+    插入、删除 O(log n + load)，按键求名次、按名次取区间 O(log n)（段的前缀计数在修改后按需重算）
+    """
+
+    def __init__(self, sorted_keys=(), load=512):
+        self._load = load
+        keys = list(sorted_keys)
+        self._lists = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._offsets = None
+        self._len = len(keys)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, key):
+        if not self._lists:
+            self._lists.append([key])
+            self._maxes.append(key)
+        else:
+            pos = bisect.bisect_left(self._maxes, key)
+            if pos == len(self._maxes):
+                pos -= 1
+                self._lists[pos].append(key)
+                self._maxes[pos] = key
+            else:
+                bisect.insort(self._lists[pos], key)
+            sub = self._lists[pos]
+            if len(sub) > 2 * self._load:
+                self._lists.insert(pos + 1, sub[self._load:])
+                del sub[self._load:]
+                self._maxes.insert(pos, sub[-1])
+        self._len += 1
+        self._offsets = None
+
+    def remove(self, key):
+        pos = bisect.bisect_left(self._maxes, key)
+        sub = self._lists[pos]
+        del sub[bisect.bisect_left(sub, key)]
+        if sub:
+            self._maxes[pos] = sub[-1]
+        else:
+            del self._lists[pos]
+            del self._maxes[pos]
+        self._len -= 1
+        self._offsets = None
+
+    def _segment_offsets(self):
+        if self._offsets is None:
+            self._offsets = [0] + list(accumulate(len(sub) for sub in self._lists))
+        return self._offsets
+
+    def index(self, key):
+        """键的名次（从0开始），键必须存在"""
+        pos = bisect.bisect_left(self._maxes, key)
+        return self._segment_offsets()[pos] + bisect.bisect_left(self._lists[pos], key)
+
+    def slice(self, start, stop):
+        """名次在 [start, stop) 之间的键"""
+        start = max(0, start)
+        stop = min(self._len, stop)
+        if start >= stop:
+            return []
+        offsets = self._segment_offsets()
+        pos = bisect.bisect_right(offsets, start) - 1
+        result = []
+        offset = start - offsets[pos]
+        while len(result) < stop - start:
+            sub = self._lists[pos]
+            result.extend(sub[offset:offset + stop - start - len(result)])
+            pos += 1
+            offset = 0
+        return result
+
+
+class _Board:
+    """一个排行榜：玩家 -> 排名键，以及有序的排名键"""
+
+    def __init__(self, sorted_keys=()):
+        self.index = RankIndex(sorted_keys)
+        self.keys = {key[2]: key for key in self.index.slice(0, len(self.index))}
+
+    def put(self, key):
+        old = self.keys.get(key[2])
+        if old is not None:
+            self.index.remove(old)
+        self.index.add(key)
+        self.keys[key[2]] = key
+
+
+def _rank_key(score, achieved_at, player):
+    # 分数高的在前，分数相同时先达成的在前
+    return (-score, achieved_at, player)
+
+
+def _is_better(key, current):
+    return current is None or key[:2] < current[:2]
+
+
+class Leaderboards:
+    """全局排行榜集合"""
+
+    LOAD_SQL = """
+        SELECT board, player_id, player_name, score, achieved_at, updated_at
+        FROM leaderboard_scores
+        ORDER BY board, score DESC, achieved_at ASC, player_id ASC
+    """
+    CHANGES_SQL = """
+        SELECT board, player_id, player_name, score, achieved_at, updated_at
+        FROM leaderboard_scores
+        WHERE updated_at > %s
+    """
+    # 只在成绩更好时覆盖（分数更高，或分数相同但更早达成），名称总是更新
+    UPSERT_SQL = """
+        INSERT INTO leaderboard_scores (board, player_id, player_name, score, achieved_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            player_name = VALUES(player_name),
+            achieved_at = CASE
+                WHEN VALUES(score) > score OR (VALUES(score) = score AND VALUES(achieved_at) < achieved_at)
+                THEN VALUES(achieved_at) ELSE achieved_at END,
+            score = CASE WHEN VALUES(score) > score THEN VALUES(score) ELSE score END,
+            updated_at = VALUES(updated_at)
+    """
+
+    def __init__(self, connect, boards=DEFAULT_BOARDS, flush_interval=2, sync_overlap=10,
+                 max_score=1e12, max_limit=100, max_range=50, enabled=True):
+        self.connect = connect
+        self.board_ids = tuple(boards)
+        self.flush_interval = float(flush_interval)
+        # 读取其他进程的变化时向前多读的秒数，容忍进程间的时钟偏差和提交延迟（重复合并没有影响）
+        self.sync_overlap = float(sync_overlap)
+        self.max_score = float(max_score)
+        self.max_limit = int(max_limit)
+        self.max_range = int(max_range)
+        self.enabled = bool(enabled)
+
+        self._boards = None
+        self._names = {}
+        self._dirty = set()
+        self._synced_until = 0.0
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._thread = None
+
+        # 统计计数器
+        self._submissions = 0
+        self._improvements = 0
+        self._flushed = 0
+        self._merged = 0
+        self._failures = 0
+        self._last_error = None
+        self._last_load_ms = None
+
+    @classmethod
+    def from_config(cls, connect, leaderboard_config=None):
+        """根据 config.json 的 leaderboard 配置创建"""
+        leaderboard_config = leaderboard_config or {}
+        return cls(
+            connect,
+            boards=leaderboard_config.get('boards', DEFAULT_BOARDS),
+            flush_interval=leaderboard_config.get('flush_interval', 2),
+            sync_overlap=leaderboard_config.get('sync_overlap', 10),
+            max_score=leaderboard_config.get('max_score', 1e12),
+            max_limit=leaderboard_config.get('max_limit', 100),
+            max_range=leaderboard_config.get('max_range', 50),
+            enabled=leaderboard_config.get('enabled', True)
+        )
+
+    def _connection(self):
+        connection = self.connect()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        return connection
+
+    # ---- 加载 ----
+
+    def _load(self):
+        start = time.monotonic()
+        connection = self._connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.LOAD_SQL)
+                rows = cursor.fetchall()
+        finally:
+            connection.close()
+
+        # 行已按排名索引的顺序返回，直接分段即可
+        keys_by_board = {board: [] for board in self.board_ids}
+        names = {}
+        synced_until = 0.0
+        for board, player, name, score, achieved_at, updated_at in rows:
+            if board in keys_by_board:
+                keys_by_board[board].append(_rank_key(score, achieved_at, player))
+            names[player] = name
+            synced_until = max(synced_until, updated_at)
+
+        with self._lock:
+            self._boards = {board: _Board(keys) for board, keys in keys_by_board.items()}
+            self._names = names
+            self._synced_until = synced_until
+        self._last_load_ms = round((time.monotonic() - start) * 1000, 1)
+        print(f"🏆 排行榜已加载: {len(rows)} 条成绩，{self._last_load_ms}ms")
+
+    def _ensure_loaded(self):
+        if self._boards is not None:
+            return
+        with self._load_lock:
+            if self._boards is None:
+                self._load()
+
+    def _board(self, board):
+        if board not in self.board_ids:
+            raise KeyError(board)
+        self._ensure_loaded()
+        return self._boards[board]
+
+    # ---- 提交与查询 ----
+
+    def submit(self, board, player, name, score):
+        """提交成绩（只保留每个玩家的最好成绩），返回 (是否刷新最好成绩, 排名条目)"""
+        entries = self._board(board)
+        key = _rank_key(float(score), time.time(), player)
+        with self._lock:
+            self._submissions += 1
+            improved = _is_better(key, entries.keys.get(player))
+            if improved:
+                entries.put(key)
+                self._improvements += 1
+            if improved or self._names.get(player) != name:
+                self._names[player] = name
+                self._dirty.add((board, player))
+            return improved, self._entry(entries, entries.keys[player])
+
+    def _entry(self, entries, key, rank=None):
+        if rank is None:
+            rank = entries.index.index(key) + 1
+        score = -key[0]
+        return {
+            'rank': rank,
+            'player': key[2],
+            'name': self._names.get(key[2], ''),
+            'score': int(score) if score.is_integer() else score,
+            'achieved_at': key[1]
+        }
+
+    def top(self, board, limit=10, offset=0):
+        """名次从 offset+1 开始的 limit 条成绩，返回 (条目列表, 玩家总数)"""
+        entries = self._board(board)
+        with self._lock:
+            keys = entries.index.slice(offset, offset + limit)
+            return [
+                self._entry(entries, key, offset + i + 1) for i, key in enumerate(keys)
+            ], len(entries.index)
+
+    def around(self, board, player, distance=5):
+        """玩家前后各 distance 名的成绩，返回 (玩家条目, 条目列表, 玩家总数)；玩家没有成绩时返回 None"""
+        entries = self._board(board)
+        with self._lock:
+            key = entries.keys.get(player)
+            if key is None:
+                return None
+            position = entries.index.index(key)
+            start = max(0, position - distance)
+            keys = entries.index.slice(start, position + distance + 1)
+            return (
+                self._entry(entries, key, position + 1),
+                [self._entry(entries, k, start + i + 1) for i, k in enumerate(keys)],
+                len(entries.index)
+            )
+
+    def summary(self):
+        """各排行榜的玩家数和最高分"""
+        self._ensure_loaded()
+        with self._lock:
+            result = []
+            for board in self.board_ids:
+                index = self._boards[board].index
+                top = index.slice(0, 1)
+                result.append({
+                    'id': board,
+                    'players': len(index),
+                    'top': self._entry(self._boards[board], top[0], 1) if top else None
+                })
+            return result
+
+    # ---- 持久化与进程间同步 ----
+
+    def flush(self):
+        """把本进程的变化写入数据库，返回写入条数"""
+        if self._boards is None:
+            return 0
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            now = time.time()
+            rows = []
+            for board, player in dirty:
+                key = self._boards[board].keys[player]
+                rows.append((board, player, self._names[player], -key[0], key[1], now))
+        if not rows:
+            return 0
+
+        connection = self._connection()
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                cursor.executemany(self.UPSERT_SQL, sorted(rows))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            # 写入失败的变化留到下次重试
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        finally:
+            connection.close()
+        self._flushed += len(rows)
+        return len(rows)
+
+    def sync(self):
+        """合并其他进程写入数据库的变化，返回合并条数"""
+        if self._boards is None:
+            return 0
+        connection = self._connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.CHANGES_SQL, (self._synced_until - self.sync_overlap,))
+                rows = cursor.fetchall()
+        finally:
+            connection.close()
+
+        merged = 0
+        with self._lock:
+            for board, player, name, score, achieved_at, updated_at in rows:
+                self._synced_until = max(self._synced_until, updated_at)
+                # 本进程尚未写入的变化以内存为准
+                if board not in self._boards or (board, player) in self._dirty:
+                    continue
+                entries = self._boards[board]
+                key = _rank_key(score, achieved_at, player)
+                if _is_better(key, entries.keys.get(player)):
+                    entries.put(key)
+                    merged += 1
+                self._names[player] = name
+        self._merged += merged
+        return merged
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self.sync()
+            except Exception as e:
+                self._failures += 1
+                self._last_error = str(e)
+                print(f"⚠️  排行榜写入失败: {e}")
+
+    def start(self):
+        """启动后台写入线程（fork出的子进程需要重新启动），进程退出时写入剩余的变化"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name='leaderboard-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️  退出时写入排行榜失败: {e}")
+
+    def after_fork(self):
+        """fork之后在子进程中调用：重建锁，已加载的索引可以沿用"""
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._thread = None
+
+    def valid_score(self, score):
+        """成绩必须是有限的非负数且不超过 max_score"""
+        return (isinstance(score, (int, float)) and not isinstance(score, bool)
+                and math.isfinite(score) and 0 <= score <= self.max_score)
+
+    def stats(self):
+        """排行榜统计信息（本进程）"""
+        boards = self._boards
+        return {
+            'enabled': self.enabled,
+            'loaded': boards is not None,
+            'players': {board: len(entries.index) for board, entries in boards.items()} if boards else {},
+            'submissions': self._submissions,
+            'improvements': self._improvements,
+            'pending': len(self._dirty),
+            'flushed': self._flushed,
+            'merged': self._merged,
+            'failures': self._failures,
+            'last_error': self._last_error,
+            'last_load_ms': self._last_load_ms
+        }
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时推送中心（Server-Sent Events）
+评分提交后把各插件统计的增量推送给所有打开插件页面的浏览器，页面不再轮询整个插件列表。
+
+推送中心在独立端口上用一个 asyncio 事件循环线程服务所有连接：空闲连接只占一个套接字和少量内存，
+不占用 WSGI 工作线程，可以同时保持数千个连接。gunicorn 预fork模式下推送中心运行在主进程中，
+各工作进程通过本机 UDP 端口把事件发给它（发送即返回，不等待）。
+
+事件序号由发布者从各进程共享的计数器中取得（在主进程中创建，fork 后共用），随数据报一起发送，
+推送中心按序号转发：序号不连续说明有数据报丢失，广播 reset 让页面重新加载。
+插件列表接口返回加载时的最新事件 id（last_event_id()），页面从这个 id 开始订阅，
+丢弃 id 不大于它的增量，快照和增量既不重复也不遗漏。
+
+事件格式（每个事件有递增的 id，断线重连时浏览器带上 Last-Event-ID 补发错过的事件）:
+    event: stats
+    data: [{"id": 插件ID, "delta": [1星增量, 2星增量, 3星增量, 4星增量, 5星增量]}, ...]
+
+    event: reset          # 错过的事件已不在历史中（或推送中心重启过），客户端需要重新加载
+"""
+
+import asyncio
+import json
+import multiprocessing
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+# 一个 UDP 数据报最多携带的插件增量数，避免超过数据报大小上限
+MAX_ITEMS_PER_DATAGRAM = 200
+
+# 监听队列长度，大量页面同时打开（或推送中心重启后集中重连）时不丢连接
+LISTEN_BACKLOG = 1024
+
+# 取事件序号时等待共享锁的最长时间（持有锁的工作进程被杀死时不阻塞评分写入）
+LOCK_TIMEOUT = 0.05
+
+RESET_FRAME = b'event: reset\ndata: {}\n\n'
+
+
+class LiveHub:
+    """SSE 推送中心：接收各进程发布的事件并广播给所有连接"""
+
+    def __init__(self, host='0.0.0.0', port=5219, publish_port=5220, heartbeat=15,
+                 history=1000, max_clients=10000, max_buffer=65536, enabled=True):
+        self.host = host
+        self.port = int(port)
+        self.publish_address = ('127.0.0.1', int(publish_port))
+        self.heartbeat = float(heartbeat)
+        self.max_clients = int(max_clients)
+        # 单个连接未发出的数据超过该字节数时断开（浏览器会自动重连并补发）
+        self.max_buffer = int(max_buffer)
+        self.enabled = bool(enabled)
+
+        # 每次启动生成新的纪元，事件 id 为 "纪元-序号"，推送中心重启后旧 id 不会被误认
+        self.epoch = format(int(time.time()), 'x')
+        # 已分配的最大事件序号，各进程共享（发布时加一）；_seq 为推送中心已转发的最大序号
+        self._sequence = multiprocessing.Value('q', 0)
+        self._seq = 0
+        self._history = deque(maxlen=max(1, int(history)))
+        self._clients = set()
+
+        self._listen_socket = None
+        self._publish_socket = None
+        self._sender = None
+        self._thread = None
+        self._loop = None
+        # fork 出的子进程只发布事件，不再启动推送中心
+        self._forked = False
+
+        # 统计计数器
+        self._published = 0
+        self._publish_failures = 0
+        self._received = 0
+        self._connections = 0
+        self._dropped = 0
+        self._gaps = 0
+
+    @classmethod
+    def from_config(cls, live_config=None):
+        """根据 config.json 的 live 配置创建"""
+        live_config = live_config or {}
+        return cls(
+            host=live_config.get('host', '0.0.0.0'),
+            port=live_config.get('port', 5219),
+            publish_port=live_config.get('publish_port', 5220),
+            heartbeat=live_config.get('heartbeat', 15),
+            history=live_config.get('history', 1000),
+            max_clients=live_config.get('max_clients', 10000),
+            max_buffer=live_config.get('max_buffer', 65536),
+            enabled=live_config.get('enabled', False)
+        )
+
+    # ---- 发布（任意进程、任意线程） ----
+
+    def last_event_id(self):
+        """最新已分配的事件 id；在查询数据库之前取得，查询结果包含了不大于它的所有事件"""
+        if not self.enabled:
+            return None
+        return f"{self.epoch}-{self._assigned()}"
+
+    def _assigned(self):
+        # 直接读取共享内存，不等待锁（64位整数的读取不会读到一半）
+        return self._sequence.get_obj().value
+
+    def publish(self, event, items):
+        """发布一个事件（在数据库提交之后调用），items 为可JSON序列化的列表；失败只计数，不影响评分写入"""
+        if not self.enabled:
+            return
+        try:
+            if self._sender is None:
+                self._sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._sender.setblocking(False)
+            for start in range(0, len(items), MAX_ITEMS_PER_DATAGRAM):
+                self._send(event, items[start:start + MAX_ITEMS_PER_DATAGRAM])
+            self._published += 1
+        except ConnectionRefusedError:
+            # 推送中心未运行（本机 UDP 端口无人监听），没有浏览器在等待事件
+            self._publish_failures += 1
+        except OSError as e:
+            self._publish_failures += 1
+            print(f"⚠️  实时事件发布失败: {e}")
+
+    def _send(self, event, items):
+        # 取序号和发送在同一把锁内完成，数据报按序号顺序到达推送中心
+        lock = self._sequence.get_lock()
+        if not lock.acquire(timeout=LOCK_TIMEOUT):
+            # 拿不到序号：发送不带序号的事件，推送中心按丢失处理（广播 reset）
+            self._sender.sendto(self._datagram(None, event, items), self.publish_address)
+            return
+        try:
+            counter = self._sequence.get_obj()
+            counter.value += 1
+            self._sender.sendto(self._datagram(counter.value, event, items), self.publish_address)
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _datagram(seq, event, items):
+        return json.dumps({'seq': seq, 'event': event, 'data': items}, separators=(',', ':')).encode('utf-8')
+
+    # ---- 推送中心 ----
+
+    def start(self, quiet=False):
+        """在当前进程启动推送中心线程；端口已被其他进程占用时只发布事件
+
+        quiet=True 时端口被占用不打印提示（重新加载的新主进程等待旧主进程释放端口时反复调用）
+        """
+        if not self.enabled or self._forked or self._thread is not None:
+            return False
+        try:
+            listen_socket = socket.create_server((self.host, self.port), backlog=LISTEN_BACKLOG)
+            publish_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                publish_socket.bind(self.publish_address)
+            except OSError:
+                listen_socket.close()
+                publish_socket.close()
+                raise
+        except OSError as e:
+            if not quiet:
+                print(f"⚠️  实时推送端口不可用，本进程只发布事件: {e}")
+            return False
+
+        listen_socket.setblocking(False)
+        publish_socket.setblocking(False)
+        self._listen_socket = listen_socket
+        self._publish_socket = publish_socket
+        self._thread = threading.Thread(target=self._run, name='live-hub', daemon=True)
+        self._thread.start()
+        print(f"📡 实时推送已启动: {self.host}:{self.port}/events")
+        return True
+
+    def after_fork(self):
+        """fork之后在子进程中调用：关闭继承的监听套接字，子进程只发布事件"""
+        self._forked = True
+        self._thread = None
+        self._loop = None
+        self._clients = set()
+        for sock in (self._listen_socket, self._publish_socket, self._sender):
+            if sock is not None:
+                sock.close()
+        self._listen_socket = self._publish_socket = self._sender = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            print(f"❌ 实时推送中心异常退出: {e}")
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.start_server(self._handle_client, sock=self._listen_socket, backlog=LISTEN_BACKLOG)
+        await loop.create_datagram_endpoint(
+            lambda: _PublishProtocol(self), sock=self._publish_socket
+        )
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            # 注释行作为心跳，防止代理因空闲断开，同时发现已断开的连接
+            self._broadcast(b': ping\n\n')
+
+    def _receive(self, data):
+        try:
+            message = json.loads(data)
+            seq = message['seq']
+            event = str(message['event'])
+            payload = json.dumps(message['data'], separators=(',', ':'))
+        except (ValueError, KeyError, TypeError):
+            return
+        self._received += 1
+        if seq is not None and seq <= self._seq:
+            # 重复或过期的数据报
+            return
+        if seq is None or seq != self._seq + 1:
+            self._reset(seq)
+            if seq is None:
+                return
+        self._seq = seq
+        frame = f"id: {self.epoch}-{seq}\nevent: {event}\ndata: {payload}\n\n".encode('utf-8')
+        self._history.append((seq, frame))
+        self._broadcast(frame)
+
+    def _reset(self, seq):
+        """有事件丢失：清空历史（更早的 Last-Event-ID 重连时会收到 reset），通知所有页面重新加载"""
+        self._gaps += 1
+        self._history.clear()
+        print(f"⚠️  实时事件丢失（序号 {self._seq} 之后），通知页面重新加载")
+        self._broadcast(RESET_FRAME)
+
+    def _broadcast(self, frame):
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                self._drop(writer)
+            else:
+                writer.write(frame)
+
+    def _drop(self, writer):
+        self._clients.discard(writer)
+        self._dropped += 1
+        writer.transport.abort()
+
+    def _replay(self, last_event_id):
+        """返回断线期间错过的事件；无法补齐时返回 reset 事件"""
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition('-')
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = -1
+        if epoch != self.epoch or seq > self._assigned():
+            return [RESET_FRAME]
+        if seq >= self._seq:
+            # 页面快照中的 id 可能比推送中心已转发的还新（数据报尚在途中），之后的事件会按序送达
+            return []
+        if not self._history or self._history[0][0] > seq + 1:
+            return [RESET_FRAME]
+        return [frame for event_seq, frame in self._history if event_seq > seq]
+
+    async def _handle_client(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(parts[1] if len(parts) > 1 else '')
+
+        if parts[0] != 'GET' or url.path != '/events':
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        if len(self._clients) >= self.max_clients:
+            writer.write(b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: 10\r\n'
+                         b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+
+        # 重连时浏览器带 Last-Event-ID 头；经过不转发该头的代理时也可以用查询参数传递
+        last_event_id = headers.get('last-event-id') or parse_qs(url.query).get('last_event_id', [''])[0]
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Connection: keep-alive\r\n'
+            b'Access-Control-Allow-Origin: *\r\n'
+            b'X-Accel-Buffering: no\r\n'
+            b'\r\n'
+            b'retry: 3000\n\n'
+        )
+        for frame in self._replay(last_event_id):
+            writer.write(frame)
+
+        self._clients.add(writer)
+        self._connections += 1
+        try:
+            # 客户端不会再发送数据，读到EOF即表示连接已断开
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def stats(self):
+        """推送统计信息（推送中心所在进程的连接数；发布计数为本进程）"""
+        return {
+            'enabled': self.enabled,
+            'running': self._thread is not None,
+            'clients': len(self._clients),
+            'connections': self._connections,
+            'dropped': self._dropped,
+            'received': self._received,
+            'gaps': self._gaps,
+            'last_event_id': self.last_event_id(),
+            'published': self._published,
+            'publish_failures': self._publish_failures
+        }
+
+
+class _PublishProtocol(asyncio.DatagramProtocol):
+    """接收各进程通过 UDP 发布的事件"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        self.hub._receive(data)
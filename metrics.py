@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标
+计数器、仪表和直方图，按 Prometheus 文本格式导出。
+多进程部署时每个工作进程定期把自己的指标写入共享目录，导出时合并所有进程：
+计数器和直方图累加（包括已退出的进程），仪表只累加仍在运行的进程。
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+
+# 请求和查询耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """带标签的指标"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        # 导出时调用 callback 取值（读取其他组件已有的统计）：返回数值，或 {标签值元组: 数值}
+        self.callback = callback
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                return {}
+            if isinstance(value, dict):
+                return {tuple(str(v) for v in key): val for key, val in value.items()}
+            return {(): value}
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 各分桶计数（不累积）、总和、次数
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = state[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self, shared_dir=None):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        # 多进程共享目录，None 表示只导出本进程的指标
+        self.shared_dir = shared_dir
+        self._flusher = None
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=(), callback=None):
+        return self._register(Counter(name, help_text, labels, callback))
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        return self._register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def collect(self):
+        """本进程全部指标的快照（可JSON序列化）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                'kind': metric.kind,
+                'help': metric.help,
+                'labels': list(metric.labels),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': [[list(key), value] for key, value in metric.samples().items()]
+            }
+            for metric in metrics
+        }
+
+    # ------------------------------------------------------------ 多进程
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.shared_dir, f"{pid}.json")
+
+    def write_snapshot(self):
+        """把本进程的指标写入共享目录（先写临时文件再改名，读取方不会读到半个文件）"""
+        if not self.shared_dir:
+            return
+        os.makedirs(self.shared_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'written_at': time.time(), 'metrics': self.collect()}, f)
+        os.replace(tmp_path, path)
+
+    def clear_snapshots(self):
+        """服务器启动时清理上次运行留下的快照"""
+        if not self.shared_dir or not os.path.isdir(self.shared_dir):
+            return
+        for name in os.listdir(self.shared_dir):
+            if name.endswith('.json') or name.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.shared_dir, name))
+                except OSError:
+                    pass
+
+    def start_flusher(self, interval):
+        """后台定期写入快照（fork出的工作进程需要各自启动）"""
+        if not self.shared_dir or interval <= 0:
+            return
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+
+        def flush():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    print(f"⚠️  指标快照写入失败: {e}")
+
+        self._flusher = threading.Thread(target=flush, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+
+    def after_fork(self):
+        """fork之后在子进程中调用：清空从父进程继承的指标值，避免重复计数"""
+        self._lock = threading.Lock()
+        self._flusher = None
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric._values = {}
+
+    def _merged(self):
+        if not self.shared_dir:
+            return self.collect()
+        try:
+            self.write_snapshot()
+            names = os.listdir(self.shared_dir)
+        except OSError:
+            return self.collect()
+
+        merged = {}
+        own_pid = os.getpid()
+        for name in sorted(names):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.shared_dir, name), 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = snapshot['pid'] == own_pid or _pid_alive(snapshot['pid'])
+            for metric_name, metric in snapshot['metrics'].items():
+                if metric['kind'] == 'gauge' and not alive:
+                    continue
+                target = merged.setdefault(metric_name, dict(metric, samples={}))
+                for key, value in metric['samples']:
+                    key = tuple(key)
+                    target['samples'][key] = _add(target['samples'].get(key), value)
+        for metric in merged.values():
+            metric['samples'] = [[list(key), value] for key, value in metric['samples'].items()]
+        return merged
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for name, metric in self._merged().items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            labels = metric['labels']
+            for key, value in sorted(metric['samples'], key=lambda sample: sample[0]):
+                if metric['kind'] == 'histogram':
+                    counts, total, count = value
+                    cumulative = 0
+                    bounds = list(metric['buckets']) + [float('inf')]
+                    for bound, bucket_count in zip(bounds, counts):
+                        cumulative += bucket_count
+                        le = f'le="{_format_value(float(bound))}"'
+                        lines.append(f"{name}_bucket{_label_text(labels, key, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_label_text(labels, key)} {_format_value(float(total))}")
+                    lines.append(f"{name}_count{_label_text(labels, key)} {count}")
+                else:
+                    lines.append(f"{name}{_label_text(labels, key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _add(current, value):
+    if current is None:
+        return value if not isinstance(value, list) else [list(value[0]), value[1], value[2]]
+    if isinstance(value, list):
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]]
+    return current + value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+`?(\w+)', re.IGNORECASE)
+_statement_labels = {}
+
+
+def statement_label(sql):
+    """把SQL语句归纳为低基数的标签，如 'SELECT plugin_statistics'（结果缓存）"""
+    label = _statement_labels.get(sql)
+    if label is None:
+        words = sql.split(None, 1)
+        verb = words[0].upper() if words else '?'
+        match = _STATEMENT_TABLE.search(sql)
+        label = f"{verb} {match.group(1)}" if match else verb
+        _statement_labels[sql] = label
+    return label
+
+
+class ServerMetrics:
+    """服务器运行指标：请求耗时、进行中的请求数、数据库连接和语句耗时，以及慢请求日志
+
+    同时作为连接池的观察者（connect / wait / query）
+    """
+
+    def __init__(self, shared_dir=None, flush_interval=5, slow_request_ms=0, slow_log_path=None):
+        self.registry = Registry(shared_dir)
+        self.flush_interval = float(flush_interval)
+        self.slow_request_seconds = float(slow_request_ms) / 1000
+        self.slow_log_path = slow_log_path
+        # 当前请求的 [开始时间, 语句列表]；上下文变量在每个线程和每个 asyncio 任务中各自独立
+        self._current = contextvars.ContextVar('metrics_request', default=None)
+        self._slow_lock = threading.Lock()
+
+        registry = self.registry
+        self.requests = registry.counter(
+            'http_requests_total', '按路由、方法和状态码统计的请求数', ('route', 'method', 'status'))
+        self.request_seconds = registry.histogram(
+            'http_request_duration_seconds', '请求处理耗时（秒）', ('route', 'method'))
+        self.in_flight = registry.gauge('http_requests_in_flight', '正在处理的请求数')
+        self.db_connect_seconds = registry.histogram('db_connect_duration_seconds', '建立数据库连接耗时（秒）')
+        self.db_wait_seconds = registry.histogram('db_pool_wait_duration_seconds', '从连接池借出连接的耗时（秒）')
+        self.query_seconds = registry.histogram(
+            'db_query_duration_seconds', '按语句统计的数据库查询耗时（秒）', ('statement',))
+        self.query_rows = registry.counter('db_query_rows_total', '按语句统计的返回或影响行数', ('statement',))
+        self.query_errors = registry.counter('db_query_errors_total', '按语句统计的失败次数', ('statement',))
+        self.slow_requests = registry.counter('http_slow_requests_total', '超过阈值的慢请求数', ('route',))
+
+    @classmethod
+    def from_config(cls, data_dir, metrics_config=None):
+        """根据 config.json 的 metrics 配置创建（相对路径相对于数据目录，不放在静态文件目录下）"""
+        metrics_config = metrics_config or {}
+        shared_dir = metrics_config.get('shared_dir', 'metrics')
+        if shared_dir and not os.path.isabs(shared_dir):
+            shared_dir = os.path.join(data_dir, shared_dir)
+        slow_log_path = metrics_config.get('slow_log_path')
+        if slow_log_path and not os.path.isabs(slow_log_path):
+            slow_log_path = os.path.join(data_dir, slow_log_path)
+        return cls(
+            shared_dir=shared_dir or None,
+            flush_interval=metrics_config.get('flush_interval', 5),
+            slow_request_ms=metrics_config.get('slow_request_ms', 500),
+            slow_log_path=slow_log_path
+        )
+
+    # ------------------------------------------------------------ 请求
+
+    def request_started(self):
+        self.in_flight.inc()
+        self._current.set([time.perf_counter(), []])
+
+    def request_finished(self, route, method, status, path=None):
+        current = self._current.get()
+        if current is None:
+            return
+        started, queries = current
+        elapsed = time.perf_counter() - started
+        self._current.set(None)
+
+        self.in_flight.dec()
+        self.requests.inc(route=route, method=method, status=status)
+        self.request_seconds.observe(elapsed, route=route, method=method)
+        if self.slow_request_seconds and elapsed >= self.slow_request_seconds:
+            self.slow_requests.inc(route=route)
+            self._log_slow(method, path or route, status, elapsed, queries)
+
+    def _log_slow(self, method, path, status, elapsed, queries):
+        db_seconds = sum(seconds for _, seconds, _ in queries)
+        slowest = sorted(queries, key=lambda query: query[1], reverse=True)[:3]
+        detail = ', '.join(f"{label} {seconds * 1000:.1f}ms/{rows}行" for label, seconds, rows in slowest)
+        line = (f"🐢 慢请求 {method} {path} {status} {elapsed * 1000:.1f}ms，"
+                f"数据库 {len(queries)}次/{db_seconds * 1000:.1f}ms" + (f": {detail}" if detail else ''))
+        if not self.slow_log_path:
+            print(line)
+            return
+        with self._slow_lock:
+            os.makedirs(os.path.dirname(self.slow_log_path), exist_ok=True)
+            with open(self.slow_log_path, 'a', encoding='utf-8') as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {line}\n")
+
+    # ------------------------------------------------------------ 连接池观察者
+
+    def connect(self, seconds):
+        self.db_connect_seconds.observe(seconds)
+
+    def wait(self, seconds):
+        self.db_wait_seconds.observe(seconds)
+
+    def query(self, sql, seconds, rows, error=False):
+        label = statement_label(sql)
+        self.query_seconds.observe(seconds, statement=label)
+        if error:
+            self.query_errors.inc(statement=label)
+        else:
+            self.query_rows.inc(rows, statement=label)
+        current = self._current.get()
+        if current is not None:
+            current[1].append((label, seconds, rows))
+
+    # ------------------------------------------------------------ 导出
+
+    def render(self):
+        return self.registry.render()
+
+    def start(self):
+        """启动后台快照线程（fork出的工作进程需要重新启动）"""
+        self.registry.start_flusher(self.flush_interval)
+
+    def after_fork(self):
+        self.registry.after_fork()
+        self._slow_lock = threading.Lock()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+插件元数据内存快照
+plugins 表很少变化：启用插件的元数据（已解码 target_complaints、已格式化时间）常驻内存，
+同时按数据库 id 和 plugin_id 标识索引。每隔 check_interval 秒用一条廉价查询
+（行数 + MAX(updated_at)）检测变化，变化时才重新加载并原子替换快照。
+"""
+
+import json
+import threading
+import time
+
+
+class CatalogSnapshot:
+    """某一版本的启用插件集合（只读）"""
+
+    def __init__(self, version, plugins):
+        self.version = version
+        self.plugins = plugins
+        self.by_id = {plugin['id']: plugin for plugin in plugins}
+        self.by_plugin_id = {plugin['plugin_id']: plugin for plugin in plugins}
+        # 抱怨类型 -> 插件ID列表（倒排索引，用于按 target_complaints 筛选）
+        self.by_complaint = {}
+        for plugin in plugins:
+            for complaint in plugin['target_complaints']:
+                self.by_complaint.setdefault(complaint, []).append(plugin['id'])
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.plugins)
+
+
+def decode_plugin_row(row):
+    """把 plugins 表的一行转换为接口使用的字典"""
+    plugin = dict(row)
+    complaints = plugin.get('target_complaints')
+    if complaints:
+        try:
+            plugin['target_complaints'] = json.loads(complaints)
+        except (TypeError, ValueError):
+            plugin['target_complaints'] = []
+    else:
+        plugin['target_complaints'] = []
+    if plugin.get('created_at'):
+        plugin['created_at'] = plugin['created_at'].isoformat()
+    return plugin
+
+
+class PluginCatalog:
+    """启用插件的内存只读模型"""
+
+    VERSION_SQL = "SELECT COUNT(*), MAX(updated_at) FROM plugins"
+    LOAD_SQL = """
+        SELECT id, plugin_name, plugin_id, description, author, version,
+               icon, color, category, target_complaints, created_at, is_active
+        FROM plugins
+        WHERE is_active = TRUE
+        ORDER BY id
+    """
+
+    def __init__(self, connect, check_interval=5, max_age=300, on_reload=None):
+        self.connect = connect
+        # 重新加载后用同一连接调用 on_reload(cursor)，用于维护依赖插件集合的数据
+        self.on_reload = on_reload
+        self.check_interval = float(check_interval)
+        # MAX(updated_at) 只精确到秒，同一秒内的多次修改可能被漏掉，超过 max_age 秒强制重新加载
+        self.max_age = float(max_age)
+
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        # 统计计数器
+        self._checks = 0
+        self._reloads = 0
+        self._failures = 0
+        self._last_error = None
+
+    @classmethod
+    def from_config(cls, connect, catalog_config=None, on_reload=None):
+        """根据 config.json 的 catalog 配置创建"""
+        catalog_config = catalog_config or {}
+        return cls(
+            connect,
+            check_interval=catalog_config.get('check_interval', 5),
+            max_age=catalog_config.get('max_age', 300),
+            on_reload=on_reload
+        )
+
+    def _refresh(self):
+        connection = self.connect()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.VERSION_SQL)
+                count, max_updated_at = cursor.fetchone()
+                version = (count, str(max_updated_at) if max_updated_at else None)
+
+                snapshot = self._snapshot
+                if (snapshot is not None and snapshot.version == version
+                        and time.time() - snapshot.loaded_at < self.max_age):
+                    return False
+
+                cursor.execute(self.LOAD_SQL)
+                columns = [column[0] for column in cursor.description]
+                plugins = [decode_plugin_row(zip(columns, row)) for row in cursor.fetchall()]
+
+                if self.on_reload:
+                    try:
+                        self.on_reload(cursor)
+                    except Exception as e:
+                        print(f"⚠️  插件元数据重新加载后处理失败: {e}")
+        finally:
+            connection.close()
+
+        self._snapshot = CatalogSnapshot(version, plugins)
+        self._reloads += 1
+        return True
+
+    def snapshot(self):
+        """返回当前快照，需要时先检测变化；从未加载成功且数据库不可用时返回 None
+
+        同一时间只有一个线程做变化检测，其他线程直接使用现有快照
+        """
+        if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+
+        # 首次加载时所有请求都需要等待结果，之后检测期间其他线程不等待
+        if not self._lock.acquire(blocking=self._snapshot is None):
+            return self._snapshot
+        try:
+            if self._snapshot is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._checks += 1
+                try:
+                    self._refresh()
+                except Exception as e:
+                    self._failures += 1
+                    self._last_error = str(e)
+                    print(f"⚠️  插件元数据刷新失败，继续使用旧数据: {e}")
+                self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+        return self._snapshot
+
+    def cached(self):
+        """不需要做变化检测时返回当前快照，否则返回 None（需要检测时应改为调用 snapshot()）"""
+        if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+        return None
+
+    def get(self, id):
+        """按数据库 id 查找启用的插件，不存在返回 None"""
+        snapshot = self.snapshot()
+        return snapshot.by_id.get(id) if snapshot else None
+
+    def get_by_plugin_id(self, plugin_id):
+        """按 plugin_id 标识查找启用的插件，不存在返回 None"""
+        snapshot = self.snapshot()
+        return snapshot.by_plugin_id.get(plugin_id) if snapshot else None
+
+    def invalidate(self):
+        """下次访问时立即检测变化（修改插件后调用）"""
+        self._checked_at = 0.0
+
+    def after_fork(self):
+        """fork之后在子进程中调用：重建锁，快照可以沿用"""
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """快照统计信息"""
+        snapshot = self._snapshot
+        return {
+            'plugins': len(snapshot) if snapshot else 0,
+            'version': list(snapshot.version) if snapshot else None,
+            'loaded_at': snapshot.loaded_at if snapshot else None,
+            'checks': self._checks,
+            'reloads': self._reloads,
+            'failures': self._failures,
+            'last_error': self._last_error
+        }
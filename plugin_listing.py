@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+插件列表分页查询
+按排序方式生成基于游标（keyset）的分页查询：下一页从上一页最后一行的排序值之后开始，
+查询代价与页码无关。每种排序都有对应的索引（见 database_schema.sql 第7节）：
+
+  rating   综合排名   plugin_statistics(ranking_score DESC, plugin_id)（贝叶斯平均，见 plugin_stats.py）
+  popular  评分人数最多 plugin_statistics(total_ratings DESC, average_rating DESC)
+  newest   最新发布   plugins(is_active, created_at, id) / plugins(category, is_active, created_at, id)
+  name     名称排序   plugins(is_active, plugin_name) / plugins(category, is_active, plugin_name)
+"""
+
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+DEFAULT_SORT = 'rating'
+
+# 每种排序的 (列, 方向) 列表，最后一列唯一，保证顺序确定
+SORTS = {
+    'rating': [('s.ranking_score', 'DESC'), ('s.plugin_id', 'ASC')],
+    'popular': [('s.total_ratings', 'DESC'), ('s.average_rating', 'DESC'), ('s.plugin_id', 'ASC')],
+    'newest': [('p.created_at', 'DESC'), ('p.id', 'DESC')],
+    'name': [('p.plugin_name', 'ASC'), ('p.id', 'ASC')],
+}
+
+# 统计表驱动的排序从统计索引扫描，其余从 plugins 索引扫描
+STATS_DRIVEN_SORTS = {'rating', 'popular'}
+
+LISTING_COLUMNS = """
+    s.plugin_id, p.created_at, p.plugin_name, s.total_ratings, s.average_rating, s.ranking_score,
+    s.rating_1_count, s.rating_2_count, s.rating_3_count,
+    s.rating_4_count, s.rating_5_count, s.last_rating_at
+"""
+
+
+class ListingError(ValueError):
+    """分页参数无效"""
+
+
+def encode_cursor(sort, row):
+    """用一行的排序值生成不透明的游标"""
+    values = []
+    for column, _ in SORTS[sort]:
+        value = row[column.split('.', 1)[1] if column != 'p.id' else 'plugin_id']
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif hasattr(value, 'strftime'):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        values.append(value)
+    payload = json.dumps([sort, values], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort, cursor):
+    """解析游标，返回排序值列表；游标无效或与排序方式不一致时抛出 ListingError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        raise ListingError('分页游标无效')
+    if cursor_sort != sort or not isinstance(values, list) or len(values) != len(SORTS[sort]):
+        raise ListingError('分页游标与排序方式不一致')
+    return values
+
+
+def keyset_condition(sort, values):
+    """生成"排在游标之后"的条件：a < ? OR (a = ? AND (b < ? OR (b = ? AND c > ?)))
+
+    展开成 OR/AND 形式而不是行比较，MySQL 才能用索引做范围扫描，也支持各列方向不同
+    """
+    columns = SORTS[sort]
+    condition = None
+    params = []
+    for (column, direction), value in reversed(list(zip(columns, values))):
+        op = '<' if direction == 'DESC' else '>'
+        if condition is None:
+            condition = f"{column} {op} %s"
+            params = [value]
+        else:
+            condition = f"{column} {op} %s OR ({column} = %s AND ({condition}))"
+            params = [value, value] + params
+    return f"({condition})", params
+
+
+def build_listing_query(sort, limit, category=None, plugin_ids=None, cursor_values=None):
+    """生成分页查询，多取一行用于判断是否还有下一页"""
+    where = ['p.is_active = TRUE']
+    params = []
+    if category:
+        where.append('p.category = %s')
+        params.append(category)
+    if plugin_ids is not None:
+        where.append(f"p.id IN ({', '.join(['%s'] * len(plugin_ids))})")
+        params.extend(plugin_ids)
+    if cursor_values is not None:
+        condition, condition_params = keyset_condition(sort, cursor_values)
+        where.append(condition)
+        params.extend(condition_params)
+
+    if sort in STATS_DRIVEN_SORTS:
+        source = "plugin_statistics s JOIN plugins p ON p.id = s.plugin_id"
+    else:
+        source = "plugins p JOIN plugin_statistics s ON s.plugin_id = p.id"
+    order_by = ', '.join(f"{column} {direction}" for column, direction in SORTS[sort])
+    sql = f"""
+        SELECT {LISTING_COLUMNS}
+        FROM {source}
+        WHERE {' AND '.join(where)}
+        ORDER BY {order_by}
+        LIMIT %s
+    """
+    return sql, params + [limit + 1]
+
+
+def parse_listing_args(args):
+    """解析查询参数，返回 (sort, limit, category, complaint, cursor)"""
+    sort = args.get('sort', DEFAULT_SORT)
+    if sort not in SORTS:
+        raise ListingError(f"排序方式无效，可选: {', '.join(SORTS)}")
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise ListingError('limit 必须是整数')
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ListingError(f"limit 必须在 1-{MAX_LIMIT} 之间")
+    return sort, limit, args.get('category') or None, args.get('complaint') or None, args.get('cursor') or None
+
+
+# 为没有统计行的插件补一行全零统计，保证所有插件都能通过统计索引排序和分页
+ENSURE_STATISTICS_ROWS_SQL = """
+    INSERT INTO plugin_statistics (plugin_id, total_ratings, average_rating,
+                                   rating_1_count, rating_2_count, rating_3_count,
+                                   rating_4_count, rating_5_count)
+    SELECT p.id, 0, 0, 0, 0, 0, 0, 0
+    FROM plugins p
+    LEFT JOIN plugin_statistics s ON s.plugin_id = p.id
+    WHERE s.plugin_id IS NULL
+"""
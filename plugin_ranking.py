@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+插件排名内存索引
+按 (ranking_score 降序, plugin_id 升序) 保存启用插件的有序键列表，二分查找得到名次，O(log n)。
+数据按 plugin_statistics 的排名索引顺序读入（数据库不需要排序）；本进程写入评分后按新分数增量调整，
+其他进程的写入在 refresh_interval 秒内通过重新读取同步。
+"""
+
+import bisect
+import threading
+import time
+
+
+class PluginRanking:
+    """启用插件的排名（只保存排名键，插件信息来自插件元数据快照）"""
+
+    LOAD_SQL = """
+        SELECT s.plugin_id, s.ranking_score
+        FROM plugin_statistics s JOIN plugins p ON p.id = s.plugin_id
+        WHERE p.is_active = TRUE
+        ORDER BY s.ranking_score DESC, s.plugin_id ASC
+    """
+
+    def __init__(self, connect, refresh_interval=5):
+        self.connect = connect
+        self.refresh_interval = float(refresh_interval)
+
+        # 有序键 (-ranking_score, plugin_id)，以及 plugin_id -> ranking_score
+        self._keys = []
+        self._scores = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        # 统计计数器
+        self._reloads = 0
+        self._updates = 0
+        self._failures = 0
+        self._last_error = None
+
+    @classmethod
+    def from_config(cls, connect, ranking_config=None):
+        """根据 config.json 的 ranking 配置创建"""
+        ranking_config = ranking_config or {}
+        return cls(connect, refresh_interval=ranking_config.get('refresh_interval', 5))
+
+    def _reload(self):
+        connection = self.connect()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.LOAD_SQL)
+                rows = cursor.fetchall()
+        finally:
+            connection.close()
+
+        # 行已按排名索引的顺序返回，键列表无需再排序
+        keys = [(-score, plugin_id) for plugin_id, score in rows]
+        scores = {plugin_id: score for plugin_id, score in rows}
+        with self._lock:
+            self._keys = keys
+            self._scores = scores
+            self._loaded_at = time.monotonic()
+        self._reloads += 1
+
+    def _ensure_fresh(self):
+        """超过 refresh_interval 时重新读取；同一时间只有一个线程读取，其他线程使用现有数据"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return True
+        if not self._refresh_lock.acquire(blocking=self._loaded_at is None):
+            return True
+        try:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                try:
+                    self._reload()
+                except Exception as e:
+                    self._failures += 1
+                    self._last_error = str(e)
+                    print(f"⚠️  插件排名刷新失败，继续使用旧数据: {e}")
+        finally:
+            self._refresh_lock.release()
+        return self._loaded_at is not None
+
+    def update(self, scores):
+        """按本进程写入后的新分数 {plugin_id: ranking_score} 调整排名，每个插件 O(log n) 查找"""
+        with self._lock:
+            for plugin_id, score in scores.items():
+                old_score = self._scores.get(plugin_id)
+                # 尚未读入的插件（新插件）在下次重新读取时加入
+                if old_score is None or old_score == score:
+                    continue
+                del self._keys[bisect.bisect_left(self._keys, (-old_score, plugin_id))]
+                bisect.insort(self._keys, (-score, plugin_id))
+                self._scores[plugin_id] = score
+                self._updates += 1
+
+    def rank(self, plugin_id):
+        """返回 (名次, 插件总数, 排名分数)，名次从1开始；插件不存在或数据不可用时返回 None"""
+        if not self._ensure_fresh():
+            return None
+        with self._lock:
+            score = self._scores.get(plugin_id)
+            if score is None:
+                return None
+            return bisect.bisect_left(self._keys, (-score, plugin_id)) + 1, len(self._keys), score
+
+    def top(self, limit):
+        """排名前 limit 的 [(plugin_id, ranking_score)]；数据不可用时返回 None"""
+        if not self._ensure_fresh():
+            return None
+        with self._lock:
+            return [(plugin_id, -negative_score) for negative_score, plugin_id in self._keys[:limit]]
+
+    def invalidate(self):
+        """下次访问时重新读取"""
+        self._loaded_at = None if not self._keys else 0.0
+
+    def after_fork(self):
+        """fork之后在子进程中调用：重建锁，数据可以沿用"""
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def stats(self):
+        """排名统计信息"""
+        return {
+            'plugins': len(self._keys),
+            'reloads': self._reloads,
+            'updates': self._updates,
+            'failures': self._failures,
+            'last_error': self._last_error
+        }
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+插件评分统计维护
+评分写入时按增量更新 plugin_statistics：新评分给对应星级计数加一，
+修改评分时旧星级减一、新星级加一，平均分由各星级计数推导。
+每次评分的代价与插件已有的评分数量无关。
+
+命令行用法（从评分明细重新统计并报告偏差）:
+    python3 plugin_stats.py           # 只检查，报告偏差
+    python3 plugin_stats.py --fix     # 检查并修正偏差
+"""
+
+import argparse
+import os
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+
+import pymysql
+
+import storage
+from config_manager import read_config
+
+RATING_LEVELS = (1, 2, 3, 4, 5)
+
+# 排名分数：贝叶斯平均 (先验均值 × 先验权重 + 评分总和) / (先验权重 + 评分数)。
+# 相当于每个插件预先带有 RANKING_PRIOR_WEIGHT 个 RANKING_PRIOR_MEAN 分的评分，
+# 评分很少的插件分数接近先验均值，评分越多越接近真实平均分。只依赖本插件的计数，可以按增量维护
+RANKING_PRIOR_MEAN = 3
+RANKING_PRIOR_WEIGHT = 10
+
+# 更新后的评分总和（更新前的计数加上增量）
+_NEW_RATING_SUM = """(
+            (rating_1_count + VALUES(rating_1_count))
+            + 2 * (rating_2_count + VALUES(rating_2_count))
+            + 3 * (rating_3_count + VALUES(rating_3_count))
+            + 4 * (rating_4_count + VALUES(rating_4_count))
+            + 5 * (rating_5_count + VALUES(rating_5_count)))"""
+
+# 按增量更新一个插件的统计。平均分和排名分数写在最前面，只引用更新前的值加上增量，
+# 因此结果与数据库按什么顺序执行各个赋值无关
+PLUGIN_STATS_DELTA_SQL = f"""
+    INSERT INTO plugin_statistics (
+        plugin_id, total_ratings, average_rating, ranking_score,
+        rating_1_count, rating_2_count, rating_3_count,
+        rating_4_count, rating_5_count, last_rating_at
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+    ON DUPLICATE KEY UPDATE
+        average_rating = CASE WHEN total_ratings + VALUES(total_ratings) > 0 THEN ROUND(
+            1.0 * {_NEW_RATING_SUM}
+            / (total_ratings + VALUES(total_ratings)), 2)
+            ELSE 0 END,
+        ranking_score = ROUND(
+            ({RANKING_PRIOR_MEAN * RANKING_PRIOR_WEIGHT} + 1.0 * {_NEW_RATING_SUM})
+            / ({RANKING_PRIOR_WEIGHT} + total_ratings + VALUES(total_ratings)), 4),
+        total_ratings = total_ratings + VALUES(total_ratings),
+        rating_1_count = rating_1_count + VALUES(rating_1_count),
+        rating_2_count = rating_2_count + VALUES(rating_2_count),
+        rating_3_count = rating_3_count + VALUES(rating_3_count),
+        rating_4_count = rating_4_count + VALUES(rating_4_count),
+        rating_5_count = rating_5_count + VALUES(rating_5_count),
+        last_rating_at = CURRENT_TIMESTAMP
+"""
+
+# 按评分明细重新聚合插件统计，每个插件一行（对账修正时使用）
+PLUGIN_STATS_REBUILD_SQL = """
+    SELECT
+        plugin_id,
+        COUNT(*) as total_ratings,
+        SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) as rating_1_count,
+        SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END) as rating_2_count,
+        SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END) as rating_3_count,
+        SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END) as rating_4_count,
+        SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END) as rating_5_count,
+        MAX(created_at) as last_rating_at
+    FROM plugin_ratings
+    GROUP BY plugin_id
+"""
+
+
+def _round_half_up(numerator, denominator, places):
+    # 与数据库对定点数的 ROUND 一致（四舍五入），而不是 Python round() 的银行家舍入
+    return (Decimal(numerator) / Decimal(denominator)).quantize(Decimal(1).scaleb(-places), ROUND_HALF_UP)
+
+
+def average_from_counts(counts):
+    """由各星级计数计算平均分（保留两位小数）"""
+    total = sum(counts)
+    if not total:
+        return Decimal('0.00')
+    return _round_half_up(sum(level * count for level, count in zip(RATING_LEVELS, counts)), total, 2)
+
+
+def ranking_score_from_counts(counts):
+    """由各星级计数计算排名分数（贝叶斯平均，保留四位小数）"""
+    return _round_half_up(
+        RANKING_PRIOR_MEAN * RANKING_PRIOR_WEIGHT
+        + sum(level * count for level, count in zip(RATING_LEVELS, counts)),
+        RANKING_PRIOR_WEIGHT + sum(counts),
+        4
+    )
+
+
+def fetch_existing_ratings(cursor, keys):
+    """查询并锁定一组 (plugin_id, user_ip) 已有的评分，返回 {(plugin_id, user_ip): rating}
+
+    需要在事务中调用，锁定到提交为止，避免并发修改同一条评分时增量被重复计算
+    """
+    return {key: rating for key, (rating, _) in fetch_existing_votes(cursor, keys).items()}
+
+
+def fetch_existing_votes(cursor, keys):
+    """与 fetch_existing_ratings 相同，返回 {(plugin_id, user_ip): (rating, submitted_at)}"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    cursor.execute(*existing_ratings_query(keys))
+    return {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+
+
+def existing_ratings_query(keys):
+    """查询并锁定一组 (plugin_id, user_ip) 已有评分的 (语句, 参数)，keys 不能为空
+
+    行为 (plugin_id, user_ip, rating, submitted_at)；异步连接（ASGI模式）直接执行该语句
+    """
+    placeholders = ', '.join(['(%s, %s)'] * len(keys))
+    params = [value for key in keys for value in key]
+    return f"""
+        SELECT plugin_id, user_ip, rating, submitted_at FROM plugin_ratings
+        WHERE (plugin_id, user_ip) IN ({placeholders})
+        FOR UPDATE
+    """, params
+
+
+def rating_deltas(changes):
+    """把评分变化 [(plugin_id, 旧评分或None, 新评分)] 汇总为每个插件各星级的增量"""
+    deltas = {}
+    for plugin_id, old_rating, new_rating in changes:
+        if old_rating == new_rating:
+            continue
+        counts = deltas.setdefault(plugin_id, [0] * len(RATING_LEVELS))
+        if old_rating is not None:
+            counts[old_rating - 1] -= 1
+        counts[new_rating - 1] += 1
+    return deltas
+
+
+def apply_rating_changes(cursor, changes):
+    """按增量更新受影响插件的统计，每个插件一条语句，返回 {plugin_id: 各星级增量}"""
+    missing = set()
+    changed = changed_plugins(changes)
+    if changed:
+        cursor.execute(*statistics_ids_query(changed))
+        missing = changed - {row[0] for row in cursor.fetchall()}
+    deltas, rows = rating_change_rows(changes, missing)
+    if rows:
+        cursor.executemany(PLUGIN_STATS_DELTA_SQL, rows)
+    return deltas
+
+
+def changed_plugins(changes):
+    """修改了已有评分（旧星级要减一）的插件ID"""
+    return {plugin_id for plugin_id, old_rating, new_rating in changes
+            if old_rating is not None and old_rating != new_rating}
+
+
+def statistics_ids_query(plugin_ids):
+    """查询一组插件中已有统计行的插件的 (语句, 参数)，行为 (plugin_id,)，plugin_ids 不能为空"""
+    plugin_ids = sorted(plugin_ids)
+    return f"""
+        SELECT plugin_id FROM plugin_statistics
+        WHERE plugin_id IN ({', '.join(['%s'] * len(plugin_ids))})
+    """, plugin_ids
+
+
+def rating_change_rows(changes, missing=()):
+    """返回 (各插件星级增量, PLUGIN_STATS_DELTA_SQL 的参数行)
+
+    统计行存在时按参数中的增量更新；不存在时语句按参数插入新行。missing 为统计行不存在、又修改了已有评分的插件
+    （由 changed_plugins 和 statistics_ids_query 得到）：减掉的旧评分本来就不在统计中，插入去掉负数后的计数
+    和对应的总数（统计有偏差时由对账命令修正）。只有新增评分的插件增量没有负数，两种情况参数相同
+    """
+    deltas = rating_deltas(changes)
+    rows = []
+    for plugin_id, counts in sorted(deltas.items()):
+        inserted_counts = [max(count, 0) for count in counts]
+        if plugin_id in missing:
+            counts = inserted_counts
+        rows.append((plugin_id, sum(counts), average_from_counts(inserted_counts),
+                     ranking_score_from_counts(inserted_counts), *counts))
+    return deltas, rows
+
+
+def fetch_ranking_scores(cursor, plugin_ids):
+    """查询一组插件当前的排名分数，返回 {plugin_id: ranking_score}
+
+    在更新统计的同一事务中调用时读到的是本次更新后的分数
+    """
+    plugin_ids = list(plugin_ids)
+    if not plugin_ids:
+        return {}
+    cursor.execute(*ranking_scores_query(plugin_ids))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def ranking_scores_query(plugin_ids):
+    """查询一组插件排名分数的 (语句, 参数)，行为 (plugin_id, ranking_score)，plugin_ids 不能为空"""
+    return f"""
+        SELECT plugin_id, ranking_score FROM plugin_statistics
+        WHERE plugin_id IN ({', '.join(['%s'] * len(plugin_ids))})
+    """, plugin_ids
+
+
+def fetch_statistics(cursor, plugin_ids):
+    """一条语句查询一组插件的统计，返回按 plugin_id 排序的行"""
+    plugin_ids = list(plugin_ids)
+    if not plugin_ids:
+        return []
+    cursor.execute(f"""
+        SELECT * FROM plugin_statistics
+        WHERE plugin_id IN ({', '.join(['%s'] * len(plugin_ids))})
+        ORDER BY plugin_id
+    """, plugin_ids)
+    return cursor.fetchall()
+
+
+def fetch_recent_ratings(cursor, plugin_ids, per_plugin):
+    """一条窗口查询取出每个插件最近的 per_plugin 条评分，按 plugin_id、时间倒序排列
+
+    ROW_NUMBER() 需要 MySQL 8.0 及以上，按 (plugin_id, created_at) 索引在每个插件内排序
+    """
+    plugin_ids = list(plugin_ids)
+    if not plugin_ids or per_plugin <= 0:
+        return []
+    cursor.execute(f"""
+        SELECT plugin_id, rating, comment, created_at
+        FROM (
+            SELECT plugin_id, rating, comment, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY plugin_id ORDER BY created_at DESC, id DESC) AS rn
+            FROM plugin_ratings
+            WHERE plugin_id IN ({', '.join(['%s'] * len(plugin_ids))})
+        ) recent
+        WHERE rn <= %s
+        ORDER BY plugin_id, rn
+    """, plugin_ids + [per_plugin])
+    return cursor.fetchall()
+
+
+def reconcile(connection, fix=False):
+    """从评分明细重新统计所有插件，与 plugin_statistics 比较
+
+    返回偏差列表 [{'plugin_id', 'expected', 'actual'}]，fix=True 时按重新统计的结果修正
+    """
+    with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+        cursor.execute(PLUGIN_STATS_REBUILD_SQL)
+        expected = {row['plugin_id']: row for row in cursor.fetchall()}
+        cursor.execute("SELECT * FROM plugin_statistics")
+        actual = {row['plugin_id']: row for row in cursor.fetchall()}
+
+    fields = ['total_ratings'] + [f'rating_{level}_count' for level in RATING_LEVELS]
+    drift = []
+    for plugin_id in sorted(set(expected) | set(actual)):
+        exp = expected.get(plugin_id)
+        act = actual.get(plugin_id)
+        exp_values = {field: int(exp[field]) if exp else 0 for field in fields}
+        exp_counts = [exp_values[f'rating_{level}_count'] for level in RATING_LEVELS]
+        exp_values['average_rating'] = average_from_counts(exp_counts)
+        exp_values['ranking_score'] = ranking_score_from_counts(exp_counts)
+        act_values = {field: int(act[field] or 0) if act else 0 for field in fields}
+        act_values['average_rating'] = (
+            Decimal(str(act['average_rating'] or 0)).quantize(Decimal('0.01')) if act else Decimal('0.00')
+        )
+        act_values['ranking_score'] = (
+            Decimal(str(act['ranking_score'])).quantize(Decimal('0.0001'))
+            if act and act['ranking_score'] is not None else None
+        )
+        if exp_values != act_values:
+            drift.append({
+                'plugin_id': plugin_id,
+                'expected': exp_values,
+                'actual': act_values,
+                'last_rating_at': exp['last_rating_at'] if exp else None
+            })
+
+    if fix and drift:
+        connection.begin()
+        try:
+            with connection.cursor() as cursor:
+                cursor.executemany("""
+                    INSERT INTO plugin_statistics (
+                        plugin_id, total_ratings, average_rating, ranking_score,
+                        rating_1_count, rating_2_count, rating_3_count,
+                        rating_4_count, rating_5_count, last_rating_at
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        total_ratings = VALUES(total_ratings),
+                        average_rating = VALUES(average_rating),
+                        ranking_score = VALUES(ranking_score),
+                        rating_1_count = VALUES(rating_1_count),
+                        rating_2_count = VALUES(rating_2_count),
+                        rating_3_count = VALUES(rating_3_count),
+                        rating_4_count = VALUES(rating_4_count),
+                        rating_5_count = VALUES(rating_5_count),
+                        last_rating_at = VALUES(last_rating_at)
+                """, [
+                    (item['plugin_id'], item['expected']['total_ratings'],
+                     item['expected']['average_rating'], item['expected']['ranking_score'],
+                     *[item['expected'][f'rating_{level}_count'] for level in RATING_LEVELS],
+                     item['last_rating_at'])
+                    for item in drift
+                ])
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    return drift
+
+
+def main():
+    """命令行入口：对账插件统计"""
+    parser = argparse.ArgumentParser(description='从评分明细重新统计插件评分并报告偏差')
+    parser.add_argument('--fix', action='store_true', help='修正发现的偏差')
+    parser.add_argument('--config', help='配置文件路径，默认 config.json')
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = args.config or os.path.join(base_dir, 'config.json')
+    config = read_config(config_path)
+    database_config = config['database']
+
+    connection = storage.connect(storage.data_dir(base_dir, config), dict(database_config, autocommit=True))
+    try:
+        drift = reconcile(connection, fix=args.fix)
+    finally:
+        connection.close()
+
+    if not drift:
+        print("✅ 插件统计与评分明细一致")
+        return
+
+    print(f"⚠️  {len(drift)} 个插件的统计存在偏差:")
+    for item in drift:
+        changed = [
+            f"{field} {item['actual'][field]} -> {item['expected'][field]}"
+            for field in item['expected'] if item['actual'][field] != item['expected'][field]
+        ]
+        print(f"   - 插件 {item['plugin_id']}: {', '.join(changed)}")
+    if args.fix:
+        print("🔧 已按评分明细修正")
+    else:
+        print("💡 使用 --fix 修正")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
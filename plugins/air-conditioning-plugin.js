@@ -118,15 +118,18 @@ class AirConditioningPlugin extends OfficePlugin {
     }
 }
 
-// 延迟注册插件
+// 注册插件：按需加载时游戏已存在，立即注册；直接用 <script> 引用时等游戏加载后注册
 if (typeof window !== 'undefined') {
-    window.addEventListener('load', () => {
-        setTimeout(() => {
-            if (window.game) {
-                const acPlugin = new AirConditioningPlugin();
-                window.game.registerPlugin(acPlugin);
-                console.log('🌡️ 空调插件已注册');
-            }
-        }, 1500); // 确保游戏完全加载后再注册
-    });
+    const registerAirConditioningPlugin = () => {
+        if (window.game) {
+            const acPlugin = new AirConditioningPlugin();
+            window.game.registerPlugin(acPlugin);
+            console.log('🌡️ 空调插件已注册');
+        }
+    };
+    if (window.game) {
+        registerAirConditioningPlugin();
+    } else {
+        window.addEventListener('load', () => setTimeout(registerAirConditioningPlugin, 1500)); // 确保游戏完全加载后再注册
+    }
 }
\ No newline at end of file
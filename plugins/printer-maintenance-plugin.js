@@ -148,15 +148,18 @@ class PrinterMaintenancePlugin extends OfficePlugin {
     }
 }
 
-// 延迟注册插件
+// 注册插件：按需加载时游戏已存在，立即注册；直接用 <script> 引用时等游戏加载后注册
 if (typeof window !== 'undefined') {
-    window.addEventListener('load', () => {
-        setTimeout(() => {
-            if (window.game) {
-                const printerPlugin = new PrinterMaintenancePlugin();
-                window.game.registerPlugin(printerPlugin);
-                console.log('🖨️ 打印机插件已注册');
-            }
-        }, 1500);
-    });
+    const registerPrinterPlugin = () => {
+        if (window.game) {
+            const printerPlugin = new PrinterMaintenancePlugin();
+            window.game.registerPlugin(printerPlugin);
+            console.log('🖨️ 打印机插件已注册');
+        }
+    };
+    if (window.game) {
+        registerPrinterPlugin();
+    } else {
+        window.addEventListener('load', () => setTimeout(registerPrinterPlugin, 1500));
+    }
 }
\ No newline at end of file
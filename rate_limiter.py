@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按客户端IP的令牌桶限流
+每个 (路由, 客户端IP) 一个令牌桶：以 rate 个/秒补充，最多积攒 burst 个，每个请求消耗一个，
+没有令牌时直接返回 429，不做任何数据库查询。
+
+令牌桶保存在一张固定大小的共享内存哈希表中（匿名 mmap，在主进程中创建），gunicorn fork 出的
+所有工作进程共用同一张表和同一把进程间锁，因此限流按整台服务器计算，而不是按进程。
+桶补满后与新桶没有区别，过期即可被复用（按补满时间自然淘汰，不需要清理线程）；
+表满时淘汰最早补满的桶。检查一次只是几次 struct 读写，耗时为微秒级。
+
+锁在 LOCK_TIMEOUT 内拿不到时（例如持有锁的工作进程被杀死）直接放行，限流不会拖垮正常请求。
+"""
+
+import hashlib
+import math
+import mmap
+import multiprocessing
+import struct
+import time
+
+# 表中每个桶：键(路由和IP的哈希), 令牌数, 上次更新时间, 补满时间
+BUCKET = struct.Struct('<Qddd')
+
+# 一个键最多探测的相邻槽位数
+PROBE_LENGTH = 8
+
+LOCK_TIMEOUT = 0.05
+
+
+def bucket_key(route, client_ip):
+    """(路由, 客户端IP) 的64位键，各进程一致（不使用随机化的 hash()），0 保留为空槽"""
+    digest = hashlib.blake2b(f"{route}\0{client_ip}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class RateLimiter:
+    """多进程共享的令牌桶限流器"""
+
+    def __init__(self, rules=None, max_buckets=65536, enabled=True):
+        self.enabled = bool(enabled)
+        # 路由规则（如 /api/rate-plugin）-> (每秒补充的令牌数, 桶容量, 限制的请求方法或 None 表示全部)
+        self.rules = {}
+        for route, rule in (rules or {}).items():
+            rate = float(rule['rate'])
+            if not rate > 0:
+                raise ValueError(f"rate_limit.routes[{route!r}].rate 必须大于0: {rule['rate']}")
+            methods = rule.get('methods')
+            self.rules[route] = (
+                rate,
+                max(1.0, float(rule.get('burst', 1))),
+                frozenset(method.upper() for method in methods) if methods else None
+            )
+        self.slots = 1 << max(PROBE_LENGTH, int(max_buckets) - 1).bit_length()
+
+        self._table = mmap.mmap(-1, self.slots * BUCKET.size)
+        self._lock = multiprocessing.Lock()
+
+        # 统计计数器（每个进程各自计数）
+        self._allowed = 0
+        self._limited = {route: 0 for route in self.rules}
+        self._evictions = 0
+        self._lock_timeouts = 0
+
+    @classmethod
+    def from_config(cls, limit_config=None):
+        """根据 config.json 的 rate_limit 配置创建（在fork之前调用）"""
+        limit_config = limit_config or {}
+        return cls(
+            rules=limit_config.get('routes'),
+            max_buckets=limit_config.get('max_buckets', 65536),
+            enabled=limit_config.get('enabled', True)
+        )
+
+    def check(self, route, method, client_ip):
+        """消耗一个令牌：放行返回 None，被限流返回建议的重试秒数"""
+        if not self.enabled:
+            return None
+        rule = self.rules.get(route)
+        if rule is None:
+            return None
+        rate, burst, methods = rule
+        if methods is not None and method not in methods:
+            return None
+
+        key = bucket_key(route, client_ip)
+        if not self._lock.acquire(timeout=LOCK_TIMEOUT):
+            self._lock_timeouts += 1
+            return None
+        try:
+            now = time.monotonic()
+            offset, tokens, updated_at = self._find(key, now, burst)
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                self._limited[route] += 1
+                BUCKET.pack_into(self._table, offset, key, tokens, now, now + (burst - tokens) / rate)
+                return math.ceil((1 - tokens) / rate)
+            tokens -= 1
+            BUCKET.pack_into(self._table, offset, key, tokens, now, now + (burst - tokens) / rate)
+            self._allowed += 1
+            return None
+        finally:
+            self._lock.release()
+
+    def _find(self, key, now, burst):
+        """调用者持有锁：返回 (槽位偏移, 令牌数, 更新时间)；没有该键时分配一个满的新桶"""
+        mask = self.slots - 1
+        free = None
+        oldest = None
+        oldest_full_at = None
+        for probe in range(PROBE_LENGTH):
+            offset = ((key + probe) & mask) * BUCKET.size
+            slot_key, tokens, updated_at, full_at = BUCKET.unpack_from(self._table, offset)
+            if slot_key == key:
+                return offset, tokens, updated_at
+            if free is None and (slot_key == 0 or full_at <= now):
+                free = offset
+            if oldest_full_at is None or full_at < oldest_full_at:
+                oldest, oldest_full_at = offset, full_at
+        if free is None:
+            # 相邻槽位都是未补满的桶：淘汰最早补满的一个
+            free = oldest
+            self._evictions += 1
+        return free, burst, now
+
+    def after_fork(self):
+        """fork之后在子进程中调用：共享表和锁继续使用，只重置本进程的计数"""
+        self._allowed = 0
+        self._limited = {route: 0 for route in self.rules}
+        self._evictions = 0
+        self._lock_timeouts = 0
+
+    def stats(self):
+        """本进程的限流统计"""
+        return {
+            'enabled': self.enabled,
+            'routes': {
+                route: {'rate': rate, 'burst': burst, 'methods': sorted(methods) if methods else None}
+                for route, (rate, burst, methods) in self.rules.items()
+            },
+            'buckets': self.slots,
+            'allowed': self._allowed,
+            'limited': dict(self._limited),
+            'evictions': self._evictions,
+            'lock_timeouts': self._lock_timeouts
+        }
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评分异步写入队列
+评分请求校验后先写入本地持久化队列（SQLite文件）并立即返回，
+后台线程按批次取出评分写入数据库，每批每个插件只重算一次统计。
+进程崩溃或数据库不可用时评分保留在队列中，恢复后继续写入。
+多个工作进程可以共用同一个队列文件：每批评分先被"认领"，超时未完成的认领会被其他进程接手。
+
+整批写入因数据错误失败时（例如评分的插件已被删除），改为逐条写入：其余评分照常写入，
+写不进去的评分记一次失败，失败 max_attempts 次后移到 failed_ratings 表，不会一直堵住后面的评分。
+数据库不可用（连接类错误）时整批放回队列，不计失败次数。
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from circuit_breaker import is_connection_error
+
+
+class RatingQueue:
+    """持久化的评分写入队列"""
+
+    def __init__(self, spool_path, writer, batch_size=200, flush_interval=0.5,
+                 claim_timeout=60, retry_interval=5, max_attempts=5):
+        self.spool_path = spool_path
+        self.writer = writer
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.claim_timeout = float(claim_timeout)
+        self.retry_interval = float(retry_interval)
+        self.max_attempts = max(1, int(max_attempts))
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._conn = None
+        self._pid = None
+        self._thread = None
+        self._unflushed = 0
+
+        # 统计计数器
+        self._enqueued = 0
+        self._written = 0
+        self._batches = 0
+        self._failures = 0
+        self._dead_lettered = 0
+        self._last_error = None
+        self._last_batch_ms = 0.0
+
+    @classmethod
+    def from_config(cls, data_dir, writer, queue_config=None):
+        """根据 config.json 的 rating_queue 配置创建队列（相对路径相对于数据目录）"""
+        queue_config = queue_config or {}
+        spool_path = queue_config.get('spool_path', 'rating_queue.db')
+        if not os.path.isabs(spool_path):
+            spool_path = os.path.join(data_dir, spool_path)
+        return cls(
+            spool_path,
+            writer,
+            batch_size=queue_config.get('batch_size', 200),
+            flush_interval=queue_config.get('flush_interval', 0.5),
+            claim_timeout=queue_config.get('claim_timeout', 60),
+            retry_interval=queue_config.get('retry_interval', 5),
+            max_attempts=queue_config.get('max_attempts', 5)
+        )
+
+    def _connection(self):
+        """获取本进程的SQLite连接（fork后的子进程重新打开）"""
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+            conn = sqlite3.connect(self.spool_path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_ratings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # 旧版本创建的队列文件没有 attempts 列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(pending_ratings)")}
+            if 'attempts' not in columns:
+                conn.execute("ALTER TABLE pending_ratings ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS failed_ratings (
+                    id INTEGER PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error TEXT,
+                    failed_at REAL NOT NULL
+                )
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def enqueue(self, vote):
+        """写入一条评分（dict），落盘后返回"""
+        payload = json.dumps(vote, ensure_ascii=False)
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO pending_ratings (payload, created_at) VALUES (?, ?)",
+                (payload, time.time())
+            )
+            self._enqueued += 1
+            self._unflushed += 1
+            full = self._unflushed >= self.batch_size
+        # 攒够一批时立即唤醒写入线程，否则等到下一个 flush_interval
+        if full:
+            self._wakeup.set()
+
+    def _claim_batch(self):
+        """认领一批未处理（或认领已超时）的评分"""
+        token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""
+                    UPDATE pending_ratings SET claimed_by = ?, claimed_at = ?
+                    WHERE id IN (
+                        SELECT id FROM pending_ratings
+                        WHERE claimed_by IS NULL OR claimed_at < ?
+                        ORDER BY id LIMIT ?
+                    )
+                """, (token, now, now - self.claim_timeout, self.batch_size))
+                rows = conn.execute(
+                    "SELECT id, payload, attempts FROM pending_ratings WHERE claimed_by = ? ORDER BY id",
+                    (token,)
+                ).fetchall()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return token, rows
+
+    def _finish_batch(self, token, success):
+        with self._lock:
+            conn = self._connection()
+            if success:
+                conn.execute("DELETE FROM pending_ratings WHERE claimed_by = ?", (token,))
+            else:
+                conn.execute(
+                    "UPDATE pending_ratings SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?",
+                    (token,)
+                )
+
+    def _finish_row(self, row_id, success):
+        with self._lock:
+            conn = self._connection()
+            if success:
+                conn.execute("DELETE FROM pending_ratings WHERE id = ?", (row_id,))
+            else:
+                conn.execute(
+                    "UPDATE pending_ratings SET claimed_by = NULL, claimed_at = NULL WHERE id = ?",
+                    (row_id,)
+                )
+
+    def _record_failure(self, row_id, attempts, error):
+        """一条评分写入失败：失败次数加一，达到 max_attempts 时移到 failed_ratings 表"""
+        with self._lock:
+            self._last_error = str(error)
+            conn = self._connection()
+            if attempts + 1 < self.max_attempts:
+                conn.execute("""
+                    UPDATE pending_ratings SET attempts = attempts + 1, claimed_by = NULL, claimed_at = NULL
+                    WHERE id = ?
+                """, (row_id,))
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""
+                    INSERT OR REPLACE INTO failed_ratings (id, payload, created_at, attempts, error, failed_at)
+                    SELECT id, payload, created_at, attempts + 1, ?, ? FROM pending_ratings WHERE id = ?
+                """, (str(error), time.time(), row_id))
+                conn.execute("DELETE FROM pending_ratings WHERE id = ?", (row_id,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._dead_lettered += 1
+        print(f"❌ 评分写入失败 {self.max_attempts} 次，已移到 failed_ratings: {error}")
+
+    def _write_one_by_one(self, rows, votes):
+        """整批写入失败后逐条写入，返回写入条数；数据库不可用时把剩余评分放回队列并抛出异常"""
+        written = 0
+        for index, ((row_id, _, attempts), vote) in enumerate(zip(rows, votes)):
+            try:
+                self.writer([vote])
+            except Exception as e:
+                if is_connection_error(e):
+                    for remaining_id, _, _ in rows[index:]:
+                        self._finish_row(remaining_id, success=False)
+                    raise
+                self._record_failure(row_id, attempts, e)
+                continue
+            self._finish_row(row_id, success=True)
+            written += 1
+        return written
+
+    def flush_once(self):
+        """处理一批评分，返回处理条数（包括写入失败的）；队列为空返回0，数据库不可用时抛出异常"""
+        token, rows = self._claim_batch()
+        if not rows:
+            return 0
+
+        votes = [json.loads(payload) for _, payload, _ in rows]
+        start = time.monotonic()
+        try:
+            self.writer(votes)
+        except Exception as e:
+            if is_connection_error(e):
+                # 数据库不可用：整批放回队列，由 _run 稍后重试
+                self._finish_batch(token, success=False)
+                raise
+            if len(rows) == 1:
+                row_id, _, attempts = rows[0]
+                self._record_failure(row_id, attempts, e)
+                written = 0
+            else:
+                print(f"⚠️  评分批量写入失败，改为逐条写入: {e}")
+                written = self._write_one_by_one(rows, votes)
+        else:
+            self._finish_batch(token, success=True)
+            written = len(votes)
+
+        with self._lock:
+            self._written += written
+            self._batches += 1
+            self._last_batch_ms = round((time.monotonic() - start) * 1000, 3)
+        return len(votes)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            with self._lock:
+                self._unflushed = 0
+            try:
+                # 积压较多时连续处理，直到队列清空
+                while self.flush_once() >= self.batch_size:
+                    pass
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                    self._last_error = str(e)
+                print(f"⚠️  评分批量写入失败，{self.retry_interval}秒后重试: {e}")
+                time.sleep(self.retry_interval)
+
+    def start(self):
+        """启动后台写入线程（fork出的子进程需要重新启动）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='rating-queue-writer', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """fork之后在子进程中调用：重建锁和连接，父进程的线程不会被继承"""
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._conn = None
+        self._thread = None
+
+    def pending(self):
+        """队列中尚未写入数据库的评分数"""
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM pending_ratings").fetchone()[0]
+
+    def dead_letters(self):
+        """写入失败次数达到上限、已移出队列的评分数"""
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM failed_ratings").fetchone()[0]
+
+    def stats(self):
+        """队列统计信息"""
+        pending = self.pending()
+        failed = self.dead_letters()
+        with self._lock:
+            return {
+                'pending': pending,
+                'failed': failed,
+                'enqueued': self._enqueued,
+                'written': self._written,
+                'batches': self._batches,
+                'failures': self._failures,
+                'last_error': self._last_error,
+                'last_batch_ms': self._last_batch_ms,
+                'batch_size': self.batch_size
+            }
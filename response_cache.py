@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内响应缓存
+缓存已序列化好的JSON响应体，带过期时间(TTL)和条目数上限，线程安全
+
+fetch() / fetch_async() 合并同一个键的并发加载：缓存未命中时只有一个加载在进行，
+其他请求等待并共享它的结果；已过期但未超过 stale_ttl 的值直接返回，同时在后台刷新。
+高峰时数据库查询数取决于不同键的数量，而不是客户端数量。
+
+每个键最后一次加载成功的值另外保留（不受过期和失效影响），数据库不可用时 last_good() 取出作为降级响应。
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Flight:
+    """一次进行中的加载，等待者（线程或协程）共享其结果或异常"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        # 加载期间缓存被失效：结果仍返回给等待者，但不写入缓存
+        self.invalidated = False
+        # 异步加载的任务（保持引用，避免被回收）
+        self.task = None
+        self._lock = threading.Lock()
+        self._waiters = []
+
+    def finish(self):
+        with self._lock:
+            self.event.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.event.is_set():
+                return
+            self._waiters.append((loop, future))
+        await future
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class ResponseCache:
+    """带TTL和容量上限的LRU缓存"""
+
+    def __init__(self, ttl=10, max_entries=256, enabled=True, stale_ttl=30):
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.enabled = bool(enabled)
+        # 过期后仍可返回旧值（同时后台刷新）的时间
+        self.stale_ttl = max(0.0, float(stale_ttl))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._last_good = OrderedDict()
+        self._flights = {}
+        self._hits = 0
+        self._misses = 0
+        self._stale_hits = 0
+        self._coalesced = 0
+        self._refreshes = 0
+        self._evictions = 0
+        self._invalidations = 0
+        # 每次失效加一：在缓存之外加载的调用者据此判断加载期间是否发生过失效
+        self._generation = 0
+
+    @classmethod
+    def from_config(cls, cache_config=None):
+        """根据 config.json 的 cache 配置创建缓存"""
+        cache_config = cache_config or {}
+        return cls(
+            ttl=cache_config.get('ttl', 10),
+            max_entries=cache_config.get('max_entries', 256),
+            enabled=cache_config.get('enabled', True),
+            stale_ttl=cache_config.get('stale_ttl', 30)
+        )
+
+    def _lookup(self, key, allow_stale):
+        """返回 (值, 是否未过期)；未命中返回 (None, False)，超过 stale_ttl 的条目被删除"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1], True
+            if entry is not None and allow_stale and entry[0] + self.stale_ttl > now:
+                self._stale_hits += 1
+                return entry[1], False
+            if entry is not None and entry[0] + self.stale_ttl <= now:
+                del self._entries[key]
+            self._misses += 1
+            return None, False
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回 None"""
+        if not self.enabled:
+            return None
+        return self._lookup(key, allow_stale=False)[0]
+
+    def _store(self, key, value, ttl=None):
+        # 调用者持有锁
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+        self._last_good[key] = value
+        self._last_good.move_to_end(key)
+        while len(self._last_good) > self.max_entries:
+            self._last_good.popitem(last=False)
+
+    def generation(self):
+        """当前失效代数：查询前取得，写入时传给 set(generation=)"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, ttl=None, generation=None):
+        """写入缓存，超过容量时淘汰最久未使用的条目
+
+        传入 generation 时，如果取得它之后发生过失效（值可能是失效前的数据）则不写入，返回 False
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._store(key, value, ttl)
+        return True
+
+    def last_good(self, key):
+        """最后一次写入缓存的值（可能已过期或已失效），没有时返回 None"""
+        with self._lock:
+            return self._last_good.get(key)
+
+    # ------------------------------------------------------------ 合并加载
+
+    def _join(self, key):
+        """返回 (进行中的加载, 是否由调用者负责加载)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _land(self, key, flight, value, error):
+        """加载结束：写入缓存（未被失效时）并唤醒等待者"""
+        flight.value = value
+        flight.error = error
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if error is None and not flight.invalidated:
+                self._store(key, value)
+        flight.finish()
+
+    def _run(self, key, flight, load):
+        try:
+            value = load()
+        except BaseException as e:
+            self._land(key, flight, None, e)
+        else:
+            self._land(key, flight, value, None)
+
+    async def _run_async(self, key, flight, load):
+        try:
+            value = await load()
+        except BaseException as e:
+            self._land(key, flight, None, e)
+        else:
+            self._land(key, flight, value, None)
+
+    def _refresh_done(self, key, flight):
+        # 后台刷新没有等待者，失败时只记录日志，旧值继续使用到 stale_ttl 结束
+        if flight.error is not None:
+            print(f"⚠️  缓存后台刷新失败 {key}: {flight.error}")
+
+    def _refresh_in_background(self, key, flight, load):
+        self._run(key, flight, load)
+        self._refresh_done(key, flight)
+
+    def fetch(self, key, load):
+        """读取缓存，未命中时调用 load() 加载并写入（工作线程中调用）
+
+        同一个键同时只有一次加载，其他线程等待并共享结果（load 抛出的异常同样抛给每个等待者）；
+        已过期但未超过 stale_ttl 的值直接返回，并在后台线程中刷新
+        """
+        if not self.enabled:
+            return load()
+        value, fresh = self._lookup(key, allow_stale=True)
+        if value is not None:
+            if not fresh:
+                flight, leader = self._join(key)
+                if leader:
+                    self._refreshes += 1
+                    threading.Thread(target=self._refresh_in_background, args=(key, flight, load),
+                                     name='cache-refresh', daemon=True).start()
+            return value
+
+        flight, leader = self._join(key)
+        if leader:
+            self._run(key, flight, load)
+        else:
+            flight.event.wait()
+        return flight.result()
+
+    async def fetch_async(self, key, load):
+        """fetch() 的协程版本，load 为协程函数（事件循环中调用）
+
+        加载在单独的任务中运行：发起加载的请求被取消时，加载仍会完成并把结果交给其他等待者
+        """
+        if not self.enabled:
+            return await load()
+        value, fresh = self._lookup(key, allow_stale=True)
+        if value is not None:
+            if not fresh:
+                flight, leader = self._join(key)
+                if leader:
+                    self._refreshes += 1
+                    flight.task = asyncio.ensure_future(self._run_async(key, flight, load))
+                    flight.task.add_done_callback(lambda task: self._refresh_done(key, flight))
+            return value
+
+        flight, leader = self._join(key)
+        if leader:
+            flight.task = asyncio.ensure_future(self._run_async(key, flight, load))
+        await flight.wait_async()
+        return flight.result()
+
+    # ------------------------------------------------------------ 失效
+
+    def _invalidate_flights(self, keys):
+        # 调用者持有锁：进行中的加载可能读到了失效前的数据，结果不再写入缓存
+        self._generation += 1
+        for key in keys:
+            flight = self._flights.pop(key, None)
+            if flight is not None:
+                flight.invalidated = True
+
+    def invalidate(self, key):
+        """删除单个缓存条目"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+            self._invalidate_flights([key])
+
+    def invalidate_prefix(self, prefix):
+        """删除所有以 prefix 开头的缓存条目"""
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            self._invalidations += len(keys)
+            self._invalidate_flights([k for k in self._flights if k.startswith(prefix)])
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._invalidate_flights(list(self._flights))
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'stale_ttl': self.stale_ttl,
+                'stale_hits': self._stale_hits,
+                'coalesced': self._coalesced,
+                'refreshes': self._refreshes,
+                'in_flight': len(self._flights),
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
@@ -14,7 +14,7 @@ def main():
     print("=" * 40)
     
     # 设置环境变量强制Flask使用5218端口
-    os.environ['FLASK_APP'] = 'app.py'
+    os.environ['FLASK_APP'] = 'app:create_app()'
     os.environ['FLASK_ENV'] = 'development'
     os.environ['FLASK_RUN_HOST'] = '0.0.0.0'
     os.environ['FLASK_RUN_PORT'] = '5218'
@@ -51,8 +51,8 @@ def main():
         
         # 备用方法：直接导入并运行
         try:
-            from app import app
-            app.run(host='0.0.0.0', port=5218, debug=True)
+            from app import create_app
+            create_app().run(host='0.0.0.0', port=5218, debug=True, use_reloader=False)
         except Exception as e2:
             print(f"❌ 备用方法也失败: {e2}")
 
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务器启动入口
+根据 config.json 中 server.mode 选择运行方式:
+  - development: Werkzeug开发服务器（单进程多线程）
+  - production:  gunicorn 预fork多进程（未安装时退回 waitress，再退回开发服务器）
+  - asgi:        gunicorn + uvicorn 工作进程，热点接口以协程处理（未安装gunicorn时单进程运行uvicorn）
+
+用法:
+    python3 serve.py                    # 按配置启动
+    python3 serve.py --mode development # 临时使用开发服务器
+    python3 serve.py --mode asgi        # 异步模式（需要 uvicorn，MySQL 后端还需要 aiomysql）
+    python3 serve.py --port 5218        # 覆盖端口
+    python3 serve.py --reload           # 平滑重新加载正在运行的服务器（新代码和新配置）
+
+应用在主进程中加载一次，工作进程由主进程fork（相当于 gunicorn 的 preload_app），
+因此 HUP 换出的新工作进程仍运行旧代码和旧配置，只用于回收工作进程:
+    kill -HUP $(cat server.pid)
+
+部署新代码或修改 config.json 后用 --reload 重新加载（gunicorn 模式），不中断请求:
+  1. 向旧主进程发送 USR2：旧主进程以相同的命令行重新执行出新主进程，新主进程继承监听套接字，
+     重新加载代码和配置后写入 server.pid.2 并启动工作进程；此时新旧工作进程同时接受连接
+  2. 新主进程就绪后向旧主进程发送 TERM：旧主进程不再接受连接，等待进行中的请求完成
+     （最多 graceful_timeout 秒）后退出，新主进程把自己的 pid 写回 server.pid
+新主进程启动失败时旧主进程继续运行。监听地址沿用旧主进程的套接字，修改 server.host/port 需要完整重启。
+"""
+
+import argparse
+import importlib.util
+import os
+import signal
+import sys
+import threading
+import time
+
+import app as app_module
+import asgi_app
+
+# 新主进程等待旧主进程释放实时推送端口时的重试间隔（秒）
+LIVE_HUB_RETRY_INTERVAL = 0.5
+# 新主进程写入 pid 文件后观察多久仍在运行才让旧主进程退出（秒）
+RELOAD_SETTLE_SECONDS = 2
+
+
+def module_available(name):
+    """检查可选依赖是否已安装"""
+    return importlib.util.find_spec(name) is not None
+
+
+def default_workers():
+    """默认工作进程数：CPU核心数"""
+    return os.cpu_count() or 1
+
+
+def reexecuted_master():
+    """当前进程是否为 gunicorn 收到 USR2 后重新执行出的新主进程（旧主进程尚未退出）"""
+    return 'GUNICORN_PID' in os.environ
+
+
+def listen_port(address):
+    """TCP 监听地址取端口，Unix 套接字取路径"""
+    return address[1] if isinstance(address, tuple) else address
+
+
+def when_ready(server):
+    """gunicorn钩子：主进程监听就绪、工作进程启动之前"""
+    if not server.master_pid:
+        return
+    # 重新加载的新主进程继承旧主进程的监听套接字，配置中新的监听地址不会生效
+    inherited = {listen_port(listener.cfg_addr) for listener in server.LISTENERS}
+    configured = {listen_port(address) for address in server.cfg.address}
+    if inherited != configured:
+        listeners = ','.join(str(listener) for listener in server.LISTENERS)
+        print(f"⚠️  重新加载沿用原监听地址 {listeners}，修改 server.host/port 需要完整重启")
+
+
+def post_fork(server, worker):
+    """gunicorn钩子：工作进程fork后重建连接池并启动后台线程"""
+    app_module.reinit_after_fork()
+
+
+def asgi_post_fork(server, worker):
+    """gunicorn钩子（ASGI模式）：另外重建异步连接池"""
+    asgi_app.reinit_after_fork()
+
+
+def asgi_worker_class():
+    """uvicorn 的 gunicorn 工作进程类（新版本在单独的 uvicorn-worker 包中）"""
+    if module_available('uvicorn_worker'):
+        return 'uvicorn_worker.UvicornWorker'
+    return 'uvicorn.workers.UvicornWorker'
+
+
+def wsgi_worker_class(name):
+    """gthread 换成退出时处理完已接受连接的版本（见 graceful_worker.py）"""
+    if name == 'gthread':
+        return 'graceful_worker.DrainingThreadWorker'
+    return name
+
+
+def gunicorn_options(server_config, host, port):
+    """把 config.json 的 server 配置转换为 gunicorn 配置"""
+    return {
+        'bind': f"{host}:{port}",
+        'workers': server_config.get('workers') or default_workers(),
+        'worker_class': wsgi_worker_class(server_config.get('worker_class', 'gthread')),
+        'threads': server_config.get('threads', 4),
+        'keepalive': server_config.get('keepalive', 5),
+        'timeout': server_config.get('timeout', 30),
+        'graceful_timeout': server_config.get('graceful_timeout', 30),
+        'max_requests': server_config.get('max_requests', 0),
+        'max_requests_jitter': server_config.get('max_requests_jitter', 0),
+        'backlog': server_config.get('backlog', 2048),
+        'pidfile': server_config.get('pidfile'),
+        'accesslog': server_config.get('accesslog'),
+        'when_ready': when_ready,
+        'post_fork': post_fork
+    }
+
+
+def start_live_hub():
+    """在 gunicorn 主进程中启动实时推送中心
+
+    重新加载时旧主进程仍占用推送端口：新主进程在后台重试，旧主进程退出后接管
+    """
+    hub = app_module.LIVE_HUB
+    if not reexecuted_master():
+        hub.start()
+        return
+    if not hub.enabled or hub.start(quiet=True):
+        return
+
+    def take_over():
+        while not hub.start(quiet=True):
+            time.sleep(LIVE_HUB_RETRY_INTERVAL)
+
+    print("⏳ 实时推送端口仍由旧主进程占用，旧主进程退出后接管")
+    threading.Thread(target=take_over, name='live-hub-takeover', daemon=True).start()
+
+
+def run_gunicorn(application, options):
+    """使用 gunicorn 预fork多进程运行
+
+    应用已在主进程中初始化（静态资源只构建一次，工作进程通过fork共享），
+    工作进程在 post_fork 钩子中各自重建数据库连接池。
+    HUP 只替换工作进程，不会重新加载代码和配置；部署新版本用 USR2 重新执行主进程（见 reload_server）
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    StandaloneApplication(application, options).run()
+
+
+def run_uvicorn(application, server_config, host, port):
+    """单进程运行 uvicorn（Windows等不支持fork的平台）"""
+    import uvicorn
+
+    uvicorn.run(
+        application,
+        host=host,
+        port=port,
+        backlog=server_config.get('backlog', 2048),
+        timeout_keep_alive=server_config.get('keepalive', 5)
+    )
+
+
+def run_waitress(flask_app, server_config, host, port):
+    """使用 waitress 多线程运行（Windows等不支持fork的平台）"""
+    from waitress import serve
+
+    serve(
+        flask_app,
+        host=host,
+        port=port,
+        threads=server_config.get('threads', 4) * default_workers(),
+        backlog=server_config.get('backlog', 2048),
+        channel_timeout=server_config.get('timeout', 30)
+    )
+
+
+def run_server(host=None, port=None, mode=None, debug=False, config_path=None):
+    """按配置启动服务器，参数不为空时覆盖配置"""
+    # 后台线程在确定运行方式后再启动：gunicorn 由工作进程在fork后启动
+    flask_app = app_module.create_app(config_path, start_background=False)
+    server_config = app_module.CONFIG['server']
+    host = host or server_config['host']
+    port = port or server_config['port']
+    mode = mode or server_config.get('mode', 'development')
+
+    # 清理上次运行留下的各进程指标快照；重新加载时旧工作进程的计数仍要累计，不能清理
+    if not reexecuted_master():
+        app_module.METRICS.registry.clear_snapshots()
+    app_module.print_startup_info()
+    print(f"🚀 启动服务器: {host}:{port} ({mode})")
+
+    if mode == 'asgi':
+        if not module_available('uvicorn'):
+            raise RuntimeError("ASGI模式需要安装uvicorn: pip install uvicorn uvicorn-worker")
+        application = asgi_app.build_asgi_app(flask_app)
+        if sys.platform != 'win32' and module_available('gunicorn'):
+            options = gunicorn_options(server_config, host, port)
+            options['worker_class'] = asgi_worker_class()
+            options['post_fork'] = asgi_post_fork
+            print(f"⚙️  gunicorn: {options['workers']} 个 uvicorn 工作进程")
+            start_live_hub()
+            run_gunicorn(application, options)
+            return
+        app_module.start_background_tasks()
+        print("⚙️  uvicorn: 单进程模式")
+        run_uvicorn(application, server_config, host, port)
+        return
+
+    if mode == 'production':
+        if sys.platform != 'win32' and module_available('gunicorn'):
+            options = gunicorn_options(server_config, host, port)
+            print(f"⚙️  gunicorn: {options['workers']} 个工作进程 x {options['threads']} 线程")
+            # 实时推送中心运行在主进程中，工作进程重启不影响已建立的推送连接
+            start_live_hub()
+            run_gunicorn(flask_app, options)
+            return
+        app_module.start_background_tasks()
+        if module_available('waitress'):
+            print("⚙️  waitress: 多线程模式")
+            run_waitress(flask_app, server_config, host, port)
+            return
+        print("⚠️  未安装gunicorn/waitress，退回开发服务器: pip install gunicorn")
+    else:
+        app_module.start_background_tasks()
+
+    flask_app.run(
+        host=host,
+        port=port,
+        debug=debug,
+        use_reloader=False,  # 避免自动重启导致端口问题
+        threaded=True
+    )
+
+
+def read_pid(path):
+    """读取 pid 文件，文件不存在或进程已退出时返回 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            pid = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return None
+    if pid <= 0:
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    return pid
+
+
+def wait_for(condition, timeout, interval=0.1):
+    """等待 condition() 返回真值，超时返回 None"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = condition()
+        if result or time.monotonic() >= deadline:
+            return result or None
+        time.sleep(interval)
+
+
+def reload_server(config_path=None):
+    """平滑重新加载正在运行的 gunicorn 服务器（新代码和新配置），成功返回0
+
+    USR2 让旧主进程重新执行出新主进程（pid 写入 <pidfile>.2），新主进程保持运行后 TERM 旧主进程，
+    等待新主进程把 pid 写回 <pidfile>。新主进程启动失败时旧主进程继续运行。
+    pid 文件的相对路径相对于当前目录，需要在启动服务器的目录中运行。
+    """
+    config = app_module.load_config(config_path)
+    if not config:
+        return 1
+    server_config = config['server']
+    pidfile = server_config.get('pidfile')
+    if not pidfile or not hasattr(signal, 'SIGUSR2'):
+        print("❌ 平滑重新加载需要 gunicorn 模式并配置 server.pidfile")
+        return 1
+
+    old_pid = read_pid(pidfile)
+    if old_pid is None:
+        print(f"❌ 服务器未运行（{pidfile} 不存在或进程已退出）")
+        return 1
+    new_pidfile = f"{pidfile}.2"
+    if read_pid(new_pidfile) is not None:
+        print(f"❌ 上一次重新加载尚未完成（{new_pidfile} 中的进程仍在运行）")
+        return 1
+
+    os.kill(old_pid, signal.SIGUSR2)
+    print(f"🔄 已通知主进程 {old_pid} 重新加载，等待新主进程启动...")
+    # 新主进程先加载应用（构建静态资源、连接数据库）再写入 pid 文件
+    new_pid = wait_for(lambda: read_pid(new_pidfile), server_config.get('timeout', 30) + 30)
+    if new_pid is not None:
+        time.sleep(RELOAD_SETTLE_SECONDS)
+    if new_pid is None or read_pid(new_pidfile) != new_pid:
+        print("❌ 新主进程启动失败（见服务器日志），旧主进程继续运行")
+        return 1
+
+    os.kill(old_pid, signal.SIGTERM)
+    print(f"⏳ 新主进程 {new_pid} 已就绪，旧主进程 {old_pid} 正在等待进行中的请求完成...")
+    if wait_for(lambda: read_pid(pidfile) == new_pid, server_config.get('graceful_timeout', 30) + 10) is None:
+        print(f"⚠️  旧主进程 {old_pid} 尚未退出，新主进程 {new_pid} 已在处理请求")
+        return 1
+    print(f"✅ 重新加载完成，主进程: {new_pid}")
+    return 0
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='办公室生存游戏服务器')
+    parser.add_argument('--host', help='监听地址，默认读取配置')
+    parser.add_argument('--port', type=int, help='监听端口，默认读取配置')
+    parser.add_argument('--mode', choices=['development', 'production', 'asgi'], help='运行模式，默认读取配置')
+    parser.add_argument('--config', help='配置文件路径，默认 config.json')
+    parser.add_argument('--reload', action='store_true',
+                        help='平滑重新加载正在运行的服务器（gunicorn 模式，加载新代码和新配置）')
+    args = parser.parse_args()
+
+    if args.reload:
+        sys.exit(reload_server(config_path=args.config))
+
+    try:
+        run_server(host=args.host, port=args.port, mode=args.mode, config_path=args.config)
+    except KeyboardInterrupt:
+        print("\n👋 服务器已停止")
+    except Exception as e:
+        print(f"❌ 服务器启动失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 兼容连接
+以 PyMySQL 连接的接口访问本地 SQLite 文件，把应用用到的 MySQL 语法
+（%s 占位符、ON DUPLICATE KEY UPDATE、FOR UPDATE、TRUE/FALSE）转换为 SQLite 语法。
+作为 database.backend = "sqlite" 的存储后端（见 storage.py），也用作基准测试的数据库替身：
+无需安装 MySQL，也没有网络往返。
+ASGI模式使用 connect_async，接口与 aiomysql 一致，语句在线程池中执行。
+"""
+
+import asyncio
+import datetime
+import decimal
+import re
+import sqlite3
+import threading
+
+import pymysql.cursors
+
+# 与 database_schema.sql 对应的表结构
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plugins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plugin_name VARCHAR(100) NOT NULL UNIQUE,
+    plugin_id VARCHAR(50) NOT NULL UNIQUE,
+    description TEXT,
+    author VARCHAR(100) DEFAULT '未知作者',
+    version VARCHAR(20) DEFAULT '1.0.0',
+    icon VARCHAR(20) DEFAULT 'plugin',
+    color VARCHAR(20) DEFAULT '#4CAF50',
+    category VARCHAR(50) DEFAULT 'general',
+    target_complaints TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_category ON plugins(category);
+CREATE INDEX IF NOT EXISTS idx_plugins_newest ON plugins(is_active, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_plugins_category_newest ON plugins(category, is_active, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_plugins_name ON plugins(is_active, plugin_name);
+CREATE INDEX IF NOT EXISTS idx_plugins_category_name ON plugins(category, is_active, plugin_name);
+
+CREATE TABLE IF NOT EXISTS plugin_ratings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plugin_id INTEGER NOT NULL REFERENCES plugins(id) ON DELETE CASCADE,
+    user_ip VARCHAR(45) NOT NULL,
+    user_agent TEXT,
+    rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+    comment TEXT,
+    submitted_at DOUBLE NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (plugin_id, user_ip)
+);
+CREATE INDEX IF NOT EXISTS idx_plugin_rating ON plugin_ratings(plugin_id, rating);
+CREATE INDEX IF NOT EXISTS idx_user_ip ON plugin_ratings(user_ip);
+CREATE INDEX IF NOT EXISTS idx_created_at ON plugin_ratings(created_at);
+CREATE INDEX IF NOT EXISTS idx_plugin_recent ON plugin_ratings(plugin_id, created_at);
+
+CREATE TABLE IF NOT EXISTS plugin_statistics (
+    plugin_id INTEGER PRIMARY KEY REFERENCES plugins(id) ON DELETE CASCADE,
+    total_ratings INTEGER DEFAULT 0,
+    average_rating DECIMAL(3,2) DEFAULT 0.00,
+    ranking_score DECIMAL4(6,4) NOT NULL DEFAULT 3.0000,
+    rating_1_count INTEGER DEFAULT 0,
+    rating_2_count INTEGER DEFAULT 0,
+    rating_3_count INTEGER DEFAULT 0,
+    rating_4_count INTEGER DEFAULT 0,
+    rating_5_count INTEGER DEFAULT 0,
+    last_rating_at TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_plugin_details_rating ON plugin_statistics(average_rating DESC, total_ratings DESC);
+CREATE INDEX IF NOT EXISTS idx_plugin_ranking ON plugin_statistics(ranking_score DESC, plugin_id);
+CREATE INDEX IF NOT EXISTS idx_plugin_popular ON plugin_statistics(total_ratings DESC, average_rating DESC);
+
+CREATE VIEW IF NOT EXISTS plugin_details AS
+SELECT
+    p.id, p.plugin_name, p.plugin_id, p.description, p.author, p.version,
+    p.icon, p.color, p.category, p.target_complaints, p.created_at, p.is_active,
+    COALESCE(s.total_ratings, 0) as total_ratings,
+    COALESCE(s.average_rating, 0.00) as average_rating,
+    COALESCE(s.ranking_score, 3.0000) as ranking_score,
+    COALESCE(s.rating_1_count, 0) as rating_1_count,
+    COALESCE(s.rating_2_count, 0) as rating_2_count,
+    COALESCE(s.rating_3_count, 0) as rating_3_count,
+    COALESCE(s.rating_4_count, 0) as rating_4_count,
+    COALESCE(s.rating_5_count, 0) as rating_5_count,
+    s.last_rating_at
+FROM plugins p
+LEFT JOIN plugin_statistics s ON p.id = s.plugin_id
+WHERE p.is_active = 1
+ORDER BY s.ranking_score DESC, p.id ASC;
+
+CREATE TABLE IF NOT EXISTS game_saves (
+    save_id VARCHAR(64) PRIMARY KEY,
+    version INTEGER NOT NULL,
+    snapshot_version INTEGER NOT NULL,
+    snapshot BLOB NOT NULL,
+    pending_patches INTEGER NOT NULL DEFAULT 0,
+    document_size INTEGER NOT NULL DEFAULT 0,
+    written_at INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_game_saves_compact ON game_saves(pending_patches, written_at);
+
+CREATE TABLE IF NOT EXISTS game_save_patches (
+    save_id VARCHAR(64) NOT NULL REFERENCES game_saves(save_id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    patch BLOB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (save_id, version)
+);
+
+CREATE TABLE IF NOT EXISTS leaderboard_scores (
+    board VARCHAR(50) NOT NULL,
+    player_id CHAR(20) NOT NULL,
+    player_name VARCHAR(32) NOT NULL,
+    score DOUBLE NOT NULL,
+    achieved_at DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL,
+    PRIMARY KEY (board, player_id)
+);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON leaderboard_scores(board, score DESC, achieved_at, player_id);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_updated ON leaderboard_scores(updated_at);
+
+-- MySQL 的 ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER IF NOT EXISTS plugins_touch_updated_at
+AFTER UPDATE ON plugins FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE plugins SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+"""
+
+# 与 database_schema.sql 第5节相同的初始插件（只在 plugins 表为空时写入）
+INITIAL_PLUGINS = [
+    ('智能空调系统', 'air-conditioning', '安装智能空调系统，自动调节办公室温度，减少员工关于温度的抱怨',
+     'Kiro开发团队', '2.0.0', 'snowflake', '#2196F3', 'facility', '["空调问题", "异味问题"]'),
+    ('打印机维护系统', 'printer-maintenance', '定期维护打印机，减少卡纸和故障，显示实时工作状态',
+     '办公设备专家', '3.0.0', 'printer', '#4CAF50', 'equipment', '["打印机问题", "排队问题"]'),
+    ('智能照明系统', 'smart-lighting', '安装智能LED照明系统，自动调节光线亮度，减少眼疲劳',
+     '照明专家', '1.0.0', 'lightbulb', '#FFC107', 'facility', '["光线问题", "健康问题"]'),
+    ('专业清洁服务', 'cleaning-service', '定期清洁办公室，保持环境整洁，显示清洁效果',
+     '清洁专家', '2.0.0', 'broom', '#FF9800', 'service', '["清洁问题", "异味问题"]'),
+    ('网络基础设施升级', 'network-upgrade', '升级网络设备，提供稳定高速的网络连接',
+     '网络工程师', '1.5.0', 'network', '#9C27B0', 'infrastructure', '["网络问题", "电脑问题"]'),
+]
+
+
+def _parse_timestamp(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+def _decimal_parser(places):
+    # 与 PyMySQL 一样按列的小数位数返回 Decimal
+    exponent = decimal.Decimal(1).scaleb(-places)
+    return lambda value: decimal.Decimal(value.decode()).quantize(exponent)
+
+
+sqlite3.register_converter('TIMESTAMP', _parse_timestamp)
+# SQLite 转换函数只按类型名的第一个词选择，不同小数位数的列用不同类型名：
+# DECIMAL 为 DECIMAL(3,2)，DECIMAL4 为 DECIMAL(6,4)（两者都是 NUMERIC 亲和性）
+sqlite3.register_converter('DECIMAL', _decimal_parser(2))
+sqlite3.register_converter('DECIMAL4', _decimal_parser(4))
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(decimal.Decimal, str)
+
+_TRANSLATIONS = [
+    (re.compile(r'\bVALUES\((\w+)\)'), r'excluded.\1'),
+    (re.compile(r'\bON DUPLICATE KEY UPDATE\b'), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bFOR UPDATE\b'), ''),
+    (re.compile(r'\bTRUE\b'), '1'),
+    (re.compile(r'\bFALSE\b'), '0'),
+    (re.compile(r'%s'), '?'),
+]
+
+_translated = {}
+_translated_lock = threading.Lock()
+
+
+def translate(sql):
+    """把 MySQL 语句转换为 SQLite 语句（结果缓存）"""
+    result = _translated.get(sql)
+    if result is None:
+        result = sql
+        for pattern, replacement in _TRANSLATIONS:
+            result = pattern.sub(replacement, result)
+        with _translated_lock:
+            _translated[sql] = result
+    return result
+
+
+class Cursor:
+    """PyMySQL 风格的游标"""
+
+    def __init__(self, connection, as_dict=False):
+        self._connection = connection
+        self._cursor = connection._raw.cursor()
+        self._as_dict = as_dict
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, sql, args=None):
+        self._cursor.execute(translate(sql), tuple(args or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, sql, args):
+        self._cursor.executemany(translate(sql), [tuple(row) for row in args])
+        return self._cursor.rowcount
+
+    def _convert(self, row):
+        if row is None or not self._as_dict:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """PyMySQL 风格的 SQLite 连接（自动提交，begin() 开启写事务）"""
+
+    def __init__(self, path):
+        self._raw = sqlite3.connect(
+            path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self._raw.execute("PRAGMA journal_mode=WAL")
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+        self._raw.execute("PRAGMA foreign_keys=ON")
+        self.open = True
+
+    def cursor(self, cursor_class=None):
+        as_dict = cursor_class is not None and issubclass(cursor_class, pymysql.cursors.DictCursorMixin)
+        return Cursor(self, as_dict=as_dict)
+
+    def begin(self):
+        # 立即获取写锁，相当于 MySQL 事务中 SELECT ... FOR UPDATE 的效果
+        self._raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self._raw.in_transaction:
+            self._raw.execute("COMMIT")
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self._raw.execute("SELECT 1")
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self._raw.close()
+
+
+def connect(database, **ignored):
+    """与 pymysql.connect 参数兼容的连接函数，database 为 SQLite 文件路径"""
+    return Connection(database)
+
+
+class AsyncCursor:
+    """aiomysql 风格的游标：语句在线程池中执行，结果取回后 fetch 不再阻塞"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._rows = []
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def _execute(self, method, sql, args):
+        result = method(sql, args)
+        self._rows = self._cursor.fetchall() if self._cursor.description else []
+        return result
+
+    async def execute(self, sql, args=None):
+        return await asyncio.to_thread(self._execute, self._cursor.execute, sql, args)
+
+    async def executemany(self, sql, args):
+        return await asyncio.to_thread(self._execute, self._cursor.executemany, sql, args)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    async def close(self):
+        self._cursor.close()
+
+
+class AsyncConnection:
+    """aiomysql 风格的 SQLite 连接（ASGI模式使用），每个操作在线程池中执行，不阻塞事件循环"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    @property
+    def closed(self):
+        return not self._connection.open
+
+    async def cursor(self, cursor_class=None):
+        return AsyncCursor(self._connection.cursor(cursor_class))
+
+    async def begin(self):
+        await asyncio.to_thread(self._connection.begin)
+
+    async def commit(self):
+        await asyncio.to_thread(self._connection.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._connection.rollback)
+
+    async def ping(self, reconnect=False):
+        await asyncio.to_thread(self._connection.ping)
+
+    def close(self):
+        self._connection.close()
+
+
+async def connect_async(database, **ignored):
+    """与 aiomysql.connect 参数兼容的连接函数，database 为 SQLite 文件路径"""
+    return AsyncConnection(await asyncio.to_thread(Connection, database))
+
+
+def init_schema(path, initial_data=False):
+    """创建表结构（已存在时不做修改），initial_data 为真时在空库中写入初始插件"""
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        # 旧版本创建的数据库没有 submitted_at 列
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(plugin_ratings)")}
+        if columns and 'submitted_at' not in columns:
+            connection.execute("ALTER TABLE plugin_ratings ADD COLUMN submitted_at DOUBLE NOT NULL DEFAULT 0")
+        connection.executescript(SCHEMA)
+        if initial_data:
+            with connection:
+                if connection.execute("SELECT COUNT(*) FROM plugins").fetchone()[0] == 0:
+                    connection.executemany("""
+                        INSERT OR IGNORE INTO plugins (plugin_name, plugin_id, description, author, version,
+                                                       icon, color, category, target_complaints)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, INITIAL_PLUGINS)
+    finally:
+        connection.close()
@@ -10,6 +10,8 @@ import os
 import subprocess
 import json
 
+from config_manager import ConfigManager, read_config, read_json
+
 def check_python_version():
     """检查Python版本"""
     if sys.version_info < (3, 7):
@@ -25,45 +27,16 @@ def check_config():
     
     if not os.path.exists(config_path):
         print("❌ 配置文件不存在，创建默认配置...")
-        default_config = {
-            "database": {
-                "host": "tx-db.cbore8wpy3mc.us-east-2.rds.amazonaws.com",
-                "port": 3306,
-                "username": "demo",
-                "password": "Demo1234",
-                "database": "game",
-                "charset": "utf8mb4",
-                "autocommit": True
-            },
-            "server": {
-                "host": "0.0.0.0",
-                "port": 5218,
-                "debug": True
-            },
-            "app": {
-                "name": "办公室生存游戏",
-                "version": "1.0.0",
-                "description": "插件评分系统"
-            }
-        }
-        
-        try:
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=4, ensure_ascii=False)
-            print("✅ 默认配置文件已创建")
-        except Exception as e:
-            print(f"❌ 创建配置文件失败: {e}")
+        if not ConfigManager(config_path).create_default_config():
             return False
     
     # 检查端口配置
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        
-        current_port = config.get('server', {}).get('port', 5000)
+        current_port = read_config(config_path)['server']['port']
         if current_port != 5218:
             print(f"⚠️  当前端口为 {current_port}，修改为5218...")
-            config['server']['port'] = 5218
+            config = read_json(config_path)
+            config.setdefault('server', {})['port'] = 5218
             
             with open(config_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
@@ -107,6 +80,14 @@ def check_dependencies():
 
 def test_database_connection():
     """测试数据库连接"""
+    try:
+        backend = read_config('config.json')['database']['backend']
+    except Exception:
+        backend = 'mysql'
+    if backend == 'sqlite':
+        print("✅ 使用本地SQLite数据库，启动时自动创建")
+        return True
+    
     print("🔍 测试数据库连接...")
     try:
         result = subprocess.run([
@@ -140,16 +121,11 @@ def start_plugin_server():
     print("=" * 60)
     
     try:
-        # 启动Flask应用
-        from app import app, CONFIG
+        # 按配置文件中的 server.mode 启动开发或生产服务器
+        from serve import run_server
         
         # 确保使用5218端口
-        app.run(
-            host='0.0.0.0',
-            port=5218,
-            debug=True,
-            threaded=True
-        )
+        run_server(host='0.0.0.0', port=5218)
         
     except KeyboardInterrupt:
         print("\n👋 服务器已停止")
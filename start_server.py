@@ -85,19 +85,10 @@ def start_server():
     """启动服务器"""
     print("\n🚀 启动游戏服务器...")
     try:
-        # 导入并运行Flask应用
-        from app import app, print_startup_info, CONFIG
+        # 按配置文件中的服务器设置（server.mode）启动开发或生产服务器
+        from serve import run_server
         
-        print_startup_info()
-        
-        # 使用配置文件中的服务器设置
-        server_config = CONFIG['server']
-        app.run(
-            host=server_config['host'],
-            port=server_config['port'],
-            debug=False,  # 关闭debug避免重启问题
-            threaded=True
-        )
+        run_server()
     except KeyboardInterrupt:
         print("\n👋 服务器已停止")
     except Exception as e:
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态文件索引
+启动时扫描一次可访问的静态文件，记录大小、修改时间、MIME类型和ETag，
+请求时只需一次字典查找；不在索引中的路径一律视为不存在（白名单）
+"""
+
+import fnmatch
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+
+# 不对外提供的文件（配置、服务端源码、数据库脚本、SQLite数据库及其日志、旧版本的运行时数据目录），
+# static.exclude 中的模式在此基础上追加
+DEFAULT_EXCLUDE = ['config.json', '*.py', '*.pyc', '*.sh', '*.sql',
+                   '*.db', '*.db-wal', '*.db-shm', '*.db-journal', 'data/*']
+
+
+class StaticEntry:
+    """一个可访问的静态文件"""
+
+    __slots__ = ('path', 'rel_path', 'size', 'mtime', 'mimetype', 'etag')
+
+    def __init__(self, path, rel_path, size, mtime, mimetype, etag):
+        self.path = path
+        self.rel_path = rel_path
+        self.size = size
+        self.mtime = mtime
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+def file_digest(path):
+    """计算文件内容哈希"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def make_entry(path, rel_path, mimetype=None, etag=None):
+    """读取文件元数据生成索引条目"""
+    st = os.stat(path)
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+    if etag is None:
+        etag = file_digest(path)
+    return StaticEntry(path, rel_path, st.st_size, st.st_mtime, mimetype, etag)
+
+
+class StaticIndex:
+    """静态文件白名单索引"""
+
+    def __init__(self, static_dir, exclude=None, exclude_dirs=None):
+        self.static_dir = static_dir
+        self.exclude = DEFAULT_EXCLUDE + list(exclude or [])
+        self.exclude_dirs = set(exclude_dirs or [])
+        self._entries = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.loaded_at = None
+
+    @classmethod
+    def from_config(cls, static_dir, static_config=None, exclude_dirs=None):
+        """根据 config.json 的 static 配置创建索引"""
+        static_config = static_config or {}
+        return cls(
+            static_dir,
+            exclude=static_config.get('exclude'),
+            exclude_dirs=exclude_dirs
+        )
+
+    def _is_excluded(self, rel_path):
+        name = os.path.basename(rel_path)
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern)
+                   for pattern in self.exclude)
+
+    def _scan(self):
+        """遍历静态目录，返回 {相对路径(URL形式): (绝对路径, 大小, 修改时间)}"""
+        found = {}
+        for root, dirs, filenames in os.walk(self.static_dir):
+            rel_root = os.path.relpath(root, self.static_dir)
+            # 跳过隐藏目录、Python缓存和排除的目录
+            dirs[:] = [
+                d for d in dirs
+                if not d.startswith('.') and d != '__pycache__'
+                and os.path.normpath(os.path.join(rel_root, d)) not in self.exclude_dirs
+            ]
+
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(root, filename)
+                rel_path = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                if self._is_excluded(rel_path):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found[rel_path] = (path, st.st_size, st.st_mtime)
+        return found
+
+    def refresh(self):
+        """重新扫描并原子替换索引，未变化的文件沿用之前计算的ETag"""
+        found = self._scan()
+        old_entries = self._entries
+        entries = {}
+        for rel_path, (path, size, mtime) in found.items():
+            old = old_entries.get(rel_path)
+            if old and old.size == size and old.mtime == mtime:
+                entries[rel_path] = old
+                continue
+            try:
+                entries[rel_path] = make_entry(path, rel_path)
+            except OSError:
+                continue
+
+        with self._lock:
+            self._entries = entries
+            self._signature = self._make_signature(found)
+            self.loaded_at = time.time()
+        return len(entries)
+
+    def _make_signature(self, found):
+        return frozenset((rel_path, size, mtime) for rel_path, (_, size, mtime) in found.items())
+
+    def get(self, rel_path):
+        """按URL路径查找文件，不存在返回 None"""
+        return self._entries.get(rel_path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def changed(self):
+        """文件集合或任一文件的大小/修改时间是否发生变化"""
+        return self._make_signature(self._scan()) != self._signature
+
+    def start_watcher(self, interval, on_change=None):
+        """启动后台轮询线程，发现文件变化时刷新索引并调用 on_change"""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.changed():
+                        if on_change:
+                            on_change()
+                        else:
+                            self.refresh()
+                except Exception as e:
+                    print(f"⚠️  静态文件索引刷新失败: {e}")
+
+        self._watcher = threading.Thread(target=watch, name='static-index-watcher', daemon=True)
+        self._watcher.start()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库存储后端
+config.json 的 database.backend 选择存储后端。两种后端提供相同的连接接口（PyMySQL 风格），
+插件、评分、统计的查询和增量统计维护（plugin_stats.py）对两种后端完全相同：
+
+  mysql   PyMySQL 连接 MySQL，表结构见 database_schema.sql，适合大规模部署
+  sqlite  本地 SQLite 数据库文件（WAL 模式），表结构与 database_schema.sql 一致（见 sqlite_compat.py），
+          首次启动时自动建表并写入初始插件；没有网络往返，适合小规模部署和基准测试
+
+ASGI模式（server.mode = asgi）另外使用 aiomysql 接口的异步连接（见 async_connection_settings）。
+
+SQLite 数据库、评分队列和指标快照等运行时数据放在 data_dir（默认 ~/.better-office）中，
+不能放在项目目录下：项目目录就是网站根目录，其中的文件会被静态文件索引对外提供。
+"""
+
+import os
+
+import pymysql
+
+import sqlite_compat
+
+BACKENDS = ('mysql', 'sqlite')
+DEFAULT_SQLITE_PATH = 'game.db'
+
+DEFAULT_DATA_DIR = '~/.better-office'
+# 覆盖 config.json 中 data_dir 的环境变量
+DATA_DIR_ENV = 'BETTER_OFFICE_DATA_DIR'
+
+
+def data_dir(base_dir, config):
+    """运行时数据目录的绝对路径（相对路径相对于项目目录）"""
+    path = os.environ.get(DATA_DIR_ENV) or config.get('data_dir') or DEFAULT_DATA_DIR
+    return os.path.join(base_dir, os.path.expanduser(path))
+
+
+def inside(path, directory):
+    """path 是否位于 directory 之中"""
+    path = os.path.realpath(path)
+    directory = os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def backend_of(database_config):
+    """返回配置的存储后端名称，不支持时抛出 ValueError"""
+    backend = database_config.get('backend', 'mysql')
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的数据库后端: {backend}，可选: {', '.join(BACKENDS)}")
+    return backend
+
+
+def sqlite_path(data_root, database_config):
+    """SQLite 数据库文件的绝对路径（相对路径相对于数据目录）"""
+    return os.path.join(data_root, database_config.get('path') or DEFAULT_SQLITE_PATH)
+
+
+def connection_settings(data_root, database_config):
+    """返回 (连接函数, 连接参数)，供连接池建立连接"""
+    if backend_of(database_config) == 'sqlite':
+        return sqlite_compat.connect, {
+            'database': sqlite_path(data_root, database_config),
+            'autocommit': True
+        }
+    return pymysql.connect, {
+        'host': database_config['host'],
+        'port': database_config['port'],
+        'user': database_config['username'],
+        'password': database_config['password'],
+        'database': database_config['database'],
+        'charset': database_config['charset'],
+        'autocommit': database_config.get('autocommit', True),
+        # 数据库不可用时尽快失败（交给熔断器处理），而不是等待操作系统的TCP超时
+        'connect_timeout': database_config.get('connect_timeout', 3),
+        'read_timeout': database_config.get('read_timeout', 10),
+        'write_timeout': database_config.get('write_timeout', 10)
+    }
+
+
+def async_connection_settings(data_root, database_config):
+    """返回 (异步连接协程函数, 连接参数)，供异步连接池建立连接；MySQL 后端需要安装 aiomysql"""
+    if backend_of(database_config) == 'sqlite':
+        return sqlite_compat.connect_async, {
+            'database': sqlite_path(data_root, database_config),
+            'autocommit': True
+        }
+    import aiomysql
+    return aiomysql.connect, {
+        'host': database_config['host'],
+        'port': database_config['port'],
+        'user': database_config['username'],
+        'password': database_config['password'],
+        'db': database_config['database'],
+        'charset': database_config['charset'],
+        'autocommit': database_config.get('autocommit', True),
+        # aiomysql 没有读写超时，语句耗时由 asgi.request_timeout 限制
+        'connect_timeout': database_config.get('connect_timeout', 3)
+    }
+
+
+def prepare(data_root, database_config):
+    """启动前准备存储：SQLite 后端创建数据库文件和表结构（已存在时不做修改）"""
+    if backend_of(database_config) == 'sqlite':
+        path = sqlite_path(data_root, database_config)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sqlite_compat.init_schema(path, initial_data=True)
+
+
+def connect(data_root, database_config):
+    """建立一个不经过连接池的连接（命令行工具使用）"""
+    connect_function, params = connection_settings(data_root, database_config)
+    return connect_function(**params)
+
+
+def describe(data_root, database_config):
+    """用于日志输出的存储位置描述"""
+    if backend_of(database_config) == 'sqlite':
+        return f"SQLite {sqlite_path(data_root, database_config)}"
+    return f"MySQL {database_config['database']}@{database_config['host']}:{database_config['port']}"
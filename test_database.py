@@ -125,7 +125,7 @@ def test_data():
                 FROM plugins p
                 LEFT JOIN plugin_statistics s ON p.id = s.plugin_id
                 WHERE p.is_active = TRUE
-                ORDER BY s.average_rating DESC
+                ORDER BY s.ranking_score DESC, p.id ASC
                 LIMIT 5
             """)
             
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""测试公共设施：把项目目录加入导入路径，提供使用临时 SQLite 数据库的应用"""
+
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    """初始化好的 app 模块（每个测试进程只能初始化一次），数据全部写在临时目录"""
+    import app as app_module
+
+    data_dir = tmp_path_factory.mktemp('data')
+    with open(os.path.join(PROJECT_DIR, 'config.example.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['data_dir'] = str(data_dir)
+    config['database']['backend'] = 'sqlite'
+    config['rating_queue']['enabled'] = False
+    config['live']['enabled'] = False
+    config['metrics']['shared_dir'] = str(data_dir / 'metrics')
+    config_path = data_dir / 'config.json'
+    config_path.write_text(json.dumps(config), encoding='utf-8')
+
+    os.environ.pop('BETTER_OFFICE_DATA_DIR', None)
+    app_module.create_app(str(config_path), start_background=False)
+    return app_module
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import DEADLINE, QUEUE_FULL, TIMEOUT, AdmissionLane, AdmissionRejected
+
+
+def wait_for_queue(lane, depth):
+    deadline = time.monotonic() + 5
+    while lane.stats()['queue_depth'] < depth and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert lane.stats()['queue_depth'] == depth
+
+
+def test_full_queue_is_rejected_immediately():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=0, retry_after=2)
+    started = lane.acquire()
+    with pytest.raises(AdmissionRejected) as error:
+        lane.acquire()
+    assert error.value.reason == QUEUE_FULL and error.value.retry_after == 2
+    lane.release(started)
+    lane.release(lane.acquire())
+    assert lane.stats()['rejected'][QUEUE_FULL] == 1 and lane.stats()['active'] == 0
+
+
+def test_request_that_cannot_make_the_deadline_is_rejected():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=8, max_wait=0.5)
+    # 最近一次处理耗时约1秒：排在一个请求之后至少要等1秒
+    lane.release(lane.acquire() - 1.0)
+    started = lane.acquire()
+    with pytest.raises(AdmissionRejected) as error:
+        lane.acquire()
+    assert error.value.reason == DEADLINE
+    assert error.value.retry_after >= 1
+    assert lane.stats()['queue_depth'] == 0
+    lane.release(started)
+
+
+def test_released_slot_is_handed_over_in_arrival_order():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=8, max_wait=5)
+    started = lane.acquire()
+    order = []
+
+    def worker(name):
+        acquired = lane.acquire()
+        order.append(name)
+        lane.release(acquired)
+
+    threads = []
+    for index, name in enumerate(['first', 'second', 'third']):
+        thread = threading.Thread(target=worker, args=(name,))
+        thread.start()
+        threads.append(thread)
+        wait_for_queue(lane, index + 1)
+
+    lane.release(started)
+    for thread in threads:
+        thread.join(5)
+    assert order == ['first', 'second', 'third']
+    stats = lane.stats()
+    assert stats['active'] == 0 and stats['admitted'] == 4 and stats['queued'] == 3
+
+
+def test_new_arrival_does_not_overtake_queue():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=8, max_wait=5)
+    started = lane.acquire()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(lane.acquire()))
+    thread.start()
+    wait_for_queue(lane, 1)
+
+    # 名额直接交给队首：释放后仍然占满，新来的请求只能排队
+    lane.release(started)
+    thread.join(5)
+    assert lane.stats()['active'] == 1
+    thread = threading.Thread(target=lambda: got.append(lane.acquire()))
+    thread.start()
+    wait_for_queue(lane, 1)
+
+    lane.release(got[0])
+    thread.join(5)
+    lane.release(got[1])
+    assert lane.stats()['active'] == 0
+
+
+def test_timed_out_waiter_leaves_the_queue():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=8, max_wait=0.05)
+    started = lane.acquire()
+    with pytest.raises(AdmissionRejected) as error:
+        lane.acquire()
+    assert error.value.reason == TIMEOUT
+    stats = lane.stats()
+    assert stats['queue_depth'] == 0 and stats['rejected'][TIMEOUT] == 1
+
+    # 超时的请求不会再收到名额：释放后通道空闲
+    lane.release(started)
+    assert lane.stats()['active'] == 0
+    lane.release(lane.acquire())
+
+
+def test_cancelled_async_waiter_passes_granted_slot_on():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=8, max_wait=5)
+
+    async def scenario():
+        started = lane.acquire()
+        first = asyncio.ensure_future(lane.acquire_async())
+        second = asyncio.ensure_future(lane.acquire_async())
+        await asyncio.sleep(0)
+        assert lane.stats()['queue_depth'] == 2
+
+        # 名额交给 first 之后、它恢复运行之前被取消：名额转交 second，而不是丢失
+        lane.release(started)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        acquired = await asyncio.wait_for(second, 1)
+        assert lane.stats()['active'] == 1 and lane.stats()['queue_depth'] == 0
+        lane.release(acquired)
+
+    asyncio.run(scenario())
+    assert lane.stats()['active'] == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    lane = AdmissionLane('test', max_concurrent=1, max_queue=8, max_wait=5)
+
+    async def scenario():
+        started = lane.acquire()
+        waiter = asyncio.ensure_future(lane.acquire_async())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert lane.stats()['queue_depth'] == 0
+        lane.release(started)
+
+    asyncio.run(scenario())
+    assert lane.stats()['active'] == 0
+
+
+def test_app_returns_503_with_retry_after(server, client, monkeypatch):
+    rule = '/api/plugin-rank/<int:plugin_id>'
+    lane = AdmissionLane(rule, max_concurrent=1, max_queue=0, retry_after=3)
+    monkeypatch.setitem(server.ADMISSION.lanes, rule, lane)
+    started = lane.acquire()
+    try:
+        response = client.get('/api/plugin-rank/1')
+    finally:
+        lane.release(started)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+
+    # 名额归还后正常处理，请求结束时归还名额
+    assert client.get('/api/plugin-rank/1').status_code in (200, 404)
+    assert lane.stats()['active'] == 0
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import os
+
+import pytest
+from werkzeug.http import parse_accept_header
+
+from asset_pipeline import AssetPipeline, fingerprint_name, is_local_reference, minify_text
+
+GAME_JS = ''.join(f"    var value{index} = {index};  \n\n" for index in range(200))
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / 'index.html').write_text(
+        '<html>\n  <script src="game.js"></script>\n  <link href="style.css">\n'
+        '  <script src="https://cdn.example.com/lib.js"></script>\n  <a href="#top">top</a>\n</html>\n',
+        encoding='utf-8'
+    )
+    (tmp_path / 'game.js').write_text(GAME_JS, encoding='utf-8')
+    (tmp_path / 'style.css').write_text('body { margin: 0; }\n', encoding='utf-8')
+    (tmp_path / 'plugins').mkdir()
+    (tmp_path / 'plugins' / 'clock-plugin.js').write_text('  var clock = 1;\n', encoding='utf-8')
+    return tmp_path
+
+
+def build(static_dir, **options):
+    return AssetPipeline(str(static_dir), use_brotli=False, **options).build()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_fingerprint_and_local_references():
+    assert fingerprint_name('plugins/a.js', 'abc123') == 'plugins/a.abc123.js'
+    assert minify_text('  a\n\n   b  \n') == 'a\nb\n'
+    assert is_local_reference('game.js')
+    for ref in ('https://cdn.example.com/x.js', '#top', '/abs.js', '../up.js', 'a.js?v=1', '${url}'):
+        assert not is_local_reference(ref)
+
+
+def test_build_renames_minifies_and_rewrites_entry(static_dir):
+    pipeline = build(static_dir)
+    index_html = read(pipeline.index.variants['identity'].path).decode('utf-8')
+    game = next(asset for asset in pipeline.assets.values() if asset.source == 'game.js')
+    style = next(asset for asset in pipeline.assets.values() if asset.source == 'style.css')
+
+    assert game.url_name == f'game.{game.digest}.js'
+    assert f'src="{game.url_name}"' in index_html and f'href="{style.url_name}"' in index_html
+    # 外链和锚点保持原样
+    assert 'https://cdn.example.com/lib.js' in index_html and 'href="#top"' in index_html
+    assert read(game.variants['identity'].path) == minify_text(GAME_JS).encode('utf-8')
+    assert game.integrity.startswith('sha384-')
+
+    manifest = json.loads(read(os.path.join(pipeline.build_dir, 'manifest.json')))
+    assert manifest['entry'] == pipeline.index.url_name
+    assert manifest['assets'] == {'game.js': game.url_name, 'style.css': style.url_name}
+    assert manifest['bundles'] == {'plugins/clock-plugin.js': pipeline.bundle('plugins/clock-plugin.js').url_name}
+
+
+def test_large_text_assets_are_precompressed(static_dir):
+    pipeline = build(static_dir)
+    game = next(asset for asset in pipeline.assets.values() if asset.source == 'game.js')
+    style = next(asset for asset in pipeline.assets.values() if asset.source == 'style.css')
+
+    assert set(game.variants) == {'identity', 'gzip'}
+    assert gzip.decompress(read(game.variants['gzip'].path)) == read(game.variants['identity'].path)
+    # 过小的文件不压缩
+    assert set(style.variants) == {'identity'}
+
+    assert game.choose(parse_accept_header('gzip, deflate'))[1] == 'gzip'
+    assert game.choose(parse_accept_header('identity'))[1] == 'identity'
+    assert game.variants['gzip'].etag != game.variants['identity'].etag
+
+
+def test_unchanged_sources_keep_their_names(static_dir):
+    first = build(static_dir)
+    second = build(static_dir)
+    assert sorted(first.assets) == sorted(second.assets)
+
+    (static_dir / 'style.css').write_text('body { margin: 1px; }\n', encoding='utf-8')
+    third = build(static_dir)
+    assert third.get(first.bundle('plugins/clock-plugin.js').url_name)
+    assert sorted(set(third.assets) - set(first.assets)) == [
+        name for name in third.assets if name.startswith('style.')
+    ]
+
+
+def test_app_serves_built_assets_with_immutable_caching(server, client):
+    pipeline = server.ASSET_PIPELINE
+    assert pipeline is not None
+    asset = max(pipeline.assets.values(), key=lambda item: len(item.variants))
+
+    response = client.get(f'/{asset.url_name}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    if 'gzip' in asset.variants:
+        assert response.headers['Content-Encoding'] == 'gzip'
+
+    # 入口页面不能长期缓存，否则新版本的哈希文件名无法生效
+    response = client.get('/')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert response.get_data() == read(pipeline.index.variants['identity'].path)
+
+
+def test_only_current_and_previous_generation_are_kept(static_dir):
+    def style_files():
+        return sorted(name for name in os.listdir(os.path.join(str(static_dir), 'build'))
+                      if name.startswith('style.'))
+
+    first = build(static_dir)
+    first_style = next(name for name in first.assets if name.startswith('style.'))
+    for number in (1, 2):
+        (static_dir / 'style.css').write_text(f'body {{ margin: {number}px; }}\n', encoding='utf-8')
+        latest = build(static_dir)
+        if number == 1:
+            # 上一代仍然保留
+            assert first_style in style_files() and len(style_files()) == 2
+
+    assert first_style not in style_files() and len(style_files()) == 2
+    game = next(asset for asset in latest.assets.values() if asset.source == 'game.js')
+    assert os.path.exists(game.variants['gzip'].path)
+    assert len([name for name in os.listdir(latest.build_dir) if name.startswith('index.')]) == 2
+    manifest = json.loads(read(os.path.join(latest.build_dir, 'manifest.json')))
+    assert sorted(manifest['files']) == sorted(set(latest.assets) | {latest.index.url_name})
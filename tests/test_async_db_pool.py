@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from async_db_pool import AsyncConnectionPool
+from db_pool import PoolTimeoutError
+
+
+class FakeAsyncConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.ping_fails = False
+        self.rollbacks = 0
+
+    async def ping(self, reconnect=False):
+        if self.ping_fails:
+            raise ConnectionError('连接已断开')
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class Connector:
+    def __init__(self):
+        self.created = []
+        self.fail = False
+
+    async def __call__(self, **kwargs):
+        if self.fail:
+            raise ConnectionRefusedError('无法连接')
+        connection = FakeAsyncConnection(len(self.created) + 1)
+        self.created.append(connection)
+        return connection
+
+
+def make_pool(**options):
+    connector = Connector()
+    return AsyncConnectionPool(connector, {}, **options), connector
+
+
+async def wait_for_waiters(pool, count):
+    for _ in range(1000):
+        if pool.stats()['waiting'] == count:
+            return
+        await asyncio.sleep(0)
+    assert pool.stats()['waiting'] == count
+
+
+def test_connections_are_reused_and_rolled_back():
+    pool, connector = make_pool(max_size=2)
+
+    async def scenario():
+        async with await pool.acquire() as connection:
+            first = connection._raw
+        async with await pool.acquire() as connection:
+            assert connection._raw is first
+
+    asyncio.run(scenario())
+    assert len(connector.created) == 1 and connector.created[0].rollbacks == 2
+    assert pool.stats()['checkouts'] == 2 and pool.stats()['idle'] == 1
+
+
+def test_pool_is_bounded_and_times_out():
+    pool, connector = make_pool(max_size=2, wait_timeout=0.05)
+
+    async def scenario():
+        held = [await pool.acquire(), await pool.acquire()]
+        with pytest.raises(PoolTimeoutError):
+            await pool.acquire()
+        assert pool.stats()['waiting'] == 0
+        for connection in held:
+            await connection.close()
+
+    asyncio.run(scenario())
+    assert pool.stats()['timeouts'] == 1 and len(connector.created) == 2
+
+
+def test_waiters_are_served_in_arrival_order():
+    pool, connector = make_pool(max_size=1, wait_timeout=5)
+    order = []
+
+    async def worker(name):
+        async with await pool.acquire():
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        held = await pool.acquire()
+        tasks = []
+        for index, name in enumerate(['first', 'second', 'third']):
+            tasks.append(asyncio.ensure_future(worker(name)))
+            await wait_for_waiters(pool, index + 1)
+        await held.close()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ['first', 'second', 'third']
+    assert len(connector.created) == 1 and pool.stats()['in_use'] == 0
+
+
+def test_released_connection_is_not_stolen_by_newcomer():
+    pool, connector = make_pool(max_size=1, wait_timeout=5)
+
+    async def scenario():
+        held = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await wait_for_waiters(pool, 1)
+
+        # 归还时连接直接交给队首：紧接着到达的新请求只能排在后面，不能抢走连接
+        await held.close()
+        with pytest.raises(PoolTimeoutError):
+            await pool.acquire(timeout=0.05)
+        connection = await asyncio.wait_for(waiter, 1)
+        assert connection._raw is connector.created[0]
+        await connection.close()
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert stats['in_use'] == 0 and stats['idle'] == 1 and stats['waiting'] == 0
+
+
+def test_waiter_is_not_starved_by_a_stream_of_newcomers():
+    pool, connector = make_pool(max_size=1, wait_timeout=5)
+
+    async def newcomer():
+        async with await pool.acquire():
+            await asyncio.sleep(0)
+
+    async def scenario():
+        held = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire(timeout=1))
+        await wait_for_waiters(pool, 1)
+        # 每次归还的同时都有新请求到达
+        newcomers = [asyncio.ensure_future(newcomer()) for _ in range(20)]
+        await held.close()
+        connection = await waiter
+        assert not any(task.done() for task in newcomers)
+        await connection.close()
+        await asyncio.gather(*newcomers)
+
+    asyncio.run(scenario())
+    assert pool.stats()['timeouts'] == 0 and pool.stats()['in_use'] == 0
+
+
+def test_cancelled_waiter_passes_granted_connection_on():
+    pool, connector = make_pool(max_size=1, wait_timeout=5)
+
+    async def scenario():
+        held = await pool.acquire()
+        first = asyncio.ensure_future(pool.acquire())
+        second = asyncio.ensure_future(pool.acquire())
+        await wait_for_waiters(pool, 2)
+
+        # 连接交给 first 之后、它恢复运行之前被取消：连接转交 second，而不是丢失或新建
+        await held.close()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        connection = await asyncio.wait_for(second, 1)
+        assert connection._raw is connector.created[0]
+        await connection.close()
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert len(connector.created) == 1
+    assert stats['in_use'] == 0 and stats['size'] == 1 and stats['idle'] == 1
+
+
+def test_cancelled_connection_is_closed_not_reused():
+    pool, connector = make_pool(max_size=1)
+
+    async def use_forever():
+        async with await pool.acquire():
+            await asyncio.sleep(10)
+
+    async def scenario():
+        task = asyncio.ensure_future(use_forever())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 被取消的连接协议状态未知，直接关闭
+        async with await pool.acquire() as connection:
+            assert connection._raw.number == 2
+
+    asyncio.run(scenario())
+    assert connector.created[0].closed
+    stats = pool.stats()
+    assert stats['cancelled'] == 1 and stats['size'] == 1 and stats['in_use'] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    pool, connector = make_pool(max_size=1, wait_timeout=5)
+
+    async def scenario():
+        held = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await wait_for_waiters(pool, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert pool.stats()['waiting'] == 0
+        await held.close()
+
+    asyncio.run(scenario())
+    assert pool.stats()['in_use'] == 0 and pool.stats()['idle'] == 1
+
+
+def test_dead_or_expired_connections_are_replaced():
+    pool, connector = make_pool(max_size=1)
+
+    async def scenario():
+        async with await pool.acquire() as connection:
+            connection._raw.ping_fails = True
+        async with await pool.acquire() as connection:
+            assert connection._raw.number == 2
+
+    asyncio.run(scenario())
+    assert connector.created[0].closed and pool.stats()['discarded'] == 1
+
+    pool, connector = make_pool(max_size=1, max_lifetime=0)
+
+    async def expired():
+        async with await pool.acquire():
+            pass
+        async with await pool.acquire() as connection:
+            assert connection._raw.number == 2
+
+    asyncio.run(expired())
+
+
+def test_failed_connect_frees_its_slot():
+    pool, connector = make_pool(max_size=1, wait_timeout=0.05)
+
+    async def scenario():
+        connector.fail = True
+        with pytest.raises(ConnectionRefusedError):
+            await pool.acquire()
+        connector.fail = False
+        async with await pool.acquire():
+            pass
+
+    asyncio.run(scenario())
+    assert pool.stats()['in_use'] == 0 and pool.stats()['size'] == 1
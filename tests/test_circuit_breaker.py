@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pymysql
+import pytest
+
+from async_db_pool import AsyncConnectionPool
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_connection_error
+from db_pool import ConnectionPool
+
+LOST = pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query')
+
+
+class FakeCursor:
+    rowcount = 1
+
+    def __init__(self, server):
+        self.server = server
+
+    def execute(self, sql, args=None):
+        if self.server.down:
+            raise LOST
+        return 1
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """ping 总是成功（例如空闲连接未检查），语句在 server.down 时报连接中断"""
+
+    open = True
+    closed = False
+
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, *args):
+        return FakeCursor(self.server)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncFakeCursor(FakeCursor):
+    async def execute(self, sql, args=None):
+        return FakeCursor.execute(self, sql, args)
+
+    async def close(self):
+        pass
+
+
+class AsyncFakeConnection(FakeConnection):
+    async def cursor(self, *args):
+        return AsyncFakeCursor(self.server)
+
+    async def ping(self, reconnect=False):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class Server:
+    down = False
+
+
+def test_opens_after_threshold_and_recovers_after_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.before_connect()
+    breaker.record_failure(LOST)
+    assert breaker.stats()['state'] == CLOSED
+    breaker.record_failure(LOST)
+    assert breaker.stats()['state'] == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_connect()
+
+    breaker._opened_at -= 1
+    breaker.before_connect()
+    assert breaker.stats()['state'] == HALF_OPEN
+    # 半开时只放行一个探测请求
+    with pytest.raises(CircuitOpenError):
+        breaker.before_connect()
+    breaker.record_success()
+    assert breaker.stats()['state'] == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure(LOST)
+    breaker._opened_at -= 11
+    breaker.before_connect()
+    breaker.record_failure(LOST)
+    assert breaker.stats()['state'] == OPEN
+    assert breaker.stats()['opens'] == 2
+
+
+def test_sql_errors_are_not_connection_errors():
+    assert is_connection_error(LOST)
+    assert is_connection_error(ConnectionRefusedError())
+    assert not is_connection_error(pymysql.err.OperationalError(1213, 'Deadlock found'))
+    assert not is_connection_error(pymysql.err.ProgrammingError(1064, 'syntax error'))
+
+
+def test_checkout_alone_does_not_close_breaker():
+    server = Server()
+    pool = ConnectionPool({}, max_size=2, connect=lambda **kwargs: FakeConnection(server))
+    pool.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    pool.breaker.record_failure(LOST)
+    pool.breaker._opened_at -= 11
+
+    server.down = True
+    connection = pool.get_connection()
+    assert pool.breaker.stats()['state'] == HALF_OPEN
+    with pytest.raises(pymysql.err.OperationalError):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    connection.close()
+    assert pool.breaker.stats()['state'] == OPEN
+
+    pool.breaker._opened_at -= 11
+    server.down = False
+    connection = pool.get_connection()
+    assert pool.breaker.stats()['state'] == HALF_OPEN
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    connection.close()
+    assert pool.breaker.stats()['state'] == CLOSED
+
+
+def test_async_checkout_alone_does_not_close_breaker():
+    server = Server()
+
+    async def connect(**kwargs):
+        return AsyncFakeConnection(server)
+
+    async def scenario():
+        pool = AsyncConnectionPool(connect, {}, max_size=2)
+        pool.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        pool.breaker.record_failure(LOST)
+        pool.breaker._opened_at -= 11
+
+        server.down = True
+        async with await pool.acquire() as connection:
+            assert pool.breaker.stats()['state'] == HALF_OPEN
+            with pytest.raises(pymysql.err.OperationalError):
+                async with connection.cursor() as cursor:
+                    await cursor.execute("SELECT 1")
+        assert pool.breaker.stats()['state'] == OPEN
+
+        pool.breaker._opened_at -= 11
+        server.down = False
+        async with await pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT 1")
+        assert pool.breaker.stats()['state'] == CLOSED
+
+    asyncio.run(scenario())
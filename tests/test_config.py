@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import json
+
+from config_manager import EXAMPLE_CONFIG_PATH, ConfigManager, merge_config, read_config, read_json
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return str(path)
+
+
+def test_overrides_are_merged_over_example_defaults(tmp_path):
+    path = write_json(tmp_path / 'config.json', {
+        'database': {'host': 'db.internal', 'pool': {'max_size': 3}},
+        'server': {'workers': 8}
+    })
+    config = read_config(path)
+    defaults = read_json(EXAMPLE_CONFIG_PATH)
+
+    assert config['database']['host'] == 'db.internal'
+    assert config['database']['pool']['max_size'] == 3
+    assert config['database']['pool']['wait_timeout'] == defaults['database']['pool']['wait_timeout']
+    assert config['database']['port'] == defaults['database']['port']
+    assert config['server']['workers'] == 8
+    assert config['rate_limit'] == defaults['rate_limit']
+
+
+def test_merge_does_not_modify_defaults():
+    defaults = {'a': {'b': 1, 'c': 2}}
+    assert merge_config(defaults, {'a': {'b': 3}, 'd': 4}) == {'a': {'b': 3, 'c': 2}, 'd': 4}
+    assert defaults == {'a': {'b': 1, 'c': 2}}
+
+
+def test_default_config_only_writes_overrides(tmp_path):
+    path = str(tmp_path / 'config.json')
+    manager = ConfigManager(path)
+    assert manager.create_default_config()
+    assert read_json(path) == {'database': {'backend': 'sqlite'}}
+
+    assert manager.load_config() and manager.validate_config()
+    assert manager.config['server']['port'] == read_json(EXAMPLE_CONFIG_PATH)['server']['port']
+
+    manager.update_config('server', 'workers', 2)
+    assert read_json(path) == {'database': {'backend': 'sqlite'}, 'server': {'workers': 2}}
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.open = True
+        self.ping_fails = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if self.ping_fails:
+            raise ConnectionError('连接已断开')
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.open = False
+
+
+class Connector:
+    def __init__(self):
+        self.created = []
+        self.fail = False
+
+    def __call__(self, **kwargs):
+        if self.fail:
+            raise ConnectionRefusedError('无法连接')
+        connection = FakeConnection(len(self.created) + 1)
+        self.created.append(connection)
+        return connection
+
+
+def make_pool(**options):
+    connector = Connector()
+    return ConnectionPool({}, connect=connector, **options), connector
+
+
+def test_connections_are_reused_and_rolled_back():
+    pool, connector = make_pool(max_size=2)
+    with pool.get_connection() as connection:
+        first = connection._raw
+    with pool.get_connection() as connection:
+        assert connection._raw is first
+    assert len(connector.created) == 1
+    assert first.rollbacks == 2
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_pool_is_bounded_and_times_out():
+    pool, connector = make_pool(max_size=2, wait_timeout=0.05)
+    held = [pool.get_connection(), pool.get_connection()]
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection()
+    assert pool.stats()['timeouts'] == 1
+    assert len(connector.created) == 2
+    for connection in held:
+        connection.close()
+
+
+def test_waiter_gets_released_connection():
+    pool, connector = make_pool(max_size=1, wait_timeout=5)
+    held = pool.get_connection()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(pool.get_connection()))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while pool.stats()['waiting'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    held.close()
+    thread.join(5)
+    assert got and got[0]._raw is held._raw
+    got[0].close()
+
+
+def test_dead_idle_connection_is_replaced():
+    pool, connector = make_pool(max_size=1)
+    with pool.get_connection() as connection:
+        connection._raw.ping_fails = True
+    with pool.get_connection() as connection:
+        assert connection._raw.number == 2
+    assert not connector.created[0].open
+    assert pool.stats()['discarded'] == 1
+
+
+def test_expired_connection_is_replaced():
+    pool, connector = make_pool(max_size=1, max_lifetime=0)
+    with pool.get_connection():
+        pass
+    with pool.get_connection() as connection:
+        assert connection._raw.number == 2
+
+
+def test_discarded_connection_frees_its_slot():
+    pool, connector = make_pool(max_size=1, wait_timeout=0.05)
+    connection = pool.get_connection()
+    connection.discard()
+    assert not connector.created[0].open
+    with pool.get_connection() as connection:
+        assert connection._raw.number == 2
+    assert pool.stats()['size'] == 1
+
+
+def test_failed_connect_frees_its_slot():
+    pool, connector = make_pool(max_size=1, wait_timeout=0.05)
+    connector.fail = True
+    with pytest.raises(ConnectionRefusedError):
+        pool.get_connection()
+    connector.fail = False
+    with pool.get_connection():
+        pass
+    assert pool.stats()['in_use'] == 0 and pool.stats()['size'] == 1
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(server):
+    server.PLUGIN_CATALOG.snapshot()
+    server.RESPONSE_CACHE.clear()
+    yield
+    server.RESPONSE_CACHE.clear()
+
+
+@pytest.mark.parametrize('url', ['/api/plugins', '/api/plugins?sort=rating&limit=2', '/api/plugin-stats/1'])
+def test_unchanged_response_is_answered_with_304(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+    assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_cached_304_does_not_touch_the_database(server, client, monkeypatch):
+    etag = client.get('/api/plugin-stats/1').headers['ETag']
+
+    def no_database():
+        raise AssertionError('不应访问数据库')
+
+    monkeypatch.setattr(server, 'get_db_connection', no_database)
+    assert client.get('/api/plugin-stats/1', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_rating_changes_the_etag(server, client):
+    etag = client.get('/api/plugin-stats/1').headers['ETag']
+    server.write_rating_batch([server.make_vote(1, '10.3.3.3', 'test', 4, '不错')])
+
+    response = client.get('/api/plugin-stats/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['recent_ratings'][0]['comment'] == '不错'
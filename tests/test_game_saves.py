@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+
+import pytest
+
+import sqlite_compat
+from game_saves import PatchError, SaveError, SaveStore, apply_patch
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'saves.db')
+    sqlite_compat.init_schema(path)
+    return SaveStore(lambda: sqlite_compat.connect(path), cache_entries=0)
+
+
+def read_document(store, save_id):
+    version, text, compressed = store.read(save_id)
+    return version, json.loads(text if text is not None else gzip.decompress(compressed))
+
+
+def test_apply_patch_operations():
+    document = {'a': 1, 'list': [1, 2], 'nested': {'x': 'y'}}
+    result = apply_patch(document, [
+        {'op': 'add', 'path': '/list/-', 'value': 3},
+        {'op': 'add', 'path': '/list/0', 'value': 0},
+        {'op': 'replace', 'path': '/a', 'value': 2},
+        {'op': 'remove', 'path': '/nested/x'},
+        {'op': 'copy', 'from': '/list', 'path': '/copied'},
+        {'op': 'move', 'from': '/a', 'path': '/nested/a'},
+        {'op': 'test', 'path': '/nested/a', 'value': 2},
+        {'op': 'add', 'path': '/a~1b', 'value': 'slash'},
+    ])
+    assert result == {'list': [0, 1, 2, 3], 'nested': {'a': 2}, 'copied': [0, 1, 2, 3], 'a/b': 'slash'}
+
+
+@pytest.mark.parametrize('patch', [
+    {'op': 'add'},
+    [{'op': 'remove', 'path': '/missing'}],
+    [{'op': 'replace', 'path': '/list/5', 'value': 1}],
+    [{'op': 'add', 'path': '/list/01', 'value': 1}],
+    [{'op': 'add', 'path': '/a'}],
+    [{'op': 'test', 'path': '/a', 'value': 2}],
+    [{'op': 'move', 'from': '/list', 'path': '/list/0'}],
+    [{'op': 'remove', 'path': ''}],
+    [{'op': 'frobnicate', 'path': '/a'}],
+    [{'op': 'add', 'path': 'a', 'value': 1}],
+])
+def test_invalid_patch_is_rejected(patch):
+    with pytest.raises(PatchError) as error:
+        apply_patch({'a': 1, 'list': [1]}, patch)
+    assert error.value.status == 422
+
+
+def test_patches_are_replayed_and_compacted(store):
+    assert store.write_full('save-0000000000000001', {'gold': 0, 'items': []}) == 1
+    for gold in range(1, 4):
+        store.write_patch('save-0000000000000001', gold, [
+            {'op': 'replace', 'path': '/gold', 'value': gold},
+            {'op': 'add', 'path': '/items/-', 'value': gold}
+        ])
+    assert read_document(store, 'save-0000000000000001') == (4, {'gold': 3, 'items': [1, 2, 3]})
+
+    assert store.compact('save-0000000000000001') is True
+    assert store.compact('save-0000000000000001') is False
+    version, text, compressed = store.read('save-0000000000000001')
+    # 合并后直接返回快照的压缩数据，补丁已删除
+    assert text is None and json.loads(gzip.decompress(compressed)) == {'gold': 3, 'items': [1, 2, 3]}
+    connection = store.connect()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM game_save_patches")
+        assert cursor.fetchone()[0] == 0
+    connection.close()
+
+    # 合并后继续在快照上追加补丁
+    store.write_patch('save-0000000000000001', 4, [{'op': 'replace', 'path': '/gold', 'value': 9}])
+    assert read_document(store, 'save-0000000000000001') == (5, {'gold': 9, 'items': [1, 2, 3]})
+
+
+def test_stale_patch_is_rejected(store):
+    store.write_full('save-0000000000000002', {'gold': 0})
+    store.write_patch('save-0000000000000002', 1, [{'op': 'replace', 'path': '/gold', 'value': 1}])
+    with pytest.raises(SaveError) as error:
+        store.write_patch('save-0000000000000002', 1, [{'op': 'replace', 'path': '/gold', 'value': 2}])
+    assert error.value.status == 412
+    assert read_document(store, 'save-0000000000000002') == (2, {'gold': 1})
+    assert store.stats()['conflicts'] == 1
+
+
+def test_conditional_full_write(store):
+    assert store.write_full('save-0000000000000003', {'gold': 0}, base_version=0) == 1
+    with pytest.raises(SaveError) as error:
+        store.write_full('save-0000000000000003', {'gold': 5}, base_version=0)
+    assert error.value.status == 412
+
+    store.write_patch('save-0000000000000003', 1, [{'op': 'replace', 'path': '/gold', 'value': 1}])
+    # 另一台设备仍以版本1为基准上传完整存档，不能覆盖版本2
+    with pytest.raises(SaveError) as error:
+        store.write_full('save-0000000000000003', {'gold': 5}, base_version=1)
+    assert error.value.status == 412
+    assert store.write_full('save-0000000000000003', {'gold': 5}, base_version=2) == 3
+    assert read_document(store, 'save-0000000000000003') == (3, {'gold': 5})
+
+    with pytest.raises(SaveError) as error:
+        store.write_full('save-0000000000000004', {'gold': 5}, base_version=1)
+    assert error.value.status == 412
+
+
+def put(client, save_id, document, headers=None):
+    return client.put(f'/api/saves/{save_id}', json=document, headers=headers or {})
+
+
+def patch(client, save_id, operations, headers=None):
+    return client.patch(f'/api/saves/{save_id}', data=json.dumps(operations),
+                        content_type='application/json-patch+json', headers=headers or {})
+
+
+def test_save_endpoint_conflicts(client):
+    save_id = 'endpoint-0000000000000001'
+    response = put(client, save_id, {'gold': 0}, {'If-None-Match': '*'})
+    assert response.status_code == 200 and response.get_json()['version'] == 1
+    assert put(client, save_id, {'gold': 1}, {'If-None-Match': '*'}).status_code == 412
+
+    assert patch(client, save_id, [{'op': 'replace', 'path': '/gold', 'value': 1}]).status_code == 428
+    response = patch(client, save_id, [{'op': 'replace', 'path': '/gold', 'value': 1}], {'If-Match': '"v1"'})
+    assert response.status_code == 200 and response.headers['ETag'] == '"v2"'
+
+    # 另一台设备仍以版本1为基准：补丁和完整存档都被拒绝
+    assert patch(client, save_id, [{'op': 'replace', 'path': '/gold', 'value': 7}],
+                 {'If-Match': '"v1"'}).status_code == 412
+    assert put(client, save_id, {'gold': 7}, {'If-Match': '"v1"'}).status_code == 412
+    assert patch(client, save_id, [{'op': 'remove', 'path': '/missing'}], {'If-Match': '"v2"'}).status_code == 422
+    assert put(client, save_id, {'gold': 7}, {'If-Match': 'garbage'}).status_code == 428
+
+    response = client.get(f'/api/saves/{save_id}')
+    assert response.headers['X-Save-Version'] == '2' and json.loads(response.get_data()) == {'gold': 1}
+    assert client.get(f'/api/saves/{save_id}', headers={'If-None-Match': '"v2"'}).status_code == 304
+
+    assert put(client, save_id, {'gold': 7}, {'If-Match': '"v2"'}).get_json()['version'] == 3
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from hot_file_cache import HotFileCache
+from static_index import make_entry
+
+
+def write_entry(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(bytes(index % 251 for index in range(size)))
+    return make_entry(str(path), name)
+
+
+def test_hits_and_misses(tmp_path):
+    cache = HotFileCache(max_bytes=1024, max_file_size=512)
+    entry = write_entry(tmp_path, 'a.js', 100)
+    assert cache.cached(entry) is None
+    assert cache.get(entry) == (tmp_path / 'a.js').read_bytes()
+    assert cache.get(entry) == cache.cached(entry)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['resident_bytes']) == (2, 1, 1, 100)
+
+
+def test_large_files_are_not_cached(tmp_path):
+    cache = HotFileCache(max_bytes=1024, max_file_size=512)
+    assert cache.get(write_entry(tmp_path, 'big.js', 513)) is None
+    assert cache.stats()['entries'] == 0
+    # 单文件上限不能超过总预算
+    assert HotFileCache(max_bytes=100, max_file_size=512).get(write_entry(tmp_path, 'mid.js', 200)) is None
+    assert HotFileCache(max_file_size=0).get(write_entry(tmp_path, 'small.js', 10)) is None
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    cache = HotFileCache(max_bytes=300, max_file_size=300)
+    first, second, third = (write_entry(tmp_path, f'{name}.js', 120) for name in ('first', 'second', 'third'))
+    cache.get(first)
+    cache.get(second)
+    cache.get(first)
+    cache.get(third)
+
+    assert cache.cached(second) is None
+    assert cache.cached(first) is not None and cache.cached(third) is not None
+    stats = cache.stats()
+    assert stats['resident_bytes'] == 240 and stats['evictions'] == 1
+
+
+def test_changed_file_is_read_again(tmp_path):
+    cache = HotFileCache()
+    entry = write_entry(tmp_path, 'a.js', 10)
+    cache.get(entry)
+    (tmp_path / 'a.js').write_bytes(b'changed content')
+    os.utime(tmp_path / 'a.js', (entry.mtime + 10, entry.mtime + 10))
+    assert cache.get(make_entry(str(tmp_path / 'a.js'), 'a.js')) == b'changed content'
+
+
+@pytest.mark.parametrize('max_file_size', [0, 16 * 1024 * 1024])
+def test_range_requests_from_memory_and_file(server, client, monkeypatch, max_file_size):
+    # max_file_size=0 时全部走 wsgi.file_wrapper（sendfile），否则从内存缓存返回
+    monkeypatch.setattr(server, 'HOT_FILE_CACHE', HotFileCache(max_bytes=16 * 1024 * 1024,
+                                                               max_file_size=max_file_size))
+    entry = server.STATIC_INDEX.get('game-manager.js')
+    with open(entry.path, 'rb') as f:
+        content = f.read()
+
+    response = client.get('/game-manager.js')
+    assert response.status_code == 200 and response.get_data() == content
+    assert server.HOT_FILE_CACHE.stats()['entries'] == (1 if max_file_size else 0)
+
+    response = client.get('/game-manager.js', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206 and response.headers['Accept-Ranges'] == 'bytes'
+    assert response.get_data() == content[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(content)}'
+
+    response = client.get('/game-manager.js', headers={'If-None-Match': f'"{entry.etag}"'})
+    assert response.status_code == 304
+    response = client.get('/game-manager.js', headers={'Range': f'bytes={len(content)}-'})
+    assert response.status_code == 416 and response.headers['Content-Range'] == f'bytes */{len(content)}'
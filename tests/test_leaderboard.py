@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+import sqlite_compat
+from leaderboard import Leaderboards, RankIndex, public_player_id
+
+
+@pytest.fixture
+def connect(tmp_path):
+    path = str(tmp_path / 'game.db')
+    sqlite_compat.init_schema(path)
+    return lambda: sqlite_compat.connect(path)
+
+
+def test_rank_index_matches_sorted_list():
+    rng = random.Random(3)
+    index, expected = RankIndex(load=4), []
+    for _ in range(500):
+        key = (rng.randrange(50), rng.random())
+        if expected and rng.random() < 0.3:
+            removed = expected.pop(rng.randrange(len(expected)))
+            index.remove(removed)
+        else:
+            expected.append(key)
+            index.add(key)
+        expected.sort()
+    assert len(index) == len(expected)
+    assert index.slice(0, len(expected)) == expected
+    assert index.slice(7, 19) == expected[7:19]
+    for position, key in enumerate(expected):
+        assert index.index(key) == position
+
+
+def test_best_score_is_kept(connect):
+    boards = Leaderboards(connect, boards=('total_score',))
+    assert boards.submit('total_score', 'p1', 'Alice', 100)[0] is True
+    improved, entry = boards.submit('total_score', 'p1', 'Alice2', 50)
+    # 成绩没有提高：分数不变，名称更新
+    assert improved is False
+    assert (entry['score'], entry['name'], entry['rank']) == (100, 'Alice2', 1)
+    assert boards.submit('total_score', 'p1', 'Alice2', 150)[1]['score'] == 150
+    assert boards.stats()['improvements'] == 2
+
+
+def test_top_and_around(connect):
+    boards = Leaderboards(connect, boards=('total_score',))
+    for number in range(20):
+        boards.submit('total_score', f'p{number:02d}', f'玩家{number}', number * 10)
+    # 同分时先达成的在前
+    boards.submit('total_score', 'late', '后来者', 100)
+
+    entries, total = boards.top('total_score', limit=3)
+    assert total == 21
+    assert [(entry['rank'], entry['player'], entry['score']) for entry in entries] == [
+        (1, 'p19', 190), (2, 'p18', 180), (3, 'p17', 170)
+    ]
+    entries, _ = boards.top('total_score', limit=2, offset=9)
+    assert [entry['player'] for entry in entries] == ['p10', 'late']
+
+    entry, entries, total = boards.around('total_score', 'late', distance=2)
+    assert entry['rank'] == 11
+    assert [item['player'] for item in entries] == ['p11', 'p10', 'late', 'p09', 'p08']
+    assert [item['rank'] for item in entries] == [9, 10, 11, 12, 13]
+    assert boards.around('total_score', 'p19', distance=2)[1][0]['rank'] == 1
+    assert boards.around('total_score', 'nobody') is None
+
+
+def test_flushed_scores_are_reloaded_and_merged(connect):
+    first = Leaderboards(connect, boards=('total_score', 'money_earned'))
+    first.submit('total_score', 'p1', 'Alice', 300)
+    first.submit('total_score', 'p2', 'Bob', 200)
+    first.submit('money_earned', 'p1', 'Alice', 5)
+    assert first.flush() == 3
+    assert first.flush() == 0
+
+    # 新进程启动时从数据库重建索引
+    second = Leaderboards(connect, boards=('total_score', 'money_earned'))
+    entries, total = second.top('total_score')
+    assert total == 2 and [(entry['player'], entry['score']) for entry in entries] == [('p1', 300), ('p2', 200)]
+
+    # 另一个进程写入的更好成绩通过 sync 合并，更差的成绩不会覆盖数据库中的最好成绩
+    second.submit('total_score', 'p2', 'Bob', 400)
+    second.flush()
+    first.submit('total_score', 'p2', 'Bob', 250)
+    first.flush()
+    assert first.sync() == 1
+    assert first.around('total_score', 'p2')[0]['rank'] == 1
+
+    third = Leaderboards(connect, boards=('total_score', 'money_earned'))
+    assert third.top('total_score', limit=1)[0][0]['score'] == 400
+
+
+def test_leaderboard_endpoints(server, client):
+    save_id = 'leaderboard-test-000000001'
+    response = client.post('/api/leaderboards/efficiency_score', json={
+        'save_id': save_id, 'name': '测试玩家', 'score': 42
+    })
+    body = response.get_json()
+    player = public_player_id(save_id)
+    assert response.status_code == 200 and body['improved'] is True
+    # 排行榜中只出现派生的玩家标识，不出现存档码
+    assert body['entry']['player'] == player and save_id not in response.get_data(as_text=True)
+
+    assert client.post('/api/leaderboards/efficiency_score', json={
+        'save_id': save_id, 'score': -1
+    }).status_code == 400
+    assert client.post('/api/leaderboards/no_such_board', json={}).status_code == 404
+
+    body = client.get('/api/leaderboards/efficiency_score?limit=5').get_json()
+    assert body['total'] >= 1 and player in [entry['player'] for entry in body['entries']]
+    body = client.get(f'/api/leaderboards/efficiency_score/around/{player}?range=1').get_json()
+    assert body['entry']['player'] == player
+    assert client.get('/api/leaderboards/efficiency_score/around/nobody').status_code == 404
+    assert client.get('/api/leaderboards/efficiency_score?limit=x').status_code == 400
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from plugin_listing import (SORTS, ListingError, build_listing_query, decode_cursor, encode_cursor,
+                            parse_listing_args)
+
+
+def listing_db():
+    """有并列排序值的小数据集：分数、评分人数、发布时间、名称都有重复"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE plugins (id INTEGER PRIMARY KEY, plugin_name TEXT, category TEXT,
+                              created_at TEXT, is_active BOOLEAN);
+        CREATE TABLE plugin_statistics (plugin_id INTEGER PRIMARY KEY, total_ratings INTEGER,
+                                        average_rating REAL, ranking_score REAL,
+                                        rating_1_count INTEGER, rating_2_count INTEGER,
+                                        rating_3_count INTEGER, rating_4_count INTEGER,
+                                        rating_5_count INTEGER, last_rating_at TEXT);
+    """)
+    for plugin_id in range(1, 24):
+        conn.execute("INSERT INTO plugins VALUES (?, ?, ?, ?, ?)", (
+            plugin_id, f"插件{plugin_id % 5}", 'tools' if plugin_id % 2 else 'fun',
+            f"2026-01-0{plugin_id % 4 + 1} 00:00:00", plugin_id != 7
+        ))
+        conn.execute("INSERT INTO plugin_statistics VALUES (?, ?, ?, ?, 0, 0, 0, 0, 0, NULL)", (
+            plugin_id, plugin_id % 3, round(plugin_id % 4 * 1.25, 2), round(3 + plugin_id % 6 * 0.1, 4)
+        ))
+    return conn
+
+
+def fetch_page(conn, sort, limit, category=None, cursor=None):
+    cursor_values = decode_cursor(sort, cursor) if cursor else None
+    sql, params = build_listing_query(sort, limit, category=category, cursor_values=cursor_values)
+    rows = [dict(row) for row in conn.execute(sql.replace('%s', '?'), params)]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, rows[-1]) if has_more else None
+
+
+@pytest.mark.parametrize('sort', list(SORTS))
+@pytest.mark.parametrize('category', [None, 'tools'])
+def test_pages_cover_full_ordering_without_duplicates(sort, category):
+    conn = listing_db()
+    sql, params = build_listing_query(sort, 1000, category=category)
+    expected = [row['plugin_id'] for row in conn.execute(sql.replace('%s', '?'), params)]
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(conn, sort, 4, category, cursor)
+        seen.extend(row['plugin_id'] for row in rows)
+        if cursor is None:
+            break
+    assert seen == expected
+    assert 7 not in seen
+
+
+def test_cursor_round_trips_decimal_and_datetime():
+    row = {'ranking_score': Decimal('3.1234'), 'plugin_id': 5,
+           'created_at': datetime(2026, 1, 2, 3, 4, 5)}
+    assert decode_cursor('rating', encode_cursor('rating', row)) == ['3.1234', 5]
+    assert decode_cursor('newest', encode_cursor('newest', row)) == ['2026-01-02 03:04:05', 5]
+    # 游标是 URL 安全的，不带填充
+    assert '=' not in encode_cursor('rating', row)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', '!!!', 'e30'])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ListingError):
+        decode_cursor('rating', cursor)
+
+
+def test_cursor_from_another_sort_is_rejected():
+    cursor = encode_cursor('name', {'plugin_name': 'a', 'plugin_id': 1})
+    with pytest.raises(ListingError):
+        decode_cursor('rating', cursor)
+
+
+@pytest.mark.parametrize('args', [{'sort': 'random'}, {'limit': '0'}, {'limit': '101'}, {'limit': 'x'}])
+def test_invalid_listing_args(args):
+    with pytest.raises(ListingError):
+        parse_listing_args(args)
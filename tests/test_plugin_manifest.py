@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(server):
+    server.RESPONSE_CACHE.clear()
+    yield
+    server.RESPONSE_CACHE.clear()
+
+
+def manifest(client):
+    response = client.get('/api/plugin-manifest')
+    assert response.status_code == 200
+    return {plugin['plugin_id']: plugin for plugin in response.get_json()['plugins']}
+
+
+def test_plugins_map_to_hashed_bundles(server, client):
+    plugins = manifest(client)
+    assert set(plugins) >= {'air-conditioning', 'printer-maintenance', 'smart-lighting'}
+
+    # 有脚本的插件指向带哈希的构建产物，并带完整性校验值
+    bundle = server.ASSET_PIPELINE.bundle('plugins/air-conditioning-plugin.js')
+    assert plugins['air-conditioning']['script'] == bundle.url_name
+    assert plugins['air-conditioning']['integrity'] == bundle.integrity
+    assert client.get(f"/{bundle.url_name}").headers['Cache-Control'].endswith('immutable')
+    # 没有脚本的插件
+    assert plugins['smart-lighting']['script'] is None and plugins['smart-lighting']['integrity'] is None
+
+
+def test_source_scripts_without_asset_build(server, client, monkeypatch):
+    monkeypatch.setattr(server, 'ASSET_PIPELINE', None)
+    plugins = manifest(client)
+    assert plugins['air-conditioning']['script'] == 'plugins/air-conditioning-plugin.js'
+    assert plugins['air-conditioning']['integrity'] is None
+
+
+def test_manifest_is_conditional(client):
+    etag = client.get('/api/plugin-manifest').headers['ETag']
+    response = client.get('/api/plugin-manifest', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.headers['ETag'] == etag
+
+
+def test_plugin_set_change_updates_manifest(server, client):
+    before = manifest(client)
+    connection = server.get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO plugins (plugin_name, plugin_id, description, author, version)
+                VALUES ('测试插件', 'manifest-test', '', '', '1.0.0')
+            """)
+        connection.commit()
+        server.PLUGIN_CATALOG.invalidate()
+
+        # 插件集合变化后快照版本改变，旧的缓存不再命中
+        after = manifest(client)
+        assert set(after) == set(before) | {'manifest-test'}
+        assert after['manifest-test']['script'] is None
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM plugin_statistics WHERE plugin_id IN "
+                           "(SELECT id FROM plugins WHERE plugin_id = 'manifest-test')")
+            cursor.execute("DELETE FROM plugins WHERE plugin_id = 'manifest-test'")
+        connection.commit()
+        connection.close()
+        server.PLUGIN_CATALOG.invalidate()
+    assert set(manifest(client)) == set(before)
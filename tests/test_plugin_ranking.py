@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import random
+
+from plugin_ranking import PluginRanking
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, args=None):
+        if self.db.down:
+            raise ConnectionError('数据库连接失败')
+
+    def fetchall(self):
+        # 与 LOAD_SQL 相同的顺序
+        return sorted(self.db.scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class FakeDb:
+    def __init__(self, scores):
+        self.scores = dict(scores)
+        self.down = False
+
+    def connect(self):
+        return self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def expected_rank(scores, plugin_id):
+    order = sorted(scores, key=lambda pid: (-scores[pid], pid))
+    return order.index(plugin_id) + 1
+
+
+def test_incremental_updates_match_full_sort():
+    rng = random.Random(7)
+    scores = {plugin_id: round(rng.uniform(1, 5), 2) for plugin_id in range(1, 200)}
+    db = FakeDb(scores)
+    ranking = PluginRanking(db.connect, refresh_interval=3600)
+    assert ranking.rank(1) is not None
+
+    for _ in range(500):
+        plugin_id = rng.randrange(1, 200)
+        # 分数取有限几个值，制造大量并列
+        scores[plugin_id] = rng.choice([2.5, 3.0, 3.5, round(rng.uniform(1, 5), 2)])
+        ranking.update({plugin_id: scores[plugin_id]})
+
+    for plugin_id in scores:
+        rank, total, score = ranking.rank(plugin_id)
+        assert (rank, total, score) == (expected_rank(scores, plugin_id), len(scores), scores[plugin_id])
+    top = ranking.top(5)
+    assert [plugin_id for plugin_id, _ in top] == sorted(scores, key=lambda pid: (-scores[pid], pid))[:5]
+
+
+def test_ties_are_ordered_by_plugin_id():
+    ranking = PluginRanking(FakeDb({3: 4.0, 1: 4.0, 2: 4.0}).connect)
+    assert [ranking.rank(plugin_id)[0] for plugin_id in (1, 2, 3)] == [1, 2, 3]
+    ranking.update({3: 4.5})
+    assert [ranking.rank(plugin_id)[0] for plugin_id in (3, 1, 2)] == [1, 2, 3]
+
+
+def test_unknown_plugin_update_waits_for_reload():
+    db = FakeDb({1: 3.0})
+    ranking = PluginRanking(db.connect, refresh_interval=3600)
+    ranking.rank(1)
+    ranking.update({2: 5.0})
+    assert ranking.rank(2) is None
+
+    db.scores[2] = 5.0
+    ranking.invalidate()
+    assert ranking.rank(2) == (1, 2, 5.0)
+
+
+def test_failed_reload_keeps_previous_ranking():
+    db = FakeDb({1: 3.0, 2: 4.0})
+    ranking = PluginRanking(db.connect, refresh_interval=0)
+    assert ranking.rank(1) == (2, 2, 3.0)
+
+    db.down = True
+    assert ranking.rank(1) == (2, 2, 3.0)
+    assert ranking.stats()['failures'] == 1
+
+
+def test_unavailable_before_first_load():
+    db = FakeDb({1: 3.0})
+    db.down = True
+    ranking = PluginRanking(db.connect)
+    assert ranking.rank(1) is None
+    assert ranking.top(10) is None
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+import re
+
+import pytest
+
+import plugin_stats
+import sqlite_compat
+from plugin_stats import (PLUGIN_STATS_DELTA_SQL, PLUGIN_STATS_REBUILD_SQL, apply_rating_changes,
+                          fetch_existing_ratings, rating_change_rows, reconcile)
+
+PLUGIN_IDS = (1, 2, 3)
+COUNT_FIELDS = [f'rating_{level}_count' for level in plugin_stats.RATING_LEVELS]
+
+
+@pytest.fixture
+def connection(tmp_path):
+    path = str(tmp_path / 'game.db')
+    sqlite_compat.init_schema(path, initial_data=True)
+    connection = sqlite_compat.connect(path)
+    yield connection
+    connection.close()
+
+
+def rate(connection, plugin_id, user_ip, rating):
+    """与同步评分接口相同的写入顺序：锁定旧评分、写入评分、按增量更新统计"""
+    connection.begin()
+    with connection.cursor() as cursor:
+        old_rating = fetch_existing_ratings(cursor, [(plugin_id, user_ip)]).get((plugin_id, user_ip))
+        cursor.execute("""
+            INSERT INTO plugin_ratings (plugin_id, user_ip, rating) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE rating = VALUES(rating)
+        """, (plugin_id, user_ip, rating))
+        apply_rating_changes(cursor, [(plugin_id, old_rating, rating)])
+    connection.commit()
+
+
+def statistics(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT plugin_id, total_ratings, {', '.join(COUNT_FIELDS)}, average_rating, ranking_score
+            FROM plugin_statistics WHERE total_ratings > 0 ORDER BY plugin_id
+        """)
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def rebuilt(connection):
+    """由 PLUGIN_STATS_REBUILD_SQL 聚合的期望统计"""
+    with connection.cursor() as cursor:
+        cursor.execute(PLUGIN_STATS_REBUILD_SQL)
+        rows = sorted(cursor.fetchall())
+    return [
+        (row[0], row[1], *row[2:7], plugin_stats.average_from_counts(row[2:7]),
+         plugin_stats.ranking_score_from_counts(row[2:7]))
+        for row in rows
+    ]
+
+
+def update_assignments():
+    """PLUGIN_STATS_DELTA_SQL 中 ON DUPLICATE KEY UPDATE 的赋值列表 [(列, 表达式)]"""
+    clause = PLUGIN_STATS_DELTA_SQL.split('ON DUPLICATE KEY UPDATE', 1)[1]
+    assignments, depth, current = [], 0, ''
+    for char in clause + ',':
+        depth += char == '('
+        depth -= char == ')'
+        if char == ',' and depth == 0:
+            column, expression = current.split('=', 1)
+            assignments.append((column.strip(), expression.strip()))
+            current = ''
+        else:
+            current += char
+    return assignments
+
+
+def apply_left_to_right(connection, row):
+    """按 MySQL 的语义执行更新分支：赋值从左到右执行，后面的赋值读到的是前面已更新的值"""
+    columns = ['plugin_id', 'total_ratings', 'average_rating', 'ranking_score'] + COUNT_FIELDS
+    values = dict(zip(columns, row))
+    with connection.cursor() as cursor:
+        for column, expression in update_assignments():
+            expression = re.sub(r'VALUES\((\w+)\)', lambda match: str(values[match.group(1)]), expression)
+            cursor.execute(f"UPDATE plugin_statistics SET {column} = {expression} WHERE plugin_id = %s",
+                           (values['plugin_id'],))
+
+
+def test_random_votes_match_rebuild(connection):
+    rng = random.Random(11)
+    for _ in range(300):
+        rate(connection, rng.choice(PLUGIN_IDS), f"10.0.0.{rng.randrange(20)}", rng.randint(1, 5))
+
+    assert statistics(connection) == rebuilt(connection)
+    assert reconcile(connection) == []
+
+
+def test_update_does_not_depend_on_assignment_order(connection, tmp_path):
+    rng = random.Random(5)
+    sqlite_compat.init_schema(str(tmp_path / 'mysql.db'), initial_data=True)
+    mysql_order = sqlite_compat.connect(str(tmp_path / 'mysql.db'))
+    for _ in range(200):
+        plugin_id, user_ip, rating = rng.choice(PLUGIN_IDS), f"10.0.0.{rng.randrange(10)}", rng.randint(1, 5)
+        with connection.cursor() as cursor:
+            old_rating = fetch_existing_ratings(cursor, [(plugin_id, user_ip)]).get((plugin_id, user_ip))
+        rate(connection, plugin_id, user_ip, rating)
+        for row in rating_change_rows([(plugin_id, old_rating, rating)])[1]:
+            with mysql_order.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM plugin_statistics WHERE plugin_id = %s", (plugin_id,))
+                if cursor.fetchone():
+                    apply_left_to_right(mysql_order, row)
+                else:
+                    cursor.execute(PLUGIN_STATS_DELTA_SQL, row)
+        # SQLite 的赋值都读更新前的值；从左到右执行（MySQL）每一步也得到相同的结果
+        assert statistics(mysql_order) == statistics(connection) == rebuilt(connection)
+    mysql_order.close()
+
+
+def test_changed_rating_without_statistics_row_inserts_clamped_counts(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO plugin_ratings (plugin_id, user_ip, rating) VALUES (2, 'a', 5)")
+        cursor.execute("INSERT INTO plugin_ratings (plugin_id, user_ip, rating) VALUES (2, 'b', 3)")
+        cursor.execute("DELETE FROM plugin_statistics WHERE plugin_id = 2")
+
+    # 统计行不存在时修改评分：旧星级的减一不能写成负数
+    rate(connection, 2, 'a', 4)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT total_ratings, {', '.join(COUNT_FIELDS)} FROM plugin_statistics WHERE plugin_id = 2")
+        assert tuple(cursor.fetchone()) == (1, 0, 0, 0, 1, 0)
+
+    # 评分 b 不在统计中，由对账修正
+    drift = reconcile(connection, fix=True)
+    assert [item['plugin_id'] for item in drift] == [2]
+    assert statistics(connection) == rebuilt(connection)
+
+
+def test_reconcile_reports_and_fixes_drift(connection):
+    for user_ip, rating in (('a', 5), ('b', 4), ('c', 4)):
+        rate(connection, 1, user_ip, rating)
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE plugin_statistics SET rating_5_count = 9, total_ratings = 11 WHERE plugin_id = 1")
+
+    drift = reconcile(connection)
+    assert len(drift) == 1 and drift[0]['plugin_id'] == 1
+    assert drift[0]['expected']['total_ratings'] == 3 and drift[0]['actual']['total_ratings'] == 11
+    # 只检查时不修改
+    assert reconcile(connection) == drift
+
+    reconcile(connection, fix=True)
+    assert reconcile(connection) == []
+    assert statistics(connection) == rebuilt(connection)
+
+
+def test_command_line_fix(tmp_path, monkeypatch, capsys):
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({
+        'data_dir': str(tmp_path), 'database': {'backend': 'sqlite', 'path': 'game.db'}
+    }), encoding='utf-8')
+    sqlite_compat.init_schema(str(tmp_path / 'game.db'), initial_data=True)
+    connection = sqlite_compat.connect(str(tmp_path / 'game.db'))
+    rate(connection, 3, 'a', 2)
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE plugin_statistics SET rating_2_count = 0 WHERE plugin_id = 3")
+    connection.close()
+    monkeypatch.delenv('BETTER_OFFICE_DATA_DIR', raising=False)
+
+    monkeypatch.setattr('sys.argv', ['plugin_stats.py', '--config', str(config_path)])
+    with pytest.raises(SystemExit) as exit_info:
+        plugin_stats.main()
+    assert exit_info.value.code == 1
+    assert '插件 3: rating_2_count 0 -> 1' in capsys.readouterr().out
+
+    monkeypatch.setattr('sys.argv', ['plugin_stats.py', '--config', str(config_path), '--fix'])
+    plugin_stats.main()
+    assert '已按评分明细修正' in capsys.readouterr().out
+
+    monkeypatch.setattr('sys.argv', ['plugin_stats.py', '--config', str(config_path)])
+    plugin_stats.main()
+    assert '一致' in capsys.readouterr().out
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+URL = '/api/plugin-stats?ids=1,2&recent=3'
+CACHE_KEY = 'plugin-stats-batch:1,2:3'
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(server):
+    # 加载插件目录时为没有统计行的插件补齐统计行
+    server.PLUGIN_CATALOG.snapshot()
+    server.RESPONSE_CACHE.clear()
+    yield
+    server.RESPONSE_CACHE.clear()
+
+
+def test_first_response_has_etag_and_is_cached(server, client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert [plugin['plugin_id'] for plugin in response.get_json()['plugins']] == [1, 2]
+    assert server.RESPONSE_CACHE.get(CACHE_KEY)[1] == etag.strip('"')
+
+    # 缓存命中和重新查询都得到相同的ETag
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 304
+    server.RESPONSE_CACHE.clear()
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_invalidation_while_streaming_is_not_cached(server, client):
+    response = client.get(URL, buffered=False)
+    chunks = response.response
+    first = next(chunks)
+    # 流式输出过程中有评分写入
+    server.invalidate_plugin_caches(1)
+    body = first + b''.join(chunks)
+    response.close()
+
+    assert json.loads(body)['count'] == 2
+    assert server.RESPONSE_CACHE.get(CACHE_KEY) is None
+
+
+def test_database_unavailable_serves_stale_copy(server, client, monkeypatch):
+    assert client.get(URL).status_code == 200
+    server.RESPONSE_CACHE.invalidate(CACHE_KEY)
+    monkeypatch.setattr(server, 'get_db_connection', lambda: None)
+
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.get_json()['stale'] is True
+
+    server.RESPONSE_CACHE.clear()
+    monkeypatch.setattr(server.RESPONSE_CACHE, 'last_good', lambda key: None)
+    monkeypatch.setattr(server.DB_BREAKER, 'is_open', lambda: True)
+    monkeypatch.setattr(server.DB_BREAKER, 'retry_after', lambda: 7)
+    response = client.get(URL)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
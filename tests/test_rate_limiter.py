@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import pytest
+from werkzeug.datastructures import Headers
+
+import rate_limiter
+from rate_limiter import RateLimiter
+
+ROUTE = '/api/rate-plugin'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock)
+    return clock
+
+
+def limiter(rate=2, burst=3, methods=('POST',)):
+    return RateLimiter.from_config({'routes': {ROUTE: {'rate': rate, 'burst': burst, 'methods': list(methods)}}})
+
+
+def test_burst_then_limited_with_retry_after(clock):
+    limits = limiter(rate=0.5, burst=3)
+    assert [limits.check(ROUTE, 'POST', '10.0.0.1') for _ in range(3)] == [None, None, None]
+    # 没有令牌：还差1个，按每秒0.5个补充需要2秒
+    assert limits.check(ROUTE, 'POST', '10.0.0.1') == 2
+    assert limits.stats()['limited'][ROUTE] == 1
+    assert limits.stats()['allowed'] == 3
+
+
+def test_tokens_refill_over_time_up_to_burst(clock):
+    limits = limiter(rate=2, burst=3)
+    for _ in range(3):
+        limits.check(ROUTE, 'POST', '10.0.0.1')
+    assert limits.check(ROUTE, 'POST', '10.0.0.1') == 1
+
+    clock.now += 0.5
+    assert limits.check(ROUTE, 'POST', '10.0.0.1') is None
+    assert limits.check(ROUTE, 'POST', '10.0.0.1') is not None
+
+    # 空闲很久也最多积攒 burst 个
+    clock.now += 60
+    assert [limits.check(ROUTE, 'POST', '10.0.0.1') for _ in range(4)] == [None, None, None, 1]
+
+
+def test_buckets_are_per_client_route_and_method(clock):
+    limits = limiter(rate=1, burst=1)
+    assert limits.check(ROUTE, 'POST', '10.0.0.1') is None
+    assert limits.check(ROUTE, 'POST', '10.0.0.1') is not None
+    assert limits.check(ROUTE, 'POST', '10.0.0.2') is None
+    assert limits.check(ROUTE, 'GET', '10.0.0.1') is None
+    assert limits.check('/api/plugins', 'POST', '10.0.0.1') is None
+
+
+@pytest.mark.parametrize('rate', [0, -1])
+def test_rate_must_be_positive(rate):
+    with pytest.raises(ValueError):
+        limiter(rate=rate)
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(server, monkeypatch):
+    monkeypatch.setattr(server, 'PROXY_COUNT', 0)
+    headers = Headers({'X-Forwarded-For': '1.1.1.1', 'X-Real-IP': '2.2.2.2'})
+    assert server.client_ip_from(headers, '10.0.0.9') == '10.0.0.9'
+    with server.app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+        assert server.get_client_ip() == '10.0.0.9'
+
+
+def test_forwarded_for_uses_address_added_by_trusted_proxy(server, monkeypatch):
+    monkeypatch.setattr(server, 'PROXY_COUNT', 1)
+    # 客户端伪造的 1.1.1.1 在前，代理追加的真实地址在最后
+    headers = Headers({'X-Forwarded-For': '1.1.1.1, 203.0.113.7'})
+    assert server.client_ip_from(headers, '127.0.0.1') == '203.0.113.7'
+    assert server.client_ip_from(Headers(), '127.0.0.1') == '127.0.0.1'
+
+    monkeypatch.setattr(server, 'PROXY_COUNT', 2)
+    assert server.client_ip_from(headers, '127.0.0.1') == '1.1.1.1'
+    assert server.client_ip_from(Headers({'X-Forwarded-For': '203.0.113.7'}), '127.0.0.1') == '127.0.0.1'
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sqlite3
+
+import pytest
+
+from rating_queue import RatingQueue
+
+
+class Writer:
+    """记录写入的评分；plugin_id 在 poison 中的评分写入时报数据错误"""
+
+    def __init__(self, poison=(), down=False):
+        self.poison = set(poison)
+        self.down = down
+        self.written = []
+
+    def __call__(self, votes):
+        if self.down:
+            raise ConnectionError('数据库连接失败')
+        if any(vote['plugin_id'] in self.poison for vote in votes):
+            raise ValueError('插件不存在')
+        self.written.extend(votes)
+
+
+def vote(plugin_id, rating=5):
+    return {'plugin_id': plugin_id, 'user_ip': '10.0.0.1', 'user_agent': 'test',
+            'rating': rating, 'comment': None}
+
+
+def attempts(queue):
+    return [row[0] for row in sqlite3.connect(queue.spool_path).execute(
+        "SELECT attempts FROM pending_ratings ORDER BY id")]
+
+
+def test_spool_path_is_relative_to_data_dir(tmp_path):
+    queue = RatingQueue.from_config(str(tmp_path), Writer(), {})
+    assert queue.spool_path == os.path.join(str(tmp_path), 'rating_queue.db')
+
+
+def test_batch_is_written_and_removed(tmp_path):
+    writer = Writer()
+    queue = RatingQueue(str(tmp_path / 'q.db'), writer, batch_size=10)
+    for plugin_id in range(3):
+        queue.enqueue(vote(plugin_id))
+
+    assert queue.flush_once() == 3
+    assert [v['plugin_id'] for v in writer.written] == [0, 1, 2]
+    assert queue.pending() == 0
+    assert queue.stats()['written'] == 3
+
+
+def test_poison_vote_does_not_block_others_and_is_dead_lettered(tmp_path):
+    writer = Writer(poison={1})
+    queue = RatingQueue(str(tmp_path / 'q.db'), writer, batch_size=10, max_attempts=3)
+    for plugin_id in range(3):
+        queue.enqueue(vote(plugin_id))
+
+    queue.flush_once()
+    assert sorted(v['plugin_id'] for v in writer.written) == [0, 2]
+    assert queue.pending() == 1
+    assert attempts(queue) == [1]
+
+    queue.flush_once()
+    assert attempts(queue) == [2]
+    queue.flush_once()
+    assert queue.pending() == 0
+    assert queue.dead_letters() == 1
+    row = sqlite3.connect(queue.spool_path).execute(
+        "SELECT attempts, error FROM failed_ratings").fetchone()
+    assert row == (3, '插件不存在')
+
+
+def test_connection_error_keeps_batch_without_counting_attempts(tmp_path):
+    writer = Writer(down=True)
+    queue = RatingQueue(str(tmp_path / 'q.db'), writer, batch_size=10, max_attempts=1)
+    queue.enqueue(vote(1))
+    queue.enqueue(vote(2))
+
+    with pytest.raises(ConnectionError):
+        queue.flush_once()
+    assert queue.pending() == 2
+    assert attempts(queue) == [0, 0]
+
+    writer.down = False
+    assert queue.flush_once() == 2
+    assert queue.pending() == 0
+    assert queue.dead_letters() == 0
+
+
+def test_old_spool_file_is_migrated(tmp_path):
+    path = str(tmp_path / 'q.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE pending_ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            claimed_by TEXT,
+            claimed_at REAL
+        )
+    """)
+    conn.execute("INSERT INTO pending_ratings (payload, created_at) VALUES (?, 0)",
+                 ('{"plugin_id": 7, "user_ip": "x", "user_agent": "", "rating": 4, "comment": null}',))
+    conn.commit()
+    conn.close()
+
+    writer = Writer()
+    queue = RatingQueue(path, writer)
+    assert queue.flush_once() == 1
+    assert writer.written[0]['plugin_id'] == 7
+
+
+def stored_rating(server, user_ip):
+    connection = server.get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rating FROM plugin_ratings WHERE plugin_id = 1 AND user_ip = %s", (user_ip,))
+            rating = cursor.fetchone()[0]
+            cursor.execute("SELECT total_ratings FROM plugin_statistics WHERE plugin_id = 1")
+            return rating, cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_older_vote_from_reclaimed_batch_does_not_overwrite_newer(server, tmp_path):
+    path = str(tmp_path / 'q.db')
+    stalled = RatingQueue(path, server.write_rating_batch, batch_size=1)
+    flusher = RatingQueue(path, server.write_rating_batch, batch_size=1)
+    stalled.enqueue(server.make_vote(1, '10.9.9.9', 'test', 2, None))
+    stalled.enqueue(server.make_vote(1, '10.9.9.9', 'test', 5, None))
+
+    # 第一个进程认领了旧评分后停顿，另一个进程先写入了新评分
+    _, rows = stalled._claim_batch()
+    assert flusher.flush_once() == 1
+    rating, total = stored_rating(server, '10.9.9.9')
+    assert rating == 5
+
+    # 停顿的进程恢复后写入旧评分：不覆盖新评分，统计也不变
+    server.write_rating_batch([json.loads(payload) for _, payload, _ in rows])
+    assert stored_rating(server, '10.9.9.9') == (5, total)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+class SlowLoad:
+    """阻塞到 release() 才返回的加载函数，记录调用次数"""
+
+    def __init__(self, value='v', error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def fetch_concurrently(cache, load, count):
+    results = []
+    errors = []
+
+    def worker():
+        try:
+            results.append(cache.fetch('k', load))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    assert load.started.wait(5)
+    # 等所有线程都加入同一次加载
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < count - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    load.gate.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResponseCache(ttl=10)
+    load = SlowLoad('v')
+    results, errors = fetch_concurrently(cache, load, 8)
+
+    assert load.calls == 1
+    assert results == ['v'] * 8 and errors == []
+    assert cache.stats()['coalesced'] == 7
+    assert cache.get('k') == 'v'
+
+
+def test_load_error_is_raised_to_every_waiter_and_not_cached():
+    cache = ResponseCache(ttl=10)
+    load = SlowLoad(error=RuntimeError('数据库不可用'))
+    results, errors = fetch_concurrently(cache, load, 4)
+
+    assert load.calls == 1
+    assert results == [] and len(errors) == 4
+    assert cache.get('k') is None
+    assert cache.stats()['in_flight'] == 0
+
+
+def test_stale_value_is_served_while_refreshing():
+    cache = ResponseCache(ttl=0.01, stale_ttl=10)
+    cache.set('k', 'old')
+    time.sleep(0.02)
+
+    load = SlowLoad('new')
+    assert cache.fetch('k', load) == 'old'
+    assert load.started.wait(5)
+    # 刷新进行中仍返回旧值，也不会再发起第二次加载
+    assert cache.fetch('k', load) == 'old'
+    load.gate.set()
+    deadline = time.monotonic() + 5
+    while cache.get('k') != 'new' and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert cache.get('k') == 'new'
+    assert load.calls == 1
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    cache = ResponseCache(ttl=10)
+    load = SlowLoad('before-invalidate')
+    thread = threading.Thread(target=cache.fetch, args=('k', load))
+    thread.start()
+    assert load.started.wait(5)
+    cache.invalidate('k')
+    load.gate.set()
+    thread.join(5)
+
+    assert cache.get('k') is None
+    assert cache.fetch('k', lambda: 'after') == 'after'
+
+
+def test_async_misses_share_one_load():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'v'
+
+    async def scenario():
+        cache = ResponseCache(ttl=10)
+        return await asyncio.gather(*(cache.fetch_async('k', load) for _ in range(10)))
+
+    assert asyncio.run(scenario()) == ['v'] * 10
+    assert len(calls) == 1
+
+
+def test_disabled_cache_always_loads():
+    cache = ResponseCache(enabled=False)
+    assert cache.fetch('k', lambda: 1) == 1
+    with pytest.raises(ZeroDivisionError):
+        cache.fetch('k', lambda: 1 / 0)
+    assert cache.get('k') is None
+
+
+def test_set_after_invalidation_is_skipped():
+    cache = ResponseCache(ttl=10)
+    generation = cache.generation()
+    cache.invalidate_prefix('other')
+    assert cache.set('k', 'before-invalidate', generation=generation) is False
+    assert cache.get('k') is None
+    assert cache.set('k', 'v', generation=cache.generation()) is True
+    assert cache.get('k') == 'v'
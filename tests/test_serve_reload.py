@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""serve.py --reload：USR2 重新执行主进程加载新配置，pid 文件交接，期间请求不中断"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import serve
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == 'win32' or not serve.module_available('gunicorn'), reason='需要 gunicorn'
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(port, path):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_until(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if condition():
+                return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def live_hub_answers(port):
+    with socket.create_connection(('127.0.0.1', port), timeout=2) as sock:
+        sock.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        return sock.recv(64).startswith(b'HTTP/1.1 200')
+
+
+@pytest.fixture
+def config(tmp_path):
+    with open(os.path.join(PROJECT_DIR, 'config.example.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['data_dir'] = str(tmp_path / 'data')
+    config['database']['backend'] = 'sqlite'
+    config['rating_queue']['enabled'] = False
+    config['metrics']['shared_dir'] = str(tmp_path / 'metrics')
+    config['live'].update({'host': '127.0.0.1', 'port': free_port(), 'publish_port': free_port()})
+    config['server'].update({
+        'host': '127.0.0.1', 'port': free_port(), 'mode': 'production', 'workers': 1, 'threads': 2,
+        'graceful_timeout': 5, 'max_requests': 0, 'pidfile': str(tmp_path / 'server.pid')
+    })
+    return config
+
+
+def write_config(path, config):
+    path.write_text(json.dumps(config), encoding='utf-8')
+
+
+def test_reload_hands_over_without_dropping_requests(tmp_path, config):
+    config_path = tmp_path / 'config.json'
+    write_config(config_path, config)
+    port = config['server']['port']
+    pidfile = config['server']['pidfile']
+    env = dict(os.environ)
+    env.pop('BETTER_OFFICE_DATA_DIR', None)
+    command = [sys.executable, 'serve.py', '--config', str(config_path)]
+
+    with open(tmp_path / 'server.log', 'wb') as log:
+        server = subprocess.Popen(command, cwd=PROJECT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        assert wait_until(lambda: serve.read_pid(pidfile) == server.pid and get(port, '/api/status') == 200)
+        assert get(port, '/api/leaderboards/reload_check') == 404
+
+        # 重新加载期间持续发送请求
+        results = []
+        stop = threading.Event()
+
+        def hammer():
+            while not stop.is_set():
+                try:
+                    results.append(get(port, '/api/leaderboards'))
+                except OSError as e:
+                    results.append(e)
+
+        thread = threading.Thread(target=hammer)
+        thread.start()
+
+        config['leaderboard']['boards'].append('reload_check')
+        write_config(config_path, config)
+        reload = subprocess.run(command + ['--reload'], cwd=PROJECT_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        assert reload.returncode == 0, reload.stdout
+
+        # 旧主进程处理完请求后退出，新主进程接管 pid 文件
+        assert server.wait(timeout=30) == 0
+        new_pid = serve.read_pid(pidfile)
+        assert new_pid not in (None, server.pid)
+        assert not os.path.exists(f'{pidfile}.2')
+
+        time.sleep(0.5)
+        stop.set()
+        thread.join(10)
+        assert results and all(result == 200 for result in results), [result for result in results if result != 200]
+
+        # 新主进程使用新配置，并接管实时推送端口
+        assert get(port, '/api/leaderboards/reload_check') == 200
+        assert wait_until(lambda: live_hub_answers(config['live']['port']), timeout=10)
+    finally:
+        # 新主进程不是本进程的子进程，按 pid 文件停止
+        if server.poll() is None:
+            server.terminate()
+        for path in (pidfile, f'{pidfile}.2'):
+            pid = serve.read_pid(path)
+            if pid and pid != server.pid:
+                os.kill(pid, signal.SIGTERM)
+        server.wait(timeout=15)
+        wait_until(lambda: serve.read_pid(pidfile) is None, timeout=15)
+
+
+def test_reload_without_running_server_fails(tmp_path, config):
+    config_path = tmp_path / 'config.json'
+    write_config(config_path, config)
+    assert serve.reload_server(str(config_path)) == 1
+
+    # pid 文件中的进程已退出
+    (tmp_path / 'server.pid').write_text('999999999\n', encoding='utf-8')
+    assert serve.read_pid(str(tmp_path / 'server.pid')) is None
+    assert serve.reload_server(str(config_path)) == 1
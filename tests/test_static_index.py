@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import os
+
+from static_index import StaticIndex
+
+
+def write(path, content=b'x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def test_database_and_data_files_are_never_indexed(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'index.html'), b'<html>')
+    write(os.path.join(root, 'data', 'game.db'), b'SQLite format 3\0')
+    write(os.path.join(root, 'data', 'metrics', '123.json'), b'{}')
+    for name in ('game.db', 'game.db-wal', 'game.db-shm', 'config.json', 'app.py'):
+        write(os.path.join(root, name))
+
+    index = StaticIndex(root, exclude=['*.log'])
+    index.refresh()
+
+    assert index.get('index.html') is not None
+    for rel_path in ('data/game.db', 'data/metrics/123.json', 'game.db', 'game.db-wal',
+                     'game.db-shm', 'config.json', 'app.py'):
+        assert index.get(rel_path) is None, rel_path
+
+
+def test_configured_exclude_adds_to_defaults(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'debug.log'))
+    write(os.path.join(root, 'game.db'))
+
+    index = StaticIndex(root, exclude=['*.log'])
+    index.refresh()
+
+    assert index.get('debug.log') is None
+    assert index.get('game.db') is None
+
+
+def test_database_is_outside_web_root(server):
+    assert not server.storage.inside(server.DATA_DIR, server.STATIC_DIR)
+    assert not server.storage.inside(server.DB_CONFIG['database'], server.STATIC_DIR)
+
+
+def test_database_file_is_not_served(server, client, tmp_path, monkeypatch):
+    # 即使数据库文件留在旧的默认位置（网站根目录下的 data/），也不能被下载
+    root = str(tmp_path)
+    write(os.path.join(root, 'index.html'), b'<html>')
+    write(os.path.join(root, 'data', 'game.db'), b'SQLite format 3\0')
+    index = StaticIndex(root)
+    index.refresh()
+    assert index.get('data/game.db') is None
+
+    monkeypatch.setattr(server, 'STATIC_INDEX', index)
+    monkeypatch.setattr(server, 'ASSET_PIPELINE', None)
+    assert client.get('/index.html').status_code == 200
+    response = client.get('/data/game.db')
+    assert response.status_code == 404
+    assert b'SQLite format 3' not in response.get_data()
+
+
+def test_metrics_snapshots_default_to_data_dir(tmp_path):
+    from metrics import ServerMetrics
+
+    metrics = ServerMetrics.from_config(str(tmp_path), {'slow_log_path': 'slow.log'})
+    assert metrics.registry.shared_dir == os.path.join(str(tmp_path), 'metrics')
+    assert metrics.slow_log_path == os.path.join(str(tmp_path), 'slow.log')
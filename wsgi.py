@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WSGI入口，供外部WSGI服务器直接加载:
+    gunicorn -w 4 -k gthread --threads 4 wsgi:app
+推荐使用 python3 serve.py，它会按 config.json 的 server 配置启动 gunicorn
+"""
+
+from app import create_app
+
+app = application = create_app()